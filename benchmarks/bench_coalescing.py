@@ -0,0 +1,150 @@
+"""Compare frames & latency per input action with & without coalescing.
+
+A mock VNC server (a websockets server in its own process) parses the KeyEvent &
+PointerEvent messages it receives, and rings the bell when an action is complete: a
+click is released, or ctrl is released at the end of a hotkey. The client repeats a
+left click (3 pointer events) & ctrl+alt+t (6 key events) with every message sent
+right away, coalesced within a window of 0 or 5 ms, & within a batch() block.
+Reports websocket messages per action (each is one write to the socket), and the
+p50 & p99 milliseconds until the server rang the bell.
+
+Run with: python benchmarks/bench_coalescing.py [--actions 200]
+"""
+
+import argparse
+import asyncio
+import time
+from multiprocessing import Process
+from struct import pack, unpack
+from typing import Callable, Dict, List, Optional
+
+from websockets.exceptions import ConnectionClosed
+from websockets.server import serve
+
+from wsvnc.constants import KEY_AltLeft, KEY_ControlLeft
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+PORT = 8801
+HOTKEY = [KEY_ControlLeft, KEY_AltLeft, ord("t")]
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def serve_forever() -> None:
+    async def handler(websocket) -> None:  # type: ignore
+        await websocket.send(b"RFB 003.008\n")
+        await websocket.recv()
+        await websocket.send(pack(">BB", 1, 1))
+        await websocket.recv()
+        await websocket.send(pack(">I", 0))
+        await websocket.recv()
+        pf = make_pixel_format().write_pixel_format()
+        await websocket.send(pack(">HH", 64, 64) + pf + pack(">I", 4) + b"mock")
+        mask = 0
+        try:
+            async for msg in websocket:
+                done = False
+                i = 0
+                while i < len(msg):
+                    if msg[i] == 4:
+                        down, key = unpack("!xBxxI", msg[i : i + 8])
+                        done |= key == KEY_ControlLeft and not down
+                        i += 8
+                    elif msg[i] == 5:
+                        done |= mask == 1 and msg[i + 1] == 0
+                        mask = msg[i + 1]
+                        i += 6
+                    else:
+                        break
+                if done:
+                    await websocket.send(b"\x02")
+        except ConnectionClosed:
+            pass
+
+    async def main() -> None:
+        async with serve(handler, "localhost", PORT, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def click(client: WSVNCClient) -> None:
+    client.left_click(10, 10)
+
+
+def hotkey(client: WSVNCClient) -> None:
+    for key in HOTKEY:
+        client.key_event(key, True)
+    for key in reversed(HOTKEY):
+        client.key_event(key, False)
+
+
+def measure(
+    window: Optional[float], batch: bool, action: Callable, actions: int
+) -> Dict[str, float]:
+    """Return websocket messages per action, and latency percentiles in ms."""
+    client = WSVNCClient(f"ws://localhost:{PORT}", coalesce_window=window)
+    transport = client._rfb_client.transport
+    latencies: List[float] = []
+    frames = transport.frames_sent
+    for _ in range(actions):
+        client._rfb_client.bell = None
+        start = time.perf_counter()
+        if batch:
+            with client.batch():
+                action(client)
+        else:
+            action(client)
+        while client.get_bell() is None:
+            time.sleep(0.00005)
+        latencies.append((time.perf_counter() - start) * 1000)
+    result = {
+        "frames": (transport.frames_sent - frames) / actions,
+        "p50": sorted(latencies)[len(latencies) // 2],
+        "p99": sorted(latencies)[int(len(latencies) * 0.99)],
+    }
+    client.close()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--actions", type=int, default=200)
+    args = parser.parse_args()
+
+    modes = [("off", None, False), ("0 ms", 0.0, False), ("5 ms", 0.005, False)]
+    modes.append(("batch()", None, True))
+    server = Process(target=serve_forever, daemon=True)
+    server.start()
+    time.sleep(1)
+    rows = []
+    try:
+        for action in (click, hotkey):
+            for name, window, batch in modes:
+                rows.append(
+                    (action.__name__, name, measure(window, batch, action, args.actions))
+                )
+    finally:
+        server.terminate()
+        server.join()
+
+    print(f"{'action':<8} {'coalescing':<11} {'frames':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for action_name, name, r in rows:
+        print(
+            f"{action_name:<8} {name:<11} {r['frames']:7.2f} "
+            f"{r['p50']:8.3f} {r['p99']:8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Compare the update rate of requesting updates with continuous updates over slow links.
+
+A mock VNC server (a websockets server in its own process) plays a small video at
+60 fps, and delays every message it sends & receives by half the round trip time,
+like a WAN link would. The client sets the resend flag, either without the
+ContinuousUpdates & Fence pseudo-encodings (so every update costs a request & a round
+trip) or with them (the server sends every frame as it comes out). Reports the
+updates per second the client applied for a few round trip times.
+
+Run with: python benchmarks/bench_continuous_updates.py [--seconds 3]
+"""
+
+import argparse
+import asyncio
+import time
+from multiprocessing import Process
+from struct import pack
+
+from websockets.exceptions import ConnectionClosed
+from websockets.server import serve
+
+from wsvnc.encodings.pseudo_continuous_updates_encoding import (
+    PseudoContinuousUpdatesEncoding,
+)
+from wsvnc.encodings.pseudo_fence_encoding import PseudoFenceEncoding
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+WIDTH, HEIGHT = 320, 240
+PORT = 8797
+VIDEO = (0, 0, 64, 64)
+VIDEO_FPS = 60
+RTTS_MS = [0, 20, 50, 100, 200]
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def serve_forever(rtt: float) -> None:
+    async def handler(websocket) -> None:  # type: ignore
+        loop = asyncio.get_running_loop()
+
+        def send_later(data: bytes) -> None:
+            """Send after half the round trip time, in order."""
+
+            async def send() -> None:
+                try:
+                    await websocket.send(data)
+                except ConnectionClosed:
+                    pass
+
+            loop.call_later(rtt / 2, asyncio.ensure_future, send())
+
+        await websocket.send(b"RFB 003.008\n")
+        await websocket.recv()
+        await websocket.send(pack(">BB", 1, 1))
+        await websocket.recv()
+        await websocket.send(pack(">I", 0))
+        await websocket.recv()
+        pf = make_pixel_format().write_pixel_format()
+        await websocket.send(pack(">HH", WIDTH, HEIGHT) + pf + pack(">I", 4) + b"mock")
+
+        start = time.perf_counter()
+        # an incremental request is waiting for the next frame
+        waiting = False
+        continuous = False
+        sent_frame = -1
+
+        def frame() -> int:
+            return int((time.perf_counter() - start) * VIDEO_FPS)
+
+        def update(full: bool) -> bytes:
+            nonlocal sent_frame
+            sent_frame = frame()
+            x, y, w, h = (0, 0, WIDTH, HEIGHT) if full else VIDEO
+            pixel = pack("<I", sent_frame & 0xFFFFFF)
+            return pack("!BxHHHHHi", 0, 1, x, y, w, h, 0) + pixel * w * h
+
+        def handle(msg: bytes) -> None:
+            nonlocal continuous, waiting
+            if msg[0] == 2 and pack(">i", -313) in msg:  # SetEncodings
+                send_later(b"\x96")
+            elif msg[0] == 3:  # FramebufferUpdateRequest
+                if not msg[1]:
+                    send_later(update(True))
+                elif not continuous:
+                    waiting = True
+            elif msg[0] == 150:  # EnableContinuousUpdates
+                continuous = bool(msg[1])
+                if not continuous:
+                    send_later(b"\x96")
+
+        async def tick() -> None:
+            nonlocal waiting
+            while True:
+                await asyncio.sleep(1 / VIDEO_FPS / 4)
+                if frame() != sent_frame and (continuous or waiting):
+                    waiting = False
+                    send_later(update(False))
+
+        ticker = asyncio.ensure_future(tick())
+        try:
+            async for msg in websocket:
+                loop.call_later(rtt / 2, handle, msg)
+        except ConnectionClosed:
+            pass
+        finally:
+            ticker.cancel()
+
+    async def main() -> None:
+        async with serve(handler, "localhost", PORT, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def measure(seconds: float, continuous: bool) -> float:
+    """Return the updates per second the client applied."""
+    client = WSVNCClient(f"ws://localhost:{PORT}")
+    if continuous:
+        client.set_encodings([PseudoContinuousUpdatesEncoding, PseudoFenceEncoding])
+    client.set_resend_flag()
+    client.wait_for_update(0, timeout=30)
+    # give continuous updates time to start
+    time.sleep(1)
+    seq = client.get_frame_seq()
+    time.sleep(seconds)
+    updates = client.get_frame_seq() - seq
+    assert client.get_continuous_updates() == continuous
+    client.close()
+    return updates / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    print(f"video {VIDEO_FPS} fps, updates per second applied")
+    print(f"{'RTT':>8} {'requests':>10} {'continuous':>11}")
+    for rtt in RTTS_MS:
+        server = Process(target=serve_forever, args=(rtt / 1000,), daemon=True)
+        server.start()
+        time.sleep(1)
+        try:
+            requests = measure(args.seconds, False)
+            continuous = measure(args.seconds, True)
+        finally:
+            server.terminate()
+            server.join()
+        print(f"{rtt:>6}ms {requests:10.1f} {continuous:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
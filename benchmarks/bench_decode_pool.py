@@ -0,0 +1,144 @@
+"""Compare decoding rectangles inline on the event loop with decoding in a pool.
+
+Replays a synthetic 4K JPEG heavy TightPNG session (every update is the whole screen
+as JPEG tiles, like a video playing full screen) through RFBClient.listen(), while
+another thread sends a pointer event every few milliseconds the way WSVNCClient
+does. Reports the updates decoded per second and how long the pointer events waited
+for the event loop before being sent, decoding inline, in a thread pool and in a
+process pool.
+
+Run with: python benchmarks/bench_decode_pool.py [--updates 20] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from struct import pack
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from websockets.exceptions import ConnectionClosedOK
+
+from wsvnc.encodings.tightpng_encoding import TightPNGEncoding
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.rfb.rfb_client import RFBClient
+from wsvnc.server_messages.framebuffer_update import build_decoders
+
+WIDTH, HEIGHT = 3840, 2160
+TILE_W, TILE_H = 960, 1080  # 8 JPEG rectangles per update
+CHUNK = 1 << 16  # websocket message size
+POINTER_INTERVAL = 0.005
+
+
+def make_updates(count: int, quality: int) -> List[bytes]:
+    """Smooth, changing content so every tile is a realistic photo-like JPEG."""
+    rng = np.random.default_rng(0)
+    texture = rng.integers(0, 256, (90, 160, 3), dtype=np.uint8)
+    texture = np.asarray(
+        Image.fromarray(texture).resize((WIDTH, HEIGHT), Image.BICUBIC)
+    )
+    updates = []
+    for i in range(count):
+        frame = np.roll(texture, i * 16, axis=1)
+        rects = []
+        for y in range(0, HEIGHT, TILE_H):
+            for x in range(0, WIDTH, TILE_W):
+                buffer = BytesIO()
+                tile = frame[y : y + TILE_H, x : x + TILE_W]
+                Image.fromarray(tile).save(buffer, format="JPEG", quality=quality)
+                data = buffer.getvalue()
+                n = len(data)
+                length = bytes([n & 0x7F | 0x80, n >> 7 & 0x7F | 0x80, n >> 14])
+                header = pack("!HHHHi", x, y, TILE_W, TILE_H, -260)
+                rects.append(header + b"\x90" + length + data)
+        updates.append(pack("!BxH", 0, len(rects)) + b"".join(rects))
+    return updates
+
+
+class FakeConn:
+    """Hands out the recorded stream as fast as the client reads it."""
+
+    def __init__(self, data: bytes) -> None:
+        self.chunks = [data[i : i + CHUNK] for i in range(0, len(data), CHUNK)]
+        self.sent: List[float] = []
+
+    async def recv(self) -> bytes:
+        # like a socket with data waiting, give other tasks a turn
+        await asyncio.sleep(0)
+        if not self.chunks:
+            raise ConnectionClosedOK(None, None)
+        return self.chunks.pop(0)
+
+    async def send(self, msg: bytes) -> None:
+        self.sent.append(time.perf_counter())
+
+    async def close(self) -> None:
+        pass
+
+
+def run(
+    updates: List[bytes], executor: Optional[Executor]
+) -> Tuple[float, List[float]]:
+    """Replay the updates, return the time taken & every pointer event's delay."""
+    conn = FakeConn(b"".join(updates))
+    client = RFBClient(conn, decode_executor=executor)  # type: ignore
+    client.width, client.height = WIDTH, HEIGHT
+    client.pixel_format = PixelFormat()
+    client.encs = [TightPNGEncoding]
+    client.decoders = build_decoders(client.encs)
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    start = time.perf_counter()
+    listening = asyncio.run_coroutine_threadsafe(client.listen(), loop)
+    submitted = []
+    while not listening.done():
+        submitted.append(time.perf_counter())
+        asyncio.run_coroutine_threadsafe(client.pointer_event(10, 10, 0), loop)
+        time.sleep(POINTER_INTERVAL)
+    elapsed = time.perf_counter() - start
+    # let the last pointer events through
+    time.sleep(0.1)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    delays = [sent - sub for sub, sent in zip(submitted, conn.sent)]
+    return elapsed, delays
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    updates = make_updates(args.updates, args.quality)
+    size = sum(len(u) for u in updates) / len(updates)
+    print(f"{args.updates} updates of {WIDTH}x{HEIGHT}, {size / 1024:.0f} KiB each")
+
+    for name, executor in (
+        ("inline", None),
+        ("threads", ThreadPoolExecutor(args.workers)),
+        ("processes", ProcessPoolExecutor(args.workers)),
+    ):
+        if executor is not None:
+            # start the workers before timing
+            executor.submit(int).result()
+        elapsed, delays = run(updates, executor)
+        if executor is not None:
+            executor.shutdown()
+        ms = np.array(delays) * 1000
+        print(
+            f"{name:9} {args.updates / elapsed:6.2f} updates/s"
+            f"  pointer delay median {np.median(ms):7.2f} ms"
+            f"  p99 {np.percentile(ms, 99):7.2f} ms  max {ms.max():7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Measure the per-rectangle cost of finding the decoder for an encoding type.
+
+The baseline replays the old dispatch (instantiating every accepted encoding for each
+rectangle to compare its type, without stopping at the first match). The table
+result is the dict lookup FrameBufferUpdate does now. An end-to-end parse of an
+update made of many tiny CopyRect rectangles is timed as well.
+
+Run with: python benchmarks/bench_dispatch.py [--rects 500] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import time
+from struct import pack
+from typing import List, Type
+
+from wsvnc.encodings.copyrect_encoding import CopyRectEncoding
+from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.pseudo_desktop_size_encoding import PseudoDesktopSizeEncoding
+from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.encodings.tightdiff_comp_encoding import TightPNGDiffCompEncoding
+from wsvnc.encodings.tightpng_encoding import TightPNGEncoding
+from wsvnc.encodings.tightpng_encoding_jpeg_10 import TightPNGEncodingJpegQuality10
+from wsvnc.encodings.vmware_define_cursor_encoding import VMWDefineCursorEncoding
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.server_messages.framebuffer_update import FrameBufferUpdate, build_decoders
+from wsvnc.utils.safe_transport import SafeTransport
+
+# CopyRect is listed last so the old dispatch has to look at every encoding.
+ENCODINGS: List[Type[EncodingInterface]] = [
+    TightPNGEncoding,
+    TightPNGEncodingJpegQuality10,
+    TightPNGDiffCompEncoding,
+    VMWDefineCursorEncoding,
+    PseudoDesktopSizeEncoding,
+    RawEncoding,
+    CopyRectEncoding,
+]
+
+
+class FakeConn:
+    """Hands out one pre-built websocket frame."""
+
+    def __init__(self, frame: bytes) -> None:
+        self.frame = frame
+
+    async def recv(self) -> bytes:
+        return self.frame
+
+
+def legacy_dispatch(enc_types: List[int]) -> int:
+    matches = 0
+    for enc_type in enc_types:
+        for enc in ENCODINGS:
+            encoding = enc()
+            if encoding.type() == enc_type:
+                matches += 1
+    return matches
+
+
+def table_dispatch(enc_types: List[int]) -> int:
+    decoders = build_decoders(ENCODINGS)
+    matches = 0
+    for enc_type in enc_types:
+        if decoders.get(enc_type) is not None:
+            matches += 1
+    return matches
+
+
+def build_update(rects: int) -> bytes:
+    msg = pack("!BxH", 0, rects)
+    for i in range(rects):
+        msg += pack("!HHHHi", i % 64, 0, 1, 1, 1) + pack("!HH", 0, 0)
+    return msg
+
+
+async def parse_update(update: bytes, pf: PixelFormat) -> None:
+    transport = SafeTransport(FakeConn(update))  # type: ignore
+    await transport.skip(1)  # message type
+    fbu = FrameBufferUpdate(
+        pf, fb=FrameBuffer(64, 1), decoders=build_decoders(ENCODINGS)
+    )
+    await fbu.read(transport, b"")
+
+
+def best_of(repeat: int, func, *args) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rects", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    enc_types = [1] * args.rects
+    legacy = best_of(args.repeat, legacy_dispatch, enc_types)
+    table = best_of(args.repeat, table_dispatch, enc_types)
+    print(f"{args.rects} rectangles, {len(ENCODINGS)} accepted encodings")
+    print(
+        f"old dispatch:   {legacy / args.rects * 1e6:8.3f} us/rect"
+        f" ({args.rects * len(ENCODINGS)} encoding objects)"
+    )
+    print(
+        f"table dispatch: {table / args.rects * 1e6:8.3f} us/rect ({legacy / table:.0f}x)"
+    )
+
+    update = build_update(args.rects)
+    pf = PixelFormat()
+    parse = best_of(args.repeat, lambda: asyncio.run(parse_update(update, pf)))
+    print(f"parse & decode: {parse / args.rects * 1e6:8.3f} us/rect (CopyRect 1x1)")
+
+
+if __name__ == "__main__":
+    main()
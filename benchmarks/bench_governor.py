@@ -0,0 +1,171 @@
+"""Measure what many continuously updated sessions cost, with & without throttling.
+
+A mock VNC server (a websockets server in its own process) plays a 160x120 video at
+60 fps on a 320x240 desktop, and answers every request with the video's Raw
+rectangle once a new frame is out. Several clients set the resend flag, either
+unthrottled (the next update is requested as soon as one is decoded), with a
+frame rate governor, or sharing one process-wide UpdateBudget. Reports the bytes
+the clients received, the updates they applied and the CPU time this process used,
+for all sessions together, after a warm-up.
+
+Run with: python benchmarks/bench_governor.py [--sessions 10] [--seconds 5]
+"""
+
+import argparse
+import asyncio
+import time
+from multiprocessing import Process
+from struct import pack
+from typing import Optional, Tuple
+
+import numpy as np
+from websockets.exceptions import ConnectionClosed
+from websockets.server import serve
+
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.update_budget import UpdateBudget
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+WIDTH, HEIGHT = 320, 240
+PORT = 8798
+VIDEO = (80, 60, 160, 120)
+VIDEO_FPS = 60
+FRAME_RATE = 5
+BYTES_PER_SECOND = 2e6
+# the first (whole screen) updates are charged to the budget too, give them time
+WARMUP = 2
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+async def handler(websocket) -> None:  # type: ignore
+    await websocket.send(b"RFB 003.008\n")
+    await websocket.recv()
+    await websocket.send(pack(">BB", 1, 1))
+    await websocket.recv()
+    await websocket.send(pack(">I", 0))
+    await websocket.recv()
+    pf = make_pixel_format().write_pixel_format()
+    await websocket.send(pack(">HH", WIDTH, HEIGHT) + pf + pack(">I", 4) + b"mock")
+
+    noise = np.random.default_rng(0).integers(0, 256, 1 << 22, dtype=np.uint8)
+    start = time.perf_counter()
+    # requests not answered yet: whether one is incremental, & the last frame sent
+    pending = asyncio.Event()
+    full = False
+    sent_frame = -1
+
+    async def read() -> None:
+        nonlocal full
+        async for msg in websocket:
+            if msg[0] == 3:  # FramebufferUpdateRequest
+                full = full or not msg[1]
+                pending.set()
+
+    reader = asyncio.ensure_future(read())
+    try:
+        while not reader.done():
+            await pending.wait()
+            frame = int((time.perf_counter() - start) * VIDEO_FPS)
+            if not full and frame == sent_frame:
+                await asyncio.sleep(
+                    (frame + 1) / VIDEO_FPS - time.perf_counter() + start
+                )
+                continue
+            x, y, w, h = (0, 0, WIDTH, HEIGHT) if full else VIDEO
+            offset = frame * 4099 % (len(noise) - w * h * 4)
+            header = pack("!BxHHHHHi", 0, 1, x, y, w, h, 0)
+            pending.clear()
+            full = False
+            sent_frame = frame
+            await websocket.send(header + noise[offset : offset + w * h * 4].tobytes())
+    except ConnectionClosed:
+        pass
+    finally:
+        reader.cancel()
+
+
+def serve_forever() -> None:
+    async def main() -> None:
+        async with serve(handler, "localhost", PORT, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def run(
+    sessions: int,
+    seconds: float,
+    fps: Optional[float],
+    budget: Optional[UpdateBudget],
+) -> Tuple[int, int, float]:
+    """Run the sessions, return the bytes received, updates & CPU time used."""
+    clients = [
+        WSVNCClient(f"ws://localhost:{PORT}", update_budget=budget)
+        for _ in range(sessions)
+    ]
+    for client in clients:
+        client.set_frame_rate(fps)
+        client.set_resend_flag()
+    for client in clients:
+        client.wait_for_update(0, timeout=30)
+    time.sleep(WARMUP)
+    received = [c._rfb_client.transport.bytes_received for c in clients]
+    seqs = [c.get_frame_seq() for c in clients]
+    cpu = time.process_time()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu
+    received_total = sum(
+        c._rfb_client.transport.bytes_received - r for c, r in zip(clients, received)
+    )
+    updates = sum(c.get_frame_seq() - s for c, s in zip(clients, seqs))
+    for client in clients:
+        client.pause_updates()
+    for client in clients:
+        client.close()
+    return received_total, updates, cpu
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    server = Process(target=serve_forever, daemon=True)
+    server.start()
+    time.sleep(1)
+    modes = (
+        ("unthrottled", None, None),
+        (f"{FRAME_RATE} fps each", FRAME_RATE, None),
+        (
+            f"budget {BYTES_PER_SECOND / 1e6:g} MB/s",
+            None,
+            UpdateBudget(bytes_per_second=BYTES_PER_SECOND),
+        ),
+    )
+    print(f"{args.sessions} sessions, {args.seconds:g}s, video {VIDEO_FPS} fps")
+    try:
+        for name, fps, budget in modes:
+            received, updates, cpu = run(args.sessions, args.seconds, fps, budget)
+            print(
+                f"{name:16} {received / args.seconds / 1e6:7.2f} MB/s"
+                f"  {updates / args.seconds:6.1f} updates/s"
+                f"  client CPU {cpu / args.seconds * 100:5.1f}%"
+            )
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
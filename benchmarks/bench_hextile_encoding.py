@@ -0,0 +1,234 @@
+"""Benchmark Hextile, RRE & CoRRE decoding of synthetic desktop frames against raw.
+
+Simple encoders turn every frame into one update per encoding: Hextile tiles are a
+background with one subrectangle per run of other colored pixels in a row (or raw,
+if that's smaller), (Co)RRE rectangles are the same on the whole frame (on 255x255
+rectangles for CoRRE). The updates are decoded in-process into a FrameBuffer
+through FrameBufferUpdate, and the result is checked against the source frame.
+It also compares FrameBuffer.fill_rects() with calling fill() for each rectangle.
+
+Run with: python benchmarks/bench_hextile_encoding.py [--frames 5] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import time
+from struct import pack
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.encodings.corre_encoding import CoRREEncoding
+from wsvnc.encodings.hextile_encoding import HextileEncoding
+from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.encodings.rre_encoding import RREEncoding
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.server_messages.framebuffer_update import FrameBufferUpdate, build_decoders
+from wsvnc.utils.safe_transport import SafeTransport
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def make_frames(count: int) -> List[np.ndarray]:
+    """Desktop-like frames: flat wallpaper, windows with text, and a small photo."""
+    rng = np.random.default_rng(0)
+    photo = rng.integers(0, 256, (40, 80, 3), dtype=np.uint8)
+    photo = np.asarray(Image.fromarray(photo).resize((160, 80), Image.BICUBIC))
+
+    frames = []
+    for i in range(count):
+        frame = np.full((HEIGHT, WIDTH, 3), (40, 80, 120), dtype=np.uint8)
+        x0 = 100 + i * 20
+        frame[100:600, x0 : x0 + 700] = (236, 236, 236)  # window
+        frame[100:130, x0 : x0 + 700] = (60, 90, 160)  # title bar
+        text = rng.random((400, 600)) < 0.05  # "text"
+        frame[160:560, x0 + 50 : x0 + 650][text] = (20, 20, 20)
+        frame[200:280, 1000:1160] = photo
+        frames.append(frame)
+    return frames
+
+
+def bgrx(pixels: np.ndarray) -> np.ndarray:
+    """(..., 3) RGB -> (..., 4) BGRX pixels."""
+    out = np.zeros(pixels.shape[:-1] + (4,), dtype=np.uint8)
+    out[..., :3] = pixels[..., ::-1]
+    return out
+
+
+def row_runs(block: np.ndarray, background: np.ndarray) -> np.ndarray:
+    """Return (x, y, width, pixel index) of runs of non-background pixels in rows."""
+    width = block.shape[1]
+    flat = block.reshape((-1, 3))
+    # a run starts where the color changes, or at the start of a row
+    starts = np.ones(len(flat), dtype=bool)
+    starts[1:] = (flat[1:] != flat[:-1]).any(axis=1)
+    starts[::width] = True
+    first = np.flatnonzero(starts)
+    ends = np.append(first[1:], len(flat))
+    keep = (flat[first] != background).any(axis=1)
+    first, ends = first[keep], ends[keep]
+    return np.stack([first % width, first // width, ends - first, first], axis=1)
+
+
+def most_common(block: np.ndarray) -> np.ndarray:
+    colors, counts = np.unique(block.reshape((-1, 3)), axis=0, return_counts=True)
+    return colors[counts.argmax()]
+
+
+def hextile_tile(tile: np.ndarray) -> bytes:
+    """A background & colored subrectangles, or a raw tile if that's smaller."""
+    raw = b"\x01" + bgrx(tile).tobytes()
+    background = most_common(tile)
+    runs = row_runs(tile, background)
+    if not len(runs):
+        return b"\x02" + bgrx(background).tobytes()
+    if len(runs) > 255:
+        return raw
+    flat = bgrx(tile).reshape((-1, 4))
+    subrects = b"".join(
+        flat[i].tobytes() + bytes([x << 4 | y, (w - 1) << 4])
+        for x, y, w, i in runs.tolist()
+    )
+    header = bytes([0x02 | 0x08 | 0x10]) + bgrx(background).tobytes()
+    return min(raw, header + bytes([len(runs)]) + subrects, key=len)
+
+
+def hextile_update(frame: np.ndarray) -> bytes:
+    tiles = b"".join(
+        hextile_tile(frame[y : y + 16, x : x + 16])
+        for y in range(0, HEIGHT, 16)
+        for x in range(0, WIDTH, 16)
+    )
+    return pack("!BxHHHHHi", 0, 1, 0, 0, WIDTH, HEIGHT, 5) + tiles
+
+
+def rre_rect(block: np.ndarray, coords: str) -> bytes:
+    background = most_common(block)
+    runs = row_runs(block, background)
+    flat = bgrx(block).reshape((-1, 4))
+    subrects = b"".join(
+        flat[i].tobytes() + pack(coords, x, y, w, 1) for x, y, w, i in runs.tolist()
+    )
+    return pack("!I", len(runs)) + bgrx(background).tobytes() + subrects
+
+
+def rre_update(frame: np.ndarray) -> bytes:
+    header = pack("!BxHHHHHi", 0, 1, 0, 0, WIDTH, HEIGHT, 2)
+    return header + rre_rect(frame, "!HHHH")
+
+
+def corre_update(frame: np.ndarray) -> bytes:
+    rects = []
+    for y in range(0, HEIGHT, 255):
+        for x in range(0, WIDTH, 255):
+            block = frame[y : y + 255, x : x + 255]
+            header = pack("!HHHHi", x, y, block.shape[1], block.shape[0], 4)
+            rects.append(header + rre_rect(block, "!BBBB"))
+    return pack("!BxH", 0, len(rects)) + b"".join(rects)
+
+
+def raw_update(frame: np.ndarray) -> bytes:
+    header = pack("!BxHHHHHi", 0, 1, 0, 0, WIDTH, HEIGHT, 0)
+    return header + bgrx(frame).tobytes()
+
+
+class FakeConn:
+    def __init__(self, frames: List[bytes]) -> None:
+        self.frames = list(frames)
+
+    async def recv(self) -> bytes:
+        return self.frames.pop(0)
+
+
+async def decode_updates(updates: List[bytes], encs: list) -> Tuple[float, FrameBuffer]:
+    """Decode the updates in order, return the total time & the framebuffer."""
+    pf = make_pixel_format()
+    transport = SafeTransport(FakeConn(updates))  # type: ignore
+    decoders = build_decoders(encs)
+    fb = FrameBuffer(WIDTH, HEIGHT)
+    start = time.perf_counter()
+    for _ in updates:
+        await transport.skip(1)  # message type
+        await FrameBufferUpdate(pf, fb=fb, decoders=decoders).read(transport, b"")
+    return time.perf_counter() - start, fb
+
+
+def bench_fill_rects(repeat: int) -> None:
+    rng = np.random.default_rng(0)
+    count = 20000
+    rects = np.stack(
+        [
+            rng.integers(0, WIDTH, count),
+            rng.integers(0, HEIGHT, count),
+            rng.integers(1, 17, count),
+            rng.integers(1, 17, count),
+        ],
+        axis=1,
+    )
+    colors = rng.integers(0, 256, (count, 3), dtype=np.uint8)
+    fb = FrameBuffer(WIDTH, HEIGHT)
+    rect_list = rects.tolist()
+    color_list = [tuple(c) for c in colors.tolist()]
+
+    def one_by_one() -> None:
+        for (x, y, w, h), color in zip(rect_list, color_list):
+            fb.fill(x, y, w, h, color)
+
+    def together() -> None:
+        fb.fill_rects(rects, colors)
+
+    for name, func in (("fill() each", one_by_one), ("fill_rects()", together)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        print(f"{count} rects up to 16x16, {name:13} {best * 1000:7.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    encoders: Dict[str, Tuple[Callable[[np.ndarray], bytes], list]] = {
+        "raw": (raw_update, [RawEncoding]),
+        "hextile": (hextile_update, [HextileEncoding]),
+        "rre": (rre_update, [RREEncoding]),
+        "corre": (corre_update, [CoRREEncoding]),
+    }
+
+    print(f"{args.frames} frames of {WIDTH}x{HEIGHT}")
+    for name, (encode, encs) in encoders.items():
+        updates = [encode(f) for f in frames]
+        best = float("inf")
+        for _ in range(args.repeat):
+            elapsed, fb = asyncio.run(decode_updates(updates, encs))
+            best = min(best, elapsed)
+        if not np.array_equal(fb.pixels[..., :3], frames[-1]):
+            raise RuntimeError(f"{name} decode doesn't match the last frame")
+        wire = sum(len(u) for u in updates)
+        print(
+            f"{name:8} {wire / args.frames / 1024:9.1f} KiB/frame"
+            f"  decode {best / args.frames * 1000:7.2f} ms/frame"
+        )
+    bench_fill_rects(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Time template search on 1080p screens, cold and as the screen changes.
+
+Draws a synthetic desktop (flat windows with noisy "text" & icons), then for small UI
+templates cut out of it times: matching on the whole screenshot every time (what
+searching get_screen() yourself costs), the cold search of ImageFinder, searching
+again with nothing changed, and searching again after small & large updates, which
+only searches the tiles the updates touched.
+
+Run with: python benchmarks/bench_image_search.py [--repeat 5]
+"""
+
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.damage_log import DamageLog
+from wsvnc.image_search import ImageFinder, match_scores
+
+WIDTH, HEIGHT = 1920, 1080
+TEMPLATES = [(16, 16), (32, 32), (64, 24)]
+# a line of text typed & a window opened
+SMALL = (300, 500, 200, 20)
+LARGE = (200, 150, 960, 540)
+
+
+def make_desktop(rng: np.random.Generator) -> np.ndarray:
+    pixels = np.full((HEIGHT, WIDTH, 4), 255, dtype=np.uint8)
+    pixels[..., :3] = (40, 80, 120)
+    for _ in range(12):
+        x, y = int(rng.integers(0, WIDTH - 400)), int(rng.integers(0, HEIGHT - 300))
+        w, h = int(rng.integers(200, 400)), int(rng.integers(150, 300))
+        pixels[y : y + h, x : x + w, :3] = rng.integers(180, 256, 3)
+        # "text" lines
+        for line in range(y + 30, y + h - 10, 18):
+            text = rng.integers(0, 2, (10, w - 40, 1)) * 200
+            pixels[line : line + 10, x + 20 : x + w - 20, :3] -= text.astype(np.uint8)
+    for i in range(40):
+        x, y = 10 + (i % 20) * 90, 1000 + (i // 20) * 40
+        pixels[y : y + 32, x : x + 64, :3] = rng.integers(0, 256, (32, 64, 3))
+    return pixels
+
+
+def timed(func: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pixels = make_desktop(rng)
+    screen = Image.fromarray(pixels)
+    print(f"{WIDTH}x{HEIGHT}")
+    for tw, th in TEMPLATES:
+        x, y = 10 + 5 * 90, 1000
+        template = pixels[y : y + th, x : x + tw, :3].copy()
+        lines: List[str] = []
+
+        def full() -> object:
+            scores = match_scores(np.asarray(screen), template.astype(np.float64))
+            return np.unravel_index(np.argmax(scores), scores.shape)
+
+        elapsed, _ = timed(full, args.repeat)
+        lines.append(f"whole screenshot {elapsed * 1000:7.1f} ms")
+
+        def cold() -> object:
+            log = DamageLog()
+            log.record(1, [(0, 0, WIDTH, HEIGHT)], screen)
+            return ImageFinder(log).find(template)
+
+        elapsed, match = timed(cold, args.repeat)
+        assert match is not None and (match.x, match.y) == (x, y)  # type: ignore
+        lines.append(f"cold {elapsed * 1000:7.1f} ms")
+
+        log = DamageLog()
+        log.record(1, [(0, 0, WIDTH, HEIGHT)], screen)
+        finder = ImageFinder(log)
+        finder.find(template)
+        elapsed, _ = timed(lambda: finder.find(template), args.repeat)
+        lines.append(f"unchanged {elapsed * 1000:6.2f} ms")
+
+        for name, rect in (("small", SMALL), ("large", LARGE)):
+            seq = log.seq
+
+            def changed() -> object:
+                nonlocal seq
+                seq += 1
+                log.record(seq, [rect], screen)
+                return finder.find(template)
+
+            elapsed, _ = timed(changed, args.repeat)
+            lines.append(f"after {name} update {elapsed * 1000:6.1f} ms")
+        print(f"{tw}x{th} template: " + "  ".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Compare scripted steps paced by sleeps with steps paced by input acknowledgements.
+
+A mock VNC server (a websockets server in its own process) answers every
+FramebufferUpdateRequest with a small raw update. Every step presses & releases a
+key, then waits for the next screen update:
+- with a defensive sleep of 50 ms after the input, as scripts did when they couldn't
+  tell if it was sent,
+- waiting for the input's future, which is done once it's written to the connection,
+- pipelined: requesting the update right after the input (it's sent after it on the
+  same connection) & checking the input's future afterwards.
+Reports the milliseconds per step, and how long it takes to notice the connection
+is gone.
+
+Run with: python benchmarks/bench_input_acks.py [--steps 100]
+"""
+
+import argparse
+import asyncio
+import time
+from multiprocessing import Process
+from struct import pack
+
+from websockets.exceptions import ConnectionClosed
+from websockets.server import serve
+
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+PORT = 8803
+SLEEP = 0.05
+MESSAGE_LENGTHS = {3: 10, 4: 8, 5: 6}
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def serve_forever() -> None:
+    async def handler(websocket) -> None:  # type: ignore
+        await websocket.send(b"RFB 003.008\n")
+        await websocket.recv()
+        await websocket.send(pack(">BB", 1, 1))
+        await websocket.recv()
+        await websocket.send(pack(">I", 0))
+        await websocket.recv()
+        pf = make_pixel_format().write_pixel_format()
+        await websocket.send(pack(">HH", 64, 64) + pf + pack(">I", 4) + b"mock")
+        update = pack(">BxHHHHHi", 0, 1, 0, 0, 8, 8, 0) + bytes(8 * 8 * 4)
+        try:
+            async for msg in websocket:
+                i = 0
+                while i < len(msg):
+                    if msg[i] == 3:
+                        await websocket.send(update)
+                    i += MESSAGE_LENGTHS.get(msg[i], len(msg))
+        except ConnectionClosed:
+            pass
+
+    async def main() -> None:
+        async with serve(handler, "localhost", PORT, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def step(client: WSVNCClient, pacing: str) -> None:
+    client.key_event(ord("a"), True)
+    written = client.key_event(ord("a"), False)
+    if pacing == "sleep":
+        time.sleep(SLEEP)
+    elif pacing == "ack":
+        written.result()
+    client.update_screen(8, 8, incremental=False, wait=True, timeout=5)
+    if pacing == "pipelined":
+        written.result()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=100)
+    args = parser.parse_args()
+
+    server = Process(target=serve_forever, daemon=True)
+    server.start()
+    time.sleep(1)
+    rows = []
+    try:
+        client = WSVNCClient(f"ws://localhost:{PORT}")
+        for pacing in ("sleep", "ack", "pipelined"):
+            start = time.perf_counter()
+            for _ in range(args.steps):
+                step(client, pacing)
+            rows.append((pacing, (time.perf_counter() - start) * 1000 / args.steps))
+        server.terminate()
+        server.join()
+
+        # how long until input on the dead connection fails
+        start = time.perf_counter()
+        try:
+            while True:
+                client.key_event(ord("a"), True).result(timeout=5)
+                time.sleep(0.001)
+        except ConnectionClosed:
+            noticed = (time.perf_counter() - start) * 1000
+        client.close()
+    finally:
+        if server.is_alive():
+            server.terminate()
+            server.join()
+
+    print(f"{'pacing':<10} {'ms per step':>12}")
+    for pacing, ms in rows:
+        print(f"{pacing:<10} {ms:12.2f}")
+    print(f"closed connection noticed after {noticed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
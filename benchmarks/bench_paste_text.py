@@ -0,0 +1,102 @@
+"""Compare how long pasting & typing text of 1 KB, 64 KB & 1 MB takes.
+
+A mock VNC server (a websockets server in its own process) echoes every
+ClientCutText back as ServerCutText, like x11vnc does, and rings the bell when it
+receives a marker key event, which the client sends right after the text. The client
+enters the text with paste_text() (waiting for the echo, then ctrl+v) & with
+type_text() (every key event in one write). Reports the milliseconds until the
+server rang the bell.
+
+Run with: python benchmarks/bench_paste_text.py
+"""
+
+import asyncio
+import time
+from multiprocessing import Process
+from struct import pack, unpack
+
+from websockets.exceptions import ConnectionClosed
+from websockets.server import serve
+
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+PORT = 8800
+LINE = "host=vm-01.example.com port=5900 user=Admin password=Secret!\n"
+SIZES = [("1 KB", 2**10), ("64 KB", 2**16), ("1 MB", 2**20)]
+MARKER = 0xFFFFFF
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def serve_forever() -> None:
+    async def handler(websocket) -> None:  # type: ignore
+        await websocket.send(b"RFB 003.008\n")
+        await websocket.recv()
+        await websocket.send(pack(">BB", 1, 1))
+        await websocket.recv()
+        await websocket.send(pack(">I", 0))
+        await websocket.recv()
+        pf = make_pixel_format().write_pixel_format()
+        await websocket.send(pack(">HH", 64, 64) + pf + pack(">I", 4) + b"mock")
+        try:
+            async for msg in websocket:
+                if msg[0] == 6:
+                    await websocket.send(b"\x03" + msg[1:])
+                elif msg[0] == 4 and unpack("!I", msg[-4:])[0] == MARKER:
+                    await websocket.send(b"\x02")
+        except ConnectionClosed:
+            pass
+
+    async def main() -> None:
+        async with serve(handler, "localhost", PORT, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def measure(client: WSVNCClient, text: str, paste: bool) -> float:
+    """Return the milliseconds until the server received the text."""
+    client._rfb_client.bell = None
+    start = time.perf_counter()
+    if paste:
+        assert client.paste_text(text)
+    else:
+        client.type_text(text).result()
+    client.key_event(MARKER, True)
+    while client.get_bell() is None:
+        time.sleep(0.0001)
+    return (time.perf_counter() - start) * 1000
+
+
+def main() -> None:
+    server = Process(target=serve_forever, daemon=True)
+    server.start()
+    time.sleep(1)
+    rows = []
+    try:
+        client = WSVNCClient(f"ws://localhost:{PORT}")
+        for name, size in SIZES:
+            text = (LINE * (size // len(LINE) + 1))[:size]
+            rows.append((name, measure(client, text, True), measure(client, text, False)))
+        client.close()
+    finally:
+        server.terminate()
+        server.join()
+
+    print(f"{'':<8} {'paste ms':>10} {'type ms':>10}")
+    for name, paste, typed in rows:
+        print(f"{name:<8} {paste:10.1f} {typed:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
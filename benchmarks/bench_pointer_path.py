@@ -0,0 +1,134 @@
+"""Compare a smooth drag made of pointer_event() calls with drag() along a path.
+
+A mock VNC server (a websockets server in its own process) counts the pointer events
+it receives & rings the bell when the button is released. The client drags along a
+bezier curve across a 1920x1080 screen for a second: by calling pointer_event() for
+every pixel of the curve (a future & a websocket message each) as scripts do, and
+with drag() at 60 & 120 events a second, and at 1000 a second with a coalesce window
+of 10 ms, where the moves superseded within the window are dropped from the send
+queue. Reports the calls made, websocket messages sent & pointer events received,
+and the milliseconds until the server got the release.
+
+Run with: python benchmarks/bench_pointer_path.py
+"""
+
+import asyncio
+import time
+from multiprocessing import Process
+from struct import pack
+from typing import Dict, Optional
+
+from websockets.exceptions import ConnectionClosed
+from websockets.server import serve
+
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.pointer import PointerPath
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+PORT = 8802
+PATH = PointerPath([(10, 10), (600, 1070), (1300, -400), (1910, 1070)], bezier=True)
+DURATION = 1.0
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def serve_forever() -> None:
+    async def handler(websocket) -> None:  # type: ignore
+        await websocket.send(b"RFB 003.008\n")
+        await websocket.recv()
+        await websocket.send(pack(">BB", 1, 1))
+        await websocket.recv()
+        await websocket.send(pack(">I", 0))
+        await websocket.recv()
+        pf = make_pixel_format().write_pixel_format()
+        await websocket.send(pack(">HH", 1920, 1080) + pf + pack(">I", 4) + b"mock")
+        mask = 0
+        events = 0
+        try:
+            async for msg in websocket:
+                for i in range(0, len(msg), 6):
+                    released = mask == 1 and msg[i + 1] == 0
+                    mask = msg[i + 1]
+                    events += 1
+                    if released:
+                        # the bell, then the events received as cut text
+                        text = str(events).encode()
+                        await websocket.send(b"\x02" + pack("!BxxxI", 3, len(text)) + text)
+                        events = 0
+        except ConnectionClosed:
+            pass
+
+    async def main() -> None:
+        async with serve(handler, "localhost", PORT, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def measure(rate: Optional[float], window: Optional[float] = None) -> Dict[str, float]:
+    """Drag along PATH, with pointer_event() calls if rate is None."""
+    client = WSVNCClient(f"ws://localhost:{PORT}", coalesce_window=window)
+    transport = client._rfb_client.transport
+    client._rfb_client.bell = None
+    frames = transport.frames_sent
+    start = time.perf_counter()
+    if rate is None:
+        positions = PATH.sample(DURATION, rate=10000)
+        x, y = PATH.at(0)
+        client.move(x, y)
+        client.pointer_event(x, y, 1)
+        for x, y in positions:
+            client.pointer_event(x, y, 1)
+        client.pointer_event(x, y, 0)
+        calls = len(positions) + 3
+    else:
+        client.drag(PATH, DURATION, rate=rate)
+        calls = 1
+    while client.get_bell() is None:
+        time.sleep(0.0001)
+    elapsed = (time.perf_counter() - start) * 1000
+    time.sleep(0.1)
+    result = {
+        "calls": calls,
+        "frames": transport.frames_sent - frames,
+        "events": int(client.get_clipboard()),
+        "ms": elapsed,
+    }
+    client.close()
+    return result
+
+
+def main() -> None:
+    server = Process(target=serve_forever, daemon=True)
+    server.start()
+    time.sleep(1)
+    try:
+        rows = [
+            ("pointer_event() per pixel", measure(None)),
+            ("drag() 60/s", measure(60)),
+            ("drag() 120/s", measure(120)),
+            ("drag() 1000/s, 10 ms window", measure(1000, 0.01)),
+        ]
+    finally:
+        server.terminate()
+        server.join()
+
+    print(f"{'':<28} {'calls':>6} {'frames':>7} {'events':>7} {'ms':>8}")
+    for name, r in rows:
+        print(
+            f"{name:<28} {r['calls']:6d} {r['frames']:7d} {r['events']:7d} "
+            f"{r['ms']:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
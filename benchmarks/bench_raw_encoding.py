@@ -0,0 +1,93 @@
+"""Benchmark RawEncoding bulk decoding against a per-pixel putpixel loop.
+
+Run with: python benchmarks/bench_raw_encoding.py [--skip-per-pixel]
+"""
+
+import argparse
+import time
+from os import urandom
+from struct import unpack
+
+from PIL import Image
+
+from wsvnc.color import Color
+from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.pixel_format import PixelFormat
+
+
+def make_pixel_format(big_endian: int, shifts: tuple, maxes: tuple) -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = big_endian
+    pf.true_color = 1
+    pf.red_shift, pf.green_shift, pf.blue_shift = shifts
+    pf.red_max, pf.green_max, pf.blue_max = maxes
+    return pf
+
+
+def make_color_map_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 8
+    pf.big_endian = 0
+    pf.true_color = 0
+    pf.color_map = {i: Color(r=i, g=255 - i, b=i // 2) for i in range(256)}
+    return pf
+
+
+def read_per_pixel(width: int, height: int, msg: bytes, pf: PixelFormat) -> Image.Image:
+    """Decode 32bpp pixels one at a time, the way RawEncoding used to."""
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    byteorder = ">" if pf.big_endian else "<"
+    for i in range(width * height):
+        raw_pixel = unpack(byteorder + "I", msg[i * 4 : i * 4 + 4])[0]
+        if pf.true_color:
+            r = (raw_pixel >> pf.red_shift & pf.red_max) & 0xFFFF
+            g = (raw_pixel >> pf.green_shift & pf.green_max) & 0xFFFF
+            b = (raw_pixel >> pf.blue_shift & pf.blue_max) & 0xFFFF
+        else:
+            color = pf.color_map[raw_pixel & 0xFF]
+            r, g, b = color.r, color.g, color.b
+        img.putpixel((i % width, i // width), (r, g, b, 255))
+    return img
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skip-per-pixel", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    formats = {
+        "BGRX (Pillow)": make_pixel_format(0, (16, 8, 0), (255, 255, 255)),
+        "shift/mask (NumPy)": make_pixel_format(1, (0, 8, 16), (256, 256, 256)),
+        "color map (NumPy)": make_color_map_format(),
+    }
+    sizes = {"1080p": (1920, 1080), "4K": (3840, 2160)}
+
+    for size_name, (width, height) in sizes.items():
+        msg = urandom(width * height * 4)
+        for fmt_name, pf in formats.items():
+            enc = RawEncoding()
+            bulk = min(
+                timed(enc.read, width, height, msg, pf) for _ in range(args.repeat)
+            )
+            line = f"{size_name:6} {fmt_name:20} bulk: {bulk * 1000:9.2f} ms"
+            if not args.skip_per_pixel:
+                per_pixel = timed(read_per_pixel, width, height, msg, pf)
+                line += (
+                    f"  per-pixel: {per_pixel * 1000:10.2f} ms"
+                    f"  speedup: {per_pixel / bulk:7.0f}x"
+                )
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Compare the threads & memory of many sessions, threaded & on one event loop.
+
+A mock VNC server (a websockets server in its own process) answers every request
+with a full screen. The client process opens the sessions either as WSVNCClients
+(each with its own event loop & thread) or with a SessionManager (AsyncWSVNCClients
+on one event loop), then takes a screenshot of every session. Reports the threads &
+resident memory the sessions added, & the CPU time per session of connecting.
+
+Run with: python benchmarks/bench_sessions.py [--sessions 200]
+"""
+
+import argparse
+import asyncio
+import os
+import threading
+import time
+from multiprocessing import Process
+from struct import pack
+from typing import Tuple
+
+from websockets.exceptions import ConnectionClosed
+from websockets.server import serve
+
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.vnc.session_manager import SessionManager
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+WIDTH, HEIGHT = 320, 240
+PORT = 8799
+URL = f"ws://localhost:{PORT}"
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def serve_forever() -> None:
+    screen = pack("!BxHHHHHi", 0, 1, 0, 0, WIDTH, HEIGHT, 0) + b"\x80" * (
+        WIDTH * HEIGHT * 4
+    )
+
+    async def handler(websocket) -> None:  # type: ignore
+        await websocket.send(b"RFB 003.008\n")
+        await websocket.recv()
+        await websocket.send(pack(">BB", 1, 1))
+        await websocket.recv()
+        await websocket.send(pack(">I", 0))
+        await websocket.recv()
+        pf = make_pixel_format().write_pixel_format()
+        await websocket.send(pack(">HH", WIDTH, HEIGHT) + pf + pack(">I", 4) + b"mock")
+        try:
+            async for msg in websocket:
+                if msg[0] == 3:
+                    await websocket.send(screen)
+        except ConnectionClosed:
+            pass
+
+    async def main() -> None:
+        async with serve(handler, "localhost", PORT, max_size=None, backlog=1024):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def rss_mib() -> float:
+    """Resident memory of this process."""
+    with open(f"/proc/{os.getpid()}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure_threaded(sessions: int) -> Tuple[int, float, float]:
+    """Return the threads, MiB & CPU ms per session of WSVNCClients."""
+    threads, memory, cpu = threading.active_count(), rss_mib(), time.process_time()
+    clients = [WSVNCClient(URL) for _ in range(sessions)]
+    connect_cpu = time.process_time() - cpu
+    for client in clients:
+        client.update_screen(wait=True, timeout=30)
+    result = (
+        threading.active_count() - threads,
+        rss_mib() - memory,
+        connect_cpu * 1000 / sessions,
+    )
+    for client in clients:
+        client.close()
+    return result
+
+
+def measure_manager(sessions: int) -> Tuple[int, float, float]:
+    """Return the threads, MiB & CPU ms per session of a SessionManager."""
+
+    async def main() -> Tuple[int, float, float]:
+        threads, memory, cpu = threading.active_count(), rss_mib(), time.process_time()
+        async with SessionManager() as manager:
+            urls = {f"vm{i}": URL for i in range(sessions)}
+            failed = await manager.open_all(urls)
+            assert not failed, failed
+            connect_cpu = time.process_time() - cpu
+            screens = await manager.screenshot_all(timeout=30)
+            assert len(screens) == sessions
+            return (
+                threading.active_count() - threads,
+                rss_mib() - memory,
+                connect_cpu * 1000 / sessions,
+            )
+
+    return asyncio.run(main())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    args = parser.parse_args()
+
+    server = Process(target=serve_forever, daemon=True)
+    server.start()
+    time.sleep(1)
+    try:
+        rows = [
+            ("WSVNCClient", measure_threaded(args.sessions)),
+            ("SessionManager", measure_manager(args.sessions)),
+        ]
+    finally:
+        server.terminate()
+        server.join()
+
+    print(f"{args.sessions} sessions, {WIDTH}x{HEIGHT} screens")
+    print(f"{'':<16} {'threads':>8} {'MiB':>8} {'MiB/session':>12} {'connect CPU ms':>15}")
+    for name, (threads, memory, cpu) in rows:
+        print(
+            f"{name:<16} {threads:>8} {memory:8.1f} {memory / args.sessions:12.2f} "
+            f"{cpu:15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
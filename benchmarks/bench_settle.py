@@ -0,0 +1,133 @@
+"""Compare waiting for many screens to settle using damage vs comparing screenshots.
+
+Runs a number of RFBClient sessions on one event loop, each getting a burst of small
+raw updates (like a window redrawing after a click) and then nothing. Every session
+waits for its screen to be stable for --quiet-ms, either with wait_until_stable(),
+which only looks at the rectangles of the updates, or by taking a screenshot every
+--poll-ms and comparing it with the previous one. Reports how long after their last
+update the sessions noticed, and the CPU time the whole process used.
+
+Run with: python benchmarks/bench_settle.py [--sessions 200] [--updates 10]
+"""
+
+import argparse
+import asyncio
+import time
+from struct import pack
+from typing import List
+
+import numpy as np
+
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.rfb.rfb_client import RFBClient
+
+WIDTH, HEIGHT = 640, 480
+RECT = 64
+UPDATE_INTERVAL = 0.03
+
+
+class FakeConn:
+    """Sends a burst of updates at a steady rate, then goes quiet."""
+
+    def __init__(self, updates: int, seed: int) -> None:
+        rng = np.random.default_rng(seed)
+        self.updates = [
+            pack("!BxHHHHHi", 0, 1, x, y, RECT, RECT, 0)
+            + rng.integers(0, 256, RECT * RECT * 4, dtype=np.uint8).tobytes()
+            for x, y in zip(
+                rng.integers(0, WIDTH - RECT, updates),
+                rng.integers(0, HEIGHT - RECT, updates),
+            )
+        ]
+        self.last_update = 0.0
+
+    async def recv(self) -> bytes:
+        await asyncio.sleep(UPDATE_INTERVAL)
+        if not self.updates:
+            await asyncio.Event().wait()
+        self.last_update = time.perf_counter()
+        return self.updates.pop(0)
+
+    async def send(self, msg: bytes) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+def make_client(conn: FakeConn) -> RFBClient:
+    client = RFBClient(conn)  # type: ignore
+    client.width, client.height = WIDTH, HEIGHT
+    client.pixel_format = PixelFormat()
+    client.pixel_format.bpp = 32
+    client.pixel_format.depth = 24
+    client.pixel_format.big_endian = 0
+    client.pixel_format.true_color = 1
+    client.pixel_format.red_max = 255
+    client.pixel_format.green_max = 255
+    client.pixel_format.blue_max = 255
+    client.pixel_format.red_shift = 16
+    client.pixel_format.green_shift = 8
+    client.pixel_format.blue_shift = 0
+    return client
+
+
+async def settle_by_damage(client: RFBClient, quiet_ms: int, poll_ms: int) -> None:
+    await client.wait_until_stable(quiet_ms=quiet_ms)
+
+
+async def settle_by_screenshots(client: RFBClient, quiet_ms: int, poll_ms: int) -> None:
+    previous = None
+    unchanged_since = time.perf_counter()
+    while time.perf_counter() - unchanged_since < quiet_ms / 1000:
+        await asyncio.sleep(poll_ms / 1000)
+        img = client.img
+        screen = None if img is None else np.asarray(img)
+        if previous is None or screen is None or not np.array_equal(screen, previous):
+            unchanged_since = time.perf_counter()
+        previous = screen
+
+
+async def run(args: argparse.Namespace, settle) -> List[float]:
+    """Settle every session, return how long after its last update each noticed."""
+    conns = [FakeConn(args.updates, i) for i in range(args.sessions)]
+    clients = [make_client(conn) for conn in conns]
+    listening = [asyncio.ensure_future(client.listen()) for client in clients]
+
+    async def session(client: RFBClient, conn: FakeConn) -> float:
+        await settle(client, args.quiet_ms, args.poll_ms)
+        return time.perf_counter() - conn.last_update
+
+    delays = await asyncio.gather(
+        *(session(client, conn) for client, conn in zip(clients, conns))
+    )
+    for task in listening:
+        task.cancel()
+    return list(delays)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=10)
+    parser.add_argument("--quiet-ms", type=int, default=300)
+    parser.add_argument("--poll-ms", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions of {WIDTH}x{HEIGHT}, {args.updates} updates each")
+    for name, settle in (
+        ("damage", settle_by_damage),
+        ("screenshots", settle_by_screenshots),
+    ):
+        start, cpu = time.perf_counter(), time.process_time()
+        delays = asyncio.run(run(args, settle))
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+        ms = np.array(delays) * 1000
+        print(
+            f"{name:11} settled after the last update median {np.median(ms):6.0f} ms"
+            f"  max {ms.max():6.0f} ms   wall {elapsed:5.2f} s  CPU {cpu:5.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark publishing framebuffer snapshots, and readers of the screen in other threads.
+
+First times FrameBuffer.commit() at 4K for updates of different sizes, against the full
+copy of the screen readers had to make before snapshots (get_screen() returned the image
+being decoded into). Then a writer thread draws & commits updates while reader threads
+poll the screen every couple of milliseconds and look at part of it, and reports the
+writer's updates/s, and how long taking the screen took, as a snapshot or as a copy
+of the live image.
+
+Run with: python benchmarks/bench_snapshots.py [--seconds 2] [--readers 4]
+"""
+
+import argparse
+import threading
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.framebuffer import FrameBuffer
+
+WIDTH, HEIGHT = 3840, 2160
+# rectangles of a typical update: a few 256x256 tiles (like a window being typed in)
+SMALL = [(x, 400, 256, 256) for x in range(0, 2048, 256)]
+QUARTER = [(0, 0, WIDTH // 2, HEIGHT // 2)]
+FULL = [(0, 0, WIDTH, HEIGHT)]
+POLL_INTERVAL = 0.002
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_commit(repeat: int) -> None:
+    fb = FrameBuffer(WIDTH, HEIGHT)
+    for name, rects in (("8 256x256", SMALL), ("quarter", QUARTER), ("full", FULL)):
+        elapsed = best_of(lambda: fb.commit(rects), repeat)
+        print(f"commit {name:10} update {elapsed * 1000:7.2f} ms")
+    elapsed = best_of(lambda: fb.img.copy(), repeat)
+    print(f"img.copy() of the screen   {elapsed * 1000:7.2f} ms")
+
+
+def contention(
+    readers: int, seconds: float, snapshots: bool
+) -> Tuple[float, List[float]]:
+    """Return the updates/s of the writer & how long every read took."""
+    fb = FrameBuffer(WIDTH, HEIGHT)
+    rng = np.random.default_rng(0)
+    colors = [tuple(int(c) for c in rng.integers(0, 256, 3)) for _ in range(64)]
+    stop = threading.Event()
+    reads: List[float] = []
+    updates = 0
+
+    def get_screen() -> Image.Image:
+        return fb.snapshot if snapshots else fb.img.copy()
+
+    def read() -> None:
+        while not stop.is_set():
+            start = time.perf_counter()
+            img = get_screen()
+            reads.append(time.perf_counter() - start)
+            img.crop((0, 400, 256, 656)).getpixel((100, 100))
+            time.sleep(POLL_INTERVAL)
+
+    def write() -> None:
+        nonlocal updates
+        while not stop.is_set():
+            for x, y, w, h in SMALL:
+                fb.fill(x, y, w, h, colors[updates % len(colors)])
+            fb.commit(SMALL)
+            updates += 1
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    threads.append(threading.Thread(target=write))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return updates / seconds, reads
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{WIDTH}x{HEIGHT}")
+    bench_commit(args.repeat)
+    for readers in (0, 1, args.readers):
+        for snapshots in (False, True):
+            name = "snapshot" if snapshots else "copy"
+            writes, reads = contention(readers, args.seconds, snapshots)
+            line = f"{readers} readers, {name:8}  writer {writes:6.1f} updates/s"
+            if reads:
+                ms = np.array(reads) * 1000
+                line += (
+                    f"  {len(reads) / args.seconds:6.0f} reads/s, taking the screen"
+                    f" median {np.median(ms):6.3f} ms p99 {np.percentile(ms, 99):6.3f} ms"
+                )
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
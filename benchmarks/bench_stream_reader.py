@@ -0,0 +1,127 @@
+"""Measure bytes copied while parsing a many-rectangle TightPNG update.
+
+The baseline replays the old parsing strategy (SafeTransport.recvd copying the
+message into a new bytearray and FrameBufferUpdate.read re-slicing the message after
+every rectangle). The stream reader result is taken from SafeTransport.bytes_copied.
+
+Run with: python benchmarks/bench_stream_reader.py [--rects 500] [--frame-size 65536]
+"""
+
+import argparse
+import asyncio
+import time
+from io import BytesIO
+from os import urandom
+from struct import pack
+
+from PIL import Image
+
+from wsvnc.encodings.tightpng_encoding import TightPNGEncoding
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.server_messages.framebuffer_update import FrameBufferUpdate
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+class FakeConn:
+    """Hands out pre-built websocket frames."""
+
+    def __init__(self, frames: list) -> None:
+        self.frames = list(frames)
+
+    async def recv(self) -> bytes:
+        return self.frames.pop(0)
+
+
+def tight_length(n: int) -> bytes:
+    """Encode the 3 byte TightPNG length the way the decoder expects it."""
+    return bytes([n & 0x7F | 0x80, (n >> 7) & 0x7F | 0x80, n >> 14])
+
+
+def build_update(rects: int) -> bytes:
+    """Build a FramebufferUpdate of 64x64 TightPNG rectangles (PNG & fill)."""
+    tile = Image.frombytes("RGB", (64, 64), urandom(64 * 64 * 3))
+    buffer = BytesIO()
+    tile.save(buffer, format="PNG")
+    png = buffer.getvalue()
+
+    msg = pack("!BxH", 0, rects)
+    for i in range(rects):
+        msg += pack("!HHHHi", (i % 30) * 64, (i // 30) * 64, 64, 64, -260)
+        if i % 2:
+            msg += bytes([0x80, 10, 20, 30])
+        else:
+            msg += bytes([0xA0]) + tight_length(len(png)) + png
+    return msg
+
+
+def legacy_bytes_copied(update: bytes, frame_size: int) -> int:
+    """Count the copies the old recvd() & msg[chg:] parsing made."""
+    frames = [update[i : i + frame_size] for i in range(0, len(update), frame_size)]
+    copied = 0
+    msg = frames.pop(0)[1:]
+
+    def recvd(msg: bytes, length: int) -> bytes:
+        nonlocal copied
+        data = bytearray(msg)
+        copied += len(msg)
+        while len(data) < length:
+            chunk = frames.pop(0)
+            data.extend(chunk)
+            copied += len(chunk)
+        return bytes(data)
+
+    def drop(msg: bytes, n: int) -> bytes:
+        nonlocal copied
+        copied += max(len(msg) - n, 0)
+        return msg[n:]
+
+    rect_num = int.from_bytes(msg[1:3], "big")
+    msg = drop(msg, 3)
+    for _ in range(rect_num):
+        msg = recvd(msg, 12)
+        msg = drop(msg, 12)
+        msg = recvd(msg, 4)
+        if msg[0] == 0x80:
+            msg = drop(msg, 1)
+            msg = drop(msg, 3)
+            continue
+        length = msg[1] & 0x7F | (msg[2] & 0x7F) << 7 | msg[3] << 14
+        msg = drop(msg, 4)
+        msg = recvd(msg, length)
+        msg = drop(msg, length)
+    return copied
+
+
+async def stream_bytes_copied(update: bytes, frame_size: int, pf: PixelFormat) -> int:
+    frames = [update[i : i + frame_size] for i in range(0, len(update), frame_size)]
+    transport = SafeTransport(FakeConn(frames))  # type: ignore
+    await transport.skip(1)  # message type
+    fbu = FrameBufferUpdate(pf, [TightPNGEncoding])
+    await fbu.read(transport, b"")
+    return transport.bytes_copied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rects", type=int, default=500)
+    parser.add_argument("--frame-size", type=int, default=65536)
+    args = parser.parse_args()
+
+    update = build_update(args.rects)
+    pf = PixelFormat()
+    print(f"update: {len(update)} bytes, {args.rects} rectangles")
+
+    legacy = legacy_bytes_copied(update, args.frame_size)
+    print(f"old parsing:   {legacy:>12} bytes copied ({legacy / len(update):.1f}x)")
+
+    start = time.perf_counter()
+    stream = asyncio.run(stream_bytes_copied(update, args.frame_size, pf))
+    elapsed = time.perf_counter() - start
+    print(
+        f"stream reader: {stream:>12} bytes copied ({stream / len(update):.3f}x),"
+        f" parsed & decoded in {elapsed * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
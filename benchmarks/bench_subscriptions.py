@@ -0,0 +1,189 @@
+"""Compare subscribing to regions of interest with re-requesting the whole screen.
+
+A mock VNC server (a websockets server in its own process) animates a 1080p desktop:
+a clock in the status bar ticks once a second, a progress bar in a dialog moves 10
+times a second and a video plays at 30 fps elsewhere. Like real servers, it answers
+incremental requests with the parts of the requested regions that changed, as Raw
+rectangles. The client either sets the resend flag (the whole screen is re-requested
+after every update), or subscribes to the status bar & the dialog. Reports the bytes
+the server sent, the updates the client applied and the CPU time the client used,
+after the first (whole screen) update.
+
+Run with: python benchmarks/bench_subscriptions.py [--seconds 5]
+"""
+
+import argparse
+import asyncio
+import time
+from multiprocessing import Process, Queue
+from struct import pack, unpack
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from websockets.server import serve
+
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+WIDTH, HEIGHT = 1920, 1080
+PORT = 8799
+Rect = Tuple[int, int, int, int]
+# what changes on the screen, and how many times a second
+AREAS: Dict[str, Tuple[Rect, float]] = {
+    "clock": ((1800, 1050, 100, 20), 1),
+    "progress": ((760, 560, 400, 20), 10),
+    "video": ((100, 100, 640, 360), 30),
+}
+STATUS_BAR = (0, 1040, WIDTH, 40)
+DIALOG = (660, 340, 600, 400)
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def intersect(a: Rect, b: Rect) -> Optional[Rect]:
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+class MockServer:
+    """Answers requests with the changed parts of the requested regions."""
+
+    def __init__(self, stats: "Queue[int]") -> None:
+        self.stats = stats
+
+    async def handler(self, websocket) -> None:  # type: ignore
+        await websocket.send(b"RFB 003.008\n")
+        await websocket.recv()
+        await websocket.send(pack(">BB", 1, 1))
+        await websocket.recv()
+        await websocket.send(pack(">I", 0))
+        await websocket.recv()
+        pf = make_pixel_format().write_pixel_format()
+        await websocket.send(pack(">HH", WIDTH, HEIGHT) + pf + pack(">I", 4) + b"mock")
+
+        # regions requested & not answered yet, and the areas that changed since
+        # they were last sent
+        requested: List[Rect] = []
+        dirty = {name: True for name in AREAS}
+        sent = 0
+        first = True
+        start = time.perf_counter()
+        frames = {name: 0 for name in AREAS}
+        rng = np.random.default_rng(0)
+        noise = rng.integers(0, 256, 1 << 24, dtype=np.uint8).tobytes()
+
+        # regions of non-incremental requests, sent whole
+        full: List[Rect] = []
+
+        async def read() -> None:
+            async for msg in websocket:
+                if msg[0] == 3:  # FramebufferUpdateRequest
+                    _, incremental, x, y, w, h = unpack("!BBHHHH", msg[:10])
+                    requested.append((x, y, w, h))
+                    if not incremental:
+                        full.append((x, y, w, h))
+
+        reader = asyncio.ensure_future(read())
+        try:
+            while not reader.done():
+                await asyncio.sleep(0.005)
+                now = time.perf_counter() - start
+                for name, (_, fps) in AREAS.items():
+                    frame = int(now * fps)
+                    if frame != frames[name]:
+                        frames[name] = frame
+                        dirty[name] = True
+                rects = list(full)
+                for name, (area, _) in AREAS.items():
+                    if not dirty[name]:
+                        continue
+                    for region in requested:
+                        part = intersect(area, region)
+                        if part is not None:
+                            rects.append(part)
+                            dirty[name] = False
+                if not rects:
+                    continue
+                msg = [pack("!BxH", 0, len(rects))]
+                for i, (x, y, w, h) in enumerate(rects):
+                    offset = (i * 4099 + frames["video"] * 997) % (1 << 21)
+                    msg.append(pack("!HHHHi", x, y, w, h, 0))
+                    msg.append(noise[offset : offset + w * h * 4])
+                data = b"".join(msg)
+                if first:
+                    first = False
+                else:
+                    sent += len(data)
+                requested.clear()
+                full.clear()
+                await websocket.send(data)
+        finally:
+            reader.cancel()
+            self.stats.put(sent)
+
+    def run(self) -> None:
+        async def main() -> None:
+            async with serve(self.handler, "localhost", PORT, max_size=None):
+                await asyncio.Future()
+
+        asyncio.run(main())
+
+
+def session(seconds: float, subscribe: bool) -> Tuple[int, int, float]:
+    """Run one client, return the bytes the server sent, updates & client CPU time."""
+    stats: "Queue[int]" = Queue()
+    server = Process(target=MockServer(stats).run, daemon=True)
+    server.start()
+    time.sleep(1)
+
+    client = WSVNCClient(f"ws://localhost:{PORT}")
+    # the first (whole screen) update isn't counted
+    if not subscribe:
+        client.set_resend_flag()
+        client.wait_for_update(0, timeout=30)
+    else:
+        client.update_screen(wait=True, timeout=30)
+    cpu = time.process_time()
+    seq = client.get_frame_seq()
+    if subscribe:
+        client.subscribe(*STATUS_BAR, fps=1)
+        client.subscribe(*DIALOG, fps=10)
+    time.sleep(seconds)
+    updates = client.get_frame_seq() - seq
+    cpu = time.process_time() - cpu
+    client.close()
+    sent = stats.get(timeout=10)
+    server.terminate()
+    server.join()
+    return sent, updates, cpu
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{WIDTH}x{HEIGHT}, {args.seconds:g}s per client")
+    for name, subscribe in (("full screen resend", False), ("subscriptions", True)):
+        sent, updates, cpu = session(args.seconds, subscribe)
+        print(
+            f"{name:18} {sent / args.seconds / 1e6:7.2f} MB/s"
+            f"  {updates / args.seconds:6.1f} updates/s"
+            f"  client CPU {cpu / args.seconds * 100:5.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""Compare Tight & Raw encoding through websockify: bytes on the wire & decode time.
+
+A mock VNC server (plain TCP, proxied by websockify like a libvncserver/x11vnc
+server would be) sends the same synthetic desktop frames with whichever of the two
+encodings the client asked for, and counts the bytes it sent. The client checks
+that its screen matches the last frame. Decode time per frame is then measured by
+replaying the recorded updates in-process through FrameBufferUpdate.
+
+The Tight encoder here is deliberately simple (fill, palette & gradient filters on
+128x64 tiles); real servers pick rectangles more cleverly and compress better.
+
+Run with: python benchmarks/bench_tight_encoding.py [--frames 10] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import socket
+import threading
+import time
+import zlib
+from multiprocessing import Process
+from struct import pack, unpack
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+from websockify import WebSocketProxy
+
+from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.encodings.tight_encoding import TightEncoding
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.server_messages.framebuffer_update import FrameBufferUpdate, build_decoders
+from wsvnc.utils.safe_transport import SafeTransport
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+WIDTH, HEIGHT = 1280, 720
+TILE_W, TILE_H = 128, 64
+TCP_PORT, WS_PORT = 5919, 5920
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def make_frames(count: int) -> List[np.ndarray]:
+    """Desktop-like frames: gradient wallpaper, flat windows, text & a photo."""
+    rng = np.random.default_rng(0)
+    ys, xs = np.indices((HEIGHT, WIDTH))
+    wallpaper = np.stack(
+        [xs * 255 // WIDTH, ys * 255 // HEIGHT, np.full_like(xs, 120)], axis=-1
+    ).astype(np.uint8)
+    photo = rng.integers(0, 256, (90, 160, 3), dtype=np.uint8)
+    photo = np.asarray(Image.fromarray(photo).resize((320, 180), Image.BICUBIC))
+
+    frames = []
+    for i in range(count):
+        frame = wallpaper.copy()
+        x0 = 100 + i * 20
+        frame[100:600, x0 : x0 + 700] = (236, 236, 236)  # window
+        frame[100:130, x0 : x0 + 700] = (60, 90, 160)  # title bar
+        text = rng.random((400, 600)) < 0.15  # "text"
+        frame[160:560, x0 + 50 : x0 + 650][text] = (20, 20, 20)
+        frame[200:380, 900:1220] = photo
+        frames.append(frame)
+    return frames
+
+
+def tight_length(n: int) -> bytes:
+    if n < 0x80:
+        return bytes([n])
+    if n < 0x4000:
+        return bytes([n & 0x7F | 0x80, n >> 7])
+    return bytes([n & 0x7F | 0x80, n >> 7 & 0x7F | 0x80, n >> 14])
+
+
+class TightEncoder:
+    """Encodes tiles with fill, palette or gradient, keeping zlib streams."""
+
+    def __init__(self) -> None:
+        self.streams = [zlib.compressobj(6) for _ in range(4)]
+
+    def _basic(self, stream: int, header: bytes, data: bytes) -> bytes:
+        msg = bytes([stream << 4 | 0x40]) + header
+        if len(data) < 12:
+            return msg + data
+        z = self.streams[stream]
+        compressed = z.compress(data) + z.flush(zlib.Z_SYNC_FLUSH)
+        return msg + tight_length(len(compressed)) + compressed
+
+    def tile(self, tile: np.ndarray) -> bytes:
+        height, width, _ = tile.shape
+        packed = tile.astype(np.uint32)
+        packed = packed[..., 0] << 16 | packed[..., 1] << 8 | packed[..., 2]
+        colors, indices = np.unique(packed, return_inverse=True)
+        indices = indices.reshape((height, width))
+        palette = b"".join(pack(">I", c)[1:] for c in colors)
+
+        if len(colors) == 1:
+            return b"\x80" + palette
+        if len(colors) == 2:
+            bits = np.packbits(indices.astype(np.uint8), axis=1).tobytes()
+            return self._basic(1, b"\x01\x01" + palette, bits)
+        if len(colors) <= 16:
+            data = indices.astype(np.uint8).tobytes()
+            return self._basic(1, bytes([1, len(colors) - 1]) + palette, data)
+
+        p = tile.astype(np.int32)
+        left = np.zeros_like(p)
+        left[:, 1:] = p[:, :-1]
+        above = np.zeros_like(p)
+        above[1:] = p[:-1]
+        above_left = np.zeros_like(p)
+        above_left[1:, 1:] = p[:-1, :-1]
+        estimate = np.clip(left + above - above_left, 0, 255)
+        diff = ((p - estimate) & 0xFF).astype(np.uint8)
+        return self._basic(2, b"\x02", diff.tobytes())
+
+    def update(self, frame: np.ndarray) -> bytes:
+        rects = []
+        for y in range(0, HEIGHT, TILE_H):
+            for x in range(0, WIDTH, TILE_W):
+                tile = frame[y : y + TILE_H, x : x + TILE_W]
+                header = pack("!HHHHi", x, y, tile.shape[1], tile.shape[0], 7)
+                rects.append(header + self.tile(tile))
+        return pack("!BxH", 0, len(rects)) + b"".join(rects)
+
+
+def raw_update(frame: np.ndarray) -> bytes:
+    bgrx = np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)
+    bgrx[..., 0] = frame[..., 2]
+    bgrx[..., 1] = frame[..., 1]
+    bgrx[..., 2] = frame[..., 0]
+    header = pack("!BxHHHHHi", 0, 1, 0, 0, WIDTH, HEIGHT, 0)
+    return header + bgrx.tobytes()
+
+
+def recv_exact(conn: socket.socket, n: int) -> bytes:
+    data = b""
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("client closed the connection")
+        data += chunk
+    return data
+
+
+class MockTCPServer:
+    """Serves the frames with Tight if the client asks for it, otherwise Raw."""
+
+    def __init__(self, frames: List[np.ndarray]) -> None:
+        # encode up front so the encoder's speed doesn't show in the timings
+        encoder = TightEncoder()
+        self.tight_updates = [encoder.update(f) for f in frames]
+        self.raw_updates = [raw_update(f) for f in frames]
+        self.updates: List[bytes] = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", TCP_PORT))
+        self.server.listen()
+
+    def handshake(self, conn: socket.socket) -> None:
+        conn.sendall(b"RFB 003.008\n")
+        recv_exact(conn, 12)
+        conn.sendall(pack(">BB", 1, 1))
+        recv_exact(conn, 1)
+        conn.sendall(pack(">I", 0))
+        recv_exact(conn, 1)
+        pf = make_pixel_format().write_pixel_format()
+        conn.sendall(pack(">HH", WIDTH, HEIGHT) + pf + pack(">I", 5) + b"bench")
+
+    def serve_one(self) -> None:
+        conn, _ = self.server.accept()
+        with conn:
+            self.handshake(conn)
+            # SetEncodings
+            _, count = unpack("!BxH", recv_exact(conn, 4))
+            encodings = unpack(f"!{count}i", recv_exact(conn, 4 * count))
+            if 7 in encodings:
+                self.updates = self.tight_updates
+            else:
+                self.updates = self.raw_updates
+            for update in self.updates:
+                conn.sendall(update)
+            # wait for the client to hang up
+            while conn.recv(4096):
+                pass
+
+
+def run_websockify_proxy() -> None:
+    proxy = WebSocketProxy(
+        target_host="127.0.0.1", target_port=TCP_PORT, listen_port=WS_PORT
+    )
+    proxy.start_server()
+
+
+def over_websockify(frames: List[np.ndarray], tight: bool) -> Tuple[List[bytes], float]:
+    """Send the frames through websockify, return the updates & the transfer time."""
+    server = MockTCPServer(frames)
+    thread = threading.Thread(target=server.serve_one, daemon=True)
+    thread.start()
+
+    client = WSVNCClient(f"ws://127.0.0.1:{WS_PORT}")
+    start = time.perf_counter()
+    client.set_encodings([TightEncoding] if tight else [])
+    expected = Image.fromarray(frames[-1]).convert("RGBA").tobytes()
+    deadline = start + 60
+    while time.perf_counter() < deadline:
+        screen = client.get_screen()
+        if screen is not None and screen.tobytes() == expected:
+            break
+        time.sleep(0.005)
+    else:
+        raise RuntimeError("client screen never matched the last frame")
+    elapsed = time.perf_counter() - start
+    client.close()
+    thread.join()
+    server.server.close()
+    return server.updates, elapsed
+
+
+class FakeConn:
+    def __init__(self, frames: List[bytes]) -> None:
+        self.frames = list(frames)
+
+    async def recv(self) -> bytes:
+        return self.frames.pop(0)
+
+
+async def decode_updates(updates: List[bytes], tight: bool) -> List[float]:
+    """Decode the recorded updates in order, return the time of each."""
+    pf = make_pixel_format()
+    transport = SafeTransport(FakeConn(updates))  # type: ignore
+    decoders = build_decoders([TightEncoding, RawEncoding] if tight else [RawEncoding])
+    fb = FrameBuffer(WIDTH, HEIGHT)
+    times = []
+    for _ in updates:
+        start = time.perf_counter()
+        await transport.skip(1)  # message type
+        await FrameBufferUpdate(pf, fb=fb, decoders=decoders).read(transport, b"")
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    proxy = Process(target=run_websockify_proxy)
+    proxy.start()
+    time.sleep(1)
+
+    try:
+        print(f"{args.frames} frames of {WIDTH}x{HEIGHT}")
+        for name, tight in (("raw", False), ("tight", True)):
+            updates, elapsed = over_websockify(frames, tight)
+            wire = sum(len(u) for u in updates)
+            decode = min(
+                sum(asyncio.run(decode_updates(updates, tight)))
+                for _ in range(args.repeat)
+            )
+            print(
+                f"{name:6} {wire / args.frames / 1024:9.1f} KiB/frame"
+                f"  decode {decode / args.frames * 1000:7.2f} ms/frame"
+                f"  through websockify {elapsed / args.frames * 1000:7.2f} ms/frame"
+            )
+    finally:
+        proxy.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Compare the characters per second of emit_text() & type_text().
+
+A mock VNC server (a websockets server in its own process) counts the KeyEvent
+messages it receives, and rings the bell once it has every event of the text. The
+client types a config blob with emit_text() (every key held down for 0.1 seconds, as
+before type_text() existed), and with type_text() without a delay (one write) & with
+a small one. Reports characters per second, until the server rang the bell.
+
+Run with: python benchmarks/bench_type_text.py [--chars 2048]
+"""
+
+import argparse
+import asyncio
+import time
+from multiprocessing import Process
+from struct import pack
+
+from websockets.exceptions import ConnectionClosed
+from websockets.server import serve
+
+from wsvnc.keyboard import compile_text
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+PORT = 8798
+LINE = "host=vm-01.example.com\nPort=5900\tUser: Admin!\n"
+# emit_text() takes seconds per character, so it types a shorter text
+EMIT_CHARS = 48
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def serve_forever() -> None:
+    async def handler(websocket) -> None:  # type: ignore
+        await websocket.send(b"RFB 003.008\n")
+        await websocket.recv()
+        await websocket.send(pack(">BB", 1, 1))
+        await websocket.recv()
+        await websocket.send(pack(">I", 0))
+        await websocket.recv()
+        pf = make_pixel_format().write_pixel_format()
+        await websocket.send(pack(">HH", 64, 64) + pf + pack(">I", 4) + b"mock")
+        # the client tells the server how many key events to expect in a cut text
+        expected = 0
+        received = 0
+        try:
+            async for msg in websocket:
+                if msg[0] == 6:
+                    expected = int(msg[8:])
+                    received = 0
+                    continue
+                received += len(msg) // 8
+                if received == expected:
+                    await websocket.send(b"\x02")
+        except ConnectionClosed:
+            pass
+
+    async def main() -> None:
+        async with serve(handler, "localhost", PORT, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def measure(client: WSVNCClient, text: str, type_text: bool, delay: float) -> float:
+    """Return the characters per second the server received."""
+    client._rfb_client.bell = None
+    client.cut_text(str(len(compile_text(text))))
+    time.sleep(0.2)
+    start = time.perf_counter()
+    if type_text:
+        client.type_text(text, delay).result()
+    else:
+        client.emit_text(text, delay)
+    while client.get_bell() is None:
+        time.sleep(0.0001)
+    return len(text) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chars", type=int, default=2048)
+    args = parser.parse_args()
+    text = (LINE * (args.chars // len(LINE) + 1))[: args.chars]
+
+    server = Process(target=serve_forever, daemon=True)
+    server.start()
+    time.sleep(1)
+    try:
+        client = WSVNCClient(f"ws://localhost:{PORT}")
+        emit_text = text[:EMIT_CHARS]
+        rows = [
+            ("emit_text, 0.1s", EMIT_CHARS, measure(client, emit_text, False, 0.1)),
+            ("type_text, 1ms", args.chars, measure(client, text, True, 0.001)),
+            ("type_text, no delay", args.chars, measure(client, text, True, 0.0)),
+        ]
+        client.close()
+    finally:
+        server.terminate()
+        server.join()
+
+    print(f"{'':<20} {'chars':>7} {'chars/s':>12}")
+    for name, chars, rate in rows:
+        print(f"{name:<20} {chars:>7} {rate:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
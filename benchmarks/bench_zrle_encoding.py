@@ -0,0 +1,188 @@
+"""Benchmark ZRLE decoding of synthetic desktop frames against raw.
+
+A simple encoder picks a subencoding for every 64x64 tile (solid, packed palette,
+palette RLE, plain RLE or raw, whichever is smallest) on one zlib stream, like a
+ZRLE server would. The updates are decoded in-process into a FrameBuffer through
+FrameBufferUpdate, and the result is checked against the source frame.
+
+Run with: python benchmarks/bench_zrle_encoding.py [--frames 10] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import time
+import zlib
+from struct import pack
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.encodings.zrle_encoding import TILE_SIZE, ZRLEEncoding
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.server_messages.framebuffer_update import FrameBufferUpdate, build_decoders
+from wsvnc.utils.safe_transport import SafeTransport
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def make_pixel_format() -> PixelFormat:
+    pf = PixelFormat()
+    pf.bpp = 32
+    pf.depth = 24
+    pf.big_endian = 0
+    pf.true_color = 1
+    pf.red_max = pf.green_max = pf.blue_max = 255
+    pf.red_shift, pf.green_shift, pf.blue_shift = 16, 8, 0
+    return pf
+
+
+def make_frames(count: int) -> List[np.ndarray]:
+    """Desktop-like frames: flat wallpaper, windows with text, and a photo."""
+    rng = np.random.default_rng(0)
+    photo = rng.integers(0, 256, (90, 160, 3), dtype=np.uint8)
+    photo = np.asarray(Image.fromarray(photo).resize((320, 180), Image.BICUBIC))
+
+    frames = []
+    for i in range(count):
+        frame = np.full((HEIGHT, WIDTH, 3), (40, 80, 120), dtype=np.uint8)
+        x0 = 100 + i * 20
+        frame[100:600, x0 : x0 + 700] = (236, 236, 236)  # window
+        frame[100:130, x0 : x0 + 700] = (60, 90, 160)  # title bar
+        text = rng.random((400, 600)) < 0.15  # "text"
+        frame[160:560, x0 + 50 : x0 + 650][text] = (20, 20, 20)
+        frame[200:380, 900:1220] = photo
+        frames.append(frame)
+    return frames
+
+
+def run_length(n: int) -> bytes:
+    n -= 1
+    return b"\xff" * (n // 255) + bytes([n % 255])
+
+
+def runs(values: np.ndarray) -> tuple:
+    """Split a flat array into (start offsets, run lengths)."""
+    change = np.flatnonzero(values[1:] != values[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    return starts, np.diff(np.concatenate((starts, [len(values)])))
+
+
+class ZRLEEncoder:
+    """Encodes 64x64 tiles with the smallest subencoding on one zlib stream."""
+
+    def __init__(self) -> None:
+        self.stream = zlib.compressobj(6)
+
+    def tile(self, tile: np.ndarray) -> bytes:
+        height, width, _ = tile.shape
+        cpixels = tile[..., ::-1].reshape((-1, 3))  # BGR, the low 3 bytes of BGRX
+        packed = tile.astype(np.uint32)
+        packed = (packed[..., 0] << 16 | packed[..., 1] << 8 | packed[..., 2]).ravel()
+        colors, indices = np.unique(packed, return_inverse=True)
+        palette = b"".join(pack("<I", c)[:3] for c in colors)
+
+        if len(colors) == 1:
+            return b"\x01" + palette
+        options = [b"\x00" + cpixels.tobytes()]
+        starts, lengths = runs(packed)
+        options.append(
+            b"\x80"
+            + b"".join(
+                cpixels[s].tobytes() + run_length(n) for s, n in zip(starts, lengths)
+            )
+        )
+        if len(colors) <= 16:
+            bits = 1 if len(colors) == 2 else 2 if len(colors) <= 4 else 4
+            rows = indices.reshape((height, width)).astype(np.uint8)
+            per_byte = 8 // bits
+            padded = np.zeros((height, -(-width // per_byte) * per_byte), np.uint8)
+            padded[:, :width] = rows
+            grouped = padded.reshape((height, -1, per_byte))
+            shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+            data = (grouped << shifts).sum(axis=2, dtype=np.uint8).tobytes()
+            options.append(bytes([len(colors)]) + palette + data)
+        if len(colors) <= 127:
+            options.append(
+                bytes([128 + len(colors)])
+                + palette
+                + b"".join(
+                    bytes([indices[s]])
+                    if n == 1
+                    else bytes([indices[s] | 0x80]) + run_length(n)
+                    for s, n in zip(starts, lengths)
+                )
+            )
+        return min(options, key=len)
+
+    def update(self, frame: np.ndarray) -> bytes:
+        tiles = b"".join(
+            self.tile(frame[y : y + TILE_SIZE, x : x + TILE_SIZE])
+            for y in range(0, HEIGHT, TILE_SIZE)
+            for x in range(0, WIDTH, TILE_SIZE)
+        )
+        z = self.stream.compress(tiles) + self.stream.flush(zlib.Z_SYNC_FLUSH)
+        header = pack("!BxHHHHHi", 0, 1, 0, 0, WIDTH, HEIGHT, 16)
+        return header + pack("!I", len(z)) + z
+
+
+def raw_update(frame: np.ndarray) -> bytes:
+    bgrx = np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)
+    bgrx[..., :3] = frame[..., ::-1]
+    header = pack("!BxHHHHHi", 0, 1, 0, 0, WIDTH, HEIGHT, 0)
+    return header + bgrx.tobytes()
+
+
+class FakeConn:
+    def __init__(self, frames: List[bytes]) -> None:
+        self.frames = list(frames)
+
+    async def recv(self) -> bytes:
+        return self.frames.pop(0)
+
+
+async def decode_updates(updates: List[bytes], zrle: bool) -> tuple:
+    """Decode the updates in order, return the total time & the framebuffer."""
+    pf = make_pixel_format()
+    transport = SafeTransport(FakeConn(updates))  # type: ignore
+    decoders = build_decoders([ZRLEEncoding, RawEncoding] if zrle else [RawEncoding])
+    fb = FrameBuffer(WIDTH, HEIGHT)
+    start = time.perf_counter()
+    for _ in updates:
+        await transport.skip(1)  # message type
+        await FrameBufferUpdate(pf, fb=fb, decoders=decoders).read(transport, b"")
+    return time.perf_counter() - start, fb
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    encoder = ZRLEEncoder()
+    encoded = {
+        "raw": [raw_update(f) for f in frames],
+        "zrle": [encoder.update(f) for f in frames],
+    }
+
+    print(f"{args.frames} frames of {WIDTH}x{HEIGHT}")
+    for name, updates in encoded.items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            elapsed, fb = asyncio.run(decode_updates(updates, name == "zrle"))
+            best = min(best, elapsed)
+        if not np.array_equal(fb.pixels[..., :3], frames[-1]):
+            raise RuntimeError(f"{name} decode doesn't match the last frame")
+        wire = sum(len(u) for u in updates)
+        print(
+            f"{name:5} {wire / args.frames / 1024:9.1f} KiB/frame"
+            f"  decode {best / args.frames * 1000:7.2f} ms/frame"
+        )
+
+
+if __name__ == "__main__":
+    main()
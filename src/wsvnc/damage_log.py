@@ -0,0 +1,214 @@
+"""Log of the parts of the screen every framebuffer update changed."""
+
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+Rect = Tuple[int, int, int, int]
+
+# number of updates whose rectangles are remembered
+DAMAGE_LOG_SIZE = 256
+# merge_rects() snaps bigger sets of rectangles out to a grid of this size
+MERGE_GRID = 16
+MAX_EXACT_RECTS = 256
+
+
+def merge_rects(rects: Iterable[Rect], width: int, height: int) -> List[Rect]:
+    """Merge rectangles into non-overlapping ones covering the same pixels.
+
+    Rectangles are clipped to the screen. Neighbours that line up are joined, so
+    overlapping & adjacent updates of the same area come out as one rectangle. More
+    than MAX_EXACT_RECTS rectangles are first grown out to a MERGE_GRID pixel grid,
+    which covers a little more of the screen but keeps merging cheap.
+
+    Args:
+        rects (Iterable[Rect]): x, y, width & height of every rectangle
+        width (int): width of the screen
+        height (int): height of the screen
+
+    Returns
+    -------
+        List[Rect]: x, y, width & height of the merged rectangles, top to bottom
+    """
+    boxes = np.array(list(rects), dtype=np.intp).reshape((-1, 4))
+    x0 = np.clip(boxes[:, 0], 0, width)
+    y0 = np.clip(boxes[:, 1], 0, height)
+    x1 = np.clip(boxes[:, 0] + boxes[:, 2], x0, width)
+    y1 = np.clip(boxes[:, 1] + boxes[:, 3], y0, height)
+    keep = (x1 > x0) & (y1 > y0)
+    x0, y0, x1, y1 = x0[keep], y0[keep], x1[keep], y1[keep]
+    if len(x0) > MAX_EXACT_RECTS:
+        x0 = x0 // MERGE_GRID * MERGE_GRID
+        y0 = y0 // MERGE_GRID * MERGE_GRID
+        x1 = np.minimum(-(-x1 // MERGE_GRID) * MERGE_GRID, width)
+        y1 = np.minimum(-(-y1 // MERGE_GRID) * MERGE_GRID, height)
+
+    # mark the rectangles on a grid of cells between all of their edges
+    xs = np.unique(np.concatenate([x0, x1]))
+    ys = np.unique(np.concatenate([y0, y1]))
+    grid = np.zeros((max(len(ys) - 1, 0), max(len(xs) - 1, 0)), dtype=bool)
+    columns = np.searchsorted(xs, [x0, x1])
+    rows = np.searchsorted(ys, [y0, y1])
+    for top, bottom, left, right in zip(rows[0], rows[1], columns[0], columns[1]):
+        grid[top:bottom, left:right] = True
+
+    # runs of marked cells in every row, extended downwards while the next row has
+    # the same run
+    merged: List[Rect] = []
+    open_runs: Dict[Tuple[int, int], int] = {}
+    for row in range(len(grid)):
+        edges = np.flatnonzero(np.diff(grid[row].astype(np.int8), prepend=0, append=0))
+        runs = {(int(xs[a]), int(xs[b])) for a, b in zip(edges[::2], edges[1::2])}
+        for run in list(open_runs):
+            if run not in runs:
+                top = open_runs.pop(run)
+                merged.append((run[0], top, run[1] - run[0], int(ys[row]) - top))
+        for run in runs:
+            open_runs.setdefault(run, int(ys[row]))
+    bottom = int(ys[-1]) if len(ys) else 0
+    for run, top in open_runs.items():
+        merged.append((run[0], top, run[1] - run[0], bottom - top))
+    merged.sort(key=lambda rect: (rect[1], rect[0]))
+    return merged
+
+
+class ScreenChanges:
+    """What changed on the screen between two frame sequence numbers.
+
+    Attributes
+    ----------
+        since (int): frame sequence number the changes are relative to
+        seq (int): frame sequence number of the screen the changes lead up to
+        regions (List[Rect]): x, y, width & height of the changed parts of the screen,
+            merged & non-overlapping
+        images (Optional[List[Image.Image]]): the pixels of every region as of seq,
+            if they were asked for
+        screen (Optional[Image.Image]): the whole screen as of seq
+    """
+
+    def __init__(
+        self,
+        since: int,
+        seq: int,
+        regions: List[Rect],
+        images: Optional[List[Image.Image]] = None,
+        screen: Optional[Image.Image] = None,
+    ) -> None:
+        self.since = since
+        self.seq = seq
+        self.regions = regions
+        self.images = images
+        self.screen = screen
+
+    def __bool__(self) -> bool:
+        """Return True if anything changed."""
+        return bool(self.regions)
+
+    def __repr__(self) -> str:
+        """Return the frame numbers & regions, without the pixels."""
+        return (
+            f"ScreenChanges(since={self.since}, seq={self.seq}, regions={self.regions})"
+        )
+
+
+class DamageLog:
+    """Rectangles every framebuffer update drew, by frame sequence number.
+
+    The log is written by the event loop, and can be read from any thread: record()
+    publishes the new frame sequence number together with the snapshot of the screen
+    it belongs to, so changes() always crops pixels from the matching screen.
+    """
+
+    def __init__(self, size: int = DAMAGE_LOG_SIZE) -> None:
+        self._entries: Deque[Tuple[int, List[Rect]]] = deque(maxlen=size)
+        self._latest: Tuple[int, Optional[Image.Image]] = (0, None)
+        # changes of updates up to this one were dropped from the log
+        self._forgotten = 0
+
+    @property
+    def seq(self) -> int:
+        """Frame sequence number of the last update recorded."""
+        return self._latest[0]
+
+    def record(
+        self, seq: int, rects: Iterable[Rect], screen: Optional[Image.Image]
+    ) -> None:
+        """Record the rectangles of an applied update.
+
+        Args:
+            seq (int): frame sequence number of the update
+            rects (Iterable[Rect]): x, y, width & height of the rectangles it drew
+            screen (Optional[Image.Image]): the screen after the update
+        """
+        rects = list(rects)
+        if rects:
+            if len(self._entries) == self._entries.maxlen:
+                self._forgotten = self._entries[0][0]
+            self._entries.append((seq, rects))
+        self._latest = (seq, screen)
+
+    def touches(self, since: int, region: Optional[Rect] = None) -> bool:
+        """Return True if an update after frame since drew on the region.
+
+        Cheaper than changes(), nothing is merged or cropped.
+
+        Args:
+            since (int): frame sequence number to look at the updates after
+            region (Optional[Rect]): x, y, width & height of the region, the whole
+                screen if None
+
+        Returns
+        -------
+            bool: True if a rectangle of those updates overlaps the region, or the
+            log no longer goes back to since
+        """
+        entries = list(self._entries)
+        if since < self._forgotten:
+            return True
+        for seq, rects in reversed(entries):
+            if seq <= since:
+                break
+            if region is None:
+                return True
+            rx, ry, rw, rh = region
+            for x, y, width, height in rects:
+                if x < rx + rw and rx < x + width and y < ry + rh and ry < y + height:
+                    return True
+        return False
+
+    def changes(self, since: int, pixels: bool = False) -> ScreenChanges:
+        """Return the parts of the screen updates after frame since changed.
+
+        If the log no longer goes back to since, the whole screen is returned as
+        changed.
+
+        Args:
+            since (int): frame sequence number to get the changes after
+            pixels (bool): also crop the changed regions out of the screen
+
+        Returns
+        -------
+            ScreenChanges: the merged regions, and their pixels if asked for
+        """
+        seq, screen = self._latest
+        # copied in one go, the event loop may be recording meanwhile
+        entries = list(self._entries)
+        if screen is None or since >= seq:
+            return ScreenChanges(since, seq, [], [] if pixels else None, screen)
+
+        width, height = screen.size
+        if since < self._forgotten:
+            regions = [(0, 0, width, height)]
+        else:
+            regions = merge_rects(
+                (rect for s, rects in entries if since < s <= seq for rect in rects),
+                width,
+                height,
+            )
+
+        images = None
+        if pixels:
+            images = [screen.crop((x, y, x + w, y + h)) for x, y, w, h in regions]
+        return ScreenChanges(since, seq, regions, images, screen)
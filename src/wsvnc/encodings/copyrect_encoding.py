@@ -5,6 +5,7 @@ from struct import unpack
 from PIL import Image
 
 from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.framebuffer import FrameBuffer
 from wsvnc.pixel_format import PixelFormat
 from wsvnc.utils.safe_transport import SafeTransport
 
@@ -23,17 +24,36 @@ class CopyRectEncoding(EncodingInterface):
         # CopyRect only contains 4 bytes (2 for src-x, and 2 for src-y)
         return await transport.recvd(msg, 4)
 
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        self.read(width, height, await transport.read_exact(4), pf)
+
+    async def decode(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        self.read(width, height, await transport.read_exact(4), pf)
+        fb.copy_rect(self.srcx, self.srcy, x, y, width, height)
+
     def type(self) -> int:
         return 1
 
-    def read(self, width: int, height: int, msg: bytes, pf: PixelFormat) -> int:
+    def read(
+        self, width: int, height: int, msg: bytes | memoryview, pf: PixelFormat
+    ) -> int:
         """Determine the x & y of the original screen to copy.
 
         CopyRect is different than most encodings in that it requires the existing image
         to construct the new one. We can't do this at this function so here we just save
-        the src-x & src-y value of the rectangle we're going to copy. In RFBClient
-        _handleFBU() you'll see that the img value is assigned to a cropped section of
-        the existing image based on these values.
+        the src-x & src-y value of the rectangle we're going to copy. decode() then
+        copies that section of the framebuffer.
         """
         (self.srcx, self.srcy) = unpack("!HH", msg[:4])
         return 4
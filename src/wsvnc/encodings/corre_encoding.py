@@ -0,0 +1,16 @@
+"""CoRRE encoding."""
+
+from wsvnc.encodings.rre_encoding import RREEncoding
+
+
+class CoRREEncoding(RREEncoding):
+    """Compact RRE encoding, RFB encoding type 4.
+
+    The same as RRE, except the subrectangles' x, y, width & height are single bytes
+    (so servers never send rectangles bigger than 255x255).
+    """
+
+    coord_type = "u1"
+
+    def type(self) -> int:
+        return 4
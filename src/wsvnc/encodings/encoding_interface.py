@@ -1,13 +1,36 @@
 """Interface class for encodings."""
 
 from abc import ABC, abstractmethod
+from typing import Any, Callable, Optional, Tuple
 
 from PIL.Image import Image
 
+from wsvnc.framebuffer import FrameBuffer
 from wsvnc.pixel_format import PixelFormat
 from wsvnc.utils.safe_transport import SafeTransport
 
 
+class DecodeJob:
+    """The work left to decode a rectangle once its data was read off the stream.
+
+    func(*args) does the heavy part (decompressing, converting pixels) in a thread or
+    process pool, so it has to be a module level function and its args picklable.
+    draw(fb, result) then puts the result on the framebuffer, on the event loop and in
+    the order the rectangles were sent. Jobs with nothing heavy to do have no func,
+    and draw gets None.
+    """
+
+    def __init__(
+        self,
+        draw: Callable[[FrameBuffer, Any], None],
+        func: Optional[Callable[..., Any]] = None,
+        args: Tuple[Any, ...] = (),
+    ) -> None:
+        self.draw = draw
+        self.func = func
+        self.args = args
+
+
 class EncodingInterface(ABC):
     img: Image
 
@@ -21,6 +44,20 @@ class EncodingInterface(ABC):
         """
         pass
 
+    def is_pseudo(self) -> bool:
+        """Return True if the encoding is a pseudo-encoding.
+
+        Pseudo-encoding rectangles tell the client something (a new screen size, a
+        cursor, capabilities) instead of drawing pixels. Their types are negative,
+        apart from vendor ones, which override this (like TightPNG does the other
+        way around).
+
+        Returns
+        -------
+            bool
+        """
+        return self.type() < 0
+
     @abstractmethod
     async def fetch_additional_data(
         self,
@@ -63,3 +100,90 @@ class EncodingInterface(ABC):
             int: number of encoded pixel bytes read
         """
         pass
+
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        """Read the rectangle straight off the transport's byte stream.
+
+        Encodings override this to pull exactly the bytes they need with
+        transport.read_exact(). The default adapts encodings that only implement
+        fetch_additional_data() & read(): their message is the rest of the websocket
+        message the rectangle started in, as bytes, fetch_additional_data() reads only
+        the bytes missing from it, and whatever read() doesn't consume is pushed back
+        onto the stream.
+
+        Args:
+            width (int): width of the rectangle
+            height (int): height of the rectangle
+            transport (SafeTransport): the socket
+            pf (PixelFormat): the pre-set pixel format
+        """
+        chunk = bytes(transport.read_chunk())
+        msg = await self.fetch_additional_data(width, height, transport, chunk, pf)
+        chg = self.read(width, height, msg, pf)
+        transport.unread(memoryview(msg)[chg:])
+
+    async def decode(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        """Decode the rectangle straight into the framebuffer.
+
+        Encodings override this to write into fb.region() without allocating an
+        image for the rectangle. The default adapts encodings that decode into
+        self.img: the image is pasted into the framebuffer and then dropped, so at
+        most one rectangle is alive at a time.
+
+        Args:
+            x (int): x-pos of the rectangle
+            y (int): y-pos of the rectangle
+            width (int): width of the rectangle
+            height (int): height of the rectangle
+            transport (SafeTransport): the socket
+            pf (PixelFormat): the pre-set pixel format
+            fb (FrameBuffer): the screen
+        """
+        await self.read_stream(width, height, transport, pf)
+        # pseudo encodings don't draw anything
+        img = getattr(self, "img", None)
+        if img is not None:
+            fb.paste(img, x, y)
+            del self.img
+
+    async def read_job(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+    ) -> Optional[DecodeJob]:
+        """Read the rectangle off the stream, and leave decoding it to a DecodeJob.
+
+        Used instead of decode() when FrameBufferUpdate has an executor. Encodings
+        override this if decoding a rectangle doesn't depend on earlier ones (like
+        stream state kept between rectangles), the default reads nothing & returns
+        None, so the rectangle is decoded with decode() once every earlier job has
+        been drawn.
+
+        Args:
+            x (int): x-pos of the rectangle
+            y (int): y-pos of the rectangle
+            width (int): width of the rectangle
+            height (int): height of the rectangle
+            transport (SafeTransport): the socket
+            pf (PixelFormat): the pre-set pixel format
+
+        Returns
+        -------
+            Optional[DecodeJob]: the job, or None to decode() the rectangle instead
+        """
+        return None
@@ -0,0 +1,335 @@
+"""Hextile encoding standard, RFC 6143 7.7.4."""
+
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.raw_encoding import decode_pixels
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.safe_transport import SafeTransport
+
+TILE_SIZE = 16
+# tile subencoding mask bits
+RAW = 1
+BACKGROUND_SPECIFIED = 2
+FOREGROUND_SPECIFIED = 4
+ANY_SUBRECTS = 8
+SUBRECTS_COLOURED = 16
+
+
+class HextileTiles:
+    """The tiles of one Hextile rectangle, parsed as their data arrives.
+
+    Parsing only records where every tile's pixels & subrectangles are, so they can
+    all be drawn together once the whole rectangle has been received. Offsets of
+    pixels are relative to the rectangle's data, the colors carried over from the
+    previous rectangle are at -2 * bpp (background) & -bpp (foreground).
+    """
+
+    def __init__(self, width: int, height: int, bpp: int) -> None:
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self.columns = -(-width // TILE_SIZE)
+        self.rows = -(-height // TILE_SIZE)
+        self.count = self.columns * self.rows
+        # tile sizes of every column & row, only the last ones can be smaller
+        self.widths = [min(TILE_SIZE, width - x) for x in range(0, width, TILE_SIZE)]
+        self.heights = [min(TILE_SIZE, height - y) for y in range(0, height, TILE_SIZE)]
+        # next tile to parse & the offset of its data
+        self.index = 0
+        self.pos = 0
+        self.background = -2 * bpp
+        self.foreground = -bpp
+        # (tile, background offset) of tiles filled with a background
+        self.filled: List[Tuple[int, int]] = []
+        # (tile, offset, count, foreground offset) of subrectangle runs
+        self.plain: List[Tuple[int, int, int, int]] = []
+        # (tile, offset, count) of subrectangle runs with their own colors
+        self.coloured: List[Tuple[int, int, int]] = []
+        # (tile, offset) of raw tiles
+        self.raw: List[Tuple[int, int]] = []
+
+    @property
+    def done(self) -> bool:
+        return self.index == self.count
+
+    def parse(self, buf: bytes | memoryview, start: int = 0) -> int:
+        """Parse the tiles buf holds, picking up from the last call.
+
+        Args:
+            buf (bytes | memoryview): the rectangle's data received so far, from
+                offset start on. It has to start at or before the next tile.
+            start (int): offset of buf in the rectangle's data. Defaults to 0.
+
+        Returns
+        -------
+            int: the length of the rectangle's data if every tile was parsed,
+            otherwise the number of bytes needed to parse the next tile.
+        """
+        bpp = self.bpp
+        size = start + len(buf)
+        columns, widths, heights = self.columns, self.widths, self.heights
+        while self.index < self.count:
+            pos = self.pos
+            if pos >= size:
+                return pos + 1
+            mask = buf[pos - start]
+            pos += 1
+            width = widths[self.index % columns]
+            height = heights[self.index // columns]
+
+            if mask & RAW:
+                end = pos + width * height * bpp
+                if end > size:
+                    return end
+                self.raw.append((self.index, pos))
+            else:
+                background, foreground = self.background, self.foreground
+                if mask & BACKGROUND_SPECIFIED:
+                    background = pos
+                    pos += bpp
+                if mask & FOREGROUND_SPECIFIED:
+                    foreground = pos
+                    pos += bpp
+                count = 0
+                if mask & ANY_SUBRECTS:
+                    if pos >= size:
+                        return pos + 1
+                    count = buf[pos - start]
+                    pos += 1
+                stride = 2 + bpp if mask & SUBRECTS_COLOURED else 2
+                end = pos + count * stride
+                if end > size:
+                    return end
+
+                self.background, self.foreground = background, foreground
+                self.filled.append((self.index, background))
+                if count and mask & SUBRECTS_COLOURED:
+                    self.coloured.append((self.index, pos, count))
+                elif count:
+                    self.plain.append((self.index, pos, count, foreground))
+
+            self.index += 1
+            self.pos = end
+        return self.pos
+
+    def tile_rects(self, tiles: np.ndarray) -> np.ndarray:
+        """Return the (n, 4) x, y, width, height of tiles, relative to the rectangle."""
+        rects = np.empty((len(tiles), 4), dtype=np.intp)
+        rects[:, 0] = tiles % self.columns * TILE_SIZE
+        rects[:, 1] = tiles // self.columns * TILE_SIZE
+        rects[:, 2] = np.minimum(TILE_SIZE, self.width - rects[:, 0])
+        rects[:, 3] = np.minimum(TILE_SIZE, self.height - rects[:, 1])
+        return rects
+
+
+def _expand_runs(
+    starts: np.ndarray, counts: np.ndarray, stride: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the run of every item & its offset, for runs of fixed size items."""
+    runs = np.repeat(np.arange(len(counts)), counts)
+    firsts = np.cumsum(counts) - counts
+    offsets = starts[runs] + (np.arange(len(runs)) - firsts[runs]) * stride
+    return runs, offsets
+
+
+class HextileEncoding(EncodingInterface):
+    """Hextile encoding, RFB encoding type 5.
+
+    Rectangles are split into 16x16 tiles, each one raw or a background color with
+    subrectangles. Tiles that don't specify a background or foreground color use the
+    previous tile's, even across rectangles. Every tile's background is drawn in one
+    go, then all the subrectangles together with FrameBuffer.fill_rects().
+    """
+
+    img: Image.Image
+
+    def __init__(self) -> None:
+        self.background = b""
+        self.foreground = b""
+
+    def type(self) -> int:
+        return 5
+
+    async def fetch_additional_data(
+        self,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        msg: bytes,
+        pf: PixelFormat,
+    ) -> bytes:
+        """Fetch more pixel data if we don't have enough yet.
+
+            This design is specific to Hextile encoding.
+        Args:
+            width: width of the rectangle
+            height: height of the rectangle
+            transport (SafeTransport): the socket
+            msg (bytes): the existing (possibly incomplete) message.
+            pf (PixelFormat): The pixel format
+
+        Returns
+        -------
+            bytes: the updated message
+        """
+        tiles = HextileTiles(width, height, pf.bpp // 8)
+        while True:
+            need = tiles.parse(msg)
+            if tiles.done:
+                return msg
+            msg = await transport.recvd(msg, need)
+
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        fb = FrameBuffer(width, height)
+        await self.decode(0, 0, width, height, transport, pf, fb)
+        self.img = fb.img.copy()
+
+    async def decode(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        tiles = HextileTiles(width, height, pf.bpp // 8)
+        # parse a received chunk at a time, only the unparsed end of the last one
+        # (part of one tile) is copied to join it to the next.
+        chunks: List[memoryview] = []
+        buf: bytes | memoryview = b""
+        start = 0
+        while True:
+            length = tiles.parse(buf, start)
+            if tiles.done:
+                break
+            await transport.peek(1)  # wait for more data
+            chunk = transport.read_chunk()
+            chunks.append(chunk)
+            tail = buf[tiles.pos - start :]
+            buf = b"".join((tail, chunk)) if len(tail) else chunk
+            start = tiles.pos
+
+        # the rest of the last chunk is the next rectangle's
+        extra = sum(len(chunk) for chunk in chunks) - length
+        if extra:
+            transport.unread(chunks[-1][-extra:])
+            chunks[-1] = chunks[-1][:-extra]
+        data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+        self._draw(x, y, tiles, data, pf, fb)
+
+    def read(
+        self, width: int, height: int, msg: bytes | memoryview, pf: PixelFormat
+    ) -> int:
+        tiles = HextileTiles(width, height, pf.bpp // 8)
+        length = tiles.parse(msg)
+        if not tiles.done:
+            raise ValueError("Failed to read enough pixel bytes")
+
+        fb = FrameBuffer(width, height)
+        self._draw(0, 0, tiles, msg[:length], pf, fb)
+        self.img = fb.img.copy()
+        return length
+
+    def _draw(
+        self,
+        x: int,
+        y: int,
+        tiles: HextileTiles,
+        buf: bytes | memoryview,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        """Draw the parsed tiles of a rectangle at (x, y) on the framebuffer."""
+        bpp = pf.bpp // 8
+        # the carried over colors go first, so offsets are shifted by 2 * bpp
+        carried = self._carried(self.background, bpp) + self._carried(
+            self.foreground, bpp
+        )
+        data = np.frombuffer(carried + bytes(buf), dtype=np.uint8)
+        base = 2 * bpp
+
+        filled = np.array(tiles.filled, dtype=np.intp).reshape((-1, 2))
+        color_offsets = [filled[:, 1]]
+        rects = []
+
+        # every subrectangle is (pixel,) x << 4 | y, (width - 1) << 4 | (height - 1)
+        plain = np.array(tiles.plain, dtype=np.intp).reshape((-1, 4))
+        runs, offsets = _expand_runs(plain[:, 1], plain[:, 2], 2)
+        rects.append(self._subrects(tiles, plain[runs, 0], data, offsets + base))
+        color_offsets.append(plain[runs, 3])
+
+        coloured = np.array(tiles.coloured, dtype=np.intp).reshape((-1, 3))
+        runs, offsets = _expand_runs(coloured[:, 1], coloured[:, 2], 2 + bpp)
+        rects.append(
+            self._subrects(tiles, coloured[runs, 0], data, offsets + base + bpp)
+        )
+        color_offsets.append(offsets)
+
+        pixel_offsets = np.concatenate(color_offsets) + base
+        pixels = data[pixel_offsets[:, None] + np.arange(bpp)]
+        colors = decode_pixels(pixels.tobytes(), len(pixels), 1, pf).reshape((-1, 3))
+
+        # backgrounds are blown up from one pixel per tile to the whole rectangle,
+        # raw tiles are drawn over theirs later
+        grid = np.full((tiles.count, 4), 255, dtype=np.uint8)
+        grid[filled[:, 0], :3] = colors[: len(filled)]
+        grid = grid.reshape((tiles.rows, tiles.columns, 4))
+        region = fb.region(x, y, tiles.width, tiles.height)
+        height, width, _ = region.shape
+        rows, columns = -(-height // TILE_SIZE), -(-width // TILE_SIZE)
+        region[...] = (
+            grid[:rows, :columns]
+            .repeat(TILE_SIZE, axis=0)
+            .repeat(TILE_SIZE, axis=1)[:height, :width]
+        )
+
+        # subrectangles are clipped to their tile, so tiles' drawing order is kept
+        all_rects = np.concatenate(rects)
+        all_rects[:, 0] += x
+        all_rects[:, 1] += y
+        fb.fill_rects(all_rects, colors[len(filled) :])
+
+        for index, pos in tiles.raw:
+            tx, ty, width, height = tiles.tile_rects(np.array([index]))[0]
+            start = pos + base
+            raw = data[start : start + width * height * bpp]
+            region = fb.region(x + tx, y + ty, width, height)
+            region[..., :3] = decode_pixels(raw.data, width, height, pf)[
+                : region.shape[0], : region.shape[1]
+            ]
+            region[..., 3] = 255
+
+        self.background = data[tiles.background + base :][:bpp].tobytes()
+        self.foreground = data[tiles.foreground + base :][:bpp].tobytes()
+
+    def _subrects(
+        self,
+        tiles: HextileTiles,
+        tile_ids: np.ndarray,
+        data: np.ndarray,
+        offsets: np.ndarray,
+    ) -> np.ndarray:
+        """Decode the position & size of subrectangles, clipped to their tile."""
+        rects = tiles.tile_rects(tile_ids)
+        xy = data[offsets].astype(np.intp)
+        wh = data[offsets + 1].astype(np.intp)
+        sx = np.minimum(xy >> 4, rects[:, 2])
+        sy = np.minimum(xy & 0xF, rects[:, 3])
+        rects[:, 2] = np.minimum((wh >> 4) + 1, rects[:, 2] - sx)
+        rects[:, 3] = np.minimum((wh & 0xF) + 1, rects[:, 3] - sy)
+        rects[:, 0] += sx
+        rects[:, 1] += sy
+        return rects
+
+    def _carried(self, pixel: bytes, bpp: int) -> bytes:
+        """Return a color carried over from the last rectangle, black if there's none."""
+        return pixel if len(pixel) == bpp else bytes(bpp)
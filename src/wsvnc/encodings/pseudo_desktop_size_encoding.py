@@ -3,6 +3,7 @@
 from PIL import Image
 
 from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.framebuffer import FrameBuffer
 from wsvnc.pixel_format import PixelFormat
 from wsvnc.utils.safe_transport import SafeTransport
 
@@ -20,6 +21,25 @@ class PseudoDesktopSizeEncoding(EncodingInterface):
     ) -> bytes:
         return msg
 
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        # no payload, nothing to read off the stream.
+        return
+
+    async def decode(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        # the rectangle's width & height are the new size of the screen
+        fb.resize(width, height)
+
     def type(self) -> int:
         return -223
 
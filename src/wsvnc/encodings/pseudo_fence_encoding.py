@@ -0,0 +1,34 @@
+"""Header encoding to tell the server the client supports Fence messages."""
+
+from PIL import Image
+
+from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+class PseudoFenceEncoding(EncodingInterface):
+    """Fence pseudo-encoding.
+
+    Servers that support it send a Fence message, and use fences to measure the round
+    trip time of continuous updates. It never appears in a rectangle.
+    """
+
+    img: Image.Image
+
+    async def fetch_additional_data(
+        self,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        msg: bytes,
+        pf: PixelFormat,
+    ) -> bytes:
+        return msg
+
+    def type(self) -> int:
+        return -312
+
+    def read(self, width: int, height: int, msg: bytes, pf: PixelFormat) -> int:
+        """Header encoding."""
+        return 0
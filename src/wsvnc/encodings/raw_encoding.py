@@ -1,16 +1,187 @@
 """Basic raw pixel encoding class supported by ESXi."""
 
-from struct import unpack
+from typing import Optional, Tuple
 
+import numpy as np
 from PIL import Image
 
-from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.encoding_interface import DecodeJob, EncodingInterface
+from wsvnc.framebuffer import FrameBuffer
 from wsvnc.pixel_format import PixelFormat
 from wsvnc.utils.logger import get_logger
 from wsvnc.utils.safe_transport import SafeTransport
 
 logger = get_logger(__name__)
 
+# Pillow raw modes that unpack a whole 32bpp rectangle in C, named after the byte
+# position of each channel (X marks the padding byte).
+_RAWMODES_32 = {"RGBX", "BGRX", "XRGB", "XBGR"}
+
+
+def channel_bytes(pf: PixelFormat) -> Optional[Tuple[int, int, int]]:
+    """Return the byte offset of the red, green & blue channels in a 32bpp pixel.
+
+    Only for the 24-in-32 layouts, where every channel is 8 bits on a byte boundary.
+
+    Args:
+        pf (PixelFormat): the pixel format
+
+    Returns
+    -------
+        Optional[Tuple[int, int, int]]: byte offsets or None
+    """
+    if not pf.true_color or pf.bpp != 32:
+        return None
+    shifts = (pf.red_shift, pf.green_shift, pf.blue_shift)
+    maxes = (pf.red_max, pf.green_max, pf.blue_max)
+    if maxes != (255, 255, 255):
+        return None
+    if any(s % 8 for s in shifts) or len(set(shifts)) != 3:
+        return None
+    r, g, b = (3 - s // 8 if pf.big_endian else s // 8 for s in shifts)
+    return (r, g, b)
+
+
+def pillow_rawmode(pf: PixelFormat) -> Optional[str]:
+    """Return the Pillow raw mode that decodes this pixel format, if there is one.
+
+    Covers the common 24-in-32 layouts (8-bit channels on byte boundaries), where
+    no channel is scaled. Pillow scales 16bpp channels up differently than
+    decode_true_color() does, so those always go through NumPy.
+
+    Args:
+        pf (PixelFormat): the pixel format
+
+    Returns
+    -------
+        Optional[str]: raw mode for ``Image.frombuffer`` or None
+    """
+    offsets = channel_bytes(pf)
+    if offsets is not None:
+        layout = ["X"] * 4
+        for channel, index in zip("RGB", offsets):
+            layout[index] = channel
+        rawmode = "".join(layout)
+        return rawmode if rawmode in _RAWMODES_32 else None
+    return None
+
+
+def decode_true_color(
+    data: bytes | memoryview, width: int, height: int, pf: PixelFormat
+) -> np.ndarray:
+    """Decode true color pixels into an RGB array with NumPy shifts and masks.
+
+    Works for any shifts and maxes. Channels with a max below 255 are scaled up to
+    the full 8-bit range, larger maxes are clipped to 255.
+
+    Args:
+        data (bytes | memoryview): the raw pixels
+        width (int): width of the rectangle
+        height (int): height of the rectangle
+        pf (PixelFormat): the pixel format
+
+    Returns
+    -------
+        np.ndarray: (height, width, 3) uint8 array
+    """
+    byteorder = ">" if pf.big_endian else "<"
+    dtype = np.dtype({8: "u1", 16: byteorder + "u2", 32: byteorder + "u4"}[pf.bpp])
+    pixels = np.frombuffer(data, dtype=dtype, count=width * height).astype(np.uint32)
+
+    rgb = np.empty((width * height, 3), dtype=np.uint8)
+    for i, (shift, cmax) in enumerate(
+        (
+            (pf.red_shift, pf.red_max),
+            (pf.green_shift, pf.green_max),
+            (pf.blue_shift, pf.blue_max),
+        )
+    ):
+        channel = (pixels >> shift) & cmax
+        if 0 < cmax < 255:
+            channel = channel * 255 // cmax
+        rgb[:, i] = np.minimum(channel, 255)
+    return rgb.reshape((height, width, 3))
+
+
+def decode_pixels(
+    data: bytes | memoryview, width: int, height: int, pf: PixelFormat
+) -> np.ndarray:
+    """Decode pixels of any 8, 16 or 32 bpp pixel format into an RGB array.
+
+    True color pixels go through decode_true_color(), color map pixels are looked up
+    in the pixel format's color map (indices past the end of it use its last color).
+
+    Args:
+        data (bytes | memoryview): the raw pixels
+        width (int): width of the rectangle
+        height (int): height of the rectangle
+        pf (PixelFormat): the pixel format
+
+    Raises
+    ------
+        ValueError: the color map hasn't been received yet.
+
+    Returns
+    -------
+        np.ndarray: (height, width, 3) uint8 array
+    """
+    if pf.true_color:
+        return decode_true_color(data, width, height, pf)
+    if not pf.color_map:
+        raise ValueError("Color map is not ready. Cannot parse encoding.")
+
+    byteorder = ">" if pf.big_endian else "<"
+    dtype = np.dtype({8: "u1", 16: byteorder + "u2", 32: byteorder + "u4"}[pf.bpp])
+    indices = np.frombuffer(data, dtype=dtype, count=width * height)
+    # clipped to 8 bits like the per-pixel decoder does
+    lut = np.zeros((max(pf.color_map) + 1, 3), dtype=np.uint8)
+    for index, color in pf.color_map.items():
+        lut[index] = np.minimum((color.r, color.g, color.b), 255)
+    return lut.take(indices, axis=0, mode="clip").reshape((height, width, 3))
+
+
+def write_rgba(
+    out: np.ndarray, data: bytes | memoryview, width: int, height: int, pf: PixelFormat
+) -> None:
+    """Decode 8, 16 or 32 bpp pixels into an RGBA array.
+
+    Args:
+        out (np.ndarray): (height, width, 4) array to write the pixels into
+        data (bytes | memoryview): the raw pixels
+        width (int): width of the rectangle
+        height (int): height of the rectangle
+        pf (PixelFormat): the pixel format
+    """
+    offsets = channel_bytes(pf)
+    if offsets is not None:
+        # 24-in-32, copy the channel bytes straight across
+        src = np.frombuffer(data, dtype=np.uint8).reshape((height, width, 4))
+        for i, offset in enumerate(offsets):
+            out[..., i] = src[..., offset]
+    else:
+        out[..., :3] = decode_pixels(data, width, height, pf)
+    out[..., 3] = 255
+
+
+def decode_rgba(
+    data: bytes | memoryview, width: int, height: int, pf: PixelFormat
+) -> np.ndarray:
+    """Decode 8, 16 or 32 bpp pixels into a new RGBA array.
+
+    Args:
+        data (bytes | memoryview): the raw pixels
+        width (int): width of the rectangle
+        height (int): height of the rectangle
+        pf (PixelFormat): the pixel format
+
+    Returns
+    -------
+        np.ndarray: (height, width, 4) uint8 array
+    """
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    write_rgba(pixels, data, width, height, pf)
+    return pixels
+
 
 class RawEncoding(EncodingInterface):
     img: Image.Image
@@ -42,45 +213,67 @@ class RawEncoding(EncodingInterface):
         """
         return await transport.recvd(msg, (width * height * pf.bpp // 8))
 
-    def read(self, width: int, height: int, msg: bytes, pf: PixelFormat) -> int:
-        self.img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        data = await transport.read_exact(width * height * pf.bpp // 8)
+        self.read(width, height, data, pf)
+
+    async def decode(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        data = await transport.read_exact(width * height * pf.bpp // 8)
+        if not pf.true_color and not pf.color_map:
+            logger.error("Color map is not ready. Cannot parse encoding.")
+            return
+        write_rgba(fb.region(x, y, width, height), data, width, height, pf)
+
+    async def read_job(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+    ) -> Optional[DecodeJob]:
+        if not pf.true_color:
+            # the color map can change between updates, look it up inline
+            return None
+        data = await transport.read_exact(width * height * pf.bpp // 8)
+        return DecodeJob(
+            lambda fb, pixels: fb.paste(pixels, x, y),
+            decode_rgba,
+            (data, width, height, pf),
+        )
+
+    def read(
+        self, width: int, height: int, msg: bytes | memoryview, pf: PixelFormat
+    ) -> int:
+        """Decode the whole rectangle in one shot.
+
+        Common layouts are unpacked by Pillow, any other true color format and color
+        map pixels go through NumPy.
+        """
+        length = width * height * pf.bpp // 8
+        if len(msg) < length:
+            raise ValueError("Failed to read enough pixel bytes")
+        if not pf.true_color and not pf.color_map:
+            logger.error("Color map is not ready. Cannot parse encoding.")
+            self.img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+            return length
 
-        bytes_per_pixel = pf.bpp // 8
-        if pf.big_endian:
-            byteorder = ">"
+        rawmode = pillow_rawmode(pf)
+        if rawmode is not None:
+            img = Image.frombuffer("RGB", (width, height), msg, "raw", rawmode, 0, 1)
         else:
-            byteorder = "<"
-
-        offs = 0
-        for i in range(height * width):
-            x = i % width
-            y = i // width
-
-            pixel_bytes = msg[offs : offs + bytes_per_pixel]
-            offs += bytes_per_pixel
-
-            if len(pixel_bytes) < bytes_per_pixel:
-                raise ValueError("Failed to read enough pixel bytes")
-
-            if pf.bpp == 8:
-                raw_pixel = pixel_bytes[0]
-            elif pf.bpp == 16:
-                raw_pixel = unpack(byteorder + "H", pixel_bytes)[0]
-            elif pf.bpp == 32:
-                raw_pixel = unpack(byteorder + "I", pixel_bytes)[0]
-
-            # determines the color of this pixel
-            # the final "&0xffff" ensures its a uint16 type
-            if pf.true_color:
-                r = (raw_pixel >> pf.red_shift & pf.red_max) & 0xFFFF
-                g = (raw_pixel >> pf.green_shift & pf.green_max) & 0xFFFF
-                b = (raw_pixel >> pf.blue_shift & pf.blue_max) & 0xFFFF
-                self.img.putpixel((x, y), (r, g, b, 255))
-            else:
-                if pf.color_map is None:
-                    logger.error("Color map is not ready. Cannot parse encoding.")
-                    return offs
-                color = pf.color_map[raw_pixel]
-                self.img.putpixel((x, y), (color.r, color.g, color.b, 255))
-
-        return offs
+            img = Image.fromarray(decode_pixels(msg, width, height, pf), "RGB")
+        self.img = img.convert("RGBA")
+        return length
@@ -0,0 +1,134 @@
+"""RRE encoding standard, RFC 6143 7.7.3."""
+
+from struct import unpack_from
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.raw_encoding import decode_pixels
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+class RREEncoding(EncodingInterface):
+    """RRE encoding, RFB encoding type 2.
+
+    A rectangle is a background color followed by subrectangles of a single color
+    each, which are drawn together with FrameBuffer.fill_rects().
+    """
+
+    img: Image.Image
+    # big endian x, y, width & height of a subrectangle
+    coord_type = ">u2"
+
+    def type(self) -> int:
+        return 2
+
+    async def fetch_additional_data(
+        self,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        msg: bytes,
+        pf: PixelFormat,
+    ) -> bytes:
+        """Fetch more pixel data if we don't have enough yet.
+
+            This design is specific to (Co)RRE encoding.
+        Args:
+            width: width of the rectangle
+            height: height of the rectangle
+            transport (SafeTransport): the socket
+            msg (bytes): the existing (possibly incomplete) message.
+            pf (PixelFormat): The pixel format
+
+        Returns
+        -------
+            bytes: the updated message
+        """
+        header = 4 + pf.bpp // 8
+        msg = await transport.recvd(msg, header)
+        count = unpack_from("!I", msg)[0]
+        return await transport.recvd(msg, header + count * self._subrect_size(pf))
+
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        fb = FrameBuffer(width, height)
+        await self.decode(0, 0, width, height, transport, pf, fb)
+        self.img = fb.img.copy()
+
+    async def decode(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        header = await transport.read_exact(4 + pf.bpp // 8)
+        count = unpack_from("!I", header)[0]
+        subrects = await transport.read_exact(count * self._subrect_size(pf))
+        self._draw(x, y, width, height, header[4:], subrects, count, pf, fb)
+
+    def read(
+        self, width: int, height: int, msg: bytes | memoryview, pf: PixelFormat
+    ) -> int:
+        header = 4 + pf.bpp // 8
+        if len(msg) < header:
+            raise ValueError("Failed to read enough pixel bytes")
+        count = unpack_from("!I", msg)[0]
+        length = header + count * self._subrect_size(pf)
+        if len(msg) < length:
+            raise ValueError("Failed to read enough pixel bytes")
+
+        fb = FrameBuffer(width, height)
+        self._draw(
+            0, 0, width, height, msg[4:header], msg[header:length], count, pf, fb
+        )
+        self.img = fb.img.copy()
+        return length
+
+    def _subrect_size(self, pf: PixelFormat) -> int:
+        return pf.bpp // 8 + 4 * np.dtype(self.coord_type).itemsize
+
+    def _draw(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        background: bytes | memoryview,
+        subrects: bytes | memoryview,
+        count: int,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        """Fill the background, then every subrectangle (clipped to the rectangle)."""
+        bpp = pf.bpp // 8
+        fields = np.dtype(
+            [
+                ("pixel", np.uint8, (bpp,)),
+                ("x", self.coord_type),
+                ("y", self.coord_type),
+                ("w", self.coord_type),
+                ("h", self.coord_type),
+            ]
+        )
+        parsed = np.frombuffer(subrects, dtype=fields, count=count)
+        rects = np.empty((count + 1, 4), dtype=np.intp)
+        rects[0] = (x, y, width, height)
+        sx = np.minimum(parsed["x"].astype(np.intp), width)
+        sy = np.minimum(parsed["y"].astype(np.intp), height)
+        rects[1:, 0] = x + sx
+        rects[1:, 1] = y + sy
+        rects[1:, 2] = np.minimum(parsed["w"], width - sx)
+        rects[1:, 3] = np.minimum(parsed["h"], height - sy)
+
+        pixels = bytes(background) + parsed["pixel"].tobytes()
+        colors = decode_pixels(pixels, count + 1, 1, pf).reshape((count + 1, 3))
+        fb.fill_rects(rects, colors)
@@ -0,0 +1,412 @@
+"""Tight encoding standard (used by libvncserver, x11vnc, TigerVNC, TightVNC)."""
+
+import zlib
+from io import BytesIO
+from typing import List, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.raw_encoding import decode_pixels
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.logger import get_logger
+from wsvnc.utils.safe_transport import SafeTransport
+
+logger = get_logger(__name__)
+
+# compression types, the upper 4 bits of the compression control byte.
+# Anything below FILL is basic compression.
+FILL = 0x08
+JPEG = 0x09
+# basic compression: bits 4-5 pick the zlib stream, bit 6 says a filter id follows
+READ_FILTER = 0x40
+# filters that can be applied to basic compression data
+FILTER_COPY = 0
+FILTER_PALETTE = 1
+FILTER_GRADIENT = 2
+# basic compression data shorter than this is sent without zlib
+MIN_TO_COMPRESS = 12
+
+
+def tpixel_size(pf: PixelFormat) -> int:
+    """Return the size of a Tight pixel (TPIXEL).
+
+    24 bit depth true color in 32 bpp is sent as 3 bytes (red, green, blue), any
+    other pixel format is sent as a normal pixel.
+
+    Args:
+        pf (PixelFormat): the pixel format
+
+    Returns
+    -------
+        int: number of bytes
+    """
+    maxes = (pf.red_max, pf.green_max, pf.blue_max)
+    if pf.true_color and pf.bpp == 32 and pf.depth == 24 and maxes == (255, 255, 255):
+        return 3
+    return pf.bpp // 8
+
+
+def compact_length(buf: bytes | memoryview, pos: int) -> Tuple[int, int]:
+    """Decode the 1-3 byte compact length starting at buf[pos].
+
+    The first two bytes hold 7 bits each plus a continuation bit, the third byte
+    holds 8 bits.
+
+    Args:
+        buf (bytes | memoryview): the rectangle data
+        pos (int): offset of the compact length
+
+    Returns
+    -------
+        Tuple[int, int]: the length & the offset of the data that follows it. If buf
+        ends before the compact length does, the length is -1 and the offset is the
+        number of bytes needed to read it.
+    """
+    length = 0
+    for i in range(3):
+        if len(buf) <= pos + i:
+            return -1, pos + i + 1
+        byte = buf[pos + i]
+        if i == 2:
+            length |= byte << 14
+            break
+        length |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            break
+    return length, pos + i + 1
+
+
+def undo_gradient(diff: np.ndarray, maxes: Tuple[int, int, int]) -> np.ndarray:
+    """Reconstruct pixels sent with the gradient filter.
+
+    The server predicted each pixel as left + above - above-left (clamped to the
+    channel range) and sent the difference to the prediction. As long as no
+    prediction gets clamped the pixels are just the 2D prefix sum of the differences
+    (modulo max + 1), which is what smooth content, the reason for using the filter,
+    gives. The prefix sum is checked, and the rows from the first clamped prediction
+    on are rebuilt exactly by _gradient_wavefront().
+
+    Args:
+        diff (np.ndarray): (height, width, 3) differences, per color channel
+        maxes (Tuple[int, int, int]): max of each channel, 2^n - 1
+
+    Returns
+    -------
+        np.ndarray: (height, width, 3) integer channel values
+    """
+    height, width, channels = diff.shape
+    cmax = np.asarray(maxes, dtype=np.int32)
+    # the prefix sum wraps around in the accumulator, which is fine since
+    # max + 1 divides its range. 8-bit channels get small (faster) arrays.
+    acc, work, unsigned = (
+        (np.dtype(np.uint8), np.dtype(np.int16), np.dtype(np.uint16))
+        if max(maxes) <= 0xFF
+        else (np.dtype(np.uint32), np.dtype(np.int64), np.dtype(np.uint64))
+    )
+    values = np.zeros((height + 1, width + 1, channels), dtype=work)
+    values[1:, 1:] = np.cumsum(
+        np.cumsum(diff, axis=0, dtype=acc), axis=1, dtype=acc
+    ) & cmax.astype(acc)
+
+    estimate = values[1:, :-1] + values[:-1, 1:]
+    estimate -= values[:-1, :-1]
+    # negative estimates wrap around to huge unsigned values
+    clamped = (estimate.view(unsigned) > cmax).any(axis=(1, 2))
+    if clamped.any():
+        y = int(clamped.argmax())
+        values[y + 1 :, 1:] = _gradient_wavefront(diff[y:], cmax, values[y, 1:])
+    return values[1:, 1:]
+
+
+def _gradient_wavefront(
+    diff: np.ndarray, cmax: np.ndarray, above: np.ndarray
+) -> np.ndarray:
+    """Reconstruct gradient filtered pixels below an already known row of pixels.
+
+    A pixel depends on the ones to its left and above it, but the pixels on an
+    anti-diagonal don't depend on each other, so the pixels are rebuilt one
+    anti-diagonal at a time. The diagonals are stored skewed so each one is a
+    contiguous slice.
+    """
+    height, width, channels = diff.shape
+    ys, xs = np.indices((height, width))
+    skewed_diff = np.zeros((width + height, height, channels), dtype=np.int32)
+    skewed_diff[xs + ys, ys] = diff
+    # skewed[d + 1, y + 1] is the pixel at (y, x = d - y), so the row above the
+    # pixels is skewed[x, 0]. The slots of column -1 are never written so they read
+    # as 0, like the filter expects. The last diagonal is never written either, so
+    # skewed[-1] is a row of zeros too.
+    skewed = np.zeros((width + height + 1, height + 1, channels), dtype=np.int32)
+    skewed[:width, 0] = above
+
+    # np.clip() has a lot of overhead for arrays this small, so use min & max
+    estimate = np.empty((height, channels), dtype=np.int32)
+    for d in range(width + height - 1):
+        lo = max(0, d - width + 1)
+        hi = min(d, height - 1) + 1
+        est = estimate[: hi - lo]
+        np.add(skewed[d, lo + 1 : hi + 1], skewed[d, lo:hi], out=est)
+        np.subtract(est, skewed[d - 1, lo:hi], out=est)
+        np.maximum(est, 0, out=est)
+        np.minimum(est, cmax, out=est)
+        np.add(est, skewed_diff[d, lo:hi], out=est)
+        np.bitwise_and(est, cmax, out=skewed[d + 1, lo + 1 : hi + 1])
+
+    return skewed[xs + ys + 1, ys + 1]
+
+
+class TightEncoding(EncodingInterface):
+    """Tight encoding, RFB encoding type 7.
+
+    Rectangles are either a fill color, a JPEG, or pixels compressed by one of four
+    zlib streams after going through a copy, palette or gradient filter. The zlib
+    streams last for the whole connection, so one decoder has to read every Tight
+    rectangle in order.
+    """
+
+    img: Image.Image
+    streams: List["zlib._Decompress"]
+
+    def __init__(self) -> None:
+        self.streams = [zlib.decompressobj() for _ in range(4)]
+
+    def type(self) -> int:
+        return 7
+
+    async def fetch_additional_data(
+        self,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        msg: bytes,
+        pf: PixelFormat,
+    ) -> bytes:
+        """Fetch more pixel data if we don't have enough yet.
+
+            The length of the data is only known after reading the headers, so the
+            headers are read piece by piece.
+        Args:
+            width: width of the rectangle
+            height: height of the rectangle
+            transport (SafeTransport): the socket
+            msg (bytes): the existing (possibly incomplete) message.
+            pf (PixelFormat): The pixel format
+
+        Returns
+        -------
+            bytes: the updated message
+        """
+        need = 1
+        while True:
+            msg = await transport.recvd(msg, need)
+            length = self._rect_length(width, height, msg, pf)
+            if length <= len(msg):
+                return msg
+            need = length
+
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        self.read(
+            width, height, await self._read_rect(width, height, transport, pf), pf
+        )
+
+    async def decode(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        data = await self._read_rect(width, height, transport, pf)
+        pixels = self._decode_rect(width, height, data, pf)
+        if isinstance(pixels, tuple):
+            fb.fill(x, y, width, height, pixels)
+            return
+
+        region = fb.region(x, y, width, height)
+        region[..., :3] = pixels
+        region[..., 3] = 255
+
+    def read(
+        self, width: int, height: int, msg: bytes | memoryview, pf: PixelFormat
+    ) -> int:
+        length = self._rect_length(width, height, msg, pf)
+        if length > len(msg):
+            raise ValueError("Failed to read enough pixel bytes")
+
+        pixels = self._decode_rect(width, height, msg[:length], pf)
+        if isinstance(pixels, tuple):
+            self.img = Image.new("RGBA", (width, height), (*pixels, 255))
+        else:
+            self.img = Image.fromarray(pixels, "RGB").convert("RGBA")
+        return length
+
+    async def _read_rect(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> memoryview:
+        """Read all of the rectangle's data off the stream."""
+        need = 1
+        while True:
+            length = self._rect_length(width, height, await transport.peek(need), pf)
+            if length <= need:
+                return await transport.read_exact(length)
+            need = length
+
+    def _rect_length(
+        self, width: int, height: int, buf: bytes | memoryview, pf: PixelFormat
+    ) -> int:
+        """Return the length of the rectangle's data starting at buf[0].
+
+        If buf ends before the headers that give the length, return the number of
+        bytes needed to read further instead (always more than len(buf)).
+        """
+        if len(buf) < 1:
+            return 1
+        tpixel = tpixel_size(pf)
+        comp = buf[0] >> 4
+        if comp == FILL:
+            return 1 + tpixel
+        if comp == JPEG:
+            length, pos = compact_length(buf, 1)
+            return pos if length < 0 else pos + length
+        if comp > JPEG:
+            raise ValueError(f"Invalid Tight compression type: {comp}")
+
+        pos = 1
+        filter_id = FILTER_COPY
+        if buf[0] & READ_FILTER:
+            if len(buf) < 2:
+                return 2
+            filter_id = buf[1]
+            pos = 2
+
+        colors = 0
+        if filter_id == FILTER_PALETTE:
+            if len(buf) <= pos:
+                return pos + 1
+            colors = buf[pos] + 1
+            pos += 1 + colors * tpixel
+        elif filter_id not in (FILTER_COPY, FILTER_GRADIENT):
+            raise ValueError(f"Invalid Tight filter: {filter_id}")
+
+        size = self._data_size(width, height, filter_id, colors, tpixel)
+        if size < MIN_TO_COMPRESS:
+            return pos + size
+        length, pos = compact_length(buf, pos)
+        return pos if length < 0 else pos + length
+
+    def _data_size(
+        self, width: int, height: int, filter_id: int, colors: int, tpixel: int
+    ) -> int:
+        """Return the size of the (uncompressed) filtered pixel data."""
+        if filter_id == FILTER_PALETTE:
+            if colors == 2:
+                # 1 bit per pixel, rows padded to a whole byte
+                return (width + 7) // 8 * height
+            return width * height
+        return width * height * tpixel
+
+    def _decode_rect(
+        self, width: int, height: int, msg: bytes | memoryview, pf: PixelFormat
+    ) -> Union[Tuple[int, int, int], np.ndarray]:
+        """Decode a whole rectangle of Tight data.
+
+        Returns
+        -------
+            Union[Tuple[int, int, int], np.ndarray]: the fill color, or the
+            (height, width, 3) uint8 RGB pixels.
+        """
+        ctl = msg[0]
+        for i in range(4):
+            if ctl & (1 << i):
+                self.streams[i] = zlib.decompressobj()
+        comp = ctl >> 4
+        tpixel = tpixel_size(pf)
+
+        if comp == FILL:
+            r, g, b = self._to_rgb(msg[1 : 1 + tpixel], 1, pf)[0]
+            return (int(r), int(g), int(b))
+
+        if comp == JPEG:
+            length, pos = compact_length(msg, 1)
+            img = Image.open(BytesIO(msg[pos : pos + length])).convert("RGB")
+            if img.size != (width, height):
+                raise ValueError(f"Tight JPEG is {img.size}, expected {width, height}")
+            return np.asarray(img)
+
+        pos = 1
+        filter_id = FILTER_COPY
+        if ctl & READ_FILTER:
+            filter_id = msg[1]
+            pos = 2
+
+        colors = 0
+        if filter_id == FILTER_PALETTE:
+            colors = msg[pos] + 1
+            palette = self._to_rgb(msg[pos + 1 : pos + 1 + colors * tpixel], colors, pf)
+            pos += 1 + colors * tpixel
+
+        size = self._data_size(width, height, filter_id, colors, tpixel)
+        if size < MIN_TO_COMPRESS:
+            data: bytes | memoryview = msg[pos : pos + size]
+        else:
+            length, pos = compact_length(msg, pos)
+            data = self.streams[comp & 0x03].decompress(msg[pos : pos + length])
+            if len(data) != size:
+                raise ValueError(
+                    f"Tight zlib data is {len(data)} bytes, expected {size} bytes"
+                )
+
+        if filter_id == FILTER_PALETTE:
+            if colors == 2:
+                rows = np.frombuffer(data, dtype=np.uint8).reshape((height, -1))
+                indices = np.unpackbits(rows, axis=1)[:, :width]
+            else:
+                indices = np.frombuffer(data, dtype=np.uint8).reshape((height, width))
+            return palette.take(indices, axis=0, mode="clip")
+
+        if filter_id == FILTER_GRADIENT:
+            return self._undo_gradient(data, width, height, pf)
+
+        return self._to_rgb(data, width * height, pf).reshape((height, width, 3))
+
+    def _to_rgb(
+        self, data: bytes | memoryview, count: int, pf: PixelFormat
+    ) -> np.ndarray:
+        """Decode count TPIXELs into a (count, 3) uint8 RGB array."""
+        if tpixel_size(pf) == 3:
+            return np.frombuffer(data, dtype=np.uint8, count=count * 3).reshape(
+                (count, 3)
+            )
+        return decode_pixels(data, count, 1, pf).reshape((count, 3))
+
+    def _undo_gradient(
+        self, data: bytes | memoryview, width: int, height: int, pf: PixelFormat
+    ) -> np.ndarray:
+        """Apply undo_gradient() to the color channels of the pixels."""
+        if tpixel_size(pf) == 3:
+            diff = np.frombuffer(data, dtype=np.uint8).reshape((height, width, 3))
+            return undo_gradient(diff, (255, 255, 255)).astype(np.uint8)
+        if not pf.true_color:
+            raise ValueError("Tight gradient filter needs a true color pixel format")
+
+        byteorder = ">" if pf.big_endian else "<"
+        dtype = np.dtype({8: "u1", 16: byteorder + "u2", 32: byteorder + "u4"}[pf.bpp])
+        pixels = np.frombuffer(data, dtype=dtype).astype(np.uint32)
+        shifts = (pf.red_shift, pf.green_shift, pf.blue_shift)
+        maxes = (pf.red_max, pf.green_max, pf.blue_max)
+        diff = np.stack([(pixels >> s) & m for s, m in zip(shifts, maxes)], axis=-1)
+        values = undo_gradient(diff.reshape((height, width, 3)), maxes)
+
+        # scale the channels to 8 bits, like decode_true_color()
+        for i, cmax in enumerate(maxes):
+            if 0 < cmax < 255:
+                values[..., i] = values[..., i] * 255 // cmax
+        return np.minimum(values, 255).astype(np.uint8)
@@ -20,9 +20,19 @@ class TightPNGDiffCompEncoding(EncodingInterface):
     ) -> bytes:
         return b""
 
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        # no payload, nothing to read off the stream.
+        return
+
     def type(self) -> int:
         return 1464686102
 
+    def is_pseudo(self) -> bool:
+        """Return True, the header doesn't draw on the screen."""
+        return True
+
     def read(self, width: int, height: int, msg: bytes, pf: PixelFormat) -> int:
         """Header encoding."""
         return 0
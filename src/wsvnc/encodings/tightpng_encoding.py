@@ -1,10 +1,12 @@
 """TightPNG encoding standard."""
 
 from io import BytesIO
+from typing import Optional
 
 from PIL import Image
 
-from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.encoding_interface import DecodeJob, EncodingInterface
+from wsvnc.framebuffer import FrameBuffer
 from wsvnc.pixel_format import PixelFormat
 from wsvnc.utils.logger import get_logger
 from wsvnc.utils.safe_transport import SafeTransport
@@ -12,6 +14,25 @@ from wsvnc.utils.safe_transport import SafeTransport
 logger = get_logger(__name__)
 
 
+def decode_image(data: bytes | memoryview) -> Image.Image:
+    """Decode a JPEG or PNG into an RGBA image.
+
+    Args:
+        data (bytes | memoryview): the compressed image
+
+    Returns
+    -------
+        Image.Image: the decoded image
+    """
+    img = Image.open(BytesIO(data))
+    # decode now, not when the image is first used
+    img.load()
+    if img.mode == "RGBA":
+        return img
+    rgba: Image.Image = img.convert("RGBA")
+    return rgba
+
+
 class TightPNGEncoding(EncodingInterface):
     img: Image.Image
 
@@ -25,6 +46,10 @@ class TightPNGEncoding(EncodingInterface):
     def type(self) -> int:
         return -260
 
+    def is_pseudo(self) -> bool:
+        """Return False, TightPNG draws pixels even though its type is negative."""
+        return False
+
     async def fetch_additional_data(
         self,
         width: int,
@@ -63,15 +88,7 @@ class TightPNGEncoding(EncodingInterface):
         if self.sub_encoding == self.sub_enc_fill:
             return pixel_data[1:]
 
-        # get the length of the data encoded (lots of shifting here)
-        # but this is correct (exact same logic in wmks.js from VMWare)
-        data_length = pixel_data[1]
-        data_length &= -129
-        data_length += pixel_data[2] << 7
-        data_length &= -16385
-        data_length += pixel_data[3] << 14
-        logger.debug(f"Tight Encoding length: {data_length}")
-
+        data_length = self._data_length(pixel_data[1:4])
         self.data_length = data_length
 
         # chop off the header with subencoding & length
@@ -83,7 +100,83 @@ class TightPNGEncoding(EncodingInterface):
 
         return pixel_data
 
-    def read(self, width: int, height: int, msg: bytes, pf: PixelFormat) -> int:
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        self.sub_encoding = (await transport.read_exact(1))[0] & self.sub_enc_mask
+        logger.debug(f"Subencoding Unmasked: {self.sub_encoding}")
+
+        # fill is just one pixel, there is no length header
+        if self.sub_encoding == self.sub_enc_fill:
+            self.read(width, height, await transport.read_exact(3), pf)
+            return
+
+        self.data_length = self._data_length(await transport.read_exact(3))
+        self.read(width, height, await transport.read_exact(self.data_length), pf)
+
+    async def decode(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        self.sub_encoding = (await transport.read_exact(1))[0] & self.sub_enc_mask
+        logger.debug(f"Subencoding Unmasked: {self.sub_encoding}")
+
+        if self.sub_encoding == self.sub_enc_fill:
+            color = await transport.read_exact(3)
+            fb.fill(x, y, width, height, (color[0], color[1], color[2]))
+            return
+
+        self.data_length = self._data_length(await transport.read_exact(3))
+        self.read(width, height, await transport.read_exact(self.data_length), pf)
+        fb.paste(self.img, x, y)
+        del self.img
+
+    async def read_job(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+    ) -> Optional[DecodeJob]:
+        sub_encoding = (await transport.read_exact(1))[0] & self.sub_enc_mask
+
+        if sub_encoding == self.sub_enc_fill:
+            pixel = await transport.read_exact(3)
+            color = (pixel[0], pixel[1], pixel[2])
+            return DecodeJob(lambda fb, _: fb.fill(x, y, width, height, color))
+
+        data = await transport.read_exact(
+            self._data_length(await transport.read_exact(3))
+        )
+        if sub_encoding == self.sub_enc_diff_jpeg:
+            raise NotImplementedError
+        if sub_encoding == self.sub_enc_jpeg or sub_encoding == self.sub_enc_png:
+            return DecodeJob(lambda fb, img: fb.paste(img, x, y), decode_image, (data,))
+        raise ValueError(f"Unknown TightPNG subencoding: {sub_encoding}")
+
+    def _data_length(self, header: bytes | memoryview) -> int:
+        """Decode the 3 byte length of the compressed data."""
+        # get the length of the data encoded (lots of shifting here)
+        # but this is correct (exact same logic in wmks.js from VMWare)
+        data_length = header[0]
+        data_length &= -129
+        data_length += header[1] << 7
+        data_length &= -16385
+        data_length += header[2] << 14
+        logger.debug(f"Tight Encoding length: {data_length}")
+        return data_length
+
+    def read(
+        self, width: int, height: int, msg: bytes | memoryview, pf: PixelFormat
+    ) -> int:
         # if sub_encoding is fill then our img is just a pixel
         # from three bytes in the buffer
         if self.sub_encoding == self.sub_enc_fill:
@@ -97,10 +190,7 @@ class TightPNGEncoding(EncodingInterface):
             or self.sub_encoding == self.sub_enc_png
         ):
             """Implements JPEG & PNG logic."""
-            self.img = Image.open(BytesIO(data))
-
-            if self.img.mode != "RGBA":
-                self.img = self.img.convert("RGBA")
+            self.img = decode_image(data)
 
         if self.sub_encoding == self.sub_enc_diff_jpeg:
             """Implements JPEGDiff logic."""
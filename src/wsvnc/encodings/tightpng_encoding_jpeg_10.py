@@ -20,6 +20,12 @@ class TightPNGEncodingJpegQuality10(EncodingInterface):
     ) -> bytes:
         return b""
 
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        # no payload, nothing to read off the stream.
+        return
+
     def type(self) -> int:
         return -23
 
@@ -39,9 +39,26 @@ class VMWDefineCursorEncoding(EncodingInterface):
 
         return data
 
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        # cursor type is the first byte, the second is garbage
+        self.cursor_type = (await transport.read_exact(2))[0]
+        self.pixel_length = width * height * 4
+        if self.cursor_type == 0:
+            self.mask_length = self.pixel_length
+        else:
+            self.mask_length = 0
+        # the cursor pixels & mask are unused, see read()
+        await transport.skip(self.pixel_length + self.mask_length)
+
     def type(self) -> int:
         return 1464686180
 
+    def is_pseudo(self) -> bool:
+        """Return True, the cursor doesn't draw on the screen."""
+        return True
+
     def read(self, width: int, height: int, msg: bytes, pf: PixelFormat) -> int:
         """Not properly implemented.
 
@@ -0,0 +1,303 @@
+"""ZRLE encoding standard, RFC 6143 7.7.6."""
+
+import zlib
+from struct import unpack_from
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.raw_encoding import (
+    channel_bytes,
+    decode_pixels,
+    decode_true_color,
+)
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.logger import get_logger
+from wsvnc.utils.safe_transport import SafeTransport
+
+logger = get_logger(__name__)
+
+TILE_SIZE = 64
+# tile subencodings, 2-16 are packed palettes & 130-255 are palette RLE
+SUB_RAW = 0
+SUB_SOLID = 1
+SUB_PLAIN_RLE = 128
+
+
+def cpixel_layout(pf: PixelFormat) -> int:
+    """Return how a compressed pixel (CPIXEL) relates to a pixel.
+
+    True color 32 bpp pixels with a depth of at most 24, whose color bits all fit in
+    the least or most significant 3 bytes, drop the unused byte.
+
+    Args:
+        pf (PixelFormat): the pixel format
+
+    Returns
+    -------
+        int: 0 if a CPIXEL is a whole pixel, 1 if it's the first 3 bytes of the pixel
+        (the last one is dropped), -1 if it's the last 3 bytes.
+    """
+    if not pf.true_color or pf.bpp != 32 or pf.depth > 24:
+        return 0
+    color_bits = (
+        pf.red_max << pf.red_shift
+        | pf.green_max << pf.green_shift
+        | pf.blue_max << pf.blue_shift
+    )
+    fits_ls = color_bits < 1 << 24
+    fits_ms = color_bits & 0xFF == 0
+    # same choice as libvncserver's encoder
+    if (fits_ls and not pf.big_endian) or (fits_ms and pf.big_endian):
+        return 1
+    if (fits_ls and pf.big_endian) or (fits_ms and not pf.big_endian):
+        return -1
+    return 0
+
+
+class ZRLEEncoding(EncodingInterface):
+    """ZRLE encoding, RFB encoding type 16.
+
+    Rectangles are zlib compressed, with one zlib stream for the whole connection,
+    and split into 64x64 tiles. Each tile is raw, a solid color, packed palette
+    indices, or runs of pixels or palette indices.
+    """
+
+    img: Image.Image
+
+    def __init__(self) -> None:
+        self.stream = zlib.decompressobj()
+
+    def type(self) -> int:
+        return 16
+
+    async def fetch_additional_data(
+        self,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        msg: bytes,
+        pf: PixelFormat,
+    ) -> bytes:
+        """Fetch more pixel data if we don't have enough yet.
+
+            This design is specific to ZRLE encoding.
+        Args:
+            width: width of the rectangle
+            height: height of the rectangle
+            transport (SafeTransport): the socket
+            msg (bytes): the existing (possibly incomplete) message.
+            pf (PixelFormat): The pixel format
+
+        Returns
+        -------
+            bytes: the updated message
+        """
+        msg = await transport.recvd(msg, 4)
+        length = unpack_from("!I", msg)[0]
+        return await transport.recvd(msg, 4 + length)
+
+    async def read_stream(
+        self, width: int, height: int, transport: SafeTransport, pf: PixelFormat
+    ) -> None:
+        length = unpack_from("!I", await transport.read_exact(4))[0]
+        data = self.stream.decompress(await transport.read_exact(length))
+        fb = FrameBuffer(width, height)
+        self._decode_tiles(0, 0, width, height, data, pf, fb)
+        self.img = fb.img.copy()
+
+    async def decode(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        transport: SafeTransport,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        length = unpack_from("!I", await transport.read_exact(4))[0]
+        data = self.stream.decompress(await transport.read_exact(length))
+        self._decode_tiles(x, y, width, height, data, pf, fb)
+
+    def read(
+        self, width: int, height: int, msg: bytes | memoryview, pf: PixelFormat
+    ) -> int:
+        length = unpack_from("!I", msg)[0]
+        if len(msg) < 4 + length:
+            raise ValueError("Failed to read enough pixel bytes")
+
+        data = self.stream.decompress(msg[4 : 4 + length])
+        fb = FrameBuffer(width, height)
+        self._decode_tiles(0, 0, width, height, data, pf, fb)
+        self.img = fb.img.copy()
+        return 4 + length
+
+    def _decode_tiles(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        data: bytes,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> None:
+        """Draw the tiles of a decompressed rectangle on the framebuffer."""
+        pos = 0
+        try:
+            for ty in range(0, height, TILE_SIZE):
+                th = min(TILE_SIZE, height - ty)
+                for tx in range(0, width, TILE_SIZE):
+                    tw = min(TILE_SIZE, width - tx)
+                    pos = self._decode_tile(x + tx, y + ty, tw, th, data, pos, pf, fb)
+        except IndexError as e:
+            raise ValueError("ZRLE data ended before the last tile") from e
+
+    def _decode_tile(
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        data: bytes,
+        pos: int,
+        pf: PixelFormat,
+        fb: FrameBuffer,
+    ) -> int:
+        """Draw one tile on the framebuffer, return the offset of the next tile."""
+        cpixel = self._cpixel_size(pf)
+        sub = data[pos]
+        pos += 1
+
+        if sub == SUB_SOLID:
+            r, g, b = self._to_rgb(data[pos : pos + cpixel], 1, pf)[0]
+            fb.fill(x, y, width, height, (int(r), int(g), int(b)))
+            return pos + cpixel
+
+        if sub == SUB_RAW:
+            count = width * height
+            rgb = self._to_rgb(data[pos : pos + count * cpixel], count, pf)
+            pos += count * cpixel
+        elif sub <= 16:
+            palette = self._to_rgb(data[pos : pos + sub * cpixel], sub, pf)
+            pos += sub * cpixel
+            bits = 1 if sub == 2 else 2 if sub <= 4 else 4
+            row_bytes = (width * bits + 7) // 8
+            packed = np.frombuffer(data, np.uint8, row_bytes * height, pos)
+            pos += row_bytes * height
+            # split every byte into its indices, most significant bits first
+            shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+            indices = (packed.reshape((height, row_bytes, 1)) >> shifts) & (
+                (1 << bits) - 1
+            )
+            indices = indices.reshape((height, -1))[:, :width]
+            rgb = palette.take(indices, axis=0, mode="clip")
+        elif sub == SUB_PLAIN_RLE:
+            offsets, lengths, pos = self._read_plain_runs(
+                data, pos, cpixel, width * height
+            )
+            # gather the color of every run, then decode them together
+            cpixels = np.frombuffer(data, np.uint8)[
+                np.add.outer(offsets, np.arange(cpixel))
+            ]
+            colors = self._to_rgb(cpixels.tobytes(), len(offsets), pf)
+            rgb = self._expand_runs(colors, lengths, width * height)
+        elif sub >= 130:
+            size = sub - 128
+            palette = self._to_rgb(data[pos : pos + size * cpixel], size, pf)
+            pos += size * cpixel
+            indices, lengths, pos = self._read_palette_runs(data, pos, width * height)
+            colors = palette.take(indices, axis=0, mode="clip")
+            rgb = self._expand_runs(colors, lengths, width * height)
+        else:
+            raise ValueError(f"Invalid ZRLE subencoding: {sub}")
+
+        region = fb.region(x, y, width, height)
+        region[..., :3] = rgb.reshape((height, width, 3))
+        region[..., 3] = 255
+        return pos
+
+    def _read_plain_runs(
+        self, data: bytes, pos: int, cpixel: int, count: int
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Read (CPIXEL, run length) runs until count pixels are covered.
+
+        Returns the offsets of the CPIXELs, the run lengths & the offset of the data
+        after the runs.
+        """
+        offsets: List[int] = []
+        lengths: List[int] = []
+        covered = 0
+        while covered < count:
+            offsets.append(pos)
+            length, pos = self._run_length(data, pos + cpixel)
+            lengths.append(length)
+            covered += length
+        return np.array(offsets, dtype=np.intp), np.array(lengths, dtype=np.intp), pos
+
+    def _read_palette_runs(
+        self, data: bytes, pos: int, count: int
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Read palette index runs until count pixels are covered.
+
+        Each run is an index byte, with the top bit set if a run length follows
+        (otherwise the run is a single pixel).
+        """
+        indices: List[int] = []
+        lengths: List[int] = []
+        covered = 0
+        while covered < count:
+            index = data[pos]
+            pos += 1
+            length = 1
+            if index & 0x80:
+                length, pos = self._run_length(data, pos)
+            indices.append(index & 0x7F)
+            lengths.append(length)
+            covered += length
+        return np.array(indices, dtype=np.intp), np.array(lengths, dtype=np.intp), pos
+
+    def _run_length(self, data: bytes, pos: int) -> Tuple[int, int]:
+        """Read a run length: 1 + the sum of its bytes, which end at a byte < 255."""
+        length = 1
+        while True:
+            byte = data[pos]
+            pos += 1
+            length += byte
+            if byte != 255:
+                return length, pos
+
+    def _expand_runs(
+        self, colors: np.ndarray, lengths: np.ndarray, count: int
+    ) -> np.ndarray:
+        """Repeat every run's color over the run."""
+        if int(lengths.sum()) != count:
+            raise ValueError(f"ZRLE runs cover {lengths.sum()} pixels, not {count}")
+        return np.repeat(colors, lengths, axis=0)
+
+    def _cpixel_size(self, pf: PixelFormat) -> int:
+        return 3 if cpixel_layout(pf) else pf.bpp // 8
+
+    def _to_rgb(
+        self, data: bytes | memoryview, count: int, pf: PixelFormat
+    ) -> np.ndarray:
+        """Decode count CPIXELs into a (count, 3) uint8 RGB array."""
+        layout = cpixel_layout(pf)
+        if not layout:
+            return decode_pixels(data, count, 1, pf).reshape((count, 3))
+
+        # put the dropped byte back to get whole pixels
+        pixels = np.zeros((count, 4), dtype=np.uint8)
+        cpixels = np.frombuffer(data, np.uint8, count * 3).reshape((count, 3))
+        if layout == 1:
+            pixels[:, :3] = cpixels
+        else:
+            pixels[:, 1:] = cpixels
+        offsets = channel_bytes(pf)
+        if offsets is not None:
+            return pixels[:, list(offsets)]
+        return decode_true_color(pixels.data, count, 1, pf).reshape((count, 3))
@@ -0,0 +1,245 @@
+"""Persistent framebuffer that encodings decode rectangles directly into."""
+
+import sys
+from collections import deque
+from typing import Deque, Iterable, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# fill_rects() fills rectangles at least this big one at a time
+SCATTER_PIXELS = 1 << 16
+# number of commits whose damage is remembered to bring snapshot buffers up to date
+DAMAGE_HISTORY = 16
+# snapshot buffers no reader holds that are kept to be reused
+SPARE_BUFFERS = 2
+
+
+class _SnapshotBuffer:
+    """Pixels of a committed screen, and the version of the screen they show."""
+
+    def __init__(self, pixels: np.ndarray, version: int) -> None:
+        self.pixels = pixels
+        self.version = version
+
+    def in_use(self) -> bool:
+        """Return True while a snapshot image (or anything else) refers to the pixels."""
+        # the only other reference is the one getrefcount() is passed
+        return sys.getrefcount(self.pixels) > 2
+
+
+class FrameBuffer:
+    """RGBA pixels of the whole screen, backed by a NumPy array.
+
+    Encodings write into views of `pixels` so decoding a rectangle doesn't allocate an
+    intermediate image. `img` is a PIL image sharing memory with `pixels`, so it always
+    shows the current screen without any copying, including half drawn updates.
+
+    commit() publishes the screen as `snapshot`, a read-only image other threads can
+    use while decoding goes on. Snapshots live in their own buffers, which are only
+    written again once no snapshot of them is referenced anywhere, and then only where
+    the screen changed since they were last committed.
+    """
+
+    pixels: np.ndarray
+    img: Image.Image
+    snapshot: Image.Image
+    version: int = 0
+
+    def __init__(self, width: int, height: int) -> None:
+        self.resize(width, height)
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    def resize(self, width: int, height: int) -> None:
+        """Replace the screen with a blank (transparent black) one of a new size.
+
+        Args:
+            width (int): new width of the screen
+            height (int): new height of the screen
+        """
+        self.pixels = np.zeros((height, width, 4), dtype=np.uint8)
+        self.img = Image.frombuffer(
+            "RGBA", (width, height), self.pixels, "raw", "RGBA", 0, 1
+        )
+        # the blank screen is already committed, no copying needed
+        self.version += 1
+        self._damage: Deque[Tuple[int, List[Tuple[int, int, int, int]]]] = deque(
+            maxlen=DAMAGE_HISTORY
+        )
+        self._buffers: List[_SnapshotBuffer] = []
+        self._publish(_SnapshotBuffer(np.zeros_like(self.pixels), self.version))
+
+    def commit(self, rects: Iterable[Tuple[int, int, int, int]]) -> None:
+        """Publish the screen as a new snapshot, after the rectangles were drawn.
+
+        Args:
+            rects (Iterable[Tuple[int, int, int, int]]): x, y, width & height of every
+                rectangle drawn since the last commit
+        """
+        self.version += 1
+        self._damage.append((self.version, list(rects)))
+        # reuse the most recent buffer no snapshot refers to any more, and keep a few
+        # spares around for the next commits
+        free = sorted(
+            (b for b in self._buffers[:-1] if not b.in_use()), key=lambda b: b.version
+        )
+        for spare in free[: -1 - SPARE_BUFFERS]:
+            self._buffers.remove(spare)
+        if free:
+            buffer = free[-1]
+            self._buffers.remove(buffer)
+        else:
+            current = self._buffers[-1]
+            buffer = _SnapshotBuffer(current.pixels.copy(), current.version)
+        self._update(buffer)
+        self._publish(buffer)
+
+    def _update(self, buffer: _SnapshotBuffer) -> None:
+        """Copy what changed since the buffer's version from the screen into it."""
+        if buffer.version < self._damage[0][0] - 1:
+            # too old to know what changed
+            buffer.pixels[...] = self.pixels
+        else:
+            for version, rects in self._damage:
+                if version <= buffer.version:
+                    continue
+                for x, y, width, height in rects:
+                    region = (slice(y, y + height), slice(x, x + width))
+                    buffer.pixels[region] = self.pixels[region]
+        buffer.version = self.version
+
+    def _publish(self, buffer: _SnapshotBuffer) -> None:
+        self._buffers.append(buffer)
+        height, width, _ = buffer.pixels.shape
+        # read-only, Pillow copies it first if anything tries to draw on it
+        self.snapshot = Image.frombuffer(
+            "RGBA", (width, height), buffer.pixels, "raw", "RGBA", 0, 1
+        )
+
+    def region(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Return a writable (height, width, 4) view of a rectangle of the screen.
+
+        Args:
+            x (int): x-pos of the rectangle
+            y (int): y-pos of the rectangle
+            width (int): width of the rectangle
+            height (int): height of the rectangle
+
+        Returns
+        -------
+            np.ndarray: view into the framebuffer
+        """
+        return self.pixels[y : y + height, x : x + width]
+
+    def fill(
+        self, x: int, y: int, width: int, height: int, color: Tuple[int, int, int]
+    ) -> None:
+        """Fill a rectangle with a single opaque color.
+
+        Args:
+            x (int): x-pos of the rectangle
+            y (int): y-pos of the rectangle
+            width (int): width of the rectangle
+            height (int): height of the rectangle
+            color (Tuple[int, int, int]): RGB color
+        """
+        self.pixels[y : y + height, x : x + width] = (*color, 255)
+
+    def fill_rects(self, rects: np.ndarray, colors: np.ndarray) -> None:
+        """Fill many rectangles, each with its own opaque color, in order.
+
+        The result is the same as calling fill() for each rectangle (later ones are
+        drawn over earlier ones, and everything is clipped to the screen), but small
+        rectangles are scattered into the framebuffer together instead of one by one.
+
+        Args:
+            rects (np.ndarray): (n, 4) array of x, y, width, height
+            colors (np.ndarray): (n, 3) uint8 array of RGB colors
+        """
+        rects = np.asarray(rects, dtype=np.intp).reshape((-1, 4))
+        if not len(rects):
+            return
+        x0 = np.clip(rects[:, 0], 0, self.width)
+        y0 = np.clip(rects[:, 1], 0, self.height)
+        x1 = np.clip(rects[:, 0] + rects[:, 2], x0, self.width)
+        y1 = np.clip(rects[:, 1] + rects[:, 3], y0, self.height)
+        widths = x1 - x0
+        areas = widths * (y1 - y0)
+
+        rgba = np.full((len(rects), 4), 255, dtype=np.uint8)
+        rgba[:, :3] = colors
+        words = rgba.view(np.uint32).ravel()
+        screen = self.pixels.view(np.uint32).reshape(-1)
+
+        # scatter runs of small rectangles covering up to SCATTER_PIXELS at a time, so
+        # the index arrays stay small, and fill big rectangles with a plain slice
+        ends = np.cumsum(areas)
+        firsts = ends - areas
+        start = 0
+        while start < len(rects):
+            if areas[start] >= SCATTER_PIXELS:
+                self.pixels[y0[start] : y1[start], x0[start] : x1[start]] = rgba[start]
+                start += 1
+                continue
+            limit = firsts[start] + SCATTER_PIXELS
+            stop = max(int(np.searchsorted(ends, limit, side="right")), start + 1)
+            big = np.flatnonzero(areas[start:stop] >= SCATTER_PIXELS)
+            if len(big):
+                stop = start + int(big[0])
+
+            # split the rectangles into rows, then the rows into pixels
+            heights = y1[start:stop] - y0[start:stop]
+            ids = np.repeat(np.arange(start, stop), heights)
+            row_ys = (
+                y0[ids]
+                + np.arange(len(ids))
+                - np.repeat(np.cumsum(heights) - heights, heights)
+            )
+            row_widths = widths[ids]
+            # screen index of each row's first pixel, minus the pixels before it
+            row_offsets = row_ys * self.width + x0[ids]
+            row_offsets -= np.cumsum(row_widths) - row_widths
+            pixels = np.arange(int(row_widths.sum()))
+            pixels += np.repeat(row_offsets, row_widths)
+            screen[pixels] = np.repeat(words[ids], row_widths)
+            start = stop
+
+    def copy_rect(
+        self, srcx: int, srcy: int, x: int, y: int, width: int, height: int
+    ) -> None:
+        """Copy a rectangle of the screen to another position (may overlap).
+
+        Args:
+            srcx (int): x-pos of the source rectangle
+            srcy (int): y-pos of the source rectangle
+            x (int): x-pos of the destination
+            y (int): y-pos of the destination
+            width (int): width of the rectangle
+            height (int): height of the rectangle
+        """
+        self.region(x, y, width, height)[...] = self.region(srcx, srcy, width, height)
+
+    def paste(self, img: Image.Image | np.ndarray, x: int, y: int) -> None:
+        """Draw a decoded image at position(x, y).
+
+        Args:
+            img (Image.Image | np.ndarray): image of the rectangle, or its
+                (height, width, 4) RGBA pixels
+            x (int): x-pos of the rectangle
+            y (int): y-pos of the rectangle
+        """
+        if isinstance(img, Image.Image):
+            if img.mode != "RGBA":
+                img = img.convert("RGBA")
+            pixels = np.asarray(img)
+        else:
+            pixels = img
+        region = self.region(x, y, pixels.shape[1], pixels.shape[0])
+        region[...] = pixels[: region.shape[0], : region.shape[1]]
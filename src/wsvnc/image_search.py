@@ -0,0 +1,272 @@
+"""Template search on the screen, cached per tile & kept up to date by damage."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.damage_log import DamageLog, Rect
+
+# positions are searched & cached in tiles of this size
+SEARCH_TILE = 256
+# default minimum score of a match
+THRESHOLD = 0.95
+# number of templates whose searches are cached
+SEARCH_CACHE_SIZE = 32
+
+# x & y positions of the matches in a tile, and their scores
+TileMatches = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class Match:
+    """Where a template was found on the screen.
+
+    Attributes
+    ----------
+        x (int): x-pos of the template's top left corner
+        y (int): y-pos of the template's top left corner
+        width (int): width of the template
+        height (int): height of the template
+        score (float): similarity, 1 is a pixel perfect match
+    """
+
+    def __init__(self, x: int, y: int, width: int, height: int, score: float) -> None:
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.score = score
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        """Center of the match, e.g. to click on."""
+        return self.x + self.width // 2, self.y + self.height // 2
+
+    def __repr__(self) -> str:
+        """Return the position, size & score of the match."""
+        return (
+            f"Match(x={self.x}, y={self.y}, width={self.width}, height={self.height},"
+            f" score={self.score:.3f})"
+        )
+
+
+def fft_size(n: int) -> int:
+    """Return the smallest size >= n with no prime factors above 5, FFTs are fast."""
+    size = n
+    while True:
+        m = size
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return size
+        size += 1
+
+
+def match_scores(
+    area: np.ndarray, template: np.ndarray, template_fft: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Score the template at every position it fits in the area.
+
+    The score is 1 - RMS difference / 255 of the RGB channels, the squared
+    differences are computed from a cross-correlation done with FFTs, so the cost
+    hardly depends on the template's size.
+
+    Args:
+        area (np.ndarray): (height, width, 3+) pixels to search
+        template (np.ndarray): (height, width, 3) float64 RGB pixels of the template
+        template_fft (Optional[np.ndarray]): conjugate of the template's FFT at
+            fft_size() of the area's height & width, computed if None
+
+    Returns
+    -------
+        np.ndarray: (area height - template height + 1, area width - template width
+        + 1) scores, by the position of the template's top left corner
+    """
+    height, width = area.shape[:2]
+    th, tw = template.shape[:2]
+    pixels = area[..., :3].astype(np.float64)
+    shape = (fft_size(height), fft_size(width))
+    if template_fft is None:
+        template_fft = np.conj(np.fft.rfft2(template, shape, axes=(0, 1)))
+    # the channels are summed before transforming back
+    spectrum = (np.fft.rfft2(pixels, shape, axes=(0, 1)) * template_fft).sum(axis=2)
+    corr = np.fft.irfft2(spectrum, shape)
+    # squared sums of every window, from an integral image
+    squares = np.zeros((height + 1, width + 1))
+    squares[1:, 1:] = (pixels**2).sum(axis=2).cumsum(axis=0).cumsum(axis=1)
+    windows = (
+        squares[th:, tw:]
+        - squares[:-th, tw:]
+        - squares[th:, :-tw]
+        + squares[:-th, :-tw]
+    )
+    ssd = windows - 2 * corr[: height - th + 1, : width - tw + 1] + (template**2).sum()
+    mse = np.maximum(ssd, 0) / (th * tw * 3)
+    return 1 - np.sqrt(mse) / 255
+
+
+class TemplateSearch:
+    """Matches of one template on the screen, cached by tile of positions.
+
+    A tile holds the positions (of the template's top left corner) in a SEARCH_TILE
+    square, the matches found there stay valid until an update draws on pixels a
+    template at one of the positions would cover.
+    """
+
+    def __init__(self, template: np.ndarray, threshold: float) -> None:
+        self.template = template.astype(np.float64)
+        self.height, self.width = template.shape[:2]
+        self.threshold = threshold
+        # frame sequence number & size of the screen the tiles are up to date with
+        self.seq = 0
+        self.size = (0, 0)
+        self.tiles: Dict[Tuple[int, int], TileMatches] = {}
+        # conjugated FFTs of the template, by FFT size
+        self._ffts: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def invalidate(self, regions: List[Rect]) -> None:
+        """Forget the tiles with positions the changed regions affect."""
+        for x, y, width, height in regions:
+            left = max(x - self.width + 1, 0) // SEARCH_TILE
+            right = (x + width - 1) // SEARCH_TILE
+            top = max(y - self.height + 1, 0) // SEARCH_TILE
+            bottom = (y + height - 1) // SEARCH_TILE
+            for tile in list(self.tiles):
+                if left <= tile[0] <= right and top <= tile[1] <= bottom:
+                    del self.tiles[tile]
+
+    def find(self, screen: Image.Image, region: Optional[Rect]) -> Optional[Match]:
+        """Return the best match that lies within region, searching stale tiles.
+
+        Args:
+            screen (Image.Image): the screen the tiles are up to date with
+            region (Optional[Rect]): x, y, width & height the match must be in
+
+        Returns
+        -------
+            Optional[Match]: the best match, None if no position scores threshold
+        """
+        width, height = screen.size
+        x0, y0, x1, y1 = 0, 0, width, height
+        if region is not None:
+            x0, y0 = max(region[0], 0), max(region[1], 0)
+            x1, y1 = (
+                min(region[0] + region[2], width),
+                min(region[1] + region[3], height),
+            )
+        # the last positions the template fits at
+        last_x, last_y = x1 - self.width, y1 - self.height
+        if last_x < x0 or last_y < y0:
+            return None
+
+        best: Optional[Tuple[float, int, int]] = None
+        for ty in range(y0 // SEARCH_TILE, last_y // SEARCH_TILE + 1):
+            for tx in range(x0 // SEARCH_TILE, last_x // SEARCH_TILE + 1):
+                xs, ys, scores = self._tile(screen, tx, ty)
+                inside = np.flatnonzero(
+                    (xs >= x0) & (xs <= last_x) & (ys >= y0) & (ys <= last_y)
+                )
+                if len(inside):
+                    i = inside[np.argmax(scores[inside])]
+                    if best is None or scores[i] > best[0]:
+                        best = (float(scores[i]), int(xs[i]), int(ys[i]))
+        if best is None:
+            return None
+        score, x, y = best
+        return Match(x, y, self.width, self.height, score)
+
+    def _tile(self, screen: Image.Image, tx: int, ty: int) -> TileMatches:
+        """Return the matches at the positions of a tile, searching it if needed."""
+        if (tx, ty) not in self.tiles:
+            width, height = screen.size
+            x, y = tx * SEARCH_TILE, ty * SEARCH_TILE
+            # only the pixels of the tile are copied out of the screen
+            area = np.asarray(
+                screen.crop(
+                    (
+                        x,
+                        y,
+                        min(x + SEARCH_TILE + self.width - 1, width),
+                        min(y + SEARCH_TILE + self.height - 1, height),
+                    )
+                )
+            )
+            scores = np.zeros((0, 0))
+            if area.shape[0] >= self.height and area.shape[1] >= self.width:
+                shape = (fft_size(area.shape[0]), fft_size(area.shape[1]))
+                if shape not in self._ffts:
+                    self._ffts[shape] = np.conj(
+                        np.fft.rfft2(self.template, shape, axes=(0, 1))
+                    )
+                scores = match_scores(area, self.template, self._ffts[shape])
+            rows, columns = np.nonzero(scores >= self.threshold)
+            self.tiles[(tx, ty)] = (x + columns, y + rows, scores[rows, columns])
+        return self.tiles[(tx, ty)]
+
+
+class ImageFinder:
+    """Searches for templates on a client's screen, reusing earlier searches.
+
+    Every template (and threshold) keeps its TemplateSearch, before a search the
+    tiles that updates since its last search touched are dropped, so only those are
+    searched again. Safe to use from several threads.
+    """
+
+    def __init__(self, damage: DamageLog, size: int = SEARCH_CACHE_SIZE) -> None:
+        self.damage = damage
+        self.size = size
+        self._searches: "OrderedDict[Tuple[bytes, float], TemplateSearch]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def find(
+        self,
+        template: Image.Image | np.ndarray,
+        region: Optional[Rect] = None,
+        threshold: float = THRESHOLD,
+    ) -> Optional[Match]:
+        """Find the best match of a template on the latest screen.
+
+        Args:
+            template (Image.Image | np.ndarray): image to look for, or its
+                (height, width, 3+) RGB(A) pixels, alpha is ignored
+            region (Optional[Rect]): x, y, width & height to search in, the whole
+                screen if None
+            threshold (float): minimum score (1 - RMS difference / 255) of a match
+
+        Returns
+        -------
+            Optional[Match]: the best match, None if there is none (or no screen yet)
+        """
+        pixels = template_pixels(template)
+        key = (
+            hashlib.sha1(pixels.tobytes()).digest() + repr(pixels.shape).encode(),
+            threshold,
+        )
+        with self._lock:
+            search = self._searches.pop(key, None) or TemplateSearch(pixels, threshold)
+            self._searches[key] = search
+            while len(self._searches) > self.size:
+                self._searches.popitem(last=False)
+
+            changes = self.damage.changes(search.seq)
+            if changes.screen is None:
+                return None
+            if changes.screen.size != search.size:
+                search.tiles.clear()
+                search.size = changes.screen.size
+            search.invalidate(changes.regions)
+            search.seq = changes.seq
+            return search.find(changes.screen, region)
+
+
+def template_pixels(template: Image.Image | np.ndarray) -> np.ndarray:
+    """Return the (height, width, 3) uint8 RGB pixels of a template."""
+    if isinstance(template, Image.Image):
+        return np.asarray(template.convert("RGB"))
+    return np.ascontiguousarray(np.asarray(template, dtype=np.uint8)[..., :3])
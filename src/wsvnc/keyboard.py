@@ -0,0 +1,107 @@
+"""Compile text into the key events that type it."""
+
+from struct import pack
+from typing import List, Sequence, Tuple
+
+from wsvnc.constants import KEY_ControlLeft, KEY_Return, KEY_ShiftLeft, KEY_Tab
+
+# keysym & whether it's pressed (True) or released (False)
+KeyEvent = Tuple[int, bool]
+
+# characters typed with shift held, besides upper case letters (US layout)
+SHIFTED = '!@#$%^&*()_+{}|:"<>?~'
+# characters whose keysym isn't their code point
+SPECIAL_KEYSYMS = {"\n": KEY_Return, "\r": KEY_Return, "\t": KEY_Tab}
+
+# keys that paste the clipboard by default
+PASTE_COMBO = (KEY_ControlLeft, ord("v"))
+
+
+def is_shift_required(c: str) -> bool:
+    """Determine if we should press shift when typing this letter.
+
+    Does not check for caps lock, so don't set caps lock.
+
+    Args:
+        c (str): a character
+
+    Returns
+    -------
+        bool: true if it shift is needed on the keyboard, false otherwise
+    """
+    return c.isupper() or c in SHIFTED
+
+
+def keysym(c: str) -> int:
+    """Return the keysym of a character.
+
+    Latin-1 characters are their own keysyms, others use the Unicode keysyms.
+
+    Args:
+        c (str): a character
+
+    Returns
+    -------
+        int: the keysym
+    """
+    if c in SPECIAL_KEYSYMS:
+        return SPECIAL_KEYSYMS[c]
+    code = ord(c)
+    if code < 0x100:
+        return code
+    return 0x01000000 + code
+
+
+def compile_text(text: str) -> List[KeyEvent]:
+    """Compile text into the key presses & releases that type it.
+
+    Shift is held across runs of characters that need it, instead of being pressed
+    & released around each one.
+
+    Args:
+        text (str): text to be typed
+
+    Returns
+    -------
+        List[KeyEvent]: keysym & down flag of every key event, in order
+    """
+    events: List[KeyEvent] = []
+    shifted = False
+    for c in text:
+        if is_shift_required(c) != shifted:
+            shifted = not shifted
+            events.append((KEY_ShiftLeft, shifted))
+        key = keysym(c)
+        events.append((key, True))
+        events.append((key, False))
+    if shifted:
+        events.append((KEY_ShiftLeft, False))
+    return events
+
+
+def compile_combo(keys: Sequence[int]) -> List[KeyEvent]:
+    """Compile a key combination, e.g. ctrl+v, into key events.
+
+    The keys are pressed in order, then released in reverse order.
+
+    Args:
+        keys (Sequence[int]): keysyms of the combination
+
+    Returns
+    -------
+        List[KeyEvent]: keysym & down flag of every key event, in order
+    """
+    return [(key, True) for key in keys] + [(key, False) for key in reversed(keys)]
+
+
+def encode_key_events(events: List[KeyEvent]) -> bytes:
+    """Encode key events into KeyEvent messages, RFC 6143 Section 7.5.4.
+
+    Args:
+        events (List[KeyEvent]): keysym & down flag of every key event
+
+    Returns
+    -------
+        bytes: the messages, one after the other
+    """
+    return b"".join(pack("!BBxxI", 4, down, key) for key, down in events)
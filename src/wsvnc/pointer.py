@@ -0,0 +1,107 @@
+"""Paths for the pointer to follow, sampled into pointer positions."""
+
+from bisect import bisect_left
+from itertools import accumulate
+from math import ceil, hypot
+from typing import List, Sequence, Tuple
+
+# pointer events sent a second while following a path
+POINTER_RATE = 60.0
+# bytes the connection may have waiting to be written before moves along a path are
+# skipped, as later ones supersede them
+POINTER_BACKLOG = 0
+
+Point = Tuple[float, float]
+
+
+class PointerPath:
+    """A path through points, as a polyline or as a bezier curve.
+
+    A polyline goes through every point, at constant speed. A bezier curve starts at
+    the first point & ends at the last, the points in between are its control points.
+    """
+
+    def __init__(self, points: Sequence[Point], bezier: bool = False) -> None:
+        """Set up the path.
+
+        Args:
+            points (Sequence[Point]): (x, y) points of the path, at least one.
+            bezier (bool): if the points are the control points of a bezier curve.
+                Defaults to False (a polyline).
+        """
+        if not points:
+            raise ValueError("A path needs at least one point.")
+        self.points = [(float(x), float(y)) for x, y in points]
+        self.bezier = bezier
+        # distance from the start along the polyline to every point
+        self._lengths = list(
+            accumulate(
+                (hypot(x1 - x0, y1 - y0) for (x0, y0), (x1, y1) in self._segments()),
+                initial=0.0,
+            )
+        )
+
+    @classmethod
+    def line(cls, xpos: int, ypos: int, newx: int, newy: int) -> "PointerPath":
+        """Return the straight path from (xpos, ypos) to (newx, newy)."""
+        return cls([(xpos, ypos), (newx, newy)])
+
+    def _segments(self) -> List[Tuple[Point, Point]]:
+        return list(zip(self.points, self.points[1:]))
+
+    def at(self, t: float) -> Tuple[int, int]:
+        """Return the pixel the path is at, t from 0 (the start) to 1 (the end)."""
+        t = min(max(t, 0.0), 1.0)
+        if self.bezier:
+            x, y = self._bezier_at(t)
+        else:
+            x, y = self._polyline_at(t)
+        return round(x), round(y)
+
+    def _polyline_at(self, t: float) -> Point:
+        distance = t * self._lengths[-1]
+        i = bisect_left(self._lengths, distance)
+        if i == 0:
+            return self.points[0]
+        (x0, y0), (x1, y1) = self.points[i - 1], self.points[i]
+        start, end = self._lengths[i - 1], self._lengths[i]
+        f = (distance - start) / (end - start)
+        return x0 + (x1 - x0) * f, y0 + (y1 - y0) * f
+
+    def _bezier_at(self, t: float) -> Point:
+        # de Casteljau's algorithm
+        points = self.points
+        while len(points) > 1:
+            points = [
+                (x0 + (x1 - x0) * t, y0 + (y1 - y0) * t)
+                for (x0, y0), (x1, y1) in zip(points, points[1:])
+            ]
+        return points[0]
+
+    def sample(
+        self, duration: float, rate: float = POINTER_RATE
+    ) -> List[Tuple[int, int]]:
+        """Return the positions to move the pointer to, to follow the path.
+
+        One position every 1 / rate seconds of duration, ending at the end of the
+        path, without repeating a position the pointer is already at (it starts at
+        the start of the path).
+
+        Args:
+            duration (float): seconds following the path takes.
+            rate (float): positions a second. Defaults to POINTER_RATE.
+        """
+        ticks = path_ticks(duration, rate)
+        positions: List[Tuple[int, int]] = []
+        last = self.at(0)
+        for i in range(1, ticks + 1):
+            position = self.at(i / ticks)
+            if position != last:
+                positions.append(position)
+                last = position
+        return positions
+
+
+def path_ticks(duration: float, rate: float) -> int:
+    """Return how many positions following a path for duration seconds takes."""
+    return max(1, ceil(duration * rate))
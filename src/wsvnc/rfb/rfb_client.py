@@ -1,71 +1,167 @@
 """Client that implements RFB Protocol according to RFC 6143."""
 
+import asyncio
 import re
 import traceback
+from concurrent.futures import Executor
 from struct import pack, unpack
-from typing import List, Optional, Type
+from typing import Dict, List, Optional, Tuple, Type
 
+import numpy as np
 from PIL import Image
 from websockets import WebSocketClientProtocol
+from websockets.exceptions import ConnectionClosed, ConnectionClosedOK
 
 from wsvnc.constants import supported_versions
-from wsvnc.encodings.copyrect_encoding import CopyRectEncoding
+from wsvnc.damage_log import DamageLog, ScreenChanges
 from wsvnc.encodings.encoding_interface import EncodingInterface
 from wsvnc.encodings.pseudo_desktop_size_encoding import PseudoDesktopSizeEncoding
 from wsvnc.encodings.raw_encoding import RawEncoding
-from wsvnc.encodings.vmware_define_cursor_encoding import VMWDefineCursorEncoding
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.image_search import THRESHOLD, ImageFinder, Match
+from wsvnc.keyboard import KeyEvent, encode_key_events
 from wsvnc.pixel_format import PixelFormat, read_format
 from wsvnc.security.no_security import NoSecurity
 from wsvnc.security.security_type_interface import SecurityTypeInterface
 from wsvnc.server_messages.bell import BellMessage
 from wsvnc.server_messages.color_map_entries import ColorMapEntriesMessage
 from wsvnc.server_messages.cut_text import CutTextMessage
-from wsvnc.server_messages.framebuffer_update import FrameBufferUpdate
+from wsvnc.server_messages.end_of_continuous_updates import (
+    EndOfContinuousUpdatesMessage,
+)
+from wsvnc.server_messages.fence import FENCE_SUPPORTED, FenceMessage
+from wsvnc.server_messages.framebuffer_update import FrameBufferUpdate, build_decoders
+from wsvnc.subscription import SUBSCRIPTION_FPS, Subscription
+from wsvnc.update_budget import CPUMeter, UpdateBudget
 from wsvnc.utils.logger import get_logger
 from wsvnc.utils.safe_transport import SafeTransport
 
 logger = get_logger(__name__)
 
+# how long wait_until_stable() waits for the screen to stop changing by default
+QUIET_MS = 300
+
 
 class RFBClient:
     encs: List[Type[EncodingInterface]]
+    decoders: Dict[int, EncodingInterface]
     width: int
     height: int
     pixel_format: PixelFormat
     _server_name_length: int
     server_name: str
-    img: Optional[Image.Image] = None
+    framebuffer: Optional[FrameBuffer] = None
     resend_flag: bool = False
     bell: Optional[BellMessage] = None
+    # number of FramebufferUpdates applied, & started being received
+    frame_seq: int = 0
+    # number of ServerCutText messages received
+    cut_text_seq: int = 0
+    _updates_started: int = 0
+    closed: bool = False
+    # least seconds between the whole screen requests of the resend flag
+    min_interval: float = 0.0
+    # the server sent EndOfContinuousUpdates & Fence messages, so it supports them
+    continuous_updates_supported: bool = False
+    fence_supported: bool = False
+    # region continuous updates are enabled for, None while they're off
+    continuous_region: Optional[Tuple[int, int, int, int]] = None
 
     def __init__(
         self,
         conn: WebSocketClientProtocol,
         security_type: SecurityTypeInterface = NoSecurity(),
         shared_flag: int = 1,
+        decode_executor: Optional[Executor] = None,
+        budget: Optional[UpdateBudget] = None,
+        coalesce_window: Optional[float] = None,
     ) -> None:
-        self.transport = SafeTransport(conn)
+        """Set up the client on an open websocket connection.
+
+        Args:
+            conn (WebSocketClientProtocol): the websocket connection
+            security_type (SecurityTypeInterface): security type to authenticate with
+            shared_flag (int): 0 to disconnect other clients of the server
+            decode_executor (Optional[Executor]): thread or process pool to decode
+                rectangles in, off the event loop. Decoded inline if None.
+            budget (Optional[UpdateBudget]): bandwidth & CPU budget shared with other
+                clients, that updates are charged to & requested within
+            coalesce_window (Optional[float]): seconds messages to the server are
+                queued for, to be sent together in one websocket message. Every
+                message is sent right away if None.
+        """
+        self.transport = SafeTransport(conn, coalesce_window)
         self.security_type = security_type
         self.encs = [RawEncoding]
+        self.decoders = build_decoders(self.encs)
         self.clipboard = ""
         self.shared_flag = shared_flag
+        self.decode_executor = decode_executor
+        self._frame_applied = asyncio.Condition()
+        self._cut_text_received = asyncio.Condition()
+        self.damage = DamageLog()
+        self.image_finder = ImageFinder(self.damage)
+        self.subscriptions: List[Subscription] = []
+        self.budget = budget
+        self._unpaused = asyncio.Event()
+        self._unpaused.set()
+        self._resend: Optional[asyncio.Task] = None
+        self._last_resend = 0.0
+        # CPU time spent reading & applying this session's updates, and the bytes
+        # received & CPU time as of the last charge
+        self._cpu = CPUMeter()
+        self._charged = (0, 0.0)
+
+    @property
+    def resending(self) -> bool:
+        """True if the whole screen is requested again after every update.
+
+        That's what the resend flag does, unless there are subscriptions to regions,
+        which are refreshed instead.
+        """
+        return self.resend_flag and not self.subscriptions
+
+    @property
+    def continuous(self) -> bool:
+        """True if the server sends updates as the screen changes, without requests."""
+        return self.continuous_region is not None
+
+    @property
+    def paused(self) -> bool:
+        """True if continuous updates are paused."""
+        return not self._unpaused.is_set()
+
+    @property
+    def img(self) -> Optional[Image.Image]:
+        """Read-only image of the screen as of the last complete framebuffer update.
+
+        Safe to use from other threads while updates are decoded, it never changes.
+        """
+        if self.framebuffer is None:
+            return None
+        return self.framebuffer.snapshot
 
     """ Functions that are sent by the VNC Client -> ESXi """
 
     async def cut_text(self, text: str) -> None:
         """Tell the server that the client has new text in its cut buffer.
 
-        RFC 6143 Section 7.5.6.
+        RFC 6143 Section 7.5.6. The text is sent as latin-1 like the RFC says, text
+        outside of it as UTF-8 (which some servers accept).
 
         Args:
             text (str): string to copy
         """
         self.clipboard = text
-        await self.transport.send(pack("!BxxxI", 6, len(text)) + text.encode("utf-8"))
+        try:
+            data = text.encode("latin-1")
+        except UnicodeEncodeError:
+            data = text.encode("utf-8")
+        await self.transport.send(pack("!BxxxI", 6, len(data)) + data)
 
     async def framebuffer_update_request(
         self, x: int, y: int, width: int, height: int, incremental: bool = False
-    ) -> None:
+    ) -> int:
         """Request a framebuffer update from the server.
 
         There may be an indefinite time
@@ -78,9 +174,374 @@ class RFBClient:
             width (int): width of frame
             height (int): height of frame
             incremental (bool): true = incremental,
+
+        Returns once the request is written, unless the transport is held (e.g. by a
+        batch), then right after queueing it.
+
+        Returns
+        -------
+            int: frame sequence number of the update answering the request, the
+            first one the client starts receiving after the request is written. It's
+            approximate: an update the server started before reading the request may
+            still get it, so waiting for it can return before the requested pixels
+            arrive. If the transport is held it's counted when the request is queued,
+            so updates started before it's sent may get it too.
         """
         logger.debug("sent frame buffer update request.")
         await self.transport.send(pack("!BBHHHH", 3, incremental, x, y, width, height))
+        if not self.transport.held():
+            # updates started before the request is written can't answer it
+            await asyncio.shield(self.transport.written())
+        return self._updates_started + 1
+
+    async def enable_continuous_updates(
+        self, x: int, y: int, width: int, height: int, enable: bool = True
+    ) -> None:
+        """Ask the server to send updates of a region whenever it changes, or to stop.
+
+        Only servers that sent EndOfContinuousUpdates support it. While the resend
+        flag is set, the client turns continuous updates on & off by itself.
+
+        Args:
+            x (int): x-pos of the region
+            y (int): y-pos of the region
+            width (int): width of the region
+            height (int): height of the region
+            enable (bool): true to start continuous updates, false to stop them
+        """
+        logger.debug(f"{'en' if enable else 'dis'}abling continuous updates.")
+        await self.transport.send(pack("!BBHHHH", 150, enable, x, y, width, height))
+        self.continuous_region = (x, y, width, height) if enable else None
+
+    async def fence(self, flags: int, payload: bytes = b"") -> None:
+        """Send a fence message to the server.
+
+        Args:
+            flags (int): fence flags, see wsvnc.server_messages.fence
+            payload (bytes): up to 64 bytes the server echoes back in its answer
+        """
+        await self.transport.send(pack("!BxxxIB", 248, flags, len(payload)) + payload)
+
+    async def wait_for_update(
+        self, after: Optional[int] = None, timeout: Optional[float] = None
+    ) -> int:
+        """Wait until a FramebufferUpdate newer than frame sequence number after is applied.
+
+        Args:
+            after (Optional[int]): frame sequence number to wait past, defaults to the
+                current one (so it waits for the next update)
+            timeout (Optional[float]): seconds to wait for, forever if None
+
+        Raises
+        ------
+            TimeoutError: no update arrived in time.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            int: the current frame sequence number
+        """
+        if after is None:
+            after = self.frame_seq
+        async with self._frame_applied:
+            try:
+                await asyncio.wait_for(
+                    self._frame_applied.wait_for(
+                        lambda: self.frame_seq > after or self.closed
+                    ),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"No framebuffer update after {after} in time")
+        if self.frame_seq <= after:
+            raise ConnectionError("Connection closed before the update arrived")
+        return self.frame_seq
+
+    async def wait_for_cut_text(
+        self, after: Optional[int] = None, timeout: Optional[float] = None
+    ) -> str:
+        """Wait until a ServerCutText message newer than cut text number after arrives.
+
+        Args:
+            after (Optional[int]): cut_text_seq to wait past, defaults to the current
+                one (so it waits for the next message)
+            timeout (Optional[float]): seconds to wait for, forever if None
+
+        Raises
+        ------
+            TimeoutError: no message arrived in time.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            str: the server's clipboard
+        """
+        if after is None:
+            after = self.cut_text_seq
+        async with self._cut_text_received:
+            try:
+                await asyncio.wait_for(
+                    self._cut_text_received.wait_for(
+                        lambda: self.cut_text_seq > after or self.closed
+                    ),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"No server cut text after {after} in time")
+        if self.cut_text_seq <= after:
+            raise ConnectionError("Connection closed before the cut text arrived")
+        return self.clipboard
+
+    async def wait_until_stable(
+        self,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        quiet_ms: int = QUIET_MS,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """Wait until no update has drawn on a region for quiet_ms milliseconds.
+
+        Only the rectangles of incoming updates are looked at, the screen itself isn't
+        compared. Unless the resend flag keeps updates coming, an incremental
+        framebuffer update request for the region is kept outstanding meanwhile.
+
+        Args:
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height to
+                watch, the whole screen if None
+            quiet_ms (int): milliseconds without changes that count as stable
+            timeout (Optional[float]): seconds to wait for, forever if None
+
+        Raises
+        ------
+            TimeoutError: the region didn't settle in time.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            int: frame sequence number of the stable screen
+        """
+        loop = asyncio.get_running_loop()
+        quiet = quiet_ms / 1000
+        changed_at = loop.time()
+        deadline = None if timeout is None else changed_at + timeout
+        seq = self.frame_seq
+        # frame sequence number the answer to our outstanding request will have
+        answer = 0
+        while True:
+            now = loop.time()
+            if now - changed_at >= quiet:
+                return seq
+            if deadline is not None and now >= deadline:
+                raise TimeoutError(f"Screen still changing after {timeout}s")
+            if not self.resending and self.frame_seq >= answer:
+                x, y, width, height = region or (0, 0, self.width, self.height)
+                answer = await self.framebuffer_update_request(
+                    x, y, width, height, self.framebuffer is not None
+                )
+            wait = changed_at + quiet - now
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            try:
+                await self.wait_for_update(seq, wait)
+            except TimeoutError:
+                continue
+            if self.damage.touches(seq, region):
+                changed_at = loop.time()
+            seq = self.frame_seq
+
+    def get_changes_since(self, seq: int, pixels: bool = False) -> ScreenChanges:
+        """Return the parts of the screen that changed after frame sequence number seq.
+
+        Safe to call from other threads.
+
+        Args:
+            seq (int): frame sequence number to get the changes after
+            pixels (bool): also return the pixels of the changed regions
+
+        Returns
+        -------
+            ScreenChanges: merged changed regions up to the current frame sequence
+            number, the whole screen if seq is too old to know.
+        """
+        return self.damage.changes(seq, pixels)
+
+    def find_image(
+        self,
+        template: Image.Image | np.ndarray,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        threshold: float = THRESHOLD,
+    ) -> Optional[Match]:
+        """Find a template on the screen, only searching again where it changed.
+
+        Safe to call from other threads, the search doesn't run on the event loop.
+
+        Args:
+            template (Image.Image | np.ndarray): image to look for
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height the
+                match must lie in, the whole screen if None
+            threshold (float): minimum score, 1 - RMS difference / 255
+
+        Returns
+        -------
+            Optional[Match]: the best match, None if there is none
+        """
+        return self.image_finder.find(template, region, threshold)
+
+    async def subscribe(
+        self, x: int, y: int, width: int, height: int, fps: float = SUBSCRIPTION_FPS
+    ) -> Subscription:
+        """Keep a region of the screen up to date, refreshing it up to fps times a second.
+
+        While there are subscriptions, only their regions are requested, the resend
+        flag no longer re-requests the whole screen.
+
+        Args:
+            x (int): x-pos of the region
+            y (int): y-pos of the region
+            width (int): width of the region
+            height (int): height of the region
+            fps (float): target refresh rate of the region
+
+        Returns
+        -------
+            Subscription: the subscription, to pass to unsubscribe()
+        """
+        subscription = Subscription(x, y, width, height, fps)
+        self.subscriptions.append(subscription)
+        subscription.task = asyncio.ensure_future(self._refresh(subscription))
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop refreshing a subscribed region.
+
+        Args:
+            subscription (Subscription): the subscription subscribe() returned
+        """
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        if subscription.task is not None:
+            subscription.task.cancel()
+
+    async def _refresh(self, subscription: Subscription) -> None:
+        """Request a subscribed region once the last request was answered, at its rate.
+
+        The first request isn't incremental, so the region is up to date from the start.
+        Incremental requests are only answered once something in the region changes,
+        so a region that doesn't change costs nothing after that.
+        """
+        loop = asyncio.get_running_loop()
+        incremental = False
+        try:
+            while True:
+                sent = loop.time()
+                answer = await self.framebuffer_update_request(
+                    *subscription.region, incremental
+                )
+                subscription.requests += 1
+                incremental = True
+                await self.wait_for_update(answer - 1)
+                await self._throttle(sent + subscription.interval)
+        except (ConnectionError, ConnectionClosed):
+            logger.debug(f"Stopped refreshing {subscription}, connection closed.")
+
+    def set_frame_rate(
+        self, fps: Optional[float] = None, min_interval: float = 0.0
+    ) -> None:
+        """Limit how often the resend flag requests the whole screen again.
+
+        Args:
+            fps (Optional[float]): target frame rate, unlimited if None
+            min_interval (float): least seconds between requests
+        """
+        if fps is not None and fps <= 0:
+            raise ValueError(f"Frame rate must be positive, got {fps}")
+        if min_interval < 0:
+            raise ValueError(f"Interval can't be negative, got {min_interval}")
+        self.min_interval = max(min_interval, 0.0 if fps is None else 1 / fps)
+
+    async def pause_updates(self) -> None:
+        """Stop requesting updates for the resend flag & subscriptions until resumed.
+
+        Requests already sent are still answered, explicit requests are still sent.
+        """
+        self._unpaused.clear()
+        await self._keep_updated()
+
+    async def resume_updates(self) -> None:
+        """Request updates for the resend flag & subscriptions again."""
+        self._unpaused.set()
+        await self._keep_updated()
+
+    async def _keep_updated(self) -> None:
+        """Keep the screen updated for the resend flag, with continuous updates if possible.
+
+        Continuous updates save the round trip of a request per update, but can't be
+        throttled, so they're only used while no frame rate, budget or pause is set.
+        Otherwise (and with servers without them) the next update is requested.
+        """
+        if (
+            self.continuous_updates_supported
+            and -312 in self.decoders  # servers only allow them with fences
+            and self.resending
+            and not self.paused
+            and self.min_interval == 0
+            and self.budget is None
+        ):
+            screen = (0, 0, self.width, self.height)
+            if self.continuous_region != screen:
+                await self.enable_continuous_updates(*screen)
+            return
+        if self.continuous_region is not None:
+            await self.enable_continuous_updates(*self.continuous_region, enable=False)
+        if self.resending:
+            self._schedule_resend()
+
+    async def _throttle(self, not_before: float) -> None:
+        """Wait until updates may be requested: unpaused, not before a time & in budget.
+
+        Args:
+            not_before (float): event loop time to wait for
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._unpaused.wait()
+            wait = not_before - loop.time()
+            if self.budget is not None:
+                wait = max(wait, self.budget.delay(self))
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def _schedule_resend(self) -> None:
+        """Request the whole screen again for the resend flag, once throttled.
+
+        It's sent from a task, so listen() keeps reading while the governor holds it
+        back. At most one request waits at a time.
+        """
+        if self._resend is not None and not self._resend.done():
+            return
+        self._resend = asyncio.ensure_future(self._resend_throttled())
+
+    async def _resend_throttled(self) -> None:
+        """Wait out the governor, then request an incremental update of the screen."""
+        try:
+            await self._throttle(self._last_resend + self.min_interval)
+            if self.resending and not self.continuous:
+                self._last_resend = asyncio.get_running_loop().time()
+                await self.framebuffer_update_request(
+                    0, 0, self.width, self.height, True
+                )
+        except (ConnectionError, ConnectionClosed):
+            logger.debug("Stopped resending, connection closed.")
+
+    def _charge(self) -> None:
+        """Charge the bytes received & update CPU time since last time to the budget."""
+        if self.budget is None:
+            return
+        received, cpu = self.transport.bytes_received, self._cpu.cpu
+        self.budget.charge(
+            self, received - self._charged[0], max(cpu - self._charged[1], 0.0)
+        )
+        self._charged = (received, cpu)
 
     async def key_event(self, key: int, down: bool) -> None:
         """Press or release key on server.
@@ -98,7 +559,20 @@ class RFBClient:
             send_down = 0
         await self.transport.send(pack("!BBxxI", 4, send_down, key))
 
-    async def pointer_event(self, x: int, y: int, mask: int) -> None:
+    async def key_events(self, events: List[KeyEvent]) -> None:
+        """Press & release keys on server, in one write.
+
+        Returns once the messages are handed to the connection.
+
+        Args:
+            events (List[KeyEvent]): keysym & down flag of every key event
+        """
+        if events:
+            await self.transport.send(encode_key_events(events))
+
+    async def pointer_event(
+        self, x: int, y: int, mask: int, supersede: bool = False
+    ) -> None:
         """Send pointer event to server.
 
         RFC 6143 Section 7.5.5.
@@ -107,21 +581,30 @@ class RFBClient:
             x (int): x-cord on screen
             y (int): y-cord on screen
             mask (int): button to press (0 to unpress) (1=leftclick) (4=rightclick)
+            supersede (bool): replace the last queued message if it's a pointer event
+                with the same mask that was sent with supersede too, as a move the
+                pointer doesn't need to make anymore. Defaults to False.
         """
-        await self.transport.send(pack("!BBHH", 5, mask, x, y))
+        msg = pack("!BBHH", 5, mask, x, y)
+        await self.transport.send(msg, (5, mask) if supersede else None)
 
     async def set_encodings(self, encs: List[Type[EncodingInterface]]) -> None:
         """Set encoding types that can be sent from the server.
 
+        Also builds the table of decoders rectangles are dispatched to. Decoders
+        persist for as long as their encoding is set, so setting the encodings again
+        keeps the decoding state (like zlib streams) of the ones still used.
+
         Args:
             encs (List[EncodingInterface]): List of implemented encodings
         """
+        decoders = build_decoders(encs + [RawEncoding], self.decoders)
         msg = pack("!BxH", 2, len(encs))
         for enc in encs:
-            encoding = enc()
-            msg += pack(">i", encoding.type())
+            msg += pack(">i", enc().type())
         await self.transport.send(msg)
         self.encs = encs + [RawEncoding]
+        self.decoders = decoders
 
     async def set_pixel_format(self, format: PixelFormat) -> None:
         """Set pixel format for FramebufferUpdate messages from the server.
@@ -136,79 +619,90 @@ class RFBClient:
         await self.transport.send(pack("!Bxxx", 0) + format.write_pixel_format()[1:])
 
     async def close(self) -> None:
-        """Close the websocket connection."""
+        """Send any queued messages & close the websocket connection."""
+        try:
+            await self.transport.flush()
+        except ConnectionClosed:
+            pass
         await self.transport.conn.close()
 
     """ Functions that handle messages received by the Client, Server -> Client """
 
     async def listen(self) -> None:
-        """Async function that listens and handles server messages."""
+        """Async function that listens and handles server messages.
+
+        The websocket messages are treated as one continuous byte stream, so it doesn't
+        matter if the server (or a proxy like websockify) batches several RFB messages
+        into one websocket message or splits one RFB message over many. Every complete
+        message in the stream is handled, and the remainder is carried forward.
+        """
         try:
-            async for message in self.transport.conn:
-                if not isinstance(message, bytes):
-                    raise TypeError("Client should receive bytes.")
-                if len(message) == 0:
-                    logger.error("Received a message from the server with no bytes.")
+            while True:
+                # handlers read the rest of their message off the stream.
+                msg_type = bytes(await self.transport.read_exact(1))
+                if (
+                    msg_type[0] == 0
+                ):  # if first byte is 0 we received a framebuffer_update
+                    logger.debug("received framebuffer update.")
+                    await self._handle_framebuffer_update(msg_type)
+                    logger.debug("updated screen!")
+                    await self._keep_updated()
+                elif msg_type[0] == 1:
+                    logger.debug("received colorMap message.")
+                    await self._handle_color_map(msg_type)
+                elif msg_type[0] == 2:
+                    logger.debug("received bell message.")
+                    await self._handle_bell()
+                elif msg_type[0] == 3:
+                    logger.debug("received server cut text message.")
+                    await self._handle_server_cut_text(msg_type)
+                elif msg_type[0] == 150:
+                    logger.debug("received end of continuous updates message.")
+                    await self._handle_end_of_continuous_updates(msg_type)
+                elif msg_type[0] == 248:
+                    logger.debug("received fence message.")
+                    await self._handle_fence(msg_type)
                 else:
-                    logger.debug(f"Received: {len(message)} bytes")
-                    if (
-                        message[0] == 0
-                    ):  # if first byte is 0 we received a framebuffer_update
-                        logger.debug("received framebuffer update.")
-                        message = await self.transport.recvd(
-                            message, 16
-                        )  # read the rest of the FBU.
-                        await self._handle_framebuffer_update(message)
-                        logger.debug("updated screen!")
-                        if self.resend_flag:
-                            await self.framebuffer_update_request(
-                                0, 0, self.width, self.height, True
-                            )
-                    elif message[0] == 1:
-                        logger.debug("received colorMap message.")
-                        message = await self.transport.recvd(
-                            message, 6
-                        )  # read the rest of the FBU. # read rest of color map
-                        await self._handle_color_map(message)
-                    elif message[0] == 2:
-                        logger.debug("received bell message.")
-                        await self._handle_bell()
-                    elif message[0] == 3:
-                        logger.debug("received server cut text message.")
-                        message = await self.transport.recvd(
-                            message, 8
-                        )  # read the rest of the FBU. # read rest of cut text
-                        await self._handle_server_cut_text(message)
+                    # we can't know how long an unknown message is, so the rest of
+                    # the stream can't be parsed.
+                    raise ValueError(f"Unknown server message type: {msg_type[0]}")
+        except ConnectionClosedOK:
+            logger.info("Server closed the connection.")
         except Exception as e:
             logger.error("RFBClient Encountered An exception! {s}".format(s=e))
             logger.error(f"RFBClient Exception Traceback: {traceback.format_exc()}")
             await self.close()
+        finally:
+            # no more updates are coming
+            self.closed = True
+            if self._resend is not None:
+                self._resend.cancel()
+            if self.budget is not None:
+                self.budget.remove(self)
+            async with self._frame_applied:
+                self._frame_applied.notify_all()
+            async with self._cut_text_received:
+                self._cut_text_received.notify_all()
 
     async def _handle_framebuffer_update(self, msg: bytes) -> None:
         """Async function helper to handle framebuffer update messages from server."""
-        if self.img is None:  # set the image to the screen size and all black.
-            self.img = Image.new("RGBA", (self.width, self.height), (0, 0, 0, 0))
+        self._updates_started += 1
+        # only the CPU time of this update is charged, not that of other sessions
+        # running on the loop while it waits for data
+        fbu = await self._cpu.measure(self._apply_update(msg))
+        self._charge()
+        async with self._frame_applied:
+            self._frame_applied.notify_all()
 
-        fbu = FrameBufferUpdate(self.pixel_format, self.encs)
-        await fbu.read(self.transport, msg[1:])
-        logger.debug("Updating image with pixels.")
         for rect in fbu.rectangles:
-            enc = rect.enc
-            logger.debug(f"Processing: {rect.width * rect.height}, pixels")
-
-            # VMWare define unimplemented
-            if isinstance(enc, VMWDefineCursorEncoding):
-                continue
-
             # DesktopSize is special since it defines the screen size
-            # If we get this encoding we should redefine the img to be blank
-            # and to whatever size it now should be, and then send an FBUR for
-            # the entire screen to get an update ASAP
-            if isinstance(enc, PseudoDesktopSizeEncoding):
+            # The encoding redefined the framebuffer to be blank and to whatever size
+            # it now should be, so we send an FBUR for the entire screen to get an
+            # update ASAP
+            if isinstance(rect.enc, PseudoDesktopSizeEncoding):
                 logger.info(
                     f"Redefining Desktop Size to: width: {rect.width}, height: {rect.height}"
                 )
-                self.img = Image.new("RGBA", (rect.width, rect.height), (0, 0, 0, 0))
                 self.width = rect.width
                 self.height = rect.height
                 await self.framebuffer_update_request(
@@ -216,14 +710,34 @@ class RFBClient:
                 )
                 return
 
-            # CopyRect is special since we need the existing image to crop from
-            # to assemble the new one
-            if isinstance(enc, CopyRectEncoding):
-                enc.img = self.img.crop(
-                    (enc.srcx, enc.srcy, enc.srcx + rect.width, enc.srcy + rect.height)
-                )
-
-            self.img.paste(enc.img, (rect.x, rect.y))
+    async def _apply_update(self, msg: bytes) -> FrameBufferUpdate:
+        """Read a framebuffer update into the framebuffer and publish it."""
+        if self.framebuffer is None:  # set the screen size and all black.
+            self.framebuffer = FrameBuffer(self.width, self.height)
+
+        # the rectangles are decoded straight into the framebuffer
+        fbu = FrameBufferUpdate(
+            self.pixel_format,
+            self.encs,
+            self.framebuffer,
+            self.decoders,
+            self.decode_executor,
+        )
+        await fbu.read(self.transport, msg[1:])
+        # pseudo-encoding rectangles don't draw, apart from a new desktop size that
+        # blanks the whole screen
+        rects = [
+            (rect.x, rect.y, rect.width, rect.height)
+            for rect in fbu.rectangles
+            if not rect.enc.is_pseudo()
+            or isinstance(rect.enc, PseudoDesktopSizeEncoding)
+        ]
+        if rects:
+            # publish the whole update at once, readers never see half of it
+            self.framebuffer.commit(rects)
+        self.frame_seq += 1
+        self.damage.record(self.frame_seq, rects, self.framebuffer.snapshot)
+        return fbu
 
     async def _handle_server_cut_text(self, msg: bytes) -> None:
         """Handle server cut text messages.
@@ -234,6 +748,34 @@ class RFBClient:
         await sct.read(self.transport, msg[1:])
         logger.debug(f"Client has cut text in buffer: {sct.cut_text}")
         self.clipboard = sct.cut_text
+        async with self._cut_text_received:
+            self.cut_text_seq += 1
+            self._cut_text_received.notify_all()
+
+    async def _handle_end_of_continuous_updates(self, msg: bytes) -> None:
+        """Handle end of continuous updates server message.
+
+        The first one tells the client the server supports continuous updates, later
+        ones that the server stopped sending them. Either way the screen is kept
+        updated from here on as the resend flag asks.
+        """
+        eocu = EndOfContinuousUpdatesMessage()
+        await eocu.read(self.transport, msg[1:])
+        self.continuous_updates_supported = True
+        self.continuous_region = None
+        await self._keep_updated()
+
+    async def _handle_fence(self, msg: bytes) -> None:
+        """Handle fence server message.
+
+        Messages are handled one at a time & in order, so by the time a fence is read
+        everything before it is done, and requests are answered right away.
+        """
+        fence = FenceMessage()
+        await fence.read(self.transport, msg[1:])
+        self.fence_supported = True
+        if fence.request:
+            await self.fence(fence.flags & FENCE_SUPPORTED, fence.payload)
 
     async def _handle_color_map(self, msg: bytes) -> None:
         """Handle color map entries server message.
@@ -296,12 +838,16 @@ class RFBClient:
             # the next 4 bytes is the LENGTH of the NAME of the server
             self._server_name_length = unpack(">I", server_init_recv[20:24])[0]
             # finally read in the server name.
+            name_end = 24 + self._server_name_length
             self.server_name = str(
                 unpack(
                     "{l}s".format(l=self._server_name_length),
-                    server_init_recv[-self._server_name_length :],
+                    server_init_recv[24:name_end],
                 )[0]
             )
+            # proxies may deliver the first server message in the same frame.
+            if len(server_init_recv) > name_end:
+                self.transport.unread(server_init_recv[name_end:])
 
             logger.info("Handshake done!")
             logger.info("Client Ready!")
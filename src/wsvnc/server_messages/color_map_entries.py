@@ -1,6 +1,6 @@
 """Handle color map entries message."""
 
-from struct import unpack
+from struct import unpack_from
 
 from wsvnc.color import Color
 from wsvnc.server_messages.server_message_interface import ServerMessage
@@ -25,21 +25,18 @@ class ColorMapEntriesMessage(ServerMessage):
 
         Specified in RFC 6143 7.6.2
         """
-        # read off passing.
-        msg = msg[1:]
+        transport.unread(msg)
 
-        # read off first color & num colors
-        self._first_color = unpack(">H", msg[0:2])[0]
-        self._number_of_colors = unpack(">H", msg[2:4])[0]
+        # read off padding, first color & num colors
+        (self._first_color, self._number_of_colors) = unpack_from(
+            ">xHH", await transport.read_exact(5)
+        )
 
         # wait for the color map if message is incomplete.
-        colors = msg[4:]
-        expected_bytes = self._number_of_colors * 6
-        colors = await transport.recvd(colors, expected_bytes)
+        colors = await transport.read_exact(self._number_of_colors * 6)
 
         # read off each RGB color pixel value
         for i in range(self._number_of_colors):
-            r, g, b = unpack(">HHH", colors[0:6])
+            r, g, b = unpack_from(">HHH", colors, i * 6)
             c = Color(r=r, g=g, b=b)
             self.color_map[i + self._first_color] = c
-            colors = colors[6:]
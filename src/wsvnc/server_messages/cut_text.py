@@ -1,6 +1,6 @@
 """Server cut text message."""
 
-from struct import unpack
+from struct import unpack, unpack_from
 
 from wsvnc.server_messages.server_message_interface import ServerMessage
 from wsvnc.utils.safe_transport import SafeTransport
@@ -18,17 +18,15 @@ class CutTextMessage(ServerMessage):
     async def read(self, transport: SafeTransport, msg: bytes) -> None:
         """Handle cut text server message.
 
-        Specified in RFC 6143 7.6.4
+        The text is latin-1, like RFC 6143 says. Specified in RFC 6143 7.6.4
         """
-        # read off padding
-        msg = msg[3:]
+        transport.unread(msg)
 
-        # read text length
-        text_len = unpack(">I", msg[0:4])[0]
-        text = msg[4:]
+        # read off padding & text length
+        text_len = unpack_from(">xxxI", await transport.read_exact(7))[0]
 
         # wait for more text if message is incomplete.
-        text = await transport.recvd(text, text_len)
+        text = await transport.read_exact(text_len)
 
         # read text
-        self.cut_text = unpack("{l}s".format(l=text_len), text)[0]
+        self.cut_text = unpack("{l}s".format(l=text_len), text)[0].decode("latin-1")
@@ -0,0 +1,17 @@
+"""Server EndOfContinuousUpdates message."""
+
+from wsvnc.server_messages.server_message_interface import ServerMessage
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+class EndOfContinuousUpdatesMessage(ServerMessage):
+    def type(self) -> int:
+        return 150
+
+    async def read(self, transport: SafeTransport, msg: bytes) -> None:
+        """Handle end of continuous updates server message.
+
+        The message has no payload. Servers send it once they support continuous
+        updates, and when continuous updates stop.
+        """
+        return
@@ -0,0 +1,42 @@
+"""Server fence message."""
+
+from struct import unpack_from
+
+from wsvnc.server_messages.server_message_interface import ServerMessage
+from wsvnc.utils.safe_transport import SafeTransport
+
+# fence flags
+FENCE_BLOCK_BEFORE = 1 << 0
+FENCE_BLOCK_AFTER = 1 << 1
+FENCE_SYNC_NEXT = 1 << 2
+FENCE_REQUEST = 1 << 31
+# flags the client honours: it handles messages one at a time & in order anyway
+FENCE_SUPPORTED = FENCE_BLOCK_BEFORE | FENCE_BLOCK_AFTER | FENCE_SYNC_NEXT
+
+
+class FenceMessage(ServerMessage):
+    flags: int
+    payload: bytes
+
+    def __init__(self) -> None:
+        self.flags = 0
+        self.payload = b""
+
+    def type(self) -> int:
+        return 248
+
+    async def read(self, transport: SafeTransport, msg: bytes) -> None:
+        """Handle fence server message.
+
+        A fence with FENCE_REQUEST set has to be answered with the same payload.
+        """
+        transport.unread(msg)
+
+        # read off padding, flags & payload length
+        self.flags, length = unpack_from(">xxxIB", await transport.read_exact(8))
+        self.payload = bytes(await transport.read_exact(length))
+
+    @property
+    def request(self) -> bool:
+        """True if the server waits for the client to answer the fence."""
+        return bool(self.flags & FENCE_REQUEST)
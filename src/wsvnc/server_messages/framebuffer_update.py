@@ -1,11 +1,15 @@
 """Server framebuffer update message."""
 
-from struct import unpack
-from typing import List, Optional, Type
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor
+from copy import copy
+from struct import unpack_from
+from typing import Any, Dict, List, Optional, Tuple, Type
 
-from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.encoding_interface import DecodeJob, EncodingInterface
 from wsvnc.encodings.raw_encoding import RawEncoding
 from wsvnc.exceptions.encoding_exception import PixelEncodingError
+from wsvnc.framebuffer import FrameBuffer
 from wsvnc.pixel_format import PixelFormat
 from wsvnc.rectangle import Rectangle
 from wsvnc.server_messages.server_message_interface import ServerMessage
@@ -15,19 +19,59 @@ from wsvnc.utils.safe_transport import SafeTransport
 logger = get_logger(__name__)
 
 
+def build_decoders(
+    encs: List[Type[EncodingInterface]],
+    current: Optional[Dict[int, EncodingInterface]] = None,
+) -> Dict[int, EncodingInterface]:
+    """Build the encoding type -> decoder table used to dispatch rectangles.
+
+    Every encoding is instantiated once, so decoders keep any stream state (like zlib
+    streams) between rectangles and updates. If several encodings share a type the
+    first one listed is used. Decoders of the current table are kept when their
+    encoding is still used, since the server keeps its streams across SetEncodings.
+
+    Args:
+        encs (List[Type[EncodingInterface]]): encodings the client accepts
+        current (Optional[Dict[int, EncodingInterface]]): the table in use, if any
+
+    Returns
+    -------
+        Dict[int, EncodingInterface]: decoder for each encoding type
+    """
+    decoders: Dict[int, EncodingInterface] = {}
+    for enc in encs:
+        decoder = enc()
+        enc_type = decoder.type()
+        if enc_type in decoders:
+            continue
+        existing = current.get(enc_type) if current is not None else None
+        decoders[enc_type] = existing if type(existing) is enc else decoder
+    return decoders
+
+
 class FrameBufferUpdate(ServerMessage):
     rectangles: List[Rectangle]
     encs: List[Type[EncodingInterface]]
 
     def __init__(
-        self, pf: PixelFormat, encs: Optional[List[Type[EncodingInterface]]] = None
+        self,
+        pf: PixelFormat,
+        encs: Optional[List[Type[EncodingInterface]]] = None,
+        fb: Optional[FrameBuffer] = None,
+        decoders: Optional[Dict[int, EncodingInterface]] = None,
+        executor: Optional[Executor] = None,
     ) -> None:
         self.pf = pf
+        self.fb = fb
+        self.executor = executor
         self.rectangles = []
         if encs:
             self.encs = encs
         else:
             self.encs = [RawEncoding]
+        if decoders is None:
+            decoders = build_decoders(self.encs)
+        self.decoders = decoders
 
     def type(self) -> int:
         return 0
@@ -35,56 +79,104 @@ class FrameBufferUpdate(ServerMessage):
     async def read(self, transport: SafeTransport, msg: bytes) -> None:
         """Handle a frame buffer update server message.
 
-        Go through each rectangle and save the pixel data into an encoding object that
-        will be later drawn on a PIL.Image object.
+        Go through each rectangle, look up its decoder by encoding type and decode
+        the pixel data straight into the framebuffer. Without a framebuffer the pixel data is saved into an encoding
+        object that can be later drawn on a PIL.Image object. Everything is read off
+        the transport's byte stream, msg holds any bytes of this message that were
+        already taken off it.
+        With an executor, rectangles that can be decoded on their own (see
+        EncodingInterface.read_job()) are decoded in it, in parallel and off the event
+        loop, while the rest of the message is read. They are still drawn in order:
+        other rectangles wait until every earlier one has been drawn.
         Specified in RFC 6143 7.6.1
 
         Raise:
             PixelEncodingError: Couldn't decode rectangle.
         """
-        # read off padding
-        msg = msg[1:]
+        transport.unread(msg)
 
-        # number of rectangles
-        rect_num = unpack(">H", msg[0:2])[0]
+        # padding & number of rectangles
+        rect_num = unpack_from(">xH", await transport.read_exact(3))[0]
 
         # read every rectangle
-        msg = msg[2:]  # read off the rect number
         logger.debug(f"Num rectangles: {rect_num}")
-        for _ in range(rect_num):
-            rect = Rectangle()
-
-            # wait for rectangle header if message is incomplete.
-            msg = await transport.recvd(msg, 12)
-
-            (rect.x, rect.y, rect.width, rect.height, enc_type) = unpack(
-                "!HHHHi", msg[:12]
-            )
-            logger.debug(f"rectangle: {(rect.x, rect.y, rect.width, rect.height)}")
-            msg = msg[12:]  # drop the rectangles header
-
-            # here we read off the pixel data into the encodings colors field.
-            success = False
-            for enc in self.encs:
-                encoding = enc()
-                # use the first encoding that matches the enc_type 4 byte integer
-                if encoding.type() == enc_type:
-                    # update the msg first if necessary
-                    msg = await encoding.fetch_additional_data(
-                        rect.width, rect.height, transport, msg, self.pf
-                    )
-                    # remember to increase offset by data read
-                    chg = encoding.read(rect.width, rect.height, msg, self.pf)
-                    msg = msg[chg:]
-                    rect.enc = encoding
-                    success = True
-            if not success:
-                logger.error(
-                    f"Rect: {rect.x, rect.y, rect.width, rect.height}, Encoding Type: {enc_type}"
-                )
-                raise PixelEncodingError(
-                    "Server encoding does not match acceptable client encodings."
+        # decode jobs that haven't been drawn yet, in order
+        pending: List[Tuple[DecodeJob, Optional[asyncio.Future[Any]]]] = []
+        try:
+            for _ in range(rect_num):
+                rect = Rectangle()
+
+                (rect.x, rect.y, rect.width, rect.height, enc_type) = unpack_from(
+                    "!HHHHi", await transport.read_exact(12)
                 )
+                logger.debug(f"rectangle: {(rect.x, rect.y, rect.width, rect.height)}")
 
-            # next rectangle
-            self.rectangles.append(rect)
+                decoder = self.decoders.get(enc_type)
+                if decoder is None:
+                    logger.error(
+                        f"Rect: {rect.x, rect.y, rect.width, rect.height}, Encoding Type: {enc_type}"
+                    )
+                    raise PixelEncodingError(
+                        "Server encoding does not match acceptable client encodings."
+                    )
+
+                if self.fb is None:
+                    # the pixel data is kept on the encoding object, so each rectangle
+                    # gets a copy of the decoder (which shares its stream state).
+                    await decoder.read_stream(
+                        rect.width, rect.height, transport, self.pf
+                    )
+                    rect.enc = copy(decoder)
+                else:
+                    job = None
+                    if self.executor is not None:
+                        job = await decoder.read_job(
+                            rect.x, rect.y, rect.width, rect.height, transport, self.pf
+                        )
+                    if job is not None:
+                        pending.append((job, self._submit(job)))
+                    else:
+                        await self._draw_pending(pending, self.fb)
+                        await decoder.decode(
+                            rect.x,
+                            rect.y,
+                            rect.width,
+                            rect.height,
+                            transport,
+                            self.pf,
+                            self.fb,
+                        )
+                    rect.enc = decoder
+
+                # next rectangle
+                self.rectangles.append(rect)
+            if self.fb is not None:
+                await self._draw_pending(pending, self.fb)
+        finally:
+            # only left over if a rectangle failed
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+    def _submit(self, job: DecodeJob) -> Optional[asyncio.Future[Any]]:
+        """Start a job's heavy part in the executor."""
+        if job.func is None or self.executor is None:
+            return None
+        args = job.args
+        if isinstance(self.executor, ProcessPoolExecutor):
+            # views of the stream can't be pickled
+            args = tuple(bytes(a) if isinstance(a, memoryview) else a for a in args)
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor, job.func, *args)
+
+    async def _draw_pending(
+        self,
+        pending: List[Tuple[DecodeJob, Optional[asyncio.Future[Any]]]],
+        fb: FrameBuffer,
+    ) -> None:
+        """Draw the queued jobs in order as their decoding finishes."""
+        while pending:
+            job, future = pending[0]
+            result = None if future is None else await future
+            job.draw(fb, result)
+            pending.pop(0)
@@ -0,0 +1,37 @@
+"""Regions of the screen the client keeps up to date, each at its own rate."""
+
+import asyncio
+from typing import Optional, Tuple
+
+# default refresh rate of a subscription, in updates per second
+SUBSCRIPTION_FPS = 5.0
+
+
+class Subscription:
+    """A region of interest, refreshed with incremental requests at most fps times a second.
+
+    Attributes
+    ----------
+        region (Tuple[int, int, int, int]): x, y, width & height of the region
+        fps (float): target refresh rate
+        requests (int): number of framebuffer update requests sent for it
+    """
+
+    def __init__(
+        self, x: int, y: int, width: int, height: int, fps: float = SUBSCRIPTION_FPS
+    ) -> None:
+        if fps <= 0:
+            raise ValueError(f"Refresh rate must be positive, got {fps}")
+        self.region: Tuple[int, int, int, int] = (x, y, width, height)
+        self.fps = fps
+        self.requests = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def interval(self) -> float:
+        """Seconds between requests."""
+        return 1 / self.fps
+
+    def __repr__(self) -> str:
+        """Return the region & refresh rate."""
+        return f"Subscription(region={self.region}, fps={self.fps})"
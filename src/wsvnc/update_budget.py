@@ -0,0 +1,183 @@
+"""Bandwidth & decode CPU budget shared by many client sessions."""
+
+import threading
+import time
+from typing import Any, Awaitable, Coroutine, Dict, Generator, Optional, TypeVar
+
+# sessions that were charged within this many seconds share the budget
+ACTIVE_WINDOW = 1.0
+
+T = TypeVar("T")
+
+
+class CPUMeter:
+    """Adds up the thread CPU time spent running coroutines, for one session.
+
+    Only the steps the coroutines run are timed, not the time they're suspended
+    in, so what other sessions on the same event loop do meanwhile isn't counted.
+
+    Attributes
+    ----------
+    cpu : float
+        seconds of CPU time measured so far
+    """
+
+    def __init__(self) -> None:
+        self.cpu = 0.0
+
+    def measure(self, coro: Coroutine[Any, Any, T]) -> Awaitable[T]:
+        """Return an awaitable that runs coro, adding its CPU time to the meter.
+
+        Args:
+            coro (Coroutine): the coroutine to run
+
+        Returns
+        -------
+            Awaitable: awaits coro & returns its result
+        """
+        return _Measured(self, coro)
+
+
+class _Measured(Awaitable[T]):
+    """Steps a coroutine like ``await`` does, timing every step."""
+
+    def __init__(self, meter: CPUMeter, coro: Coroutine[Any, Any, T]) -> None:
+        self._meter = meter
+        self._coro = coro
+
+    def __await__(self) -> Generator[Any, Any, T]:
+        send: Any = self._coro.send
+        message: Any = None
+        while True:
+            start = time.thread_time()
+            try:
+                yielded = send(message)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self._meter.cpu += time.thread_time() - start
+            # suspended: pass what the coroutine waits on up to the task, & its
+            # result (or exception) back down
+            try:
+                message = yield yielded
+            except GeneratorExit:
+                self._coro.close()
+                raise
+            except BaseException as e:
+                send, message = self._coro.throw, e
+            else:
+                send = self._coro.send
+
+
+class _Account:
+    """What a session still owes the budget."""
+
+    def __init__(self, now: float) -> None:
+        self.bytes = 0.0
+        self.cpu = 0.0
+        self.updated = now
+        self.charged = now
+
+
+class UpdateBudget:
+    """Caps the bytes received & CPU time spent on updates by all sessions sharing it.
+
+    Every session's updates are charged to its own account, and the session waits
+    before requesting more until the account is paid off at its share of the rate:
+    the rate divided by the number of sessions that received updates recently. So
+    the total stays within the budget and busy sessions can't starve quiet ones.
+    Sessions may run on different threads & event loops.
+
+    Args:
+        bytes_per_second (Optional[float]): bytes of updates per second for all
+            sessions together, unlimited if None
+        cpu_per_second (Optional[float]): seconds of CPU time spent reading &
+            decoding updates per second for all sessions together (e.g. 2.0 is two
+            cores), unlimited if None
+    """
+
+    def __init__(
+        self,
+        bytes_per_second: Optional[float] = None,
+        cpu_per_second: Optional[float] = None,
+    ) -> None:
+        if bytes_per_second is not None and bytes_per_second <= 0:
+            raise ValueError("bytes_per_second must be positive")
+        if cpu_per_second is not None and cpu_per_second <= 0:
+            raise ValueError("cpu_per_second must be positive")
+        self.bytes_per_second = bytes_per_second
+        self.cpu_per_second = cpu_per_second
+        self._accounts: Dict[int, _Account] = {}
+        self._lock = threading.Lock()
+
+    def charge(self, session: object, nbytes: int, cpu: float) -> None:
+        """Charge an update to a session.
+
+        Args:
+            session (object): the session, any object identifying it
+            nbytes (int): bytes the update took
+            cpu (float): seconds of CPU time reading & decoding it took
+        """
+        now = time.monotonic()
+        with self._lock:
+            account = self._accounts.setdefault(id(session), _Account(now))
+            self._repay(account, now)
+            account.bytes += nbytes
+            account.cpu += cpu
+            account.charged = now
+
+    def delay(self, session: object) -> float:
+        """Return how many seconds the session has to wait before requesting more.
+
+        Args:
+            session (object): the session
+
+        Returns
+        -------
+            float: seconds until the session's account is paid off, 0 if it is
+        """
+        now = time.monotonic()
+        with self._lock:
+            account = self._accounts.get(id(session))
+            if account is None:
+                return 0.0
+            self._repay(account, now)
+            share = self._active(now)
+            wait = 0.0
+            if self.bytes_per_second is not None:
+                wait = account.bytes / (self.bytes_per_second / share)
+            if self.cpu_per_second is not None:
+                wait = max(wait, account.cpu / (self.cpu_per_second / share))
+            return wait
+
+    def remove(self, session: object) -> None:
+        """Stop accounting for a session, e.g. once it's closed.
+
+        Args:
+            session (object): the session
+        """
+        with self._lock:
+            self._accounts.pop(id(session), None)
+
+    def _active(self, now: float) -> int:
+        """Return the number of sessions charged recently, at least 1."""
+        recent = sum(
+            1 for a in self._accounts.values() if now - a.charged <= ACTIVE_WINDOW
+        )
+        return max(recent, 1)
+
+    def _repay(self, account: _Account, now: float) -> None:
+        """Pay off the account at the session's share for the time since last time."""
+        elapsed = now - account.updated
+        account.updated = now
+        share = self._active(now)
+        if self.bytes_per_second is not None:
+            account.bytes = max(
+                account.bytes - elapsed * self.bytes_per_second / share, 0.0
+            )
+        else:
+            account.bytes = 0.0
+        if self.cpu_per_second is not None:
+            account.cpu = max(account.cpu - elapsed * self.cpu_per_second / share, 0.0)
+        else:
+            account.cpu = 0.0
@@ -1,30 +1,360 @@
 """Wrapper to ensure binary transmission."""
 
+import asyncio
+from collections import deque
+from typing import Deque, Hashable, List, Optional, Tuple
+
 from websockets import WebSocketClientProtocol
 
+from wsvnc.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _new_future() -> asyncio.Future:
+    """Return a future for messages being written.
+
+    Its exception is raised to whoever awaits it (and failures in the background are
+    logged), so it isn't reported when nobody does.
+    """
+    future = asyncio.get_running_loop().create_future()
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    return future
+
 
 class SafeTransport:
-    def __init__(self, transport: WebSocketClientProtocol) -> None:
+    def __init__(
+        self,
+        transport: WebSocketClientProtocol,
+        coalesce_window: Optional[float] = None,
+    ) -> None:
         self.conn = transport
+        # send queue state: messages sent within coalesce_window seconds of the first
+        # queued one (or while held) go out together in one websocket message. None
+        # sends every message right away.
+        self.coalesce_window = coalesce_window
+        self._queued: List[bytes] = []
+        self._held = 0
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Optional[asyncio.Task] = None
+        # futures done once the queued messages, and the last websocket message taken
+        # off the queue (& so every one before it), are written to the connection.
+        self._queued_written: Optional[asyncio.Future] = None
+        self._last_written: Optional[asyncio.Future] = None
+        # supersede key of the last queued message, see send().
+        self._last_key: Optional[Hashable] = None
+        # websocket messages & client messages sent so far, and messages replaced by
+        # later ones before they were sent.
+        self.frames_sent = 0
+        self.messages_sent = 0
+        self.messages_superseded = 0
+        # stream reader state: received chunks that haven't been consumed yet.
+        # reads slice memoryviews off the front chunk, so they don't copy unless a
+        # read spans more than one websocket message.
+        self._chunks: Deque[memoryview] = deque()
+        self._buffered = 0
+        # payload bytes copied while reassembling reads that span chunks.
+        self.bytes_copied = 0
+        # bytes received from the connection so far.
+        self.bytes_received = 0
 
     async def recv(self) -> bytes:
-        """Guarantee we receive bytes from connection."""
-        data = await self.conn.recv()
-        if isinstance(data, bytes):
-            return data
-        raise ValueError("Received data is not bytes.")
+        """Guarantee we receive bytes from connection.
+
+        Bytes already buffered by the stream reader are handed out first so the stream
+        stays in order.
+        """
+        if self._buffered:
+            return self.take_buffered()
+        return await self._recv_conn()
 
     async def recvd(self, msg: bytes, length: int) -> bytes:
-        """Wait for a specific number of bytes given an existing message."""
-        data = bytearray(msg)
-        while len(data) < length:
-            data.extend(await self.recv())
-        return data
+        """Wait for a specific number of bytes given an existing message.
+
+        Only the missing bytes are read off the stream. The result is always bytes, msg
+        itself if it's bytes and long enough already.
+        """
+        if len(msg) >= length:
+            return bytes(msg)
+        return b"".join((msg, await self.read_exact(length - len(msg))))
 
-    async def send(self, msg: bytes) -> None:
+    async def send(self, msg: bytes, supersede: Optional[Hashable] = None) -> None:
         """Guarantee we send bytes.
 
+        If messages are coalesced (or held), msg is queued & this returns right away,
+        it's sent with the other queued messages in order. Otherwise it's sent now,
+        after anything still queued.
+
         Args:
             msg (bytes): msg to be sent.
+            supersede (Optional[Hashable]): if the last queued message was sent with
+                the same key, msg replaces it instead of being queued after it.
+        """
+        if supersede is not None and self._queued and self._last_key == supersede:
+            self._queued[-1] = msg
+            self.messages_superseded += 1
+            return
+        self._queued.append(msg)
+        self._last_key = supersede
+        self.messages_sent += 1
+        if self._held:
+            return
+        if self.coalesce_window is None:
+            await self.flush()
+        elif self._flush_timer is None:
+            loop = asyncio.get_running_loop()
+            self._flush_timer = loop.call_later(self.coalesce_window, self._flush_later)
+
+    async def flush(self) -> None:
+        """Send every queued message now, in one websocket message.
+
+        Returns once they're written to the connection, along with everything sent
+        before them, so it's a barrier for everything sent so far. Raises if writing
+        them (or a message still being flushed in the background) failed, failures
+        of messages written before the call aren't raised again.
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        previous = self._last_written
+        if self._queued:
+            data, written = self._take()
+            # messages queued before these may still be written by an earlier flush.
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])
+            await self._write(data, written)
+        elif previous is not None and not previous.done():
+            await asyncio.shield(previous)
+
+    def written(self) -> asyncio.Future:
+        """Return a future done once every message sent so far is written.
+
+        Its result is None, it raises the exception writing them to the connection
+        failed with. Messages are written in order, so it's done when the last one is.
+        """
+        if self._queued:
+            if self._queued_written is None:
+                self._queued_written = _new_future()
+            return self._queued_written
+        if self._last_written is not None:
+            return self._last_written
+        written = _new_future()
+        written.set_result(None)
+        return written
+
+    def write_backlog(self) -> int:
+        """Return the bytes sent that the connection couldn't write to the socket yet.
+
+        Messages still in the queue aren't counted.
+        """
+        transport = getattr(self.conn, "transport", None)
+        return transport.get_write_buffer_size() if transport is not None else 0
+
+    def hold(self) -> None:
+        """Queue messages until release(), however long that takes.
+
+        Holds nest, messages are sent once every hold is released.
+        """
+        self._held += 1
+
+    def held(self) -> bool:
+        """Return True while a hold() keeps queued messages from being sent."""
+        return self._held > 0
+
+    def release(self) -> None:
+        """Release a hold(), sending the queued messages once the last is released."""
+        self._held -= 1
+        if not self._held:
+            self._flush_later()
+
+    def _take(self) -> Tuple[bytes, asyncio.Future]:
+        """Empty the queue into the data of one websocket message.
+
+        Returns the data & the future to resolve once it's written.
+        """
+        data = b"".join(self._queued)
+        written = self._queued_written or _new_future()
+        self._queued.clear()
+        self._queued_written = None
+        self._last_key = None
+        self._last_written = written
+        self.frames_sent += 1
+        return data, written
+
+    async def _write(self, data: bytes, written: asyncio.Future) -> None:
+        """Send data taken off the queue & resolve its future."""
+        try:
+            await self.conn.send(data)
+        except asyncio.CancelledError:
+            written.cancel()
+            raise
+        except Exception as e:
+            if not written.done():
+                written.set_exception(e)
+            raise
+        if not written.done():
+            written.set_result(None)
+
+    def _flush_later(self) -> None:
+        """Flush in a task, for the coalesce window timer & release().
+
+        The queue is emptied now, messages queued before the task runs go in the next
+        websocket message.
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._queued:
+            previous = self._last_written
+            data, written = self._take()
+            self._flushing = asyncio.ensure_future(
+                self._send_logged(data, written, previous)
+            )
+
+    async def _send_logged(
+        self,
+        data: bytes,
+        written: asyncio.Future,
+        previous: Optional[asyncio.Future],
+    ) -> None:
+        """Send data after the previous websocket message, logging failures.
+
+        There's nobody to raise them to, apart from whoever awaits written().
         """
-        await self.conn.send(msg)
+        if previous is not None and not previous.done():
+            await asyncio.wait([previous])
+        try:
+            await self._write(data, written)
+        except Exception as e:
+            logger.error(f"Failed to send queued messages: {e!r}")
+
+    """ Stream reader, treats the websocket messages as one continuous byte stream. """
+
+    async def read_exact(self, n: int) -> memoryview:
+        """Read exactly n bytes off the stream, waiting for more data if necessary.
+
+        Args:
+            n (int): number of bytes to read
+
+        Returns
+        -------
+            memoryview: the bytes, only valid for reading
+        """
+        view = await self.peek(n)
+        self._consume(n)
+        return view
+
+    async def peek(self, n: int) -> memoryview:
+        """Return the next n bytes of the stream without consuming them.
+
+        Args:
+            n (int): number of bytes to look at
+
+        Returns
+        -------
+            memoryview: the bytes, only valid for reading
+        """
+        if n == 0:
+            return memoryview(b"")
+        await self._fill(n)
+        if len(self._chunks[0]) < n:
+            self._coalesce(n)
+        return self._chunks[0][:n]
+
+    async def skip(self, n: int) -> None:
+        """Discard the next n bytes of the stream.
+
+        Args:
+            n (int): number of bytes to drop
+        """
+        await self._fill(n)
+        self._consume(n)
+
+    def feed(self, data: bytes) -> None:
+        """Append data received from the connection to the end of the stream.
+
+        Args:
+            data (bytes): bytes received
+        """
+        if data:
+            self._chunks.append(memoryview(data))
+            self._buffered += len(data)
+
+    def unread(self, data: bytes | memoryview) -> None:
+        """Push data back onto the front of the stream.
+
+        Args:
+            data (bytes | memoryview): bytes to be read again
+        """
+        if data:
+            self._chunks.appendleft(memoryview(data))
+            self._buffered += len(data)
+
+    def buffered(self) -> int:
+        """Return the number of bytes received but not read yet."""
+        return self._buffered
+
+    def read_chunk(self) -> memoryview:
+        """Read the rest of the buffered websocket message at the front of the stream.
+
+        Doesn't copy or wait, it's empty if nothing is buffered.
+
+        Returns
+        -------
+            memoryview: the bytes, only valid for reading
+        """
+        if not self._chunks:
+            return memoryview(b"")
+        chunk = self._chunks.popleft()
+        self._buffered -= len(chunk)
+        return chunk
+
+    def take_buffered(self) -> bytes:
+        """Remove and return every buffered byte.
+
+        Returns
+        -------
+            bytes: the unread bytes of the stream
+        """
+        data = b"".join(self._chunks)
+        self.bytes_copied += len(data)
+        self._chunks.clear()
+        self._buffered = 0
+        return data
+
+    async def _recv_conn(self) -> bytes:
+        data = await self.conn.recv()
+        if isinstance(data, bytes):
+            self.bytes_received += len(data)
+            return data
+        raise ValueError("Received data is not bytes.")
+
+    async def _fill(self, n: int) -> None:
+        """Wait until at least n bytes are buffered."""
+        while self._buffered < n:
+            self.feed(await self._recv_conn())
+
+    def _coalesce(self, n: int) -> None:
+        """Join the chunks holding the next n bytes into one chunk."""
+        parts = []
+        need = n
+        while need:
+            chunk = self._chunks.popleft()
+            if len(chunk) > need:
+                self._chunks.appendleft(chunk[need:])
+                chunk = chunk[:need]
+            parts.append(chunk)
+            need -= len(chunk)
+        self._chunks.appendleft(memoryview(b"".join(parts)))
+        self.bytes_copied += n
+
+    def _consume(self, n: int) -> None:
+        """Drop n bytes off the front of the buffered chunks."""
+        self._buffered -= n
+        while n:
+            chunk = self._chunks[0]
+            if len(chunk) > n:
+                self._chunks[0] = chunk[n:]
+                return
+            self._chunks.popleft()
+            n -= len(chunk)
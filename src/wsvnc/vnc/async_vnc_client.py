@@ -0,0 +1,847 @@
+"""Asyncio VNC Client class, runs on the caller's event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from io import BytesIO
+from ssl import SSLContext
+from types import TracebackType
+from typing import Iterator, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+import websockets
+from PIL import Image
+
+from wsvnc.damage_log import ScreenChanges
+from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.image_search import THRESHOLD, Match
+from wsvnc.keyboard import PASTE_COMBO, compile_combo, compile_text
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.pointer import POINTER_BACKLOG, POINTER_RATE, PointerPath, path_ticks
+from wsvnc.rfb.rfb_client import QUIET_MS, RFBClient
+from wsvnc.security import no_security, security_type_interface
+from wsvnc.server_messages.bell import BellMessage
+from wsvnc.subscription import SUBSCRIPTION_FPS, Subscription
+from wsvnc.update_budget import UpdateBudget
+from wsvnc.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# text shorter than this is typed by paste_text(), not pasted
+PASTE_MIN_LENGTH = 64
+# seconds paste_text() waits for the server to echo the clipboard by default
+PASTE_CONFIRM_TIMEOUT = 1.0
+
+
+def _is_latin1(text: str) -> bool:
+    """Return True if text can be sent as cut text, which is latin-1."""
+    return all(ord(c) < 256 for c in text)
+
+
+class AsyncWSVNCClient:
+    """VNC client for asyncio code, with no thread or event loop of its own.
+
+    Connect with ``async with AsyncWSVNCClient(url) as vnc:`` (or connect() &
+    close()), on the event loop the client is then used from. Many clients can share
+    one event loop.
+    """
+
+    _rfb_client: RFBClient
+
+    def __init__(
+        self,
+        ticket_url: str,
+        ssl_context: Optional[SSLContext] = None,
+        origin: str = "http://localhost",
+        security_type: security_type_interface.SecurityTypeInterface = no_security.NoSecurity(),
+        keep_screen_updated: bool = False,
+        shared_flag: int = 1,
+        decode_executor: Optional[Executor] = None,
+        update_budget: Optional[UpdateBudget] = None,
+        coalesce_window: Optional[float] = None,
+    ) -> None:
+        self.ticket_url = ticket_url
+        self.origin = origin
+        self.security_type = security_type
+        self.ssl_context = ssl_context
+        self.keep_screen_updated = keep_screen_updated
+        self.shared_flag = shared_flag
+        self.decode_executor = decode_executor
+        self.update_budget = update_budget
+        self.coalesce_window = coalesce_window
+        self._listener: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        """Open the websocket connection, do the handshake & start listening.
+
+        Raises
+        ------
+            Exception: the connection or the handshake failed.
+        """
+        conn = await websockets.connect(
+            self.ticket_url,
+            ssl=self.ssl_context,
+            origin=self.origin,  # type: ignore
+            subprotocols=["binary"],  # type: ignore
+            ping_interval=None,
+            max_size=2**25,
+            read_limit=2**25,
+        )
+        try:
+            self._rfb_client = RFBClient(
+                conn,
+                self.security_type,
+                self.shared_flag,
+                self.decode_executor,
+                self.update_budget,
+                self.coalesce_window,
+            )
+            await self._rfb_client.handshake()
+        except BaseException:
+            await conn.close()
+            raise
+        self._listener = asyncio.ensure_future(self._listen())
+        if self.keep_screen_updated:
+            await self.set_resend_flag()
+
+    async def _listen(self) -> None:
+        """Handle server messages until the connection closes."""
+        await self._rfb_client.listen()  # handles exceptions internally
+        logger.info("VNC Client no longer listening")
+
+    async def close(self) -> None:
+        """Close the websocket connection & wait for the client to stop listening."""
+        if self._listener is None:
+            return
+        await self._rfb_client.close()
+        await self._listener
+        logger.info("Client shutdown complete.")
+
+    async def __aenter__(self) -> AsyncWSVNCClient:
+        """Async context manager enter method, connects.
+
+        Returns
+        -------
+            AsyncWSVNCClient: The connected client
+        """
+        await self.connect()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """Async context manager exit method, closes the connection.
+
+        Args:
+            exc_type (Optional[Type[BaseException]]): exception type
+            exc_val (Optional[BaseException]): exception value
+            exc_tb (Optional[TracebackType]): exception traceback
+        """
+        await self.close()
+
+    async def set_resend_flag(self, on: bool = True) -> None:
+        """Set FBUR resend flag.
+
+        If this is set to True, the screen will continually update in the background.
+
+        Args:
+            on (bool): Resend flag value.
+        """
+        self._rfb_client.resend_flag = on
+        if on:
+            await self.update_screen()
+
+    def set_frame_rate(
+        self, fps: Optional[float] = None, min_interval: float = 0.0
+    ) -> None:
+        """Limit how often the resend flag requests the whole screen again.
+
+        Args:
+            fps (Optional[float]): target frame rate. Defaults to None (unlimited).
+            min_interval (float): least seconds between requests. Defaults to 0.
+        """
+        self._rfb_client.set_frame_rate(fps, min_interval)
+
+    async def pause_updates(self) -> None:
+        """Stop requesting updates for the resend flag & subscriptions."""
+        await self._rfb_client.pause_updates()
+
+    async def resume_updates(self) -> None:
+        """Request updates for the resend flag & subscriptions again after pausing."""
+        await self._rfb_client.resume_updates()
+
+    async def set_pixel_format(self, pf: PixelFormat) -> None:
+        """Set the pixel formatting the server will use.
+
+        Args:
+            pf (PixelFormat): Pixel format object
+        """
+        await self._rfb_client.set_pixel_format(pf)
+
+    async def set_encodings(self, encs: List[Type[EncodingInterface]]) -> None:
+        """Set the encodings the client will use.
+
+        Args:
+            encs (List[Type[EncodingInterface]]): encodings that implement the interface.
+        """
+        await self._rfb_client.set_encodings(encs)
+
+    async def subscribe(
+        self, x: int, y: int, width: int, height: int, fps: float = SUBSCRIPTION_FPS
+    ) -> Subscription:
+        """Keep a region of interest up to date at its own refresh rate.
+
+        Args:
+            x (int): x-pos of the region
+            y (int): y-pos of the region
+            width (int): width of the region
+            height (int): height of the region
+            fps (float): target refresh rate. Defaults to SUBSCRIPTION_FPS.
+
+        Returns
+        -------
+            Subscription: pass it to unsubscribe() to stop refreshing the region
+        """
+        return await self._rfb_client.subscribe(x, y, width, height, fps)
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop refreshing a region subscribe() subscribed to.
+
+        Args:
+            subscription (Subscription): the subscription
+        """
+        await self._rfb_client.unsubscribe(subscription)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Send the input & request messages of the block in one websocket message.
+
+        The messages are sent, in order, when the block exits. Don't wait for
+        anything the server has to answer inside it.
+        """
+        transport = self._rfb_client.transport
+        transport.hold()
+        try:
+            yield
+        finally:
+            transport.release()
+
+    async def flush(self) -> None:
+        """Send any messages queued by coalescing now & wait until they're written.
+
+        A barrier for all the input & requests sent so far, raises if writing them to
+        the connection failed (e.g. it was closed).
+        """
+        await self._rfb_client.transport.flush()
+
+    def written(self) -> asyncio.Future[None]:
+        """Return a future done once the input & requests sent so far are written.
+
+        It raises if writing them to the connection failed. Unlike flush() it doesn't
+        send queued messages early, so input can be pipelined, e.g. ``await
+        vnc.left_click(x, y); written = vnc.written()``, then wait for the screen to
+        change & ``await written`` to find out if the click failed.
+        """
+        return asyncio.shield(self._rfb_client.transport.written())
+
+    async def send_key(self, key: int) -> None:
+        """Press a key then release.
+
+        Args:
+            key (int): Key ID
+        """
+        await self.key_event(key, True)
+        await asyncio.sleep(0.1)
+        await self.key_event(key, False)
+
+    async def move(self, xpos: int, ypos: int) -> None:
+        """Move mouse to position(xpos,ypos).
+
+        Args:
+            xpos (int)
+            ypos (int)
+        """
+        await self.pointer_event(xpos, ypos, 0)
+
+    async def release(self, xpos: int, ypos: int) -> None:
+        """Relase is the same as move().
+
+        Args:
+            xpos (int)
+            ypos (int)
+        """
+        await self.move(xpos, ypos)
+
+    async def left_click(self, xpos: int, ypos: int) -> None:
+        """Left click at position(xpos, ypos).
+
+        Args:
+            xpos (int)
+            ypos (int)
+        """
+        await self.move(xpos, ypos)
+        await self.pointer_event(xpos, ypos, 1)
+        await self.pointer_event(xpos, ypos, 0)
+
+    async def double_left_click(self, xpos: int, ypos: int) -> None:
+        """Double left click at position(xpos, ypos).
+
+        Args:
+            xpos (int)
+            ypos (int)
+        """
+        await self.move(xpos, ypos)
+        await self.left_click(xpos, ypos)
+        await asyncio.sleep(0.05)
+        await self.left_click(xpos, ypos)
+
+    async def press(self, xpos: int, ypos: int) -> None:
+        """Left-Press and then hold.
+
+        Args:
+            xpos (int)
+            ypos (int)
+        """
+        await self.move(xpos, ypos)
+        await self.pointer_event(xpos, ypos, 1)
+
+    async def right_click(self, xpos: int, ypos: int) -> None:
+        """Right click at position(xpos, ypos).
+
+        Args:
+            xpos (int)
+            ypos (int)
+        """
+        await self.move(xpos, ypos)
+        await self.pointer_event(xpos, ypos, 4)
+        await self.pointer_event(xpos, ypos, 0)
+
+    async def wheel_up(self, xpos: int, ypos: int, delay_ms: int = 50) -> None:
+        """Scrolls up at position(xpos, ypos) for duration delay_ms.
+
+        Args:
+            xpos (int)
+            ypos (int)
+            delay_ms (int, optional): time to scroll up. Defaults to 50.
+        """
+        await self.pointer_event(xpos, ypos, 8)
+        await asyncio.sleep(delay_ms * 0.001)
+        await self.pointer_event(xpos, ypos, 0)
+
+    async def wheel_down(self, xpos: int, ypos: int, delay_ms: int = 50) -> None:
+        """Scrolls down at position(xpos, ypos) for duration delay_ms.
+
+        Args:
+            xpos (int)
+            ypos (int)
+            delay_ms (int, optional): time to scroll down. Defaults to 50.
+        """
+        await self.pointer_event(xpos, ypos, 16)
+        await asyncio.sleep(delay_ms * 0.001)
+        await self.pointer_event(xpos, ypos, 0)
+
+    async def wheel(
+        self, xpos: int, ypos: int, delay_ms: int, down: bool = False
+    ) -> None:
+        """Use mouse wheel.
+
+        If down is set to true the mouse wheel will scroll down, if not it will scroll up.
+
+        Args:
+            xpos (int)
+            ypos (int)
+            delay_ms (int): time mouse wheel will scroll in milliseconds
+            down (bool): true=wheel down, false=wheel up
+        """
+        if down:
+            await self.wheel_down(xpos, ypos, delay_ms)
+        else:
+            await self.wheel_up(xpos, ypos, delay_ms)
+
+    async def click_and_drag(
+        self, xpos: int, ypos: int, newx: int, newy: int, duration: float = 0.0
+    ) -> None:
+        """Clicks at position(xpos, ypos) and hold to position(newx, newy).
+
+        Args:
+            xpos (int): starting x coord.
+            ypos (int): starting y coord.
+            newx (int): end x coord.
+            newy (int): end y coord.
+            duration (float): seconds the pointer takes to move along the line to
+                (newx, newy). Defaults to 0, it jumps there.
+        """
+        await self.move(xpos, ypos)
+        await self.pointer_event(xpos, ypos, 1)
+        if duration > 0:
+            path = PointerPath.line(xpos, ypos, newx, newy)
+            await self.move_along(path, duration, mask=1)
+        else:
+            await self.pointer_event(newx, newy, 1)
+
+    async def move_along(
+        self,
+        path: PointerPath,
+        duration: float,
+        rate: float = POINTER_RATE,
+        mask: int = 0,
+    ) -> None:
+        """Move the pointer along a path in duration seconds, holding mask's buttons.
+
+        Positions are sent rate times a second. Positions the pointer is late for are
+        skipped, and while the connection is backed up moves are skipped, or replace
+        the move still queued before them, only the end of the path is always sent.
+        Buttons are pressed & released by separate events around it, see drag().
+
+        Args:
+            path (PointerPath): path to follow, from where the pointer is.
+            duration (float): seconds following the path takes.
+            rate (float): pointer events a second. Defaults to POINTER_RATE.
+            mask (int): buttons held while moving. Defaults to 0 (none).
+        """
+        loop = asyncio.get_running_loop()
+        transport = self._rfb_client.transport
+        ticks = path_ticks(duration, rate)
+        start = loop.time()
+        last = path.at(0)
+        i = 0
+        while i < ticks:
+            # the position due now, if we're late for the next one
+            due = ticks
+            if duration > 0:
+                due = int((loop.time() - start) / duration * ticks)
+            i = min(ticks, max(i + 1, due))
+            await asyncio.sleep(start + i * duration / ticks - loop.time())
+            position = path.at(i / ticks)
+            if position == last:
+                continue
+            if i < ticks and transport.write_backlog() > POINTER_BACKLOG:
+                continue
+            await self._rfb_client.pointer_event(*position, mask, supersede=True)
+            last = position
+
+    async def drag(
+        self,
+        path: PointerPath,
+        duration: float,
+        rate: float = POINTER_RATE,
+        button: int = 1,
+    ) -> None:
+        """Press a button at the start of a path, move along it & release at its end.
+
+        Args:
+            path (PointerPath): path to drag along.
+            duration (float): seconds moving along the path takes.
+            rate (float): pointer events a second. Defaults to POINTER_RATE.
+            button (int): mask of the buttons to hold. Defaults to 1 (left).
+        """
+        xpos, ypos = path.at(0)
+        await self.move(xpos, ypos)
+        await self.pointer_event(xpos, ypos, button)
+        await self.move_along(path, duration, rate, button)
+        xpos, ypos = path.at(1)
+        await self.pointer_event(xpos, ypos, 0)
+
+    async def emit_text(self, text: str, delay: float = 0.1) -> None:
+        """Type text on the server, holding every key down for delay seconds.
+
+        Args:
+            text (str): text to be emitted.
+            delay (float): seconds every key is held down. Defaults to 0.1.
+        """
+        await self.type_text(text, delay)
+
+    async def type_text(self, text: str, delay: float = 0.0) -> None:
+        """Type text on the server, by default as fast as the connection takes it.
+
+        The text is compiled into key events once, holding shift across runs of
+        shifted characters. Without a delay they're sent in one write, returning
+        once it's handed to the connection.
+
+        Args:
+            text (str): text to be typed
+            delay (float): seconds every key is held down. Defaults to 0.
+        """
+        events = compile_text(text)
+        if delay <= 0:
+            await self._rfb_client.key_events(events)
+            return
+        for key, down in events:
+            await self.key_event(key, down)
+            if down:
+                await asyncio.sleep(delay)
+
+    async def cut_text(self, text: str) -> None:
+        """Client tells the server it has text in its clipboard.
+
+        Args:
+            text (str): the text
+        """
+        await self._rfb_client.cut_text(text)
+
+    async def paste_text(
+        self,
+        text: str,
+        paste_combo: Sequence[int] = PASTE_COMBO,
+        confirm: bool = True,
+        timeout: float = PASTE_CONFIRM_TIMEOUT,
+        min_length: int = PASTE_MIN_LENGTH,
+    ) -> bool:
+        """Put text in the server's clipboard & paste it, typing it if that fails.
+
+        Text shorter than min_length is typed with type_text(). Otherwise it's sent
+        as ClientCutText, and if confirm is set, pasted only once the server echoes it
+        back in a ServerCutText message, else it's typed instead. Cut text is latin-1,
+        so text outside of it is always typed.
+
+        Args:
+            text (str): text to be pasted
+            paste_combo (Sequence[int]): keysyms that paste, pressed in order.
+                Defaults to PASTE_COMBO (ctrl+v).
+            confirm (bool): wait for the server to echo the clipboard. Defaults to
+                True.
+            timeout (float): seconds to wait for the echo. Defaults to
+                PASTE_CONFIRM_TIMEOUT.
+            min_length (int): shortest text that's pasted. Defaults to
+                PASTE_MIN_LENGTH.
+
+        Returns
+        -------
+            bool: true if the text was pasted, false if it was typed
+        """
+        if len(text) < min_length or not _is_latin1(text):
+            await self.type_text(text)
+            return False
+        seq = self._rfb_client.cut_text_seq
+        await self.cut_text(text)
+        if confirm:
+            try:
+                echo = await self._rfb_client.wait_for_cut_text(seq, timeout)
+            except TimeoutError:
+                echo = None
+            if echo != text:
+                logger.info("Server didn't echo the clipboard, typing the text.")
+                await self.type_text(text)
+                return False
+        await self._rfb_client.key_events(compile_combo(paste_combo))
+        return True
+
+    async def update_screen(
+        self,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        incremental: bool = False,
+        x: int = 0,
+        y: int = 0,
+        wait: bool = False,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """Send a remote framebuffer update request that will update the screen.
+
+        If no parameters are set then the FBUR will request the entire screen.
+
+        Args:
+            width (Optional[int]): Width of the frame. Defaults to None.
+            height (Optional[int]): Height of the frame. Defaults to None.
+            incremental (bool, optional): Incremental flag (see RFC 7.5.3). Defaults to False.
+            x (int, optional): Starting x coord of frame. Defaults to 0.
+            y (int, optional): Starting y coord of frame. Defaults to 0.
+            wait (bool, optional): Wait until the update answering the request has
+                been applied. Defaults to False.
+            timeout (Optional[float]): Seconds to wait for the update. Defaults to None.
+
+        Raises
+        ------
+            TimeoutError: waited for longer than timeout.
+
+        Returns
+        -------
+            int: frame sequence number of the update answering the request, once
+                it's applied if wait is True
+        """
+        if width is None:
+            width = self._rfb_client.width
+        if height is None:
+            height = self._rfb_client.height
+        answer = await self._rfb_client.framebuffer_update_request(
+            x, y, width, height, incremental
+        )
+        if not wait:
+            return answer
+        return await self.wait_for_update(answer - 1, timeout)
+
+    async def wait_for_update(
+        self, after: Optional[int] = None, timeout: Optional[float] = None
+    ) -> int:
+        """Wait until a framebuffer update newer than frame sequence number after is applied.
+
+        Args:
+            after (Optional[int]): frame sequence number to wait past. Defaults to the
+                current one, so it waits for the next update.
+            timeout (Optional[float]): Seconds to wait for. Defaults to None (forever).
+
+        Raises
+        ------
+            TimeoutError: no update arrived in time.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            int: the frame sequence number of the screen now
+        """
+        return await self._rfb_client.wait_for_update(after, timeout)
+
+    async def wait_until_stable(
+        self,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        quiet_ms: int = QUIET_MS,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """Wait until the screen (or a region of it) stops changing.
+
+        Args:
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height to
+                watch. Defaults to None (the whole screen).
+            quiet_ms (int): milliseconds without changes. Defaults to QUIET_MS.
+            timeout (Optional[float]): Seconds to wait for. Defaults to None (forever).
+
+        Raises
+        ------
+            TimeoutError: the region kept changing for longer than timeout.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            int: the frame sequence number of the stable screen
+        """
+        return await self._rfb_client.wait_until_stable(region, quiet_ms, timeout)
+
+    def find_image(
+        self,
+        template: Image.Image | np.ndarray,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        threshold: float = THRESHOLD,
+    ) -> Optional[Match]:
+        """Find where a template (e.g. a button or an icon) is on the screen.
+
+        Blocks while searching, wait_for_image() searches in a worker thread.
+
+        Args:
+            template (Image.Image | np.ndarray): image to look for, or its RGB(A)
+                pixels
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height the
+                match must lie in. Defaults to None (the whole screen).
+            threshold (float): minimum score, 1 - RMS difference / 255 of the pixels.
+                Defaults to THRESHOLD.
+
+        Returns
+        -------
+            Optional[Match]: the best match, None if nothing scores threshold
+        """
+        return self._rfb_client.find_image(template, region, threshold)
+
+    async def wait_for_image(
+        self,
+        template: Image.Image | np.ndarray,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        threshold: float = THRESHOLD,
+        timeout: Optional[float] = None,
+    ) -> Match:
+        """Wait until a template shows up on the screen.
+
+        Searches again after every framebuffer update, only where it changed, in a
+        worker thread so the event loop isn't blocked. Unless the resend flag is set,
+        incremental updates of the region are requested meanwhile.
+
+        Args:
+            template (Image.Image | np.ndarray): image to look for
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height the
+                match must lie in. Defaults to None (the whole screen).
+            threshold (float): minimum score of a match. Defaults to THRESHOLD.
+            timeout (Optional[float]): Seconds to wait for. Defaults to None (forever).
+
+        Raises
+        ------
+            TimeoutError: the template didn't show up in time.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            Match: the best match
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        answer = 0
+        while True:
+            seq = self.get_frame_seq()
+            match = await asyncio.to_thread(
+                self.find_image, template, region, threshold
+            )
+            if match is not None:
+                return match
+            answer = await self._request_more(region, answer)
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Image didn't show up on the screen in time")
+            await self.wait_for_update(seq, remaining)
+
+    async def _request_more(
+        self, region: Optional[Tuple[int, int, int, int]], answer: int
+    ) -> int:
+        """Request an incremental update of the region unless one is on its way.
+
+        Args:
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height, the
+                whole screen if None
+            answer (int): frame sequence number the last request's answer gets
+
+        Returns
+        -------
+            int: frame sequence number the outstanding request's answer gets
+        """
+        if self._rfb_client.resending or self.get_frame_seq() < answer:
+            return answer
+        x, y, width, height = region or (
+            0,
+            0,
+            self._rfb_client.width,
+            self._rfb_client.height,
+        )
+        return await self._rfb_client.framebuffer_update_request(
+            x, y, width, height, True
+        )
+
+    async def key_event(self, key: int, down: bool) -> None:
+        """Non-abstracted key event call.
+
+        Args:
+            key (int): Key ID
+            down (bool): press down
+        """
+        await self._rfb_client.key_event(key, down)
+
+    async def pointer_event(self, xpos: int, ypos: int, mask: int) -> None:
+        """Non-abstracted pointer event call.
+
+        Args:
+            xpos (int)
+            ypos (int)
+            mask (int): the mouse button ID
+        """
+        await self._rfb_client.pointer_event(xpos, ypos, mask)
+
+    def get_screen(self) -> Image.Image | None:
+        """Return latest update of the screen, a read-only snapshot.
+
+        Returns
+        -------
+            Image: The RGBA image of the screen, None if it was never updated
+        """
+        return self._rfb_client.img
+
+    def get_screen_bytes(self) -> bytes | None:
+        """Return latest update of the screen in bytes.
+
+        Returns
+        -------
+            bytes: Image of the screen in PNG format, None if it was never updated
+        """
+        buffer = BytesIO()
+        img = self.get_screen()
+        if img is not None:
+            img.save(buffer, format="PNG")
+            return buffer.getvalue()
+
+        return None
+
+    def get_frame_seq(self) -> int:
+        """Return the frame sequence number, the number of updates applied so far.
+
+        Returns
+        -------
+            int: frame sequence number of the screen get_screen() returns
+        """
+        return self._rfb_client.frame_seq
+
+    def get_changes_since(self, seq: int, pixels: bool = False) -> ScreenChanges:
+        """Return what changed on the screen after frame sequence number seq.
+
+        Args:
+            seq (int): frame sequence number, e.g. from a previous call's seq
+            pixels (bool): also crop the regions out of the screen into images
+
+        Returns
+        -------
+            ScreenChanges: seq, regions & optionally images of the changes
+        """
+        return self._rfb_client.get_changes_since(seq, pixels)
+
+    def is_closed(self) -> bool:
+        """Return whether the client isn't connected, never was or the connection closed.
+
+        Returns
+        -------
+            bool: true if no more server messages are handled
+        """
+        return self._listener is None or self._rfb_client.closed
+
+    def get_continuous_updates(self) -> bool:
+        """Return whether the server sends updates as the screen changes, without requests.
+
+        Returns
+        -------
+            bool: true if continuous updates are on
+        """
+        return self._rfb_client.continuous
+
+    def get_clipboard(self) -> str:
+        """Return the clipboard of the client.
+
+        Returns
+        -------
+            str: clipboard of the client
+        """
+        return self._rfb_client.clipboard
+
+    def get_pixel_format(self) -> PixelFormat:
+        """Return the current PixelFormat in use.
+
+        Returns
+        -------
+            PixelFormat: PixelFormat in use
+        """
+        return self._rfb_client.pixel_format
+
+    def get_server_name(self) -> str:
+        """Return the name of the server.
+
+        Returns
+        -------
+            str: Server name
+        """
+        return self._rfb_client.server_name
+
+    def get_encodings(self) -> List[Type[EncodingInterface]]:
+        """Return the encodings we are using.
+
+        Returns
+        -------
+            List[Type[EncodingInterface]]: List of encodings in use
+        """
+        return self._rfb_client.encs
+
+    def get_bell(self) -> BellMessage | None:
+        """Return a bell message if we received one.
+
+        Returns
+        -------
+            BellMessage | None: A bell message if received by the client
+        """
+        return self._rfb_client.bell
@@ -0,0 +1,342 @@
+"""Manager of many VNC sessions multiplexed on one event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from types import TracebackType
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, TypeVar
+
+from PIL import Image
+
+from wsvnc.utils.logger import get_logger
+from wsvnc.vnc.async_vnc_client import AsyncWSVNCClient
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# connections that may be opened at the same time by default
+CONNECT_CONCURRENCY = 32
+# seconds a session may take to connect & handshake by default
+CONNECT_TIMEOUT = 30.0
+
+
+class Session:
+    """A session the manager opened, and how it's doing.
+
+    Attributes
+    ----------
+        name (str): name the session was opened with
+        client (AsyncWSVNCClient): the session's client
+        state (str): "connecting", "connected", "failed", "disconnected" (the server
+            closed the connection) or "closed" (closed by the manager)
+        error (Optional[BaseException]): why connecting or the last bulk operation
+            failed, None if it didn't
+        connected_at (Optional[float]): time.monotonic() the handshake completed at
+    """
+
+    def __init__(self, name: str, client: AsyncWSVNCClient) -> None:
+        self.name = name
+        self.client = client
+        self._state = "connecting"
+        self.error: Optional[BaseException] = None
+        self.connected_at: Optional[float] = None
+        # waiting for a connection slot, connecting & handshaking
+        self._connecting: Optional[asyncio.Future] = None
+
+    @property
+    def state(self) -> str:
+        """State of the session, noticing connections the server closed."""
+        if self._state == "connected" and self.client.is_closed():
+            return "disconnected"
+        return self._state
+
+    @property
+    def healthy(self) -> bool:
+        """True if the session is connected & its last bulk operation succeeded."""
+        return self.state == "connected" and self.error is None
+
+    def __repr__(self) -> str:
+        """Return the name & state of the session."""
+        return f"Session(name={self.name!r}, state={self.state!r})"
+
+
+class SessionManager:
+    """Opens, tracks & closes many sessions on the event loop it's used from.
+
+    Every session is an AsyncWSVNCClient, so no thread or event loop is started per
+    session. At most max_connecting sessions connect at a time, so opening hundreds
+    of sessions doesn't flood the servers (or a proxy in front of them) with
+    handshakes. Use ``async with SessionManager() as manager:`` to close every
+    session on exit.
+
+    Args:
+        max_connecting (int): sessions connecting at the same time. Defaults to
+            CONNECT_CONCURRENCY.
+        connect_timeout (float): seconds a session may take to connect. Defaults to
+            CONNECT_TIMEOUT.
+        **client_kwargs: keyword arguments every AsyncWSVNCClient is created with,
+            e.g. a shared decode_executor or update_budget
+    """
+
+    def __init__(
+        self,
+        max_connecting: int = CONNECT_CONCURRENCY,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        **client_kwargs: Any,
+    ) -> None:
+        if max_connecting < 1:
+            raise ValueError("max_connecting must be at least 1")
+        self.max_connecting = max_connecting
+        self.connect_timeout = connect_timeout
+        self.client_kwargs = client_kwargs
+        self.sessions: Dict[str, Session] = {}
+        self._connecting: Optional[asyncio.Semaphore] = None
+
+    async def open(self, name: str, ticket_url: str, **kwargs: Any) -> AsyncWSVNCClient:
+        """Open a session & wait until it's connected.
+
+        Args:
+            name (str): name to refer to the session by
+            ticket_url (str): websocket URL of the server
+            **kwargs: keyword arguments for this session's AsyncWSVNCClient, on top
+                of the manager's
+
+        Raises
+        ------
+            ValueError: a session with that name is open.
+            TimeoutError: connecting took longer than connect_timeout.
+            Exception: the connection or the handshake failed.
+            asyncio.CancelledError: the session was closed while connecting.
+
+        Returns
+        -------
+            AsyncWSVNCClient: the connected client
+        """
+        if name in self.sessions and self.sessions[name].state in (
+            "connecting",
+            "connected",
+        ):
+            raise ValueError(f"Session {name!r} is already open")
+        if self._connecting is None:
+            self._connecting = asyncio.Semaphore(self.max_connecting)
+        client = AsyncWSVNCClient(ticket_url, **{**self.client_kwargs, **kwargs})
+        session = Session(name, client)
+        self.sessions[name] = session
+        # a task of its own, so closing the session can cancel it
+        session._connecting = asyncio.ensure_future(
+            self._connect(session, self._connecting)
+        )
+        await session._connecting
+        return client
+
+    async def _connect(self, session: Session, slots: asyncio.Semaphore) -> None:
+        """Connect a session once there's a free connection slot."""
+        async with slots:
+            try:
+                try:
+                    await asyncio.wait_for(
+                        session.client.connect(), self.connect_timeout
+                    )
+                except asyncio.TimeoutError:
+                    # not the builtin TimeoutError before Python 3.11
+                    raise TimeoutError(
+                        f"Session {session.name!r} didn't connect in "
+                        f"{self.connect_timeout}s"
+                    )
+            except asyncio.CancelledError:
+                # closed while connecting, connect() closed the connection
+                session._state = "closed"
+                raise
+            except BaseException as e:
+                session._state = "failed"
+                session.error = e
+                logger.error(f"Session {session.name!r} failed to connect: {e!r}")
+                raise
+        session._state = "connected"
+        session.connected_at = time.monotonic()
+
+    async def open_all(
+        self, ticket_urls: Dict[str, str], **kwargs: Any
+    ) -> Dict[str, BaseException]:
+        """Open many sessions, at most max_connecting at a time.
+
+        Sessions that fail to connect don't stop the others, they're kept as failed
+        so health() reports them.
+
+        Args:
+            ticket_urls (Dict[str, str]): websocket URL of every session by name
+            **kwargs: keyword arguments for the sessions' AsyncWSVNCClients
+
+        Returns
+        -------
+            Dict[str, BaseException]: why each session that failed to connect failed
+        """
+        names = list(ticket_urls)
+        results = await asyncio.gather(
+            *(self.open(name, ticket_urls[name], **kwargs) for name in names),
+            return_exceptions=True,
+        )
+        return {
+            name: result
+            for name, result in zip(names, results)
+            if isinstance(result, BaseException)
+        }
+
+    def get(self, name: str) -> AsyncWSVNCClient:
+        """Return the client of a session.
+
+        Args:
+            name (str): name of the session
+
+        Raises
+        ------
+            KeyError: no session has that name.
+
+        Returns
+        -------
+            AsyncWSVNCClient: the session's client
+        """
+        return self.sessions[name].client
+
+    def connected(self) -> List[str]:
+        """Return the names of the sessions that are connected.
+
+        Returns
+        -------
+            List[str]: names of the connected sessions
+        """
+        return [
+            name
+            for name, session in self.sessions.items()
+            if session.state == "connected"
+        ]
+
+    def health(self) -> Dict[str, Session]:
+        """Return every session the manager opened, with its state & last error.
+
+        Returns
+        -------
+            Dict[str, Session]: sessions by name
+        """
+        return dict(self.sessions)
+
+    async def gather(
+        self,
+        operation: Callable[[AsyncWSVNCClient], Awaitable[T]],
+        timeout: Optional[float] = None,
+    ) -> Dict[str, T]:
+        """Run an operation on every connected session concurrently.
+
+        A session the operation fails (or times out) on gets the exception as its
+        error, so it's no longer healthy, and is left out of the results.
+
+        Args:
+            operation (Callable[[AsyncWSVNCClient], Awaitable[T]]): coroutine function
+                taking a session's client
+            timeout (Optional[float]): seconds the operation may take per session.
+                Defaults to None (forever).
+
+        Returns
+        -------
+            Dict[str, T]: result of the operation for every session it succeeded on
+        """
+        names = self.connected()
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(operation(self.sessions[name].client), timeout)
+                for name in names
+            ),
+            return_exceptions=True,
+        )
+        succeeded: Dict[str, T] = {}
+        for name, result in zip(names, results):
+            session = self.sessions[name]
+            if isinstance(result, BaseException):
+                session.error = result
+                logger.warning(f"Session {name!r} failed: {result!r}")
+            else:
+                session.error = None
+                succeeded[name] = result
+        return succeeded
+
+    async def screenshot_all(
+        self, timeout: Optional[float] = None
+    ) -> Dict[str, Image.Image]:
+        """Request the whole screen of every connected session & return them.
+
+        Args:
+            timeout (Optional[float]): seconds to wait for each screen. Defaults to
+                None (forever).
+
+        Returns
+        -------
+            Dict[str, Image.Image]: screen of every session that sent it in time
+        """
+
+        async def screenshot(client: AsyncWSVNCClient) -> Image.Image:
+            await client.update_screen(wait=True)
+            img = client.get_screen()
+            if img is None:
+                raise RuntimeError("No screen after the update was applied")
+            return img
+
+        return await self.gather(screenshot, timeout)
+
+    async def close(self, name: str) -> None:
+        """Close a session & stop tracking it.
+
+        A session that's still connecting stops connecting, whoever waits for it to
+        open gets a CancelledError.
+
+        Args:
+            name (str): name of the session
+        """
+        session = self.sessions.pop(name)
+        if session._connecting is not None and not session._connecting.done():
+            session._connecting.cancel()
+            await asyncio.gather(session._connecting, return_exceptions=True)
+        if session._state == "connected":
+            await session.client.close()
+        session._state = "closed"
+
+    async def close_all(self) -> None:
+        """Close every session."""
+        await asyncio.gather(
+            *(self.close(name) for name in list(self.sessions)),
+            return_exceptions=True,
+        )
+        logger.info("Closed all sessions.")
+
+    def __len__(self) -> int:
+        """Return the number of sessions the manager tracks."""
+        return len(self.sessions)
+
+    def __contains__(self, name: object) -> bool:
+        """Return whether the manager tracks a session of that name."""
+        return name in self.sessions
+
+    async def __aenter__(self) -> SessionManager:
+        """Async context manager enter method.
+
+        Returns
+        -------
+            SessionManager: The manager
+        """
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """Async context manager exit method, closes every session.
+
+        Args:
+            exc_type (Optional[Type[BaseException]]): exception type
+            exc_val (Optional[BaseException]): exception value
+            exc_tb (Optional[TracebackType]): exception traceback
+        """
+        await self.close_all()
@@ -4,26 +4,55 @@ from __future__ import annotations
 
 import asyncio
 import threading
-import time
-from io import BytesIO
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
 from ssl import SSLContext
 from types import TracebackType
-from typing import List, Optional, Type
-
-import websockets
+from typing import (
+    Any,
+    Coroutine,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+import numpy as np
 from PIL import Image
 
+from wsvnc.damage_log import ScreenChanges
 from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.image_search import THRESHOLD, Match
+from wsvnc.keyboard import PASTE_COMBO
 from wsvnc.pixel_format import PixelFormat
-from wsvnc.rfb.rfb_client import RFBClient
+from wsvnc.pointer import POINTER_RATE, PointerPath
+from wsvnc.rfb.rfb_client import QUIET_MS, RFBClient
 from wsvnc.security import no_security, security_type_interface
 from wsvnc.server_messages.bell import BellMessage
+from wsvnc.subscription import SUBSCRIPTION_FPS, Subscription
+from wsvnc.update_budget import UpdateBudget
 from wsvnc.utils.logger import get_logger
+from wsvnc.vnc.async_vnc_client import (
+    PASTE_CONFIRM_TIMEOUT,
+    PASTE_MIN_LENGTH,
+    AsyncWSVNCClient,
+)
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
 
 class WSVNCClient:
+    """Blocking VNC client, a thin wrapper around AsyncWSVNCClient.
+
+    The async client runs on an event loop in a daemon thread of the client's own,
+    every call is handed to it & waited for (or not, for input events).
+    """
+
     def __init__(
         self,
         ticket_url: str,
@@ -32,14 +61,34 @@ class WSVNCClient:
         security_type: security_type_interface.SecurityTypeInterface = no_security.NoSecurity(),
         keep_screen_updated: bool = False,
         shared_flag: int = 1,
+        decode_executor: Optional[Executor] = None,
+        update_budget: Optional[UpdateBudget] = None,
+        coalesce_window: Optional[float] = None,
     ) -> None:
         self.ticket_url = ticket_url
         self.origin = origin
         self.security_type = security_type
         self.ssl_context = ssl_context
         self.shared_flag = shared_flag
+        self.decode_executor = decode_executor
+        self.update_budget = update_budget
+        self.coalesce_window = coalesce_window
+        self._client = AsyncWSVNCClient(
+            ticket_url,
+            ssl_context,
+            origin,
+            security_type,
+            shared_flag=shared_flag,
+            decode_executor=decode_executor,
+            update_budget=update_budget,
+            coalesce_window=coalesce_window,
+        )
         # event loop
         self._loop = asyncio.new_event_loop()
+        # batch() blocks running per thread, input & requests sent in them join it
+        self._batching = threading.local()
+        # input & requests run one after another, in the order they were sent
+        self._send_order = asyncio.Lock()
         # start the client
         self._handshake_done = threading.Event()
         self._caught_exception: Exception | None = None
@@ -56,49 +105,207 @@ class WSVNCClient:
         if keep_screen_updated:
             self.set_resend_flag()
 
-    def set_resend_flag(self, on: bool = True) -> None:
+    @property
+    def _rfb_client(self) -> RFBClient:
+        """The async client's RFB client."""
+        return self._client._rfb_client
+
+    @_rfb_client.setter
+    def _rfb_client(self, rfb_client: RFBClient) -> None:
+        self._client._rfb_client = rfb_client
+
+    def _submit(self, coro: Coroutine[Any, Any, T]) -> Future[T]:
+        """Run a coroutine on the client's event loop, without waiting for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _call(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine on the client's event loop & return its result."""
+        return self._submit(coro).result()
+
+    def _send(self, coro: Coroutine[Any, Any, T]) -> Future[T]:
+        """Run an input or request coroutine on the client's event loop.
+
+        Doesn't wait for it, but it only starts once the ones sent before it are done,
+        so their events never interleave. The future is done once the messages it sent
+        are written to the connection, with the coroutine's result, and raises if that
+        (or the coroutine) failed.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._written_after(self._in_order(self._in_batch(coro))), self._loop
+        )
+
+    async def _in_order(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Await coro once the coroutines _send() ran before it are done."""
+        async with self._send_order:
+            return await coro
+
+    def _in_batch(self, coro: Coroutine[Any, Any, T]) -> Coroutine[Any, Any, T]:
+        """Hold the transport until coro is done, if this thread is in a batch() block.
+
+        The hold is taken by a callback scheduled now, so it comes before the block's
+        release however long coro takes to start (or to send all its messages).
+        """
+        if not getattr(self._batching, "depth", 0):
+            return coro
+        self._loop.call_soon_threadsafe(self._rfb_client.transport.hold)
+        return self._released_after(coro)
+
+    async def _released_after(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Await coro, then release the transport hold _in_batch() took for it."""
+        try:
+            return await coro
+        finally:
+            self._rfb_client.transport.release()
+
+    async def _written_after(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Await coro, then the messages sent so far being written."""
+        result = await coro
+        await self._client.written()
+        return result
+
+    def set_resend_flag(self, on: bool = True) -> Optional[Future[None]]:
         """Set FBUR resend flag.
 
         If this is set to True, the screen will continually update in the background.
 
         Args:
             on (bool): Resend flag value.
+
+        Returns
+        -------
+            Optional[Future[None]]: if on, a future done once the request for the
+                whole screen is written
         """
         self._rfb_client.resend_flag = on
-        if on:
-            self.update_screen()
+        if not on:
+            return None
+        return self._send(self._client.set_resend_flag())
+
+    def set_frame_rate(
+        self, fps: Optional[float] = None, min_interval: float = 0.0
+    ) -> None:
+        """Limit how often the resend flag requests the whole screen again.
+
+        By default the next update is requested as soon as one arrives, which on
+        busy desktops decodes frames as fast as the server sends them.
+
+        Args:
+            fps (Optional[float]): target frame rate. Defaults to None (unlimited).
+            min_interval (float): least seconds between requests. Defaults to 0.
+        """
+        self._client.set_frame_rate(fps, min_interval)
 
-    def set_pixel_format(self, pf: PixelFormat) -> None:
+    def pause_updates(self) -> None:
+        """Stop requesting updates for the resend flag & subscriptions.
+
+        The screen keeps its last state until resume_updates(). Updates requested
+        explicitly, e.g. by update_screen(), still arrive.
+        """
+        self._call(self._client.pause_updates())
+
+    def resume_updates(self) -> None:
+        """Request updates for the resend flag & subscriptions again after pausing."""
+        self._call(self._client.resume_updates())
+
+    def set_pixel_format(self, pf: PixelFormat) -> Future[None]:
         """Set the pixel formatting the server will use.
 
         Args:
             pf (PixelFormat): Pixel format object
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        asyncio.run_coroutine_threadsafe(
-            self._rfb_client.set_pixel_format(pf), self._loop
-        )
+        return self._send(self._client.set_pixel_format(pf))
 
-    def set_encodings(self, encs: List[Type[EncodingInterface]]) -> None:
+    def set_encodings(self, encs: List[Type[EncodingInterface]]) -> Future[None]:
         """Set the encodings the client will use.
 
         Args:
             encs (List[Type[EncodingInterface]]): encodings that implement the interface.
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        asyncio.run_coroutine_threadsafe(
-            self._rfb_client.set_encodings(encs), self._loop
-        )
+        return self._send(self._client.set_encodings(encs))
+
+    def subscribe(
+        self, x: int, y: int, width: int, height: int, fps: float = SUBSCRIPTION_FPS
+    ) -> Subscription:
+        """Keep a region of interest up to date at its own refresh rate.
+
+        Incremental update requests are sent for the region at most fps times a
+        second (and only once the last one was answered). While there are
+        subscriptions, the resend flag doesn't re-request the whole screen, so only
+        the regions are sent by the server & decoded.
+
+        Args:
+            x (int): x-pos of the region
+            y (int): y-pos of the region
+            width (int): width of the region
+            height (int): height of the region
+            fps (float): target refresh rate. Defaults to SUBSCRIPTION_FPS.
+
+        Returns
+        -------
+            Subscription: pass it to unsubscribe() to stop refreshing the region
+        """
+        return self._call(self._client.subscribe(x, y, width, height, fps))
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop refreshing a region subscribe() subscribed to.
+
+        Args:
+            subscription (Subscription): the subscription
+        """
+        self._call(self._client.unsubscribe(subscription))
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Send the input & request messages of the block in one websocket message.
+
+        E.g. ``with vnc.batch(): vnc.left_click(x, y); vnc.type_text("hi")`` costs
+        one frame instead of four. The messages are sent, in order, once the block
+        exits and every call made in it is done sending (e.g. type_text() with a
+        delay). Messages other threads send meanwhile go out with it, without
+        waiting for their calls. Don't wait for anything the server has to answer
+        (e.g. update_screen(wait=True).result()) inside it.
+        """
+        transport = self._rfb_client.transport
+        self._loop.call_soon_threadsafe(transport.hold)
+        self._batching.depth = getattr(self._batching, "depth", 0) + 1
+        try:
+            yield
+        finally:
+            self._batching.depth -= 1
+            self._loop.call_soon_threadsafe(transport.release)
+
+    def flush(self) -> None:
+        """Send any messages queued by coalescing now & block until they're written.
+
+        A barrier for all the input & requests sent so far, raises if writing them to
+        the connection failed (e.g. it was closed).
+        """
+        self._call(self._client.flush())
 
-    def send_key(self, key: int) -> None:
+    def send_key(self, key: int) -> Future[None]:
         """Press a key then release.
 
         Args:
             key (int): Key ID
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.key_event(key, True)
-        time.sleep(0.1)
-        self.key_event(key, False)
+        return self._send(self._client.send_key(key))
 
-    def move(self, xpos: int, ypos: int) -> None:
+    def move(self, xpos: int, ypos: int) -> Future[None]:
         """Move mouse to position(xpos,ypos).
 
         Used before any other click action to ensure cursor is in the correct position.
@@ -106,87 +313,117 @@ class WSVNCClient:
         Args:
             xpos (int)
             ypos (int)
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.pointer_event(xpos, ypos, 0)
+        return self._send(self._client.move(xpos, ypos))
 
-    def release(self, xpos: int, ypos: int) -> None:
+    def release(self, xpos: int, ypos: int) -> Future[None]:
         """Relase is the same as move().
 
         Args:
             xpos (int)
             ypos (int)
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.move(xpos, ypos)
+        return self._send(self._client.release(xpos, ypos))
 
-    def left_click(self, xpos: int, ypos: int) -> None:
+    def left_click(self, xpos: int, ypos: int) -> Future[None]:
         """Left click at position(xpos, ypos).
 
         Args:
             xpos (int)
             ypos (int)
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.move(xpos, ypos)
-        self.pointer_event(xpos, ypos, 1)
-        self.pointer_event(xpos, ypos, 0)
+        return self._send(self._client.left_click(xpos, ypos))
 
-    def double_left_click(self, xpos: int, ypos: int) -> None:
+    def double_left_click(self, xpos: int, ypos: int) -> Future[None]:
         """Double left click at position(xpos, ypos).
 
         Args:
             xpos (int)
             ypos (int)
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.move(xpos, ypos)
-        self.left_click(xpos, ypos)
-        time.sleep(0.05)
-        self.left_click(xpos, ypos)
+        return self._send(self._client.double_left_click(xpos, ypos))
 
-    def press(self, xpos: int, ypos: int) -> None:
+    def press(self, xpos: int, ypos: int) -> Future[None]:
         """Left-Press and then hold.
 
         Args:
             xpos (int)
             ypos (int)
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.move(xpos, ypos)
-        self.pointer_event(xpos, ypos, 1)
+        return self._send(self._client.press(xpos, ypos))
 
-    def right_click(self, xpos: int, ypos: int) -> None:
+    def right_click(self, xpos: int, ypos: int) -> Future[None]:
         """Right click at position(xpos, ypos).
 
         Args:
             xpos (int)
             ypos (int)
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.move(xpos, ypos)
-        self.pointer_event(xpos, ypos, 4)
-        self.pointer_event(xpos, ypos, 0)
+        return self._send(self._client.right_click(xpos, ypos))
 
-    def wheel_up(self, xpos: int, ypos: int, delay_ms: int = 50) -> None:
+    def wheel_up(self, xpos: int, ypos: int, delay_ms: int = 50) -> Future[None]:
         """Scrolls up at position(xpos, ypos) for duration delay_ms.
 
         Args:
             xpos (int)
             ypos (int)
             delay_ms (int, optional): time to scroll up. Defaults to 50.
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.pointer_event(xpos, ypos, 8)
-        time.sleep(delay_ms * 0.001)
-        self.pointer_event(xpos, ypos, 0)
+        return self._send(self._client.wheel_up(xpos, ypos, delay_ms))
 
-    def wheel_down(self, xpos: int, ypos: int, delay_ms: int = 50) -> None:
+    def wheel_down(self, xpos: int, ypos: int, delay_ms: int = 50) -> Future[None]:
         """Scrolls down at position(xpos, ypos) for duration delay_ms.
 
         Args:
             xpos (int)
             ypos (int)
             delay_ms (int, optional): time to scroll down. Defaults to 50.
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.pointer_event(xpos, ypos, 16)
-        time.sleep(delay_ms * 0.001)
-        self.pointer_event(xpos, ypos, 0)
+        return self._send(self._client.wheel_down(xpos, ypos, delay_ms))
 
-    def wheel(self, xpos: int, ypos: int, delay_ms: int, down: bool = False) -> None:
+    def wheel(
+        self, xpos: int, ypos: int, delay_ms: int, down: bool = False
+    ) -> Future[None]:
         """Use mouse wheel.
 
         If down is set to true the mouse wheel will scroll down, if not it will scroll up.
@@ -196,13 +433,17 @@ class WSVNCClient:
             ypos (int)
             delay_ms (int): time mouse wheel will scroll in milliseconds
             down (bool): true=wheel down, false=wheel up
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        if down:
-            self.wheel_down(xpos, ypos, delay_ms)
-        else:
-            self.wheel_up(xpos, ypos, delay_ms)
+        return self._send(self._client.wheel(xpos, ypos, delay_ms, down))
 
-    def click_and_drag(self, xpos: int, ypos: int, newx: int, newy: int) -> None:
+    def click_and_drag(
+        self, xpos: int, ypos: int, newx: int, newy: int, duration: float = 0.0
+    ) -> Future[None]:
         """Clicks at position(xpos, ypos) and hold to position(newx, newy).
 
         Args:
@@ -210,54 +451,149 @@ class WSVNCClient:
             ypos (int): starting y coord.
             newx (int): end x coord.
             newy (int): end y coord.
+            duration (float): seconds the pointer takes to move along the line to
+                (newx, newy). Defaults to 0, it jumps there.
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        self.move(xpos, ypos)
-        self.pointer_event(xpos, ypos, 1)
-        self.pointer_event(newx, newy, 1)
+        return self._send(self._client.click_and_drag(xpos, ypos, newx, newy, duration))
+
+    def move_along(
+        self,
+        path: PointerPath,
+        duration: float,
+        rate: float = POINTER_RATE,
+        mask: int = 0,
+    ) -> Future[None]:
+        """Move the pointer along a path in duration seconds, holding mask's buttons.
+
+        Positions are sent rate times a second. Positions the pointer is late for are
+        skipped, and while the connection is backed up moves are skipped, or replace
+        the move still queued before them, only the end of the path is always sent.
+
+        Args:
+            path (PointerPath): path to follow, from where the pointer is.
+            duration (float): seconds following the path takes.
+            rate (float): pointer events a second. Defaults to POINTER_RATE.
+            mask (int): buttons held while moving. Defaults to 0 (none).
+
+        Returns
+        -------
+            Future[None]: done once the end of the path is written to the connection,
+            raises if that failed
+        """
+        return self._send(self._client.move_along(path, duration, rate, mask))
+
+    def drag(
+        self,
+        path: PointerPath,
+        duration: float,
+        rate: float = POINTER_RATE,
+        button: int = 1,
+    ) -> Future[None]:
+        """Press a button at the start of a path, move along it & release at its end.
 
-    def emit_text(self, text: str) -> None:
-        """Type text on the server. These should be strictly [a-Z0-9].
+        E.g. ``vnc.drag(PointerPath([(10, 10), (200, 40), (300, 300)], bezier=True),
+        0.5).result()`` drags along a curve for half a second.
+
+        Args:
+            path (PointerPath): path to drag along.
+            duration (float): seconds moving along the path takes.
+            rate (float): pointer events a second. Defaults to POINTER_RATE.
+            button (int): mask of the buttons to hold. Defaults to 1 (left).
+
+        Returns
+        -------
+            Future[None]: done once the release is written to the connection, raises
+            if that failed
+        """
+        return self._send(self._client.drag(path, duration, rate, button))
+
+    def emit_text(self, text: str, delay: float = 0.1) -> Future[None]:
+        """Type text on the server, holding every key down for delay seconds.
+
+        Use type_text() to type faster.
 
         Args:
             text (str): text to be emitted.
+            delay (float): seconds every key is held down. Defaults to 0.1.
+
+        Returns
+        -------
+            Future[None]: done once the text is typed & written to the connection,
+            raises if that failed
+        """
+        return self._send(self._client.emit_text(text, delay))
+
+    def type_text(self, text: str, delay: float = 0.0) -> Future[None]:
+        """Type text on the server, by default as fast as the connection takes it.
+
+        The text is compiled into key events once, holding shift across runs of
+        shifted characters (newlines & tabs press Return & Tab). Without a delay
+        they're sent in one write, otherwise paced so every key is held down for delay
+        seconds.
+
+        Args:
+            text (str): text to be typed
+            delay (float): seconds every key is held down. Defaults to 0.
+
+        Returns
+        -------
+            Future[None]: done once the key events are written to the connection,
+            raises if that failed
         """
-        for chr in text:
-            if self._is_shift_required(chr):
-                self.key_event(65505, True)  # press shift
-                time.sleep(0.1)
-                self.send_key(ord(chr))
-                self.key_event(65505, False)  # release shift
-            else:
-                self.send_key(ord(chr))
+        return self._send(self._client.type_text(text, delay))
 
-    def cut_text(self, text: str) -> None:
+    def cut_text(self, text: str) -> Future[None]:
         """Client tells the server it has text in its clipboard.
 
         Args:
             text (str): _description_
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        asyncio.run_coroutine_threadsafe(self._rfb_client.cut_text(text), self._loop)
+        return self._send(self._client.cut_text(text))
 
-    def _is_shift_required(self, c: str) -> bool:
-        """Determine if we should press shift when typing this letter.
+    def paste_text(
+        self,
+        text: str,
+        paste_combo: Sequence[int] = PASTE_COMBO,
+        confirm: bool = True,
+        timeout: float = PASTE_CONFIRM_TIMEOUT,
+        min_length: int = PASTE_MIN_LENGTH,
+    ) -> bool:
+        """Put text in the server's clipboard & paste it, typing it if that fails.
 
-        Does not check for caps lock, so don't set caps lock.
+        Much faster than typing long text. Text shorter than min_length is typed
+        with type_text() instead. Otherwise it's sent as ClientCutText, and if confirm
+        is set, pasted only once the server echoes it back in a ServerCutText message
+        within timeout seconds (not every server does), else it's typed. Cut text is
+        latin-1, so text outside of it is always typed.
 
         Args:
-            c (str): a character
+            text (str): text to be pasted
+            paste_combo (Sequence[int]): keysyms that paste, pressed in order &
+                released in reverse. Defaults to PASTE_COMBO (ctrl+v).
+            confirm (bool): wait for the server to echo the clipboard. Defaults to
+                True.
+            timeout (float): seconds to wait for the echo. Defaults to
+                PASTE_CONFIRM_TIMEOUT.
+            min_length (int): shortest text that's pasted. Defaults to
+                PASTE_MIN_LENGTH.
 
         Returns
         -------
-            bool: true if it shift is needed on the keyboard, false otherwise
+            bool: true if the text was pasted, false if it was typed
         """
-        if c.isupper():
-            return True
-
-        special = '!@#$%^&*()_+{}|:"<>?'
-        if c in special:
-            return True
-
-        return False
+        return self._call(
+            self._client.paste_text(text, paste_combo, confirm, timeout, min_length)
+        )
 
     def update_screen(
         self,
@@ -266,7 +602,9 @@ class WSVNCClient:
         incremental: bool = False,
         x: int = 0,
         y: int = 0,
-    ) -> None:
+        wait: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Future[int]:
         """Send a remote framebuffer update request that will update the screen.
 
         If resend flag is False, this will run once in the background.
@@ -278,19 +616,220 @@ class WSVNCClient:
             incremental (bool, optional): Incremental flag (see RFC 7.5.3). Defaults to False.
             x (int, optional): Starting x coord of frame. Defaults to 0.
             y (int, optional): Starting y coord of frame. Defaults to 0.
+            wait (bool, optional): Only resolve the future once the update answering
+                the request has been applied. Defaults to False.
+            timeout (Optional[float]): Seconds to wait for the update. Defaults to None.
+
+        Returns
+        -------
+            Future[int]: done once the request is written (& the update applied if
+                wait is True), with the frame sequence number of the update answering
+                it. Raises TimeoutError if waiting took longer than timeout.
+        """
+        return self._send(
+            self._client.update_screen(width, height, incremental, x, y, wait, timeout)
+        )
+
+    def wait_for_update(
+        self, after: Optional[int] = None, timeout: Optional[float] = None
+    ) -> int:
+        """Block until a framebuffer update newer than frame sequence number after is applied.
+
+        Use instead of sleeping after an action, e.g.
+        ``seq = vnc.get_frame_seq(); vnc.left_click(x, y); vnc.wait_for_update(seq)``.
+
+        Args:
+            after (Optional[int]): frame sequence number to wait past. Defaults to the
+                current one, so it waits for the next update.
+            timeout (Optional[float]): Seconds to wait for. Defaults to None (forever).
+
+        Raises
+        ------
+            TimeoutError: no update arrived in time.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            int: the frame sequence number of the screen now
+        """
+        if after is None:
+            after = self.get_frame_seq()
+        return self._call(self._client.wait_for_update(after, timeout))
+
+    async def wait_for_update_async(
+        self, after: Optional[int] = None, timeout: Optional[float] = None
+    ) -> int:
+        """Wait_for_update() for coroutines, on any event loop.
+
+        Args:
+            after (Optional[int]): frame sequence number to wait past. Defaults to the
+                current one, so it waits for the next update.
+            timeout (Optional[float]): Seconds to wait for. Defaults to None (forever).
+
+        Raises
+        ------
+            TimeoutError: no update arrived in time.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            int: the frame sequence number of the screen now
+        """
+        if after is None:
+            after = self.get_frame_seq()
+        return await asyncio.wrap_future(
+            self._submit(self._client.wait_for_update(after, timeout))
+        )
+
+    def wait_until_stable(
+        self,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        quiet_ms: int = QUIET_MS,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """Block until the screen (or a region of it) stops changing.
+
+        The region counts as stable once no framebuffer update has drawn on it for
+        quiet_ms milliseconds. Incremental updates are requested in the background
+        meanwhile, and no screenshots are compared.
+
+        Args:
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height to
+                watch. Defaults to None (the whole screen).
+            quiet_ms (int): milliseconds without changes. Defaults to QUIET_MS.
+            timeout (Optional[float]): Seconds to wait for. Defaults to None (forever).
+
+        Raises
+        ------
+            TimeoutError: the region kept changing for longer than timeout.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            int: the frame sequence number of the stable screen
+        """
+        return self._call(self._client.wait_until_stable(region, quiet_ms, timeout))
+
+    async def wait_until_stable_async(
+        self,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        quiet_ms: int = QUIET_MS,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """Wait_until_stable() for coroutines, on any event loop.
+
+        Args:
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height to
+                watch. Defaults to None (the whole screen).
+            quiet_ms (int): milliseconds without changes. Defaults to QUIET_MS.
+            timeout (Optional[float]): Seconds to wait for. Defaults to None (forever).
+
+        Raises
+        ------
+            TimeoutError: the region kept changing for longer than timeout.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            int: the frame sequence number of the stable screen
+        """
+        return await asyncio.wrap_future(
+            self._submit(self._client.wait_until_stable(region, quiet_ms, timeout))
+        )
+
+    def find_image(
+        self,
+        template: Image.Image | np.ndarray,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        threshold: float = THRESHOLD,
+    ) -> Optional[Match]:
+        """Find where a template (e.g. a button or an icon) is on the screen.
+
+        Searches are cached per tile of the screen, so searching for the same
+        template again only searches the parts framebuffer updates changed since.
+
+        Args:
+            template (Image.Image | np.ndarray): image to look for, or its RGB(A)
+                pixels
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height the
+                match must lie in. Defaults to None (the whole screen).
+            threshold (float): minimum score, 1 - RMS difference / 255 of the pixels.
+                Defaults to THRESHOLD.
+
+        Returns
+        -------
+            Optional[Match]: the best match (x, y, width, height, score & center),
+            None if nothing scores threshold
         """
-        if width is None:
-            width = self._rfb_client.width
-        if height is None:
-            height = self._rfb_client.height
-        asyncio.run_coroutine_threadsafe(
-            self._rfb_client.framebuffer_update_request(
-                x, y, width, height, incremental
-            ),
-            self._loop,
+        return self._client.find_image(template, region, threshold)
+
+    def wait_for_image(
+        self,
+        template: Image.Image | np.ndarray,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        threshold: float = THRESHOLD,
+        timeout: Optional[float] = None,
+    ) -> Match:
+        """Block until a template shows up on the screen.
+
+        Searches again after every framebuffer update, only where it changed.
+        Unless the resend flag is set, incremental updates of the region are
+        requested meanwhile.
+
+        Args:
+            template (Image.Image | np.ndarray): image to look for
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height the
+                match must lie in. Defaults to None (the whole screen).
+            threshold (float): minimum score of a match. Defaults to THRESHOLD.
+            timeout (Optional[float]): Seconds to wait for. Defaults to None (forever).
+
+        Raises
+        ------
+            TimeoutError: the template didn't show up in time.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            Match: the best match
+        """
+        return self._call(
+            self._client.wait_for_image(template, region, threshold, timeout)
+        )
+
+    async def wait_for_image_async(
+        self,
+        template: Image.Image | np.ndarray,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        threshold: float = THRESHOLD,
+        timeout: Optional[float] = None,
+    ) -> Match:
+        """Wait_for_image() for coroutines, on any event loop.
+
+        The searches run in a worker thread, so they don't block the event loop.
+
+        Args:
+            template (Image.Image | np.ndarray): image to look for
+            region (Optional[Tuple[int, int, int, int]]): x, y, width & height the
+                match must lie in. Defaults to None (the whole screen).
+            threshold (float): minimum score of a match. Defaults to THRESHOLD.
+            timeout (Optional[float]): Seconds to wait for. Defaults to None (forever).
+
+        Raises
+        ------
+            TimeoutError: the template didn't show up in time.
+            ConnectionError: the connection closed first.
+
+        Returns
+        -------
+            Match: the best match
+        """
+        return await asyncio.wrap_future(
+            self._submit(
+                self._client.wait_for_image(template, region, threshold, timeout)
+            )
         )
 
-    def key_event(self, key: int, down: bool) -> None:
+    def key_event(self, key: int, down: bool) -> Future[None]:
         """Non-abstracted key event call.
 
         Use this command if you need something beyond the key event abstractions.
@@ -298,12 +837,15 @@ class WSVNCClient:
         Args:
             key (int): Key ID
             down (bool): press down
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        asyncio.run_coroutine_threadsafe(
-            self._rfb_client.key_event(key, down), self._loop
-        )
+        return self._send(self._client.key_event(key, down))
 
-    def pointer_event(self, xpos: int, ypos: int, mask: int) -> None:
+    def pointer_event(self, xpos: int, ypos: int, mask: int) -> Future[None]:
         """Non-abstracted pointer event call.
 
         Use this command if you need something beyond the pointer event abstractions.
@@ -312,21 +854,26 @@ class WSVNCClient:
             xpos (int)
             ypos (int)
             mask (int): the mouse button ID
+
+        Returns
+        -------
+            Future[None]: done once the messages are written to the connection, raises
+            if that failed
         """
-        asyncio.run_coroutine_threadsafe(
-            self._rfb_client.pointer_event(xpos, ypos, mask), self._loop
-        )
+        return self._send(self._client.pointer_event(xpos, ypos, mask))
 
     def get_screen(self) -> Image.Image | None:
         """Return latest update of the screen.
 
         Will return None if screen was never updated with update_screen().
+        The image is a read-only snapshot of the screen after the last complete
+        update, it isn't changed by later updates, so there is no need to copy it.
 
         Returns
         -------
             Image: The RGBA image of the screen
         """
-        return self._rfb_client.img
+        return self._client.get_screen()
 
     def get_screen_bytes(self) -> bytes | None:
         """Return latest update of the screen in bytes.
@@ -337,13 +884,46 @@ class WSVNCClient:
         -------
             bytes: Image of the screen in byte format
         """
-        buffer = BytesIO()
-        img = self.get_screen()
-        if img is not None:
-            img.save(buffer, format="PNG")
-            return buffer.getvalue()
+        return self._client.get_screen_bytes()
 
-        return None
+    def get_frame_seq(self) -> int:
+        """Return the frame sequence number, the number of updates applied so far.
+
+        Returns
+        -------
+            int: frame sequence number of the screen get_screen() returns
+        """
+        return self._client.get_frame_seq()
+
+    def get_continuous_updates(self) -> bool:
+        """Return whether the server sends updates as the screen changes, without requests.
+
+        The resend flag uses continuous updates if the server supports them & the
+        ContinuousUpdates & Fence pseudo-encodings are set, and no frame rate, update
+        budget or pause holds updates back.
+
+        Returns
+        -------
+            bool: true if continuous updates are on
+        """
+        return self._client.get_continuous_updates()
+
+    def get_changes_since(self, seq: int, pixels: bool = False) -> ScreenChanges:
+        """Return what changed on the screen after frame sequence number seq.
+
+        The regions are the rectangles of every update since, merged so they don't
+        overlap. If seq is older than the damage log, the whole screen is returned.
+
+        Args:
+            seq (int): frame sequence number, e.g. from a previous call's seq
+            pixels (bool): also crop the regions out of the screen (as of the
+                returned seq) into images
+
+        Returns
+        -------
+            ScreenChanges: seq, regions & optionally images of the changes
+        """
+        return self._client.get_changes_since(seq, pixels)
 
     def get_clipboard(self) -> str:
         """Return the clipboard of the client.
@@ -352,7 +932,7 @@ class WSVNCClient:
         -------
             str: clipboard of the client
         """
-        return self._rfb_client.clipboard
+        return self._client.get_clipboard()
 
     def get_pixel_format(self) -> PixelFormat:
         """Return the current PixelFormat in use.
@@ -361,7 +941,7 @@ class WSVNCClient:
         -------
             PixelFormat: PixelFormat in use
         """
-        return self._rfb_client.pixel_format
+        return self._client.get_pixel_format()
 
     def get_server_name(self) -> str:
         """Return the name of the server.
@@ -370,7 +950,7 @@ class WSVNCClient:
         -------
             str: Server name
         """
-        return self._rfb_client.server_name
+        return self._client.get_server_name()
 
     def get_encodings(self) -> List[Type[EncodingInterface]]:
         """Return the encodings we are using.
@@ -379,7 +959,7 @@ class WSVNCClient:
         -------
             List[Type[EncodingInterface]]: List of encodings in use
         """
-        return self._rfb_client.encs
+        return self._client.get_encodings()
 
     def get_bell(self) -> BellMessage | None:
         """Return a bell message if we received one.
@@ -388,36 +968,24 @@ class WSVNCClient:
         -------
             BellMessage | None: A bell message if received by the client
         """
-        return self._rfb_client.bell
+        return self._client.get_bell()
 
     async def _main_loop(self) -> None:
-        """Loop will keep the websocket connection alive and listen for messages."""
+        """Connect the async client on the client's event loop."""
         try:
-            async with websockets.connect(
-                self.ticket_url,
-                ssl=self.ssl_context,
-                origin=self.origin,  # type: ignore
-                subprotocols=["binary"],  # type: ignore
-                ping_interval=None,
-                max_size=2**25,
-                read_limit=2**25,
-            ) as conn:
-                self._rfb_client = RFBClient(conn, self.security_type, self.shared_flag)
-                await self._rfb_client.handshake()
-                self._handshake_done.set()
-                await self._rfb_client.listen()  # handles exceptions internally
-                logger.info("VNC Client no longer listening")
+            await self._client.connect()
         except Exception as e:
             # this block runs if the websocket connection fails for any reason
             # will set the handshake so the thread doesn't block
             # can only trigger during __init__()
             self._caught_exception = e
-            self._handshake_done.set()
             raise
+        finally:
+            self._handshake_done.set()
 
     async def _close(self) -> None:
         """Close the websocket connection."""
-        await self._rfb_client.close()
+        await self._client.close()
 
     def _run(self) -> None:
         """Start the thread to run an asynchronous connection over a websocket."""
@@ -433,13 +1001,9 @@ class WSVNCClient:
 
     def close(self) -> None:
         """Terminates the thread and closes the websocket connection."""
-        # takes a moment to shut down everything, wait one second after closing websocket connection.
-        asyncio.run_coroutine_threadsafe(self._close(), self._loop)
-        time.sleep(1)
+        self._call(self._close())
         self._loop.call_soon_threadsafe(self._loop.stop)
-
         self._thread.join()
-        logger.info("Client shutdown complete.")
 
     def __enter__(self) -> WSVNCClient:
         """Context manager enter method.
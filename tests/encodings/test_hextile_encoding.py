@@ -0,0 +1,149 @@
+"""Unit tests for HextileEncoding class."""
+
+import asyncio
+from os import urandom
+from unittest import TestCase, mock
+
+import numpy as np
+import pytest
+from websockets import WebSocketClientProtocol
+
+from wsvnc.encodings.hextile_encoding import HextileEncoding
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+def pixel(r, g, b):
+    """A BGRX pixel."""
+    return bytes([b, g, r, 0])
+
+
+def subrect(x, y, w, h):
+    return bytes([x << 4 | y, (w - 1) << 4 | (h - 1)])
+
+
+class TestHextileEncoding(TestCase):
+    def setUp(self):
+        self.pf = PixelFormat()
+        self.pf.bpp = 32
+        self.pf.depth = 24
+        self.pf.big_endian = 0
+        self.pf.true_color = 1
+        self.pf.red_max = self.pf.green_max = self.pf.blue_max = 255
+        self.pf.red_shift = 16
+        self.pf.green_shift = 8
+        self.pf.blue_shift = 0
+
+    def pixels(self, enc):
+        return np.asarray(enc.img)[..., :3]
+
+    def test_raw_tiles(self):
+        """Tiles are 16x16, left to right & top to bottom, smaller at the edges."""
+        raw = [urandom(16 * 16 * 4), urandom(4 * 16 * 4), urandom(16 * 3 * 4), urandom(4 * 3 * 4)]
+        msg = b''.join(b'\x01' + data for data in raw)
+        enc = HextileEncoding()
+        assert enc.read(20, 19, msg, self.pf) == len(msg)
+
+        expected = np.zeros((19, 20, 3), dtype=np.uint8)
+        for data, (x, y, w, h) in zip(raw, [(0, 0, 16, 16), (16, 0, 4, 16), (0, 16, 16, 3), (16, 16, 4, 3)]):
+            expected[y : y + h, x : x + w] = np.frombuffer(data, np.uint8).reshape((h, w, 4))[..., 2::-1]
+        assert np.array_equal(self.pixels(enc), expected)
+
+    def test_subrects(self):
+        msg = (
+            b'\x0e' + pixel(1, 1, 1) + pixel(9, 9, 9) + b'\x02' + subrect(0, 0, 2, 1) + subrect(1, 1, 3, 3)
+            + b'\x1a' + pixel(2, 2, 2) + b'\x01' + pixel(7, 0, 0) + subrect(3, 2, 1, 1)
+        )
+        enc = HextileEncoding()
+        assert enc.read(32, 8, msg, self.pf) == len(msg)
+        pixels = self.pixels(enc)
+        assert pixels[0, 0].tolist() == [9, 9, 9]
+        assert pixels[0, 2].tolist() == [1, 1, 1]
+        assert (pixels[1:4, 1:4] == 9).all()
+        assert pixels[4, 4].tolist() == [1, 1, 1]
+        assert pixels[2, 19].tolist() == [7, 0, 0]
+        assert pixels[0, 16].tolist() == [2, 2, 2]
+
+    def test_colors_carry_over(self):
+        """Background & foreground colors carry over to later tiles & rectangles."""
+        enc = HextileEncoding()
+        msg = b'\x06' + pixel(1, 2, 3) + pixel(4, 5, 6) + b'\x00' + b'\x01' + urandom(4)
+        enc.read(3, 1, msg, self.pf)
+        # the raw tile doesn't change the colors
+        msg = b'\x08\x01' + subrect(0, 0, 1, 1)
+        enc.read(2, 1, msg, self.pf)
+        assert self.pixels(enc).tolist() == [[[4, 5, 6], [1, 2, 3]]]
+
+    def test_subrects_clipped(self):
+        """Subrectangles past the edge of a tile don't draw on the next one."""
+        msg = b'\x0e' + pixel(0, 0, 0) + pixel(9, 9, 9) + b'\x01' + subrect(14, 0, 16, 2) + b'\x02' + pixel(5, 5, 5)
+        enc = HextileEncoding()
+        enc.read(20, 2, msg, self.pf)
+        assert self.pixels(enc)[:, 14:16].tolist() == [[[9, 9, 9]] * 2] * 2
+        assert (self.pixels(enc)[:, 16:] == 5).all()
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            HextileEncoding().read(4, 4, b'\x08\x02' + subrect(0, 0, 1, 1), self.pf)
+
+    async def async_test_decode(self):
+        """Rectangles are parsed as websocket messages arrive, then drawn."""
+        msg = (
+            b'\x0a' + pixel(1, 2, 3) + b'\x01' + subrect(0, 0, 1, 1)
+            + b'\x01' + pixel(4, 5, 6) * 32
+            + b'\x00'
+        )
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg[:1], msg[1:7], msg[7:30], msg[30:] + b'next']
+        transport = SafeTransport(conn)
+        fb = FrameBuffer(40, 20)
+        enc = HextileEncoding()
+        enc.foreground = pixel(7, 8, 9)
+        await enc.decode(2, 2, 36, 2, transport, self.pf, fb)
+
+        assert fb.img.getpixel((2, 2)) == (7, 8, 9, 255)
+        assert fb.img.getpixel((3, 3)) == (1, 2, 3, 255)
+        assert fb.img.getpixel((19, 3)) == (4, 5, 6, 255)
+        # the last tile takes the first tile's background
+        assert fb.img.getpixel((37, 3)) == (1, 2, 3, 255)
+        assert fb.img.getpixel((38, 3)) == (0, 0, 0, 0)
+        assert bytes(await transport.read_exact(4)) == b'next'
+
+    async def async_test_decode_many_messages(self):
+        """A rectangle spread over many websocket messages isn't copied by the transport."""
+        tiles = [
+            b'\x01' + urandom(16 * 16 * 4) if i % 2 else b'\x0e' + pixel(i, 0, 0) + pixel(0, i, 0) + b'\x01' + subrect(1, 1, 2, 2)
+            for i in range(100)
+        ]
+        msg = b''.join(tiles)
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg[i : i + 300] for i in range(0, len(msg), 300)] + [b'next']
+        transport = SafeTransport(conn)
+        fb = FrameBuffer(160, 160)
+        await HextileEncoding().decode(0, 0, 160, 160, transport, self.pf, fb)
+
+        enc = HextileEncoding()
+        enc.read(160, 160, msg, self.pf)
+        assert np.array_equal(np.asarray(fb.img), np.asarray(enc.img))
+        assert transport.bytes_copied == 0
+        assert bytes(await transport.read_exact(4)) == b'next'
+
+    async def async_test_fetch_additional_data(self):
+        msg = b'\x0a' + pixel(1, 2, 3) + b'\x01' + subrect(0, 0, 1, 1) + b'\x00'
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg[1:3], msg[3:]]
+        data = await HextileEncoding().fetch_additional_data(32, 1, SafeTransport(conn), msg[:1], self.pf)
+        assert bytes(data) == msg
+
+    def test_decode(self):
+        asyncio.run(self.async_test_decode())
+
+    def test_decode_many_messages(self):
+        asyncio.run(self.async_test_decode_many_messages())
+
+    def test_fetch_additional_data(self):
+        asyncio.run(self.async_test_fetch_additional_data())
+
+    def test_hextile_encoding_type(self):
+        assert HextileEncoding().type() == 5
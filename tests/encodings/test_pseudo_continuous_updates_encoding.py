@@ -0,0 +1,28 @@
+import asyncio
+from unittest import TestCase, mock
+
+from wsvnc.encodings.pseudo_continuous_updates_encoding import (
+    PseudoContinuousUpdatesEncoding,
+)
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+class TestPseudoContinuousUpdatesEncoding(TestCase):
+    def setUp(self):
+        self.transport_mock = mock.Mock(spec=SafeTransport)
+
+    async def async_test_fetch_additional_data(self):
+        enc = PseudoContinuousUpdatesEncoding()
+        assert b"" == await enc.fetch_additional_data(0, 0, self.transport_mock, b"", PixelFormat())
+
+    def test_type(self):
+        enc = PseudoContinuousUpdatesEncoding()
+        assert enc.type() == -313
+
+    def test_read(self):
+        enc = PseudoContinuousUpdatesEncoding()
+        assert enc.read(0, 0, b"", PixelFormat()) == 0
+
+    def test(self):
+        asyncio.run(self.async_test_fetch_additional_data())
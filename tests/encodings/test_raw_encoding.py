@@ -5,8 +5,12 @@ from os import urandom
 from struct import unpack
 from unittest import TestCase, mock
 
+import numpy as np
+from websockets import WebSocketClientProtocol
+
 from wsvnc.color import Color
-from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.encodings.raw_encoding import RawEncoding, pillow_rawmode, write_rgba
+from wsvnc.framebuffer import FrameBuffer
 from wsvnc.pixel_format import PixelFormat
 from wsvnc.utils.safe_transport import SafeTransport
 
@@ -81,6 +85,156 @@ class TestRawEncoding(TestCase):
         assert bytes_read == 4
         assert enc.img.getpixel((0,0)) == (15,20,10,255)
         
+    def _true_color_pf(self, bpp, big_endian, shifts, maxes):
+        pf = PixelFormat()
+        pf.bpp = bpp
+        pf.big_endian = big_endian
+        pf.true_color = 1
+        pf.red_shift, pf.green_shift, pf.blue_shift = shifts
+        pf.red_max, pf.green_max, pf.blue_max = maxes
+        return pf
+
+    def _per_pixel(self, width, height, msg, pf):
+        """Decode one pixel at a time, scaling channels with a max below 255."""
+        fmt = {8: 'B', 16: 'H', 32: 'I'}[pf.bpp]
+        size = pf.bpp // 8
+        pixels = []
+        for i in range(width * height):
+            raw_pixel = unpack(('>' if pf.big_endian else '<') + fmt, msg[i*size:(i+1)*size])[0]
+            rgb = []
+            for shift, cmax in ((pf.red_shift, pf.red_max), (pf.green_shift, pf.green_max), (pf.blue_shift, pf.blue_max)):
+                c = raw_pixel >> shift & cmax
+                if cmax < 255:
+                    c = c * 255 // cmax
+                rgb.append(min(c, 255))
+            pixels.append((*rgb, 255))
+        return pixels
+
+    def test_bulk_matches_per_pixel(self):
+        """The bulk decode paths produce the same pixels as a per-pixel loop."""
+        width = 7
+        height = 5
+        formats = [
+            self._true_color_pf(32, 0, (16, 8, 0), (255, 255, 255)),  # BGRX
+            self._true_color_pf(32, 1, (16, 8, 0), (255, 255, 255)),  # XRGB
+            self._true_color_pf(32, 0, (0, 8, 16), (255, 255, 255)),  # RGBX
+            self._true_color_pf(32, 1, (0, 8, 16), (256, 256, 256)),  # numpy, clipped
+            self._true_color_pf(32, 0, (4, 12, 20), (255, 255, 255)),  # numpy
+            self._true_color_pf(8, 0, (0, 3, 6), (255, 255, 255)),  # numpy
+            self._true_color_pf(16, 1, (10, 5, 0), (31, 31, 31)),  # numpy, scaled
+        ]
+        for pf in formats:
+            msg = urandom(width * height * pf.bpp // 8)
+            bulk = RawEncoding()
+            assert bulk.read(width, height, msg, pf) == len(msg)
+            assert list(bulk.img.getdata()) == self._per_pixel(width, height, msg, pf)
+
+    async def async_test_color_map(self):
+        """Color map pixels are looked up the same way by read() and decode()."""
+        pf = PixelFormat()
+        pf.bpp = 16
+        pf.big_endian = 1
+        pf.true_color = 0
+        pf.color_map = {0: Color(r=15, g=20, b=10), 1: Color(r=1, g=2, b=3), 2: Color(r=7, g=8, b=9)}
+        msg = b'\x00\x01\x00\x02\x00\x00\x00\x01'
+
+        enc = RawEncoding()
+        assert enc.read(2, 2, msg, pf) == 8
+        assert list(enc.img.getdata()) == [(1, 2, 3, 255), (7, 8, 9, 255), (15, 20, 10, 255), (1, 2, 3, 255)]
+
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg]
+        fb = FrameBuffer(4, 4)
+        await RawEncoding().decode(1, 1, 2, 2, SafeTransport(conn), pf, fb)
+        assert list(fb.img.crop((1, 1, 3, 3)).getdata()) == list(enc.img.getdata())
+
+        # without a color map the rectangle is skipped
+        pf.color_map = None
+        conn.recv.side_effect = [msg]
+        fb = FrameBuffer(4, 4)
+        await RawEncoding().decode(1, 1, 2, 2, SafeTransport(conn), pf, fb)
+        assert not fb.pixels.any()
+
+    def test_color_map(self):
+        asyncio.run(self.async_test_color_map())
+
+    async def async_test_decode_into_framebuffer(self):
+        """decode() writes into the framebuffer what read() decodes into an image."""
+        width = 3
+        height = 2
+        formats = [
+            self._true_color_pf(32, 1, (0, 8, 16), (255, 255, 255)),
+            self._true_color_pf(32, 0, (8, 16, 24), (255, 255, 255)),
+            self._true_color_pf(16, 0, (11, 5, 0), (31, 63, 31)),
+            self._true_color_pf(32, 1, (0, 8, 16), (256, 256, 256)),
+        ]
+        for pf in formats:
+            msg = urandom(width * height * pf.bpp // 8)
+            conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+            conn.recv.side_effect = [msg]
+            fb = FrameBuffer(5, 5)
+            await RawEncoding().decode(1, 2, width, height, SafeTransport(conn), pf, fb)
+
+            enc = RawEncoding()
+            enc.read(width, height, msg, pf)
+            assert list(fb.img.crop((1, 2, 4, 4)).getdata()) == list(enc.img.getdata())
+            assert fb.img.getpixel((0, 0)) == (0, 0, 0, 0)
+
+    def test_decode_into_framebuffer(self):
+        asyncio.run(self.async_test_decode_into_framebuffer())
+
+    async def async_test_read_job(self):
+        """The job decodes the same pixels decode() does, drawn where the rect is."""
+        pf = self._true_color_pf(32, 0, (16, 8, 0), (255, 255, 255))
+        msg = urandom(3 * 2 * 4)
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg + b"\x07"]
+        transport = SafeTransport(conn)
+        job = await RawEncoding().read_job(1, 2, 3, 2, transport, pf)
+        assert transport.buffered() == 1
+
+        fb = FrameBuffer(5, 5)
+        job.draw(fb, job.func(*job.args))
+        conn.recv.side_effect = [msg]
+        expected = FrameBuffer(5, 5)
+        await RawEncoding().decode(1, 2, 3, 2, SafeTransport(conn), pf, expected)
+        assert np.array_equal(fb.pixels, expected.pixels)
+
+        # color map pixels are decoded inline
+        pf.true_color = 0
+        assert await RawEncoding().read_job(0, 0, 1, 1, transport, pf) is None
+        assert transport.buffered() == 1
+
+    def test_read_job(self):
+        asyncio.run(self.async_test_read_job())
+
+    def test_rgb565(self):
+        """16bpp pixels are scaled up to the full 8-bit range."""
+        pf = self._true_color_pf(16, 0, (11, 5, 0), (31, 63, 31))
+        assert pillow_rawmode(pf) is None
+        enc = RawEncoding()
+        assert enc.read(2, 1, b"\x00\xf8\xe0\x07", pf) == 4
+        assert enc.img.getpixel((0, 0)) == (255, 0, 0, 255)
+        assert enc.img.getpixel((1, 0)) == (0, 255, 0, 255)
+
+        # read() & the framebuffer path decode every pixel the same way
+        data = bytes(range(0, 256, 2)) + bytes(range(1, 256, 2))
+        assert enc.read(16, 8, data, pf) == 256
+        fb = FrameBuffer(16, 8)
+        write_rgba(fb.region(0, 0, 16, 8), data, 16, 8, pf)
+        assert np.array_equal(np.asarray(enc.img), fb.pixels)
+
+        pf.big_endian = 1
+        assert pillow_rawmode(pf) is None
+        assert enc.read(2, 1, b"\xf8\x00\x07\xe0", pf) == 4
+        assert enc.img.getpixel((0, 0)) == (255, 0, 0, 255)
+        assert enc.img.getpixel((1, 0)) == (0, 255, 0, 255)
+
+    def test_not_enough_bytes(self):
+        pf = self._true_color_pf(32, 0, (16, 8, 0), (255, 255, 255))
+        with self.assertRaises(ValueError):
+            RawEncoding().read(2, 2, b"\x00" * 12, pf)
+
     def test_type(self):
         """Verify type."""
         enc = RawEncoding()
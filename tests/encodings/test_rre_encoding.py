@@ -0,0 +1,115 @@
+"""Unit tests for RREEncoding & CoRREEncoding classes."""
+
+import asyncio
+from struct import pack
+from unittest import TestCase, mock
+
+import pytest
+from websockets import WebSocketClientProtocol
+
+from wsvnc.encodings.corre_encoding import CoRREEncoding
+from wsvnc.encodings.rre_encoding import RREEncoding
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+def pixel(r, g, b):
+    """A BGRX pixel."""
+    return bytes([b, g, r, 0])
+
+
+class TestRREEncoding(TestCase):
+    def setUp(self):
+        self.pf = PixelFormat()
+        self.pf.bpp = 32
+        self.pf.depth = 24
+        self.pf.big_endian = 0
+        self.pf.true_color = 1
+        self.pf.red_max = self.pf.green_max = self.pf.blue_max = 255
+        self.pf.red_shift = 16
+        self.pf.green_shift = 8
+        self.pf.blue_shift = 0
+
+    def rre(self, background, subrects, coords='!HHHH'):
+        msg = pack('!I', len(subrects)) + background
+        for color, rect in subrects:
+            msg += color + pack(coords, *rect)
+        return msg
+
+    def test_read(self):
+        """Subrectangles are drawn in order over the background."""
+        msg = self.rre(
+            pixel(1, 2, 3),
+            [(pixel(10, 0, 0), (1, 1, 3, 2)), (pixel(0, 20, 0), (3, 2, 2, 2))],
+        )
+        enc = RREEncoding()
+        assert enc.read(5, 4, msg + b'extra', self.pf) == len(msg)
+        assert enc.img.getpixel((0, 0)) == (1, 2, 3, 255)
+        assert enc.img.getpixel((1, 1)) == (10, 0, 0, 255)
+        assert enc.img.getpixel((3, 2)) == (0, 20, 0, 255)
+        assert enc.img.getpixel((4, 3)) == (0, 20, 0, 255)
+        assert enc.img.getpixel((1, 3)) == (1, 2, 3, 255)
+
+    def test_clipped(self):
+        """Subrectangles past the edge of the rectangle are clipped to it."""
+        msg = self.rre(pixel(0, 0, 0), [(pixel(9, 9, 9), (2, 2, 100, 100))])
+        fb = FrameBuffer(6, 6)
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg]
+        asyncio.run(RREEncoding().decode(1, 1, 3, 3, SafeTransport(conn), self.pf, fb))
+        assert fb.img.getpixel((3, 3)) == (9, 9, 9, 255)
+        assert fb.img.getpixel((4, 4)) == (0, 0, 0, 0)
+
+    def test_corre(self):
+        msg = self.rre(pixel(1, 1, 1), [(pixel(5, 6, 7), (0, 1, 2, 1))], coords='!BBBB')
+        enc = CoRREEncoding()
+        assert enc.type() == 4
+        assert enc.read(2, 2, msg, self.pf) == 4 + 4 + 8
+        assert list(enc.img.getdata()) == [(1, 1, 1, 255)] * 2 + [(5, 6, 7, 255)] * 2
+
+    def test_16bpp(self):
+        pf = PixelFormat()
+        pf.bpp = 16
+        pf.depth = 16
+        pf.big_endian = 1
+        pf.true_color = 1
+        pf.red_max, pf.green_max, pf.blue_max = 31, 63, 31
+        pf.red_shift, pf.green_shift, pf.blue_shift = 11, 5, 0
+        msg = self.rre(pack('>H', 0xF800), [(pack('>H', 0x001F), (1, 0, 1, 1))])
+        enc = RREEncoding()
+        enc.read(2, 1, msg, pf)
+        assert list(enc.img.getdata()) == [(255, 0, 0, 255), (0, 0, 255, 255)]
+
+    def test_invalid(self):
+        msg = self.rre(pixel(0, 0, 0), [(pixel(1, 1, 1), (0, 0, 1, 1))])
+        with pytest.raises(ValueError):
+            RREEncoding().read(2, 2, msg[:-1], self.pf)
+
+    async def async_test_decode(self):
+        msg = self.rre(pixel(1, 2, 3), [(pixel(4, 5, 6), (1, 0, 1, 1))]) + b'next'
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg[:3], msg[3:10], msg[10:]]
+        transport = SafeTransport(conn)
+        fb = FrameBuffer(4, 4)
+        await RREEncoding().decode(2, 2, 2, 2, transport, self.pf, fb)
+        assert fb.img.getpixel((2, 2)) == (1, 2, 3, 255)
+        assert fb.img.getpixel((3, 2)) == (4, 5, 6, 255)
+        assert fb.img.getpixel((1, 1)) == (0, 0, 0, 0)
+        assert bytes(await transport.read_exact(4)) == b'next'
+
+    async def async_test_fetch_additional_data(self):
+        msg = self.rre(pixel(1, 2, 3), [(pixel(4, 5, 6), (1, 0, 1, 1))])
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg[2:9], msg[9:]]
+        data = await RREEncoding().fetch_additional_data(2, 2, SafeTransport(conn), msg[:2], self.pf)
+        assert bytes(data) == msg
+
+    def test_decode(self):
+        asyncio.run(self.async_test_decode())
+
+    def test_fetch_additional_data(self):
+        asyncio.run(self.async_test_fetch_additional_data())
+
+    def test_rre_encoding_type(self):
+        assert RREEncoding().type() == 2
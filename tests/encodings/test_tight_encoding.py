@@ -0,0 +1,226 @@
+"""Unit tests for TightEncoding class."""
+
+import asyncio
+import zlib
+from io import BytesIO
+from os import urandom
+from struct import pack
+from unittest import TestCase, mock
+
+import numpy as np
+import pytest
+from PIL import Image
+from websockets import WebSocketClientProtocol
+
+from wsvnc.encodings.tight_encoding import TightEncoding, compact_length, undo_gradient
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+def tight_length(n):
+    """Encode a Tight compact length."""
+    if n < 0x80:
+        return bytes([n])
+    if n < 0x4000:
+        return bytes([n & 0x7F | 0x80, n >> 7])
+    return bytes([n & 0x7F | 0x80, n >> 7 & 0x7F | 0x80, n >> 14])
+
+
+def gradient_diff(pixels):
+    """Apply the gradient filter like a Tight server does (one pixel at a time)."""
+    height, width, _ = pixels.shape
+    p = pixels.astype(int)
+    diff = np.zeros_like(pixels)
+    for y in range(height):
+        for x in range(width):
+            left = p[y, x - 1] if x else 0
+            above = p[y - 1, x] if y else 0
+            above_left = p[y - 1, x - 1] if x and y else 0
+            estimate = np.clip(left + above - above_left, 0, 255)
+            diff[y, x] = (p[y, x] - estimate) & 0xFF
+    return diff
+
+
+class TestTightEncoding(TestCase):
+    def setUp(self):
+        self.pf = PixelFormat()
+        self.pf.bpp = 32
+        self.pf.depth = 24
+        self.pf.big_endian = 0
+        self.pf.true_color = 1
+        self.pf.red_max = self.pf.green_max = self.pf.blue_max = 255
+        self.pf.red_shift = 16
+        self.pf.green_shift = 8
+        self.pf.blue_shift = 0
+        # server side zlib streams
+        self.streams = [zlib.compressobj() for _ in range(4)]
+
+    def basic(self, data, stream=0, filter_header=b''):
+        """Build a basic compression rectangle."""
+        ctl = stream << 4 | (0x40 if filter_header else 0)
+        msg = bytes([ctl]) + filter_header
+        if len(data) < 12:
+            return msg + data
+        z = self.streams[stream]
+        compressed = z.compress(data) + z.flush(zlib.Z_SYNC_FLUSH)
+        return msg + tight_length(len(compressed)) + compressed
+
+    def test_compact_length(self):
+        for n in (0, 5, 127, 128, 300, 16383, 16384, 4000000):
+            buf = tight_length(n)
+            assert compact_length(buf, 0) == (n, len(buf))
+            # not enough bytes, asks for the next one
+            assert compact_length(buf[:-1], 0) == (-1, len(buf))
+
+    def test_undo_gradient(self):
+        """Noise clamps predictions all over, smooth content never does."""
+        ys, xs = np.indices((12, 20))
+        smooth = np.stack([xs * 12, ys * 20, xs + ys], axis=-1).astype(np.uint8)
+        clamped_half = smooth.copy()
+        clamped_half[7:, 3:9] = (255, 0, 255)
+        images = [smooth, clamped_half]
+        for height, width in ((1, 1), (3, 7), (16, 5), (1, 9)):
+            noise = np.frombuffer(urandom(height * width * 3), np.uint8)
+            images.append(noise.reshape((height, width, 3)))
+
+        for pixels in images:
+            result = undo_gradient(gradient_diff(pixels), (255, 255, 255))
+            assert np.array_equal(result, pixels)
+
+    def test_fill(self):
+        enc = TightEncoding()
+        msg = b'\x80\x01\x02\x03'
+        assert enc.read(4, 2, msg + b'extra', self.pf) == 4
+        assert enc.img.size == (4, 2)
+        assert enc.img.getpixel((3, 1)) == (1, 2, 3, 255)
+
+    def test_copy_filter(self):
+        """Zlib streams persist across rectangles, and are reset on request."""
+        enc = TightEncoding()
+        for _ in range(2):
+            rgb = urandom(5 * 3 * 3)
+            enc.read(5, 3, self.basic(rgb, stream=1), self.pf)
+            assert enc.img.tobytes() == Image.frombytes('RGB', (5, 3), rgb).convert('RGBA').tobytes()
+
+        self.streams[1] = zlib.compressobj()
+        rgb = urandom(5 * 3 * 3)
+        msg = self.basic(rgb, stream=1)
+        enc.read(5, 3, bytes([msg[0] | 0x02]) + msg[1:], self.pf)
+        assert enc.img.tobytes() == Image.frombytes('RGB', (5, 3), rgb).convert('RGBA').tobytes()
+
+    def test_uncompressed(self):
+        """Less than 12 bytes of data isn't compressed."""
+        enc = TightEncoding()
+        assert enc.read(3, 1, self.basic(b'\x01\x02\x03' * 3), self.pf) == 10
+        assert enc.img.getpixel((2, 0)) == (1, 2, 3, 255)
+
+    def test_palette_filter(self):
+        enc = TightEncoding()
+        palette = b'\xff\x00\x00' + b'\x00\xff\x00' + b'\x00\x00\xff'
+        indices = bytes([0, 1, 2, 2, 1, 0, 1, 1, 1, 2, 2, 2])
+        enc.read(6, 2, self.basic(indices, 2, b'\x01\x02' + palette), self.pf)
+        assert enc.img.getpixel((0, 0)) == (255, 0, 0, 255)
+        assert enc.img.getpixel((2, 0)) == (0, 0, 255, 255)
+        assert enc.img.getpixel((0, 1)) == (0, 255, 0, 255)
+
+    def test_two_color_palette(self):
+        """Two colors use one bit per pixel, with each row padded to a byte."""
+        enc = TightEncoding()
+        palette = b'\x00\x00\x00' + b'\xff\xff\xff'
+        bits = bytes([0b10100000, 0b01000000]) * 6
+        enc.read(10, 6, self.basic(bits, 0, b'\x01\x01' + palette), self.pf)
+        row = [enc.img.getpixel((x, 0))[0] for x in range(10)]
+        assert row == [255, 0, 255, 0, 0, 0, 0, 0, 0, 255]
+
+    def test_gradient_filter(self):
+        enc = TightEncoding()
+        pixels = np.frombuffer(urandom(8 * 4 * 3), np.uint8).reshape((4, 8, 3))
+        enc.read(8, 4, self.basic(gradient_diff(pixels).tobytes(), 3, b'\x02'), self.pf)
+        assert np.array_equal(np.asarray(enc.img)[..., :3], pixels)
+
+    def test_gradient_filter_16bpp(self):
+        """Gradient works on the channels of normal pixels for other pixel formats."""
+        pf = PixelFormat()
+        pf.bpp = 16
+        pf.depth = 16
+        pf.big_endian = 0
+        pf.true_color = 1
+        pf.red_max, pf.green_max, pf.blue_max = 31, 63, 31
+        pf.red_shift, pf.green_shift, pf.blue_shift = 11, 5, 0
+        # flat color, so every diff past the first pixel is 0
+        diff = np.zeros((2, 3), dtype='<u2')
+        diff[0, 0] = 31 << 11 | 0 << 5 | 31
+        enc = TightEncoding()
+        enc.read(3, 2, self.basic(diff.tobytes(), 0, b'\x02'), pf)
+        assert set(enc.img.getdata()) == {(255, 0, 255, 255)}
+
+    def test_jpeg(self):
+        enc = TightEncoding()
+        image = Image.new('RGB', (16, 8), (200, 100, 50))
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=95)
+        jpeg = buffer.getvalue()
+        msg = b'\x90' + tight_length(len(jpeg)) + jpeg
+        assert enc.read(16, 8, msg, self.pf) == len(msg)
+        r, g, b, a = enc.img.getpixel((4, 4))
+        assert abs(r - 200) < 4 and abs(g - 100) < 4 and abs(b - 50) < 4 and a == 255
+
+    def test_16bpp_copy(self):
+        """Pixel formats other than 24 bit true color use normal pixels."""
+        pf = PixelFormat()
+        pf.bpp = 16
+        pf.depth = 16
+        pf.big_endian = 1
+        pf.true_color = 1
+        pf.red_max, pf.green_max, pf.blue_max = 31, 63, 31
+        pf.red_shift, pf.green_shift, pf.blue_shift = 11, 5, 0
+        enc = TightEncoding()
+        enc.read(2, 1, b'\x00' + pack('>HH', 0xF800, 0x07E0), pf)
+        assert list(enc.img.getdata()) == [(255, 0, 0, 255), (0, 255, 0, 255)]
+        enc.read(2, 1, b'\x80' + pack('>H', 0x001F), pf)
+        assert enc.img.getpixel((1, 0)) == (0, 0, 255, 255)
+
+    def test_invalid(self):
+        enc = TightEncoding()
+        with pytest.raises(ValueError):
+            enc.read(1, 1, b'\xa0\x00', self.pf)
+        with pytest.raises(ValueError):
+            enc.read(1, 1, b'\x40\x07', self.pf)
+        with pytest.raises(ValueError):
+            enc.read(4, 4, b'\x00\x10\x00', self.pf)
+
+    async def async_test_decode(self):
+        """Rectangles split over websocket messages are decoded into the framebuffer."""
+        rgb = urandom(4 * 4 * 3)
+        stream = b'\x80\x0a\x0b\x0c' + self.basic(rgb) + b'next'
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [stream[:1], stream[1:6], stream[6:7], stream[7:]]
+        transport = SafeTransport(conn)
+        fb = FrameBuffer(8, 8)
+        enc = TightEncoding()
+        await enc.decode(0, 0, 8, 8, transport, self.pf, fb)
+        await enc.decode(2, 2, 4, 4, transport, self.pf, fb)
+
+        assert fb.img.getpixel((0, 0)) == (10, 11, 12, 255)
+        expected = Image.frombytes('RGB', (4, 4), rgb).convert('RGBA')
+        assert fb.img.crop((2, 2, 6, 6)).tobytes() == expected.tobytes()
+        assert bytes(await transport.read_exact(4)) == b'next'
+
+    async def async_test_fetch_additional_data(self):
+        rgb = urandom(4 * 4 * 3)
+        msg = self.basic(rgb)
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg[1:2], msg[2:]]
+        enc = TightEncoding()
+        data = await enc.fetch_additional_data(4, 4, SafeTransport(conn), msg[:1], self.pf)
+        assert bytes(data) == msg
+
+    def test_decode(self):
+        asyncio.run(self.async_test_decode())
+
+    def test_fetch_additional_data(self):
+        asyncio.run(self.async_test_fetch_additional_data())
+
+    def test_tight_encoding_type(self):
+        assert TightEncoding().type() == 7
@@ -6,9 +6,12 @@ from os import urandom
 from unittest import TestCase, mock
 
 import numpy as np
+import pytest
 from PIL import Image, ImageChops
+from websockets import WebSocketClientProtocol
 
 from wsvnc.encodings.tightpng_encoding import TightPNGEncoding
+from wsvnc.framebuffer import FrameBuffer
 from wsvnc.pixel_format import PixelFormat
 from wsvnc.utils.safe_transport import SafeTransport
 
@@ -68,9 +71,65 @@ class TestTightPNGEncoding(TestCase):
         assert 3 == enc.read(1, 1, b"\x01\x02\x03", PixelFormat())
         assert enc.img.getpixel((0, 0)) == (1,2,3,255)
 
+    async def async_test_decode(self):
+        """Fill & PNG rectangles are drawn straight into the framebuffer."""
+        image = Image.frombytes('RGB', (2, 2), urandom(12))
+        png_buffer = BytesIO()
+        image.save(png_buffer, format='PNG')
+        png_bytes = png_buffer.getvalue()
+        length = bytes([len(png_bytes) & 0x7F | 0x80, len(png_bytes) >> 7 | 0x80, 0])
+
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [b'\x80\x01\x02\x03\xa0' + length + png_bytes]
+        transport = SafeTransport(conn)
+        fb = FrameBuffer(4, 4)
+        enc = TightPNGEncoding()
+        await enc.decode(0, 0, 4, 4, transport, PixelFormat(), fb)
+        await enc.decode(1, 1, 2, 2, transport, PixelFormat(), fb)
+
+        assert fb.img.getpixel((0, 0)) == (1, 2, 3, 255)
+        assert fb.img.getpixel((3, 3)) == (1, 2, 3, 255)
+        assert not ImageChops.difference(image.convert('RGBA'), fb.img.crop((1, 1, 3, 3))).getbbox()
+        assert transport.buffered() == 0
+
+    async def async_test_read_job(self):
+        """Jobs draw the same pixels decode() does."""
+        image = Image.frombytes('RGB', (2, 2), urandom(12))
+        png_buffer = BytesIO()
+        image.save(png_buffer, format='PNG')
+        png_bytes = png_buffer.getvalue()
+        stream = (
+            b'\x80\x01\x02\x03'
+            + b'\xa0' + bytes([len(png_bytes) & 0x7F | 0x80, len(png_bytes) >> 7 | 0x80, 0]) + png_bytes
+            + b'\x50\x01\x00\x00\x00'
+        )
+
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [stream]
+        transport = SafeTransport(conn)
+        enc = TightPNGEncoding()
+        fb = FrameBuffer(4, 4)
+        for rect in ((0, 0, 4, 4), (1, 1, 2, 2)):
+            job = await enc.read_job(*rect, transport, PixelFormat())
+            job.draw(fb, job.func(*job.args) if job.func else None)
+
+        assert fb.img.getpixel((3, 3)) == (1, 2, 3, 255)
+        assert not ImageChops.difference(image.convert('RGBA'), fb.img.crop((1, 1, 3, 3))).getbbox()
+        # unknown subencodings can't be skipped
+        with pytest.raises(ValueError):
+            await enc.read_job(0, 0, 1, 1, transport, PixelFormat())
+
+    def test_read_job(self):
+        asyncio.run(self.async_test_read_job())
+
+    def test_decode(self):
+        asyncio.run(self.async_test_decode())
+
     def test_tightpng_encoding_type(self):
         enc = TightPNGEncoding()
         assert enc.type() == -260
+        # draws pixels, despite the negative type
+        assert not enc.is_pseudo()
 
     def test(self):
         asyncio.run(self.async_test_fetch_additional_data_need_transport())
@@ -28,6 +28,7 @@ class TestVMWDefineCursorEncoding(TestCase):
 
     def test_type(self):
         assert 1464686180 == VMWDefineCursorEncoding().type()
+        assert VMWDefineCursorEncoding().is_pseudo()
         
     def test_read(self):
         enc = VMWDefineCursorEncoding()
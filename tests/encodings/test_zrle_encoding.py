@@ -0,0 +1,162 @@
+"""Unit tests for ZRLEEncoding class."""
+
+import asyncio
+import zlib
+from os import urandom
+from struct import pack
+from unittest import TestCase, mock
+
+import numpy as np
+import pytest
+from websockets import WebSocketClientProtocol
+
+from wsvnc.encodings.zrle_encoding import ZRLEEncoding, cpixel_layout
+from wsvnc.framebuffer import FrameBuffer
+from wsvnc.pixel_format import PixelFormat
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+def run_length(n):
+    """Encode a ZRLE run length."""
+    n -= 1
+    return b'\xff' * (n // 255) + bytes([n % 255])
+
+
+def make_pf(big_endian=0, shifts=(16, 8, 0), depth=24, bpp=32, maxes=(255, 255, 255)):
+    pf = PixelFormat()
+    pf.bpp = bpp
+    pf.depth = depth
+    pf.big_endian = big_endian
+    pf.true_color = 1
+    pf.red_max, pf.green_max, pf.blue_max = maxes
+    pf.red_shift, pf.green_shift, pf.blue_shift = shifts
+    return pf
+
+
+class TestZRLEEncoding(TestCase):
+    def setUp(self):
+        # little endian 0x00RRGGBB, so a CPIXEL is the bytes B, G, R
+        self.pf = make_pf()
+        self.stream = zlib.compressobj()
+
+    def rect(self, tiles):
+        """Compress tile data like a ZRLE server."""
+        compressed = self.stream.compress(tiles) + self.stream.flush(zlib.Z_SYNC_FLUSH)
+        return pack('!I', len(compressed)) + compressed
+
+    def pixels(self, enc, width, height):
+        return np.asarray(enc.img)[..., :3].reshape((height, width, 3))
+
+    def test_cpixel_layout(self):
+        assert cpixel_layout(make_pf(0, (16, 8, 0))) == 1
+        assert cpixel_layout(make_pf(1, (16, 8, 0))) == -1
+        assert cpixel_layout(make_pf(0, (24, 16, 8))) == -1
+        assert cpixel_layout(make_pf(1, (24, 16, 8))) == 1
+        # a full 32 bit depth, or 16 bpp, sends whole pixels
+        assert cpixel_layout(make_pf(depth=32)) == 0
+        assert cpixel_layout(make_pf(bpp=16, depth=16, shifts=(11, 5, 0))) == 0
+
+    def test_solid_and_raw(self):
+        """Rectangles are split into 64x64 tiles, left to right, top to bottom."""
+        raw = urandom(6 * 64 * 3)
+        tiles = b'\x01\x03\x02\x01' + b'\x00' + raw + b'\x01\x06\x05\x04' + b'\x01\x09\x08\x07'
+        enc = ZRLEEncoding()
+        enc.read(70, 65, self.rect(tiles), self.pf)
+
+        pixels = self.pixels(enc, 70, 65)
+        assert (pixels[:64, :64] == (1, 2, 3)).all()
+        expected = np.frombuffer(raw, np.uint8).reshape((64, 6, 3))[..., ::-1]
+        assert np.array_equal(pixels[:64, 64:], expected)
+        assert (pixels[64:, :64] == (4, 5, 6)).all()
+        assert (pixels[64:, 64:] == (7, 8, 9)).all()
+
+    def test_packed_palette(self):
+        palette = b'\x00\x00\xff' + b'\x00\xff\x00' + b'\xff\x00\x00'
+        enc = ZRLEEncoding()
+        # 3 colors use 2 bits per pixel, rows padded to a byte
+        enc.read(5, 2, self.rect(b'\x03' + palette + bytes([0b00011000, 0, 0b10010000, 0b01000000])), self.pf)
+        pixels = self.pixels(enc, 5, 2)
+        assert pixels[0].tolist() == [[255, 0, 0], [0, 255, 0], [0, 0, 255], [255, 0, 0], [255, 0, 0]]
+        assert pixels[1].tolist() == [[0, 0, 255], [0, 255, 0], [255, 0, 0], [255, 0, 0], [0, 255, 0]]
+
+        # 2 colors use 1 bit
+        enc.read(9, 1, self.rect(b'\x02' + palette[:6] + bytes([0b10000001, 0b10000000])), self.pf)
+        assert self.pixels(enc, 9, 1)[0, :, 1].tolist() == [255, 0, 0, 0, 0, 0, 0, 255, 255]
+
+        # 16 colors use 4 bits
+        palette16 = bytes(range(48))
+        enc.read(3, 1, self.rect(b'\x10' + palette16 + bytes([0x0F, 0x10])), self.pf)
+        assert self.pixels(enc, 3, 1).tolist() == [[[2, 1, 0], [47, 46, 45], [5, 4, 3]]]
+
+    def test_plain_rle(self):
+        tiles = b'\x80' + b'\x03\x02\x01' + run_length(300) + b'\x06\x05\x04' + run_length(100)
+        enc = ZRLEEncoding()
+        enc.read(20, 20, self.rect(tiles), self.pf)
+        pixels = self.pixels(enc, 20, 20).reshape((400, 3))
+        assert (pixels[:300] == (1, 2, 3)).all()
+        assert (pixels[300:] == (4, 5, 6)).all()
+
+    def test_palette_rle(self):
+        palette = b'\x00\x00\xff' + b'\x00\xff\x00' + b'\xff\x00\x00'
+        runs = b'\x00' + b'\x81' + run_length(600) + b'\x02' + b'\x80' + run_length(422)
+        enc = ZRLEEncoding()
+        enc.read(32, 32, self.rect(b'\x83' + palette + runs), self.pf)
+        pixels = self.pixels(enc, 32, 32).reshape((1024, 3))
+        assert pixels[0].tolist() == [255, 0, 0]
+        assert (pixels[1:601] == (0, 255, 0)).all()
+        assert pixels[601].tolist() == [0, 0, 255]
+        assert (pixels[602:] == (255, 0, 0)).all()
+
+    def test_stream_persists(self):
+        """One zlib stream is used for the whole connection."""
+        enc = ZRLEEncoding()
+        for color in (b'\x01\x02\x03', b'\x04\x05\x06'):
+            enc.read(2, 2, self.rect(b'\x01' + color), self.pf)
+            assert enc.img.getpixel((1, 1)) == (color[2], color[1], color[0], 255)
+
+    def test_16bpp(self):
+        pf = make_pf(big_endian=1, bpp=16, depth=16, shifts=(11, 5, 0), maxes=(31, 63, 31))
+        enc = ZRLEEncoding()
+        enc.read(2, 1, self.rect(b'\x00' + pack('>HH', 0xF800, 0x001F)), pf)
+        assert list(enc.img.getdata()) == [(255, 0, 0, 255), (0, 0, 255, 255)]
+
+    def test_invalid(self):
+        enc = ZRLEEncoding()
+        with pytest.raises(ValueError):
+            enc.read(2, 2, self.rect(b'\x11'), self.pf)
+        with pytest.raises(ValueError):
+            enc.read(2, 2, self.rect(b'\x80\x01\x02\x03' + run_length(5)), self.pf)
+        with pytest.raises(ValueError):
+            enc.read(2, 2, self.rect(b'\x80\x01\x02\x03' + run_length(2)), self.pf)
+
+    async def async_test_decode(self):
+        """Tiles are drawn straight into the framebuffer."""
+        msg = self.rect(b'\x01\x03\x02\x01') + self.rect(b'\x00' + b'\x06\x05\x04' * 4)
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg[:3], msg[3:]]
+        transport = SafeTransport(conn)
+        fb = FrameBuffer(4, 4)
+        enc = ZRLEEncoding()
+        await enc.decode(0, 0, 4, 4, transport, self.pf, fb)
+        await enc.decode(1, 1, 2, 2, transport, self.pf, fb)
+
+        assert fb.img.getpixel((0, 0)) == (1, 2, 3, 255)
+        assert fb.img.getpixel((2, 2)) == (4, 5, 6, 255)
+        assert fb.img.getpixel((3, 3)) == (1, 2, 3, 255)
+        assert transport.buffered() == 0
+
+    async def async_test_fetch_additional_data(self):
+        msg = self.rect(b'\x01\x03\x02\x01')
+        conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        conn.recv.side_effect = [msg[2:5], msg[5:]]
+        data = await ZRLEEncoding().fetch_additional_data(4, 4, SafeTransport(conn), msg[:2], self.pf)
+        assert bytes(data) == msg
+
+    def test_decode(self):
+        asyncio.run(self.async_test_decode())
+
+    def test_fetch_additional_data(self):
+        asyncio.run(self.async_test_fetch_additional_data())
+
+    def test_zrle_encoding_type(self):
+        assert ZRLEEncoding().type() == 16
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from struct import pack
+
+from websockets import WebSocketServerProtocol
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.vnc.async_vnc_client import AsyncWSVNCClient
+
+SESSIONS = 20
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        super().__init__()
+
+    async def recv_key_event(self, websocket: WebSocketServerProtocol, down: int):
+        key_event_msg = await websocket.recv()
+        assert key_event_msg[0] == 4
+        assert key_event_msg[1] == down
+        assert key_event_msg[4:8] == pack(">I", 500)
+
+    async def answer_request(self, websocket: WebSocketServerProtocol):
+        """Answer an FBUR with the whole screen in one color."""
+        fbur = await websocket.recv()
+        assert fbur[0] == 3
+        header = pack('>BxHHHHHi', 0, 1, 0, 0, 100, 100, 0)
+        await websocket.send(header + b'\x00\x01\x00\x02' * 100 * 100)
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            await self.recv_key_event(websocket, 1)
+            await self.recv_key_event(websocket, 0)
+            await self.answer_request(websocket)
+            await websocket.wait_closed()
+        finally:
+            self.clients.remove(websocket)
+
+
+async def session():
+    async with AsyncWSVNCClient(ticket_url="ws://localhost:8765") as c:
+        await c.key_event(500, True)
+        await c.key_event(500, False)
+        assert await c.update_screen(wait=True, timeout=5) == 1
+        assert c.get_screen() is not None
+
+
+def session_threads():
+    """Threads besides the default executor's, which resolves host names."""
+    return [t for t in threading.enumerate() if not t.name.startswith("asyncio_")]
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    # every session runs on this event loop, no thread is started per session
+    threads = session_threads()
+    await asyncio.gather(*(session() for _ in range(SESSIONS)))
+    assert session_threads() == threads
+
+    server.close()
+
+
+def test():
+    asyncio.run(main())
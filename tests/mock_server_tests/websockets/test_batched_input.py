@@ -0,0 +1,73 @@
+import asyncio
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.pointer import PointerPath
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        super().__init__()
+        self.msgs = []
+        self.received = asyncio.Event()
+        self.expected = 3
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            async for msg in websocket:
+                self.msgs.append(msg)
+                if len(self.msgs) >= self.expected:
+                    self.received.set()
+        finally:
+            self.clients.remove(websocket)
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    c = WSVNCClient(ticket_url="ws://localhost:8765", coalesce_window=0.05)
+
+    # a click & typing "hi" in one websocket message
+    with c.batch():
+        c.left_click(10, 20)
+        c.type_text("hi")
+    # coalesced within the window
+    c.key_event(1, True)
+    c.key_event(1, False)
+    c.flush()
+    # sent once the window is over
+    c.move(1, 2)
+
+    await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(server.received.wait(), server.loop)
+    )
+    assert [len(msg) for msg in server.msgs] == [3 * 6 + 4 * 8, 2 * 8, 6]
+    assert server.msgs[0][:6] == bytes([5, 0, 0, 10, 0, 20])
+    assert server.msgs[0][-8:] == bytes([4, 0, 0, 0, 0, 0, 0, ord("i")])
+
+    # calls that take a while to send everything still join the batch
+    server.received.clear()
+    server.expected = 4
+    with c.batch():
+        typed = c.type_text("ab", delay=0.02)
+        dragged = c.drag(PointerPath.line(0, 0, 5, 5), 0.05, rate=100)
+    typed.result(timeout=5)
+    dragged.result(timeout=5)
+    await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(server.received.wait(), server.loop)
+    )
+    assert len(server.msgs) == 4
+    assert server.msgs[3][:8] == bytes([4, 1, 0, 0, 0, 0, 0, ord("a")])
+    assert server.msgs[3][-6:] == bytes([5, 0, 0, 5, 0, 5])
+
+    # close server & client
+    c.close()
+    server.close()
+
+
+def test():
+    asyncio.run(main())
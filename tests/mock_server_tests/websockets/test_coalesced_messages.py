@@ -0,0 +1,61 @@
+import asyncio
+from os import urandom
+from struct import pack
+
+from PIL import ImageChops
+from websockets import WebSocketServerProtocol
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+
+class MockVNCServer(MockVNCBaseServer):
+    """Batches RFB messages like a proxy would: a FrameBufferUpdate & a cut text
+    message share websocket messages, and are split at arbitrary offsets."""
+
+    def __init__(self):
+        super().__init__()
+
+    async def batched_messages(self, websocket: WebSocketServerProtocol):
+        header = pack('>bxHHHHHI', 0, 1, 0, 0, 100, 100, 0)
+        self.compare_pixel_data = urandom(100 * 100 * 4)
+        cut_text = pack("!BxxxI", 3, 12) + b"Hello World!"
+        stream = header + self.compare_pixel_data + cut_text + pack("!B", 2)
+
+        # split the stream so that no message lines up with a websocket message
+        splits = [0, 7, 20000, len(stream) - 10, len(stream)]
+        for start, end in zip(splits, splits[1:]):
+            await websocket.send(stream[start:end])
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            await self.batched_messages(websocket)
+            await asyncio.sleep(2)
+        finally:
+            self.clients.remove(websocket)
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    c = WSVNCClient(ticket_url="ws://localhost:8765")
+    await asyncio.sleep(1)  # wait for the messages to process
+
+    raw_enc = RawEncoding()
+    raw_enc.read(100, 100, server.compare_pixel_data, c.get_pixel_format())
+    assert ImageChops.difference(c.get_screen(), raw_enc.img).getbbox() is None
+    assert c.get_clipboard() == "Hello World!"
+    assert c.get_bell() is not None
+
+    # close server & client
+    c.close()
+    server.close()
+
+
+def test():
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+import asyncio
+from struct import pack, unpack
+
+from websockets import WebSocketServerProtocol
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.encodings.pseudo_continuous_updates_encoding import (
+    PseudoContinuousUpdatesEncoding,
+)
+from wsvnc.encodings.pseudo_fence_encoding import PseudoFenceEncoding
+from wsvnc.server_messages.fence import FENCE_BLOCK_BEFORE, FENCE_REQUEST
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+UPDATE = pack('>BxHHHHHi', 0, 1, 0, 0, 10, 10, 0) + b'\x00\x01\x00\x02' * 100
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        self.requests = []
+        self.fences = []
+        self.enabled = []
+        super().__init__()
+
+    async def stream(self, websocket: WebSocketServerProtocol):
+        """Send updates without waiting for requests, like continuous updates do."""
+        while True:
+            await asyncio.sleep(0.02)
+            await websocket.send(UPDATE)
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        streaming = None
+        try:
+            await self.handshake(websocket)
+            async for msg in websocket:
+                if msg[0] == 2 and pack('>i', -313) in msg:  # SetEncodings
+                    # tell the client continuous updates are supported, & ask for a fence
+                    await websocket.send(b'\x96')
+                    await websocket.send(
+                        pack('>BxxxIB', 248, FENCE_REQUEST | FENCE_BLOCK_BEFORE, 4) + b'ping'
+                    )
+                elif msg[0] == 3:
+                    self.requests.append(unpack('>BBHHHH', msg))
+                    await websocket.send(UPDATE)
+                elif msg[0] == 150:
+                    self.enabled.append(unpack('>BBHHHH', msg)[1:])
+                    if msg[1] and streaming is None:
+                        streaming = asyncio.ensure_future(self.stream(websocket))
+                elif msg[0] == 248:
+                    self.fences.append(msg)
+        finally:
+            if streaming is not None:
+                streaming.cancel()
+            self.clients.remove(websocket)
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    c = WSVNCClient(ticket_url="ws://localhost:8765")
+    c.set_encodings([PseudoContinuousUpdatesEncoding, PseudoFenceEncoding])
+    c.set_resend_flag()
+
+    # updates keep coming without requests
+    c.wait_for_update(10, timeout=5)
+    assert c.get_continuous_updates()
+    assert server.enabled == [(1, 0, 0, 100, 100)]
+    # only the first (non-incremental) request, & maybe one incremental one sent
+    # before the server said it supports continuous updates
+    assert len(server.requests) <= 2
+    assert server.fences == [pack('>BxxxIB', 248, FENCE_BLOCK_BEFORE, 4) + b'ping']
+
+    # close server & client
+    c.close()
+    server.close()
+
+
+def test():
+    asyncio.run(main())
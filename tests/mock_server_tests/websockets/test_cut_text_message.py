@@ -33,9 +33,9 @@ async def main():
     
     # start the client
     c = WSVNCClient(ticket_url="ws://localhost:8765")
+    await asyncio.sleep(1) # wait for the cut text to arrive
     
-    if c.get_clipboard() != b"Hello World!":
-        assert "TEST FAILED!!!!"
+    assert c.get_clipboard() == "Hello World!"
     
     # close server & client
     c.close()
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from websockets.exceptions import ConnectionClosed
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        super().__init__()
+        self.msgs = []
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            # the click & the key, then hang up
+            for _ in range(2):
+                self.msgs.append(await websocket.recv())
+        finally:
+            self.clients.remove(websocket)
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    c = WSVNCClient(ticket_url="ws://localhost:8765", coalesce_window=0.05)
+
+    # done once written, not when queued
+    click = c.left_click(10, 20)
+    key = c.key_event(1, True)
+    assert not click.done()
+    assert key.result(timeout=5) is None
+    assert click.done()
+    # everything sent so far is written after the barrier
+    c.key_event(1, False)
+    c.flush()
+    await asyncio.sleep(0.2)
+    assert [len(msg) for msg in server.msgs] == [3 * 6 + 8, 8]
+
+    # input on a closed connection raises, instead of being swallowed
+    with pytest.raises(ConnectionClosed):
+        c.key_event(2, True).result(timeout=5)
+    c.move(1, 2)
+    with pytest.raises(ConnectionClosed):
+        c.flush()
+
+    # close server & client
+    c.close()
+    server.close()
+
+
+def test():
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+import asyncio
+from struct import unpack
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.constants import KEY_ShiftLeft
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        super().__init__()
+        self.data = b''
+        self.received = asyncio.Event()
+        self.expected = 12
+
+    def events(self):
+        """The key & pointer events received, in order."""
+        events = []
+        i = 0
+        while i < len(self.data):
+            if self.data[i] == 4:
+                down, key = unpack(">BxxI", self.data[i + 1 : i + 8])
+                events.append((key, down))
+                i += 8
+            elif self.data[i] == 5:
+                events.append(("pointer", self.data[i + 1]))
+                i += 6
+            else:
+                raise ValueError(f"Unexpected message type {self.data[i]}")
+        return events
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            async for msg in websocket:
+                self.data += msg
+                if len(self.events()) >= self.expected:
+                    self.received.set()
+        finally:
+            self.clients.remove(websocket)
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    c = WSVNCClient(ticket_url="ws://localhost:8765")
+
+    # calls that sleep between their events don't overlap the ones after them
+    c.send_key(ord("a"))
+    c.send_key(ord("b"))
+    c.emit_text("cd", delay=0.01)
+    c.type_text("X").result(timeout=5)
+
+    await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(server.received.wait(), server.loop)
+    )
+    assert server.events() == [
+        (ord("a"), 1), (ord("a"), 0),
+        (ord("b"), 1), (ord("b"), 0),
+        (ord("c"), 1), (ord("c"), 0),
+        (ord("d"), 1), (ord("d"), 0),
+        (KEY_ShiftLeft, 1), (ord("X"), 1), (ord("X"), 0), (KEY_ShiftLeft, 0),
+    ]
+
+    # pointer input too
+    server.received.clear()
+    server.expected += 4
+    c.wheel_up(1, 1, 20)
+    c.key_event(ord("e"), True)
+    c.key_event(ord("e"), False).result(timeout=5)
+
+    await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(server.received.wait(), server.loop)
+    )
+    assert server.events()[12:] == [
+        ("pointer", 8), ("pointer", 0), (ord("e"), 1), (ord("e"), 0),
+    ]
+
+    # close server & client
+    c.close()
+    server.close()
+
+
+def test():
+    asyncio.run(main())
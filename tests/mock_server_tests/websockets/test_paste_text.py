@@ -0,0 +1,70 @@
+import asyncio
+from struct import pack, unpack
+
+from websockets import WebSocketServerProtocol
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.constants import KEY_ControlLeft
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+TEXT = "line of a long config file\n" * 1000
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        super().__init__()
+
+    async def echo_cut_text(self, websocket: WebSocketServerProtocol):
+        """Receive ClientCutText & send it back as ServerCutText, like x11vnc does."""
+        cut_text_msg = await websocket.recv()
+        assert cut_text_msg[0] == 6
+        length = unpack("!xxxxI", cut_text_msg[:8])[0]
+        assert cut_text_msg[8:].decode() == TEXT
+        await websocket.send(pack("!BxxxI", 3, length) + cut_text_msg[8:])
+
+    async def recv_paste(self, websocket: WebSocketServerProtocol):
+        """The paste combo arrives in one message."""
+        msg = await websocket.recv()
+        events = [unpack("!BBxxI", msg[i:i + 8]) for i in range(0, len(msg), 8)]
+        assert events == [
+            (4, 1, KEY_ControlLeft),
+            (4, 1, ord("v")),
+            (4, 0, ord("v")),
+            (4, 0, KEY_ControlLeft),
+        ]
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            await self.echo_cut_text(websocket)
+            await self.recv_paste(websocket)
+            # no echo this time
+            await websocket.recv()
+            typed = 0
+            async for msg in websocket:
+                typed += len(msg) // 8
+            assert typed == 2 * len(TEXT)
+        finally:
+            self.clients.remove(websocket)
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    # start the client
+    c = WSVNCClient(ticket_url="ws://localhost:8765")
+
+    assert c.paste_text(TEXT)
+    assert c.get_clipboard() == TEXT
+    assert not c.paste_text(TEXT, timeout=0.2)
+
+    # close server & client
+    c.close()
+    server.close()
+
+
+def test():
+    asyncio.run(main())
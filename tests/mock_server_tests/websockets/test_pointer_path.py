@@ -0,0 +1,71 @@
+import asyncio
+from struct import unpack
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.pointer import PointerPath
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+PATH = PointerPath([(10, 10), (200, 400), (400, 10)], bezier=True)
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        self.released = asyncio.Event()
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            async for msg in websocket:
+                for i in range(0, len(msg), 6):
+                    msg_type, mask, x, y = unpack("!BBHH", msg[i:i + 6])
+                    assert msg_type == 5
+                    self.events.append((x, y, mask))
+                    if mask == 0 and len(self.events) > 2:
+                        self.released.set()
+        finally:
+            self.clients.remove(websocket)
+
+
+async def drag(server: MockVNCServer, client: WSVNCClient, rate: float):
+    """Drag along PATH, return the moves in between the press & the release."""
+    server.events.clear()
+    server.released.clear()
+    client.drag(PATH, 0.2, rate=rate).result(timeout=5)
+    await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(server.released.wait(), server.loop)
+    )
+    # button transitions are exact
+    assert server.events[:2] == [(10, 10, 0), (10, 10, 1)]
+    assert server.events[-2:] == [(400, 10, 1), (400, 10, 0)]
+    moves = server.events[2:-1]
+    assert all(mask == 1 for _, _, mask in moves)
+    assert set(moves) <= {(x, y, 1) for x, y in PATH.sample(0.2, rate)}
+    return moves
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    c = WSVNCClient(ticket_url="ws://localhost:8765")
+    moves = await drag(server, c, rate=100)
+    assert 10 <= len(moves) <= 20
+    c.close()
+
+    # superseded moves are dropped from the send queue
+    c = WSVNCClient(ticket_url="ws://localhost:8765", coalesce_window=0.05)
+    moves = await drag(server, c, rate=1000)
+    assert len(moves) <= 10
+    assert c._rfb_client.transport.messages_superseded > 100
+
+    # close server & client
+    c.close()
+    server.close()
+
+
+def test():
+    asyncio.run(main())
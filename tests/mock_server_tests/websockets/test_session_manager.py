@@ -0,0 +1,75 @@
+import asyncio
+import os
+import threading
+import time
+from struct import pack
+
+from websockets import WebSocketServerProtocol
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.vnc.session_manager import SessionManager
+
+SESSIONS = 100
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        super().__init__()
+
+    async def answer_requests(self, websocket: WebSocketServerProtocol):
+        """Answer every FBUR with the whole screen in one color."""
+        async for fbur in websocket:
+            assert fbur[0] == 3
+            header = pack('>BxHHHHHi', 0, 1, 0, 0, 100, 100, 0)
+            await websocket.send(header + b'\x00\x01\x00\x02' * 100 * 100)
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            await self.answer_requests(websocket)
+        finally:
+            self.clients.remove(websocket)
+
+
+def rss_kib():
+    """Resident memory of this process."""
+    with open(f"/proc/{os.getpid()}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    threads = threading.active_count()
+    memory = rss_kib()
+    start = time.perf_counter()
+    cpu = time.thread_time()
+    async with SessionManager(max_connecting=16) as manager:
+        urls = {f"vm{i}": "ws://localhost:8765" for i in range(SESSIONS)}
+        assert await manager.open_all(urls) == {}
+        connected = time.perf_counter()
+        connect_cpu = time.thread_time() - cpu
+
+        screens = await manager.screenshot_all(timeout=10)
+        assert len(screens) == SESSIONS
+        assert all(session.healthy for session in manager.health().values())
+
+        print(
+            f"{SESSIONS} sessions connected in {connected - start:.2f}s, "
+            f"{SESSIONS / max(connect_cpu, 1e-6):.0f} handshakes per CPU second, "
+            f"{(rss_kib() - memory) / SESSIONS:.0f} KiB per session, "
+            f"{threading.active_count() - threads} more threads"
+        )
+    assert len(manager) == 0
+
+    server.close()
+
+
+def test():
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+import asyncio
+import time
+from struct import unpack
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.keyboard import compile_text
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+TEXT = "host=vm-01.example.com\nPort=5900\tUser: Admin!\n" * 45  # ~2 KB
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        self.typed = asyncio.Event()
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            expected = len(compile_text(TEXT))
+            async for msg in websocket:
+                for i in range(0, len(msg), 8):
+                    msg_type, down, key = unpack("!BBxxI", msg[i:i + 8])
+                    assert msg_type == 4
+                    self.events.append((key, bool(down)))
+                if len(self.events) == expected:
+                    self.typed.set()
+        finally:
+            self.clients.remove(websocket)
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    c = WSVNCClient(ticket_url="ws://localhost:8765")
+    start = time.perf_counter()
+    c.type_text(TEXT).result(timeout=5)
+    await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(server.typed.wait(), server.loop)
+    )
+    elapsed = time.perf_counter() - start
+    print(f"typed {len(TEXT)} characters at {len(TEXT) / elapsed:.0f} per second")
+    assert server.events == compile_text(TEXT)
+
+    # close server & client
+    c.close()
+    server.close()
+
+
+def test():
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from struct import pack
+
+import pytest
+from websockets import WebSocketServerProtocol
+
+from tests.conftest import MockVNCBaseServer
+from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.vnc.vnc_client import WSVNCClient
+
+PIXELS = [b'\x00\x01\x00\x02', b'\x00\x02\x00\x01']
+
+
+class MockVNCServer(MockVNCBaseServer):
+    def __init__(self):
+        super().__init__()
+
+    async def answer_request(self, websocket: WebSocketServerProtocol, pixel: bytes):
+        """Answer an FBUR a little later with the whole screen in one color."""
+        fbur = await websocket.recv()
+        assert fbur[0] == 3
+        await asyncio.sleep(0.3)
+        header = pack('>BxHHHHHi', 0, 1, 0, 0, 100, 100, 0)
+        await websocket.send(header + pixel * 100 * 100)
+
+    async def handler(self, websocket):
+        self.clients.add(websocket)
+        try:
+            await self.handshake(websocket)
+            for pixel in PIXELS:
+                await self.answer_request(websocket, pixel)
+            await websocket.wait_closed()
+        finally:
+            self.clients.remove(websocket)
+
+
+def color(pixel, pf):
+    enc = RawEncoding()
+    enc.read(1, 1, pixel, pf)
+    return enc.img.getpixel((0, 0))
+
+
+async def main():
+    # start the server
+    server = MockVNCServer()
+    await asyncio.sleep(1)
+
+    c = WSVNCClient(ticket_url="ws://localhost:8765")
+    assert c.get_frame_seq() == 0
+
+    # done once the answer is applied, no sleeping
+    start = time.perf_counter()
+    assert c.update_screen(wait=True, timeout=5).result() == 1
+    assert time.perf_counter() - start >= 0.3
+    pf = c.get_pixel_format()
+    assert c.get_screen().getpixel((50, 50)) == color(PIXELS[0], pf)
+
+    # nothing else is coming
+    with pytest.raises(TimeoutError):
+        c.wait_for_update(timeout=0.2)
+
+    c.update_screen()
+    assert await c.wait_for_update_async(after=1, timeout=5) == 2
+    assert c.get_screen().getpixel((50, 50)) == color(PIXELS[1], pf)
+    assert color(PIXELS[0], pf) != color(PIXELS[1], pf)
+
+    # close server & client
+    c.close()
+    server.close()
+
+
+def test():
+    asyncio.run(main())
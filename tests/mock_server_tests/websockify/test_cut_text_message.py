@@ -114,7 +114,7 @@ def test():
     c = WSVNCClient('ws://0.0.0.0:5910')
     sleep(1)
     
-    assert c.get_clipboard() != b''
+    assert c.get_clipboard() != ''
     
     # Clean up
     c.close()
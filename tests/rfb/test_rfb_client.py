@@ -1,21 +1,54 @@
 """Unit tests for RFBClient class."""
 
 import asyncio
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from struct import pack, unpack
 from unittest import TestCase, mock
 
 import pytest
-from PIL import Image
 from websockets import WebSocketClientProtocol
+from websockets.exceptions import ConnectionClosedOK
 
+from wsvnc.encodings.copyrect_encoding import CopyRectEncoding
+from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.pseudo_continuous_updates_encoding import (
+    PseudoContinuousUpdatesEncoding,
+)
+from wsvnc.encodings.pseudo_desktop_size_encoding import PseudoDesktopSizeEncoding
+from wsvnc.encodings.pseudo_fence_encoding import PseudoFenceEncoding
 from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.encodings.tight_encoding import TightEncoding
+from wsvnc.encodings.zrle_encoding import ZRLEEncoding
 from wsvnc.pixel_format import PixelFormat
 from wsvnc.rectangle import Rectangle
 from wsvnc.rfb.rfb_client import RFBClient
 from wsvnc.security.no_security import NoSecurity
 from wsvnc.server_messages import framebuffer_update
+from wsvnc.server_messages.fence import FENCE_BLOCK_BEFORE, FENCE_REQUEST
+from wsvnc.update_budget import UpdateBudget
 from wsvnc.utils.safe_transport import SafeTransport
 
 
+class BusyEncoding(EncodingInterface):
+    """Takes 0.3 s of CPU time to decode a rectangle, without a payload."""
+
+    def type(self):
+        return 30
+
+    async def fetch_additional_data(self, width, height, transport, msg, pf):
+        return msg
+
+    def read(self, width, height, msg, pf):
+        return 0
+
+    async def read_stream(self, width, height, transport, pf):
+        end = time.thread_time() + 0.3
+        while time.thread_time() < end:
+            pass
+
+
 class TestRFBClient(TestCase):
     def setUp(self):
         self.conn_mock = mock.AsyncMock(spec=WebSocketClientProtocol)
@@ -50,6 +83,25 @@ class TestRFBClient(TestCase):
         await rfb.handshake()
         assert rfb.width == 1
         assert rfb.height == 1
+        self.transport_mock.unread.assert_not_called()
+
+    async def async_test_handshake_keeps_trailing_message(self):
+        """Bytes after ServerInit in the same frame stay on the stream."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.transport = self.transport_mock
+        rfb._security_handshake = mock.AsyncMock()
+        self.transport_mock.send = mock.AsyncMock()
+        cut_text = pack("!BxxxI", 3, 2) + b'hi'
+        self.transport_mock.recv.side_effect = [
+            b'RFB 003.008\n',
+            b'\x00\x00',
+            b'\x00\x00\x00\x00',
+            b'\x00\x01\x00\x01' + self.pf.write_pixel_format() + b'\x00\x00\x00\x03' + b'abc' + cut_text,
+        ]
+
+        await rfb.handshake()
+        assert rfb.server_name == str(b'abc')
+        self.transport_mock.unread.assert_called_once_with(cut_text)
         
     async def async_test_handshake_fail(self):
         rfb = RFBClient(self.conn_mock, self.security_type)
@@ -65,24 +117,19 @@ class TestRFBClient(TestCase):
     
     async def async_test_listen(self):
         rfb = RFBClient(self.conn_mock, self.security_type)
-        rfb.transport = self.transport_mock
-        rfb.transport.conn = self.conn_mock
         rfb._handle_bell = mock.AsyncMock()
         rfb._handle_color_map = mock.AsyncMock()
         rfb._handle_framebuffer_update = mock.AsyncMock()
         rfb._handle_server_cut_text = mock.AsyncMock()
+        # the handlers are mocked, so they don't read anything off the stream
         messages = [
-            b'\x00' + b'\x00'*15,  # FBU
-            b'\x01' + b'\x00'*5,   # ColorMap
-            b'\x02',               # Bell
-            b'\x03' + b'\x00'*7    # Cut text
+            b'\x00',  # FBU
+            b'\x01',  # ColorMap
+            b'\x02',  # Bell
+            b'\x03',  # Cut text
         ]
         
-        self.transport_mock.recvd = mock.AsyncMock(side_effect=messages)
-        
-        # sets the asynchronous iter for: 
-        # async for message in self.transport.conn:
-        self.conn_mock.__aiter__.return_value = messages
+        self.conn_mock.recv.side_effect = messages + [ConnectionClosedOK(None, None)]
         
         await rfb.listen()
         
@@ -91,9 +138,35 @@ class TestRFBClient(TestCase):
         rfb._handle_framebuffer_update.assert_awaited()
         rfb._handle_server_cut_text.assert_awaited()
         
+    async def async_test_listen_coalesced_and_split(self):
+        """Several RFB messages in one websocket message, and one split over many."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb._handle_bell = mock.AsyncMock()
+        cut_text = b'\x03\x00\x00\x00\x00\x00\x00\x05hello'
+        messages = [
+            b'\x02' + cut_text + b'\x02' + cut_text[:4],
+            cut_text[4:9],
+            cut_text[9:] + b'\x02',
+        ]
+        self.conn_mock.recv.side_effect = messages + [ConnectionClosedOK(None, None)]
+
+        await rfb.listen()
+
+        assert rfb._handle_bell.await_count == 3
+        assert rfb.clipboard == 'hello'
+        self.conn_mock.close.assert_not_awaited()
+
+    async def async_test_listen_unknown_message(self):
+        """An unknown message type desyncs the stream so the connection is closed."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        self.conn_mock.recv.side_effect = [b'\x7f']
+
+        await rfb.listen()
+
+        self.conn_mock.close.assert_awaited()
+
     @mock.patch('wsvnc.rfb.rfb_client.FrameBufferUpdate', new_callable=mock.MagicMock, spec=framebuffer_update.FrameBufferUpdate)
-    @mock.patch('PIL.Image.new')
-    async def async_test_fbu(self, mock_image_new, mock_fbu_new):
+    async def async_test_fbu(self, mock_fbu_new):
         rfb = RFBClient(self.conn_mock, self.security_type)
         rfb.transport = self.transport_mock
         rfb.width = 800
@@ -102,7 +175,6 @@ class TestRFBClient(TestCase):
         
         rect = Rectangle() # test rectangle
         rect.enc = RawEncoding()
-        rect.enc.img = Image.new('RGBA', (1, 1), (1, 2, 3, 2555))
         rect.height, rect.width, rect.x, rect.y = (1, 1, 1, 1)
         
         # setup mocked variables (mocks the FBU object)
@@ -110,17 +182,470 @@ class TestRFBClient(TestCase):
         mock_fbu.rectangles = [rect]
         mock_fbu.read = mock.AsyncMock()
         mock_fbu_new.return_value = mock_fbu
-        mock_image = mock.MagicMock() # mocks the Image.new() call
-        mock_image_new.return_value = mock_image
         
         await rfb._handle_framebuffer_update(b'')
         
-        # Check if an image was created when none was set
-        assert rfb.img.getpixel((0, 0)) is not None
-        mock_image_new.assert_called()
-        mock_fbu_new.assert_called_once()
+        # Check if a framebuffer was created when none was set
+        assert rfb.framebuffer.width == 800
+        assert rfb.framebuffer.height == 600
+        assert rfb.img.getpixel((0, 0)) == (0, 0, 0, 0)
+        # rectangles are decoded straight into the framebuffer
+        mock_fbu_new.assert_called_once_with(
+            self.pf, rfb.encs, rfb.framebuffer, rfb.decoders, None
+        )
         mock_fbu.read.assert_awaited_once()
+
+    async def async_test_fbu_decodes_into_framebuffer(self):
+        """Rectangles are drawn on the persistent framebuffer, which img shows."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.width = 4
+        rfb.height = 4
+        rfb.pixel_format = self.pf
+        self.pf.red_max = self.pf.green_max = self.pf.blue_max = 255
+        # raw pixel at (1, 1), then CopyRect of it to (3, 3)
+        await rfb.set_encodings([CopyRectEncoding])
+        self.conn_mock.send.reset_mock()
+        self.conn_mock.recv.side_effect = [
+            b'\x00\x00\x02'
+            + pack('!HHHHi', 1, 1, 1, 1, 0) + b'\x00\x03\x02\x01'
+            + pack('!HHHHi', 3, 3, 1, 1, 1) + pack('!HH', 1, 1),
+            b'\x00\x00\x00',  # empty update
+            b'\x00\x00\x01' + pack('!HHHHi', 0, 0, 1, 1, 0) + b'\x00\x06\x05\x04',
+        ]
+        
+        await rfb._handle_framebuffer_update(b'\x00')
+        
+        img = rfb.img
+        assert img.getpixel((1, 1)) == (1, 2, 3, 255)
+        assert img.getpixel((3, 3)) == (1, 2, 3, 255)
+        assert img.getpixel((0, 0)) == (0, 0, 0, 0)
+        # the framebuffer persists across updates
+        await rfb._handle_framebuffer_update(b'\x00')
+        assert rfb.img is img
+        # img is a snapshot, later updates don't change it
+        await rfb._handle_framebuffer_update(b'\x00')
+        assert rfb.img.getpixel((0, 0)) == (4, 5, 6, 255)
+        assert img.getpixel((0, 0)) == (0, 0, 0, 0)
+
+    async def async_test_get_changes_since(self):
+        """The rectangles of every update are logged by frame sequence number."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.width = 4
+        rfb.height = 4
+        rfb.pixel_format = self.pf
+        self.pf.red_max = self.pf.green_max = self.pf.blue_max = 255
+        self.conn_mock.recv.side_effect = [
+            b'\x00\x00\x01' + pack('!HHHHi', 1, 1, 1, 1, 0) + b'\x00\x03\x02\x01',
+            b'\x00\x00\x00',  # empty update
+            b'\x00\x00\x01' + pack('!HHHHi', 2, 1, 1, 1, 0) + b'\x00\x06\x05\x04',
+        ]
+        for _ in range(3):
+            await rfb._handle_framebuffer_update(b'\x00')
+
+        changes = rfb.get_changes_since(0, pixels=True)
+        assert changes.seq == 3
+        # both pixels, merged
+        assert changes.regions == [(1, 1, 2, 1)]
+        assert list(changes.images[0].getdata()) == [(1, 2, 3, 255), (4, 5, 6, 255)]
+        assert rfb.get_changes_since(1).regions == [(2, 1, 1, 1)]
+        assert not rfb.get_changes_since(3)
+
+    async def async_test_pseudo_rects_not_damage(self):
+        """Pseudo-encoding rectangles aren't committed or logged as changes."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.width = 4
+        rfb.height = 4
+        rfb.pixel_format = self.pf
+        self.pf.red_max = self.pf.green_max = self.pf.blue_max = 255
+        await rfb.set_encodings([RawEncoding, PseudoContinuousUpdatesEncoding])
+        self.conn_mock.recv.side_effect = [
+            b'\x00\x00\x02' + pack('!HHHHi', 1, 1, 1, 1, 0) + b'\x00\x03\x02\x01'
+            + pack('!HHHHi', 0, 0, 4, 4, -313),
+            b'\x00\x00\x01' + pack('!HHHHi', 0, 0, 4, 4, -313),
+        ]
+        await rfb._handle_framebuffer_update(b'\x00')
+        version = rfb.framebuffer.version
+
+        assert rfb.get_changes_since(0).regions == [(1, 1, 1, 1)]
+        await rfb._handle_framebuffer_update(b'\x00')
+        assert rfb.frame_seq == 2
+        assert not rfb.get_changes_since(1)
+        assert rfb.framebuffer.version == version
+
+    async def async_test_fbu_decode_executor(self):
+        """Rectangles are decoded in the client's decode executor."""
+        executor = mock.Mock(wraps=ThreadPoolExecutor(1))
+        rfb = RFBClient(self.conn_mock, self.security_type, decode_executor=executor)
+        rfb.width = 4
+        rfb.height = 4
+        rfb.pixel_format = self.pf
+        self.pf.red_max = self.pf.green_max = self.pf.blue_max = 255
+        self.conn_mock.recv.side_effect = [
+            b'\x00\x00\x01' + pack('!HHHHi', 1, 1, 1, 1, 0) + b'\x00\x03\x02\x01'
+        ]
+
+        await rfb._handle_framebuffer_update(b'\x00')
+
+        executor.submit.assert_called_once()
+        assert rfb.img.getpixel((1, 1)) == (1, 2, 3, 255)
+        executor.shutdown()
+
+    async def async_test_wait_for_update(self):
+        """Waiters wake up once an update is applied, or time out."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.width = 4
+        rfb.height = 4
+        rfb.pixel_format = self.pf
+        self.conn_mock.recv.side_effect = [
+            b'\x00\x00\x00',
+            b'\x00\x00\x00\x00',
+            ConnectionClosedOK(None, None),
+        ]
+
+        # the answer to a request is the next update the client starts receiving
+        assert await rfb.framebuffer_update_request(0, 0, 4, 4) == 1
+        waiter = asyncio.ensure_future(rfb.wait_for_update())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        await rfb._handle_framebuffer_update(b'\x00')
+        assert await waiter == 1 == rfb.frame_seq
+
+        # already applied
+        assert await rfb.wait_for_update(after=0) == 1
+        with pytest.raises(TimeoutError):
+            await rfb.wait_for_update(timeout=0.01)
+
+        waiter = asyncio.ensure_future(rfb.wait_for_update(after=1))
+        await asyncio.sleep(0)
+        await rfb.listen()  # the second update, then the connection closes
+        assert await waiter == 2
+        with pytest.raises(ConnectionError):
+            await rfb.wait_for_update()
+
+    async def async_test_request_answer_after_written(self):
+        """Updates started while a request is queued don't count as its answer."""
+        rfb = RFBClient(self.conn_mock, self.security_type, coalesce_window=0.05)
+        self.conn_mock.send = mock.AsyncMock()
+        request = asyncio.ensure_future(rfb.framebuffer_update_request(0, 0, 4, 4))
+        await asyncio.sleep(0)
+        # an update the server started before it got the request
+        rfb._updates_started += 1
+        assert await request == 2
+        self.conn_mock.send.assert_awaited_once()
+
+        # held, it's counted when queued
+        rfb.transport.hold()
+        assert await rfb.framebuffer_update_request(0, 0, 4, 4) == 2
+        self.conn_mock.send.assert_awaited_once()
+        rfb.transport.release()
+
+    async def async_test_wait_until_stable(self):
+        """Stable once no update draws on the region for quiet_ms."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.width = 8
+        rfb.height = 8
+        rfb.pixel_format = self.pf
+        # pixels at (1, 1) every 20ms, then at (6, 6) every 20ms
+        updates = [(1, 1)] * 3 + [(6, 6)] * 20
+
+        async def recv():
+            await asyncio.sleep(0.02)
+            if not updates:
+                await asyncio.Event().wait()
+            x, y = updates.pop(0)
+            return pack('!BxHHHHHi', 0, 1, x, y, 1, 1, 0) + bytes(4)
+
+        self.conn_mock.recv.side_effect = recv
+        listening = asyncio.ensure_future(rfb.listen())
+        loop = asyncio.get_running_loop()
+
+        start = loop.time()
+        seq = await rfb.wait_until_stable((0, 0, 4, 4), quiet_ms=50, timeout=5)
+        elapsed = loop.time() - start
+        assert 3 <= seq < 20
+        # quiet from the third update, changes elsewhere don't matter
+        assert 0.06 + 0.05 <= elapsed < 0.4
+        # keeps one incremental request for the region outstanding
+        requests = [c.args[0] for c in self.conn_mock.send.await_args_list]
+        assert requests[0] == pack('!BBHHHH', 3, 0, 0, 0, 4, 4)
+        assert set(requests[1:]) == {pack('!BBHHHH', 3, 1, 0, 0, 4, 4)}
+        assert len(requests) <= seq + 1
+
+        with pytest.raises(TimeoutError):
+            await rfb.wait_until_stable(quiet_ms=50, timeout=0.1)
+        listening.cancel()
+
+    async def async_test_subscriptions(self):
+        """Subscribed regions are requested at their own rates, not the whole screen."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.width = 100
+        rfb.height = 100
+        rfb.pixel_format = self.pf
+        rfb.resend_flag = True
+        requests = []
+        pending = asyncio.Queue()
+
+        async def send(msg):
+            requests.append(msg)
+            await pending.put(msg)
+
+        async def recv():
+            # answer every request right away with its region
+            _, _, x, y, width, height = unpack('!BBHHHH', await pending.get())
+            header = pack('!BxHHHHHi', 0, 1, x, y, width, height, 0)
+            return header + bytes(width * height * 4)
+
+        self.conn_mock.send.side_effect = send
+        self.conn_mock.recv.side_effect = recv
+        listening = asyncio.ensure_future(rfb.listen())
+
+        fast = await rfb.subscribe(0, 0, 10, 10, fps=50)
+        slow = await rfb.subscribe(50, 50, 20, 5, fps=10)
+        assert not rfb.resending
+        await asyncio.sleep(0.5)
+        await rfb.unsubscribe(fast)
+        await rfb.unsubscribe(slow)
+        listening.cancel()
+
+        regions = [unpack('!BBHHHH', msg)[1:] for msg in requests]
+        # the first request of a region isn't incremental
+        assert regions[:2] == [(0, 0, 0, 10, 10), (0, 50, 50, 20, 5)]
+        assert set(regions[2:]) == {(1, 0, 0, 10, 10), (1, 50, 50, 20, 5)}
+        assert 10 <= fast.requests <= 26
+        assert 3 <= slow.requests <= 6
+        assert rfb.resending
+
+    def answering_server(self, rfb, size=10):
+        """Answer every request right away with a size x size update, return the requests."""
+        requests = []
+        pending = asyncio.Queue()
+
+        async def send(msg):
+            requests.append(msg)
+            await pending.put(msg)
+
+        async def recv():
+            await pending.get()
+            header = pack('!BxHHHHHi', 0, 1, 0, 0, size, size, 0)
+            return header + bytes(size * size * 4)
+
+        self.conn_mock.send.side_effect = send
+        self.conn_mock.recv.side_effect = recv
+        rfb.width = 100
+        rfb.height = 100
+        rfb.pixel_format = self.pf
+        rfb.resend_flag = True
+        return requests
+
+    async def async_test_frame_rate_and_pause(self):
+        """The resend flag requests the screen at the frame rate, not while paused."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        requests = self.answering_server(rfb)
+        rfb.set_frame_rate(20)
+        assert rfb.min_interval == 0.05
+        listening = asyncio.ensure_future(rfb.listen())
+        await rfb.framebuffer_update_request(0, 0, 100, 100)
+        await asyncio.sleep(0.5)
+        assert 8 <= len(requests) <= 13
+
+        await rfb.pause_updates()
+        assert rfb.paused
+        await asyncio.sleep(0.1)
+        paused_at = len(requests)
+        await asyncio.sleep(0.3)
+        assert len(requests) == paused_at
+
+        await rfb.resume_updates()
+        await asyncio.sleep(0.2)
+        listening.cancel()
+        assert len(requests) > paused_at
+        assert unpack('!BBHHHH', requests[-1]) == (3, 1, 0, 0, 100, 100)
+        with pytest.raises(ValueError):
+            rfb.set_frame_rate(0)
+
+    async def async_test_update_budget(self):
+        """Updates are charged to the budget & requested within it."""
+        budget = UpdateBudget(bytes_per_second=10 * 416)
+        rfb = RFBClient(self.conn_mock, self.security_type, budget=budget)
+        requests = self.answering_server(rfb)
+        listening = asyncio.ensure_future(rfb.listen())
+        await rfb.framebuffer_update_request(0, 0, 100, 100)
+        await asyncio.sleep(0.5)
+        listening.cancel()
+        await asyncio.sleep(0)
+        # 416 bytes per update, 10 a second
+        assert 4 <= len(requests) <= 8
+        # closed sessions are no longer accounted for
+        assert budget.delay(rfb) == 0
+
+    async def async_test_update_budget_sessions(self):
+        """Sessions on one loop are only charged for their own updates' CPU time."""
+        budget = UpdateBudget(cpu_per_second=1)
+        budget.charge = mock.Mock(wraps=budget.charge)
+        busy_conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        quiet_conn = mock.AsyncMock(spec=WebSocketClientProtocol)
+        busy = RFBClient(busy_conn, self.security_type, budget=budget)
+        quiet = RFBClient(quiet_conn, self.security_type, budget=budget)
+        for rfb in (busy, quiet):
+            rfb.width = rfb.height = 4
+            rfb.pixel_format = self.pf
+        await busy.set_encodings([BusyEncoding])
+        busy_conn.recv.side_effect = [b'\x00\x00\x01' + pack('!HHHHi', 0, 0, 1, 1, 30)]
+        # the quiet session's update is still arriving while the busy one decodes
+        pixels = asyncio.Event()
+        quiet_update = [b'\x00\x00\x01' + pack('!HHHHi', 0, 0, 1, 1, 0), bytes(4)]
+
+        async def recv():
+            if len(quiet_update) == 1:
+                await pixels.wait()
+            return quiet_update.pop(0)
+
+        quiet_conn.recv.side_effect = recv
+
+        async def decode_busy():
+            await asyncio.sleep(0)
+            await busy._handle_framebuffer_update(b'\x00')
+            pixels.set()
+
+        await asyncio.gather(quiet._handle_framebuffer_update(b'\x00'), decode_busy())
+
+        charged = {c.args[0]: c.args[2] for c in budget.charge.call_args_list}
+        assert charged[busy] >= 0.3
+        assert charged[quiet] < 0.1
+
+    async def async_test_continuous_updates(self):
+        """The resend flag uses continuous updates once the server supports them."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.width = 100
+        rfb.height = 100
+        rfb.pixel_format = self.pf
+        await rfb.set_encodings([PseudoContinuousUpdatesEncoding, PseudoFenceEncoding])
+        rfb.resend_flag = True
+        sent = []
+        incoming = asyncio.Queue()
+        self.conn_mock.send.side_effect = sent.append
+        self.conn_mock.recv.side_effect = incoming.get
+        update = pack('!BxHHHHHi', 0, 1, 0, 0, 2, 2, 0) + bytes(16)
+        fbur = pack('!BBHHHH', 3, 1, 0, 0, 100, 100)
+        listening = asyncio.ensure_future(rfb.listen())
+
+        # without support, the next update is requested
+        await incoming.put(update)
+        await asyncio.sleep(0.05)
+        assert sent == [fbur]
+
+        # the server tells it supports them, & asks for a fence
+        sent.clear()
+        await incoming.put(b'\x96')
+        await incoming.put(
+            pack('!BxxxIB', 248, FENCE_REQUEST | FENCE_BLOCK_BEFORE | 1 << 8, 2) + b'hi'
+        )
+        for _ in range(3):
+            await incoming.put(update)
+        await asyncio.sleep(0.05)
+        assert rfb.continuous_updates_supported and rfb.fence_supported
+        assert rfb.continuous
+        assert rfb.frame_seq == 4
+        # enabled for the whole screen, the fence answered with the supported flags
+        assert sent == [
+            pack('!BBHHHH', 150, 1, 0, 0, 100, 100),
+            pack('!BxxxIB', 248, FENCE_BLOCK_BEFORE, 2) + b'hi',
+        ]
+
+        # they can't be throttled, so a frame rate falls back to requests
+        sent.clear()
+        rfb.set_frame_rate(1000)
+        await incoming.put(update)
+        await asyncio.sleep(0.05)
+        assert not rfb.continuous
+        assert sent[0] == pack('!BBHHHH', 150, 0, 0, 0, 100, 100)
+        # requested again once the server confirms they stopped
+        await incoming.put(b'\x96')
+        await asyncio.sleep(0.05)
+        listening.cancel()
+        assert not rfb.continuous
+        assert sent[1:] and set(sent[1:]) == {fbur}
+
+    async def async_test_fbu_desktop_size(self):
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.width = 4
+        rfb.height = 4
+        rfb.pixel_format = self.pf
+        await rfb.set_encodings([PseudoDesktopSizeEncoding])
+        self.conn_mock.send.reset_mock()
+        self.conn_mock.recv.side_effect = [
+            b'\x00\x00\x01' + pack('!HHHHi', 0, 0, 8, 2, -223)
+        ]
+        
+        await rfb._handle_framebuffer_update(b'\x00')
+        
+        assert rfb.img.size == (8, 2)
+        assert (rfb.width, rfb.height) == (8, 2)
+        # requests the whole (new) screen
+        self.conn_mock.send.assert_awaited_once_with(pack("!BBHHHH", 3, 0, 0, 0, 8, 2))
     
+    async def async_test_set_encodings(self):
+        """set_encodings() tells the server & builds the decoder table."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        assert list(rfb.decoders) == [0]
+
+        await rfb.set_encodings([CopyRectEncoding, PseudoDesktopSizeEncoding])
+
+        self.conn_mock.send.assert_awaited_once_with(pack("!BxHii", 2, 2, 1, -223))
+        assert rfb.encs == [CopyRectEncoding, PseudoDesktopSizeEncoding, RawEncoding]
+        assert {t: type(d) for t, d in rfb.decoders.items()} == {
+            1: CopyRectEncoding,
+            -223: PseudoDesktopSizeEncoding,
+            0: RawEncoding,
+        }
+
+    async def async_test_set_encodings_keeps_streams(self):
+        """Setting the encodings again keeps the zlib streams of Tight & ZRLE."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.width = 4
+        rfb.height = 2
+        rfb.pixel_format = self.pf
+        self.pf.depth = 24
+        self.pf.big_endian = 0
+        self.pf.red_shift, self.pf.green_shift, self.pf.blue_shift = 16, 8, 0
+        self.pf.red_max = self.pf.green_max = self.pf.blue_max = 255
+        # server side zlib streams
+        zrle_stream = zlib.compressobj()
+        tight_stream = zlib.compressobj()
+
+        def update(color):
+            # a solid ZRLE tile at (0, 0) & a Tight copy filter rect at (2, 0)
+            zrle = zrle_stream.compress(b'\x01' + color[::-1])
+            zrle += zrle_stream.flush(zlib.Z_SYNC_FLUSH)
+            tight = tight_stream.compress(color * 4)
+            tight += tight_stream.flush(zlib.Z_SYNC_FLUSH)
+            return (
+                b'\x00\x00\x02'
+                + pack('!HHHHi', 0, 0, 2, 2, 16) + pack('!I', len(zrle)) + zrle
+                + pack('!HHHHiB', 2, 0, 2, 2, 7, 0) + bytes([len(tight)]) + tight
+            )
+
+        await rfb.set_encodings([ZRLEEncoding, TightEncoding])
+        decoders = dict(rfb.decoders)
+        self.conn_mock.recv.side_effect = [update(b'\x01\x02\x03')]
+        await rfb._handle_framebuffer_update(b'\x00')
+
+        await rfb.set_encodings([TightEncoding, CopyRectEncoding, ZRLEEncoding])
+        assert rfb.decoders[16] is decoders[16]
+        assert rfb.decoders[7] is decoders[7]
+        assert rfb.decoders[0] is decoders[0]
+        self.conn_mock.recv.side_effect = [update(b'\x04\x05\x06')]
+        await rfb._handle_framebuffer_update(b'\x00')
+        assert rfb.img.getpixel((1, 1)) == (4, 5, 6, 255)
+        assert rfb.img.getpixel((3, 1)) == (4, 5, 6, 255)
+
+        # encodings no longer set are dropped, & get new streams when set again
+        await rfb.set_encodings([TightEncoding])
+        assert 16 not in rfb.decoders
+        await rfb.set_encodings([ZRLEEncoding, TightEncoding])
+        assert rfb.decoders[16] is not decoders[16]
+        assert rfb.decoders[7] is decoders[7]
+
     @mock.patch('wsvnc.server_messages.color_map_entries.ColorMapEntriesMessage.read')
     async def async_test_color_map(self, cme_read):
         rfb = RFBClient(self.conn_mock, self.security_type)
@@ -141,14 +666,100 @@ class TestRFBClient(TestCase):
         cut_text_read.assert_awaited()
         
         
+    async def async_test_key_events(self):
+        """Key events are sent in one write."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        rfb.transport = self.transport_mock
+
+        await rfb.key_events([(65505, True), (65, True), (65, False), (65505, False)])
+        await rfb.key_events([])
+
+        self.transport_mock.send.assert_awaited_once()
+        msg = self.transport_mock.send.await_args.args[0]
+        assert len(msg) == 32
+        assert msg[8:16] == pack("!BBxxI", 4, 1, 65)
+
+    async def async_test_wait_for_cut_text(self):
+        """Waiters wake up once the server sends cut text, or the connection closes."""
+        rfb = RFBClient(self.conn_mock, self.security_type)
+        self.conn_mock.recv.side_effect = [
+            b'\x00\x00\x00\x00\x00\x00\x03ab\xe9',
+            ConnectionClosedOK(None, None),
+        ]
+
+        # cut text is latin-1, text outside of it is sent as UTF-8
+        await rfb.cut_text("é")
+        self.conn_mock.send.assert_awaited_with(pack("!BxxxI", 6, 1) + b"\xe9")
+        await rfb.cut_text("€")
+        self.conn_mock.send.assert_awaited_with(pack("!BxxxI", 6, 3) + "€".encode())
+        waiter = asyncio.ensure_future(rfb.wait_for_cut_text())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        await rfb._handle_server_cut_text(b'\x03')
+        assert await waiter == 'abé'
+        assert rfb.clipboard == 'abé'
+        assert rfb.cut_text_seq == 1
+        with pytest.raises(TimeoutError):
+            await rfb.wait_for_cut_text(timeout=0.01)
+
+        waiter = asyncio.ensure_future(rfb.wait_for_cut_text())
+        await asyncio.sleep(0)
+        await rfb.listen()
+        with pytest.raises(ConnectionError):
+            await waiter
+
     def test_handshake(self):
         asyncio.run(self.async_test_handshake())
+    def test_wait_for_cut_text(self):
+        asyncio.run(self.async_test_wait_for_cut_text())
+    def test_key_events(self):
+        asyncio.run(self.async_test_key_events())
+    def test_handshake_keeps_trailing_message(self):
+        asyncio.run(self.async_test_handshake_keeps_trailing_message())
+
     def test_bad_handshake(self):
         asyncio.run(self.async_test_handshake_fail())
     def test_listen(self):
         asyncio.run(self.async_test_listen())
+    def test_listen_coalesced_and_split(self):
+        asyncio.run(self.async_test_listen_coalesced_and_split())
+    def test_listen_unknown_message(self):
+        asyncio.run(self.async_test_listen_unknown_message())
     def test_fbu(self):
         asyncio.run(self.async_test_fbu())
+    def test_fbu_decodes_into_framebuffer(self):
+        asyncio.run(self.async_test_fbu_decodes_into_framebuffer())
+    def test_get_changes_since(self):
+        asyncio.run(self.async_test_get_changes_since())
+    def test_pseudo_rects_not_damage(self):
+        asyncio.run(self.async_test_pseudo_rects_not_damage())
+    def test_fbu_decode_executor(self):
+        asyncio.run(self.async_test_fbu_decode_executor())
+    def test_wait_for_update(self):
+        asyncio.run(self.async_test_wait_for_update())
+    def test_request_answer_after_written(self):
+        asyncio.run(self.async_test_request_answer_after_written())
+    def test_wait_until_stable(self):
+        asyncio.run(self.async_test_wait_until_stable())
+    def test_subscriptions(self):
+        asyncio.run(self.async_test_subscriptions())
+    def test_frame_rate_and_pause(self):
+        asyncio.run(self.async_test_frame_rate_and_pause())
+    def test_update_budget(self):
+        asyncio.run(self.async_test_update_budget())
+
+    def test_update_budget_sessions(self):
+        asyncio.run(self.async_test_update_budget_sessions())
+    def test_continuous_updates(self):
+        asyncio.run(self.async_test_continuous_updates())
+    def test_fbu_desktop_size(self):
+        asyncio.run(self.async_test_fbu_desktop_size())
+    def test_set_encodings(self):
+        asyncio.run(self.async_test_set_encodings())
+
+    def test_set_encodings_keeps_streams(self):
+        asyncio.run(self.async_test_set_encodings_keeps_streams())
+
     def test_color_map(self):
         asyncio.run(self.async_test_color_map())
     def test_cut_text(self):
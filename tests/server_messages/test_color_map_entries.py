@@ -3,6 +3,8 @@
 import asyncio
 from unittest import TestCase, mock
 
+from websockets import WebSocketClientProtocol
+
 from wsvnc.color import Color
 from wsvnc.server_messages.color_map_entries import ColorMapEntriesMessage
 from wsvnc.utils.safe_transport import SafeTransport
@@ -10,7 +12,8 @@ from wsvnc.utils.safe_transport import SafeTransport
 
 class TestColorMapMessage(TestCase):
     def setUp(self):
-        self.transport_mock = mock.Mock(spec=SafeTransport)
+        self.conn_mock = mock.AsyncMock(spec=WebSocketClientProtocol)
+        self.transport = SafeTransport(self.conn_mock)
         self.test_color = Color(r=1,g=2,b=3)
 
 
@@ -19,8 +22,8 @@ class TestColorMapMessage(TestCase):
         cmem = ColorMapEntriesMessage()
         # message here is padding=[0] fist_color=[1:3]=0, num_colors=[3:5]=1, color=RGB=1,2,3
         msg = b'\x00\x00\x00\x00\x01\x00\x01\x00\x02\x00\x03'
-        self.transport_mock.recvd = mock.AsyncMock(return_value=msg[5:])
-        await cmem.read(self.transport_mock, msg)
+        await cmem.read(self.transport, msg)
+        self.conn_mock.recv.assert_not_awaited()
         
         self.assertEqual(cmem.color_map[0].r, self.test_color.r)
         self.assertEqual(cmem.color_map[0].g, self.test_color.g)
@@ -31,8 +34,8 @@ class TestColorMapMessage(TestCase):
         cmem = ColorMapEntriesMessage()
         # message here is padding=[0] fist_color=[1:3]=0, num_colors=[3:5]=1, color=RGB=1,2,3
         msg = b'\x00\x00\x00\x00\x01\x00\x01\x00\x02'
-        self.transport_mock.recvd = mock.AsyncMock(return_value=msg[5:] + b'\x00\x03')
-        await cmem.read(self.transport_mock, msg)
+        self.conn_mock.recv.side_effect = [b'\x00\x03']
+        await cmem.read(self.transport, msg)
         
         
         self.assertEqual(cmem.color_map[0].r, self.test_color.r)
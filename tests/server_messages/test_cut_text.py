@@ -3,13 +3,16 @@
 import asyncio
 from unittest import TestCase, mock
 
+from websockets import WebSocketClientProtocol
+
 from wsvnc.server_messages.cut_text import CutTextMessage
 from wsvnc.utils.safe_transport import SafeTransport
 
 
 class TestCutTextMessage(TestCase):
     def setUp(self):
-        self.transport_mock = mock.Mock(spec=SafeTransport)
+        self.conn_mock = mock.AsyncMock(spec=WebSocketClientProtocol)
+        self.transport = SafeTransport(self.conn_mock)
 
 
     async def async_test_message_no_transport(self):
@@ -17,20 +20,20 @@ class TestCutTextMessage(TestCase):
         ctm = CutTextMessage()
         # message here is padding=[0:3] text_len=[3:7]=3 text='abc'
         msg = b'\x00\x00\x00\x00\x00\x00\x03abc'
-        self.transport_mock.recvd = mock.AsyncMock(return_value=b'abc')
-        await ctm.read(self.transport_mock, msg)
+        await ctm.read(self.transport, msg)
         
-        assert ctm.cut_text == b'abc'
+        assert ctm.cut_text == 'abc'
+        self.conn_mock.recv.assert_not_awaited()
         
     async def async_test_message_need_transport(self):
         """Test cut text server message but wait for extra data from connection."""
         ctm = CutTextMessage()
         # message here is padding=[0:3] text_len=[3:7]=3 text='abc'
         msg = b'\x00\x00\x00\x00\x00\x00\x03'
-        self.transport_mock.recvd = mock.AsyncMock(return_value=b'abc')
-        await ctm.read(self.transport_mock, msg)
+        self.conn_mock.recv.side_effect = [b'ab', b'c']
+        await ctm.read(self.transport, msg)
         
-        assert ctm.cut_text == b'abc'
+        assert ctm.cut_text == 'abc'
     
     def test_type(self):
         """Verify type."""
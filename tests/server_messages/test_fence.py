@@ -0,0 +1,53 @@
+"""Unit tests for FenceMessage & EndOfContinuousUpdatesMessage classes."""
+
+import asyncio
+from struct import pack
+from unittest import TestCase, mock
+
+from websockets import WebSocketClientProtocol
+
+from wsvnc.server_messages.end_of_continuous_updates import (
+    EndOfContinuousUpdatesMessage,
+)
+from wsvnc.server_messages.fence import (
+    FENCE_BLOCK_BEFORE,
+    FENCE_REQUEST,
+    FenceMessage,
+)
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+class TestFenceMessage(TestCase):
+    def setUp(self):
+        self.conn_mock = mock.AsyncMock(spec=WebSocketClientProtocol)
+        self.transport = SafeTransport(self.conn_mock)
+
+    async def async_test_message(self):
+        """Test fence server message split over several websocket messages."""
+        fence = FenceMessage()
+        # message here is padding=[0:3] flags=[3:7] length=[7] payload='abc'
+        msg = pack('>xxxIB', FENCE_REQUEST | FENCE_BLOCK_BEFORE, 3)
+        self.conn_mock.recv.side_effect = [msg[:4], msg[4:] + b'ab', b'c\x02']
+        await fence.read(self.transport, b'')
+
+        assert fence.flags == FENCE_REQUEST | FENCE_BLOCK_BEFORE
+        assert fence.payload == b'abc'
+        assert fence.request
+        # the next message is left on the stream
+        assert self.transport.buffered() == 1
+
+    async def async_test_end_of_continuous_updates(self):
+        """The message has no payload."""
+        self.conn_mock.recv.reset_mock()
+        eocu = EndOfContinuousUpdatesMessage()
+        await eocu.read(self.transport, b'')
+        self.conn_mock.recv.assert_not_awaited()
+
+    def test_type(self):
+        """Verify types."""
+        assert FenceMessage().type() == 248
+        assert EndOfContinuousUpdatesMessage().type() == 150
+
+    def test(self):
+        asyncio.run(self.async_test_message())
+        asyncio.run(self.async_test_end_of_continuous_updates())
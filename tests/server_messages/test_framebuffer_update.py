@@ -1,16 +1,77 @@
 """Unit tests for FrameBufferUpdate class."""
 
 import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from os import urandom
+from struct import pack
 from unittest import TestCase, mock
 
+import numpy as np
+import pytest
+from PIL import Image
+from websockets import WebSocketClientProtocol
+
+from wsvnc.encodings.copyrect_encoding import CopyRectEncoding
+from wsvnc.encodings.encoding_interface import EncodingInterface
+from wsvnc.encodings.raw_encoding import RawEncoding
+from wsvnc.encodings.tightpng_encoding import TightPNGEncoding
+from wsvnc.exceptions.encoding_exception import PixelEncodingError
+from wsvnc.framebuffer import FrameBuffer
 from wsvnc.pixel_format import PixelFormat
-from wsvnc.server_messages.framebuffer_update import FrameBufferUpdate
+from wsvnc.server_messages.framebuffer_update import FrameBufferUpdate, build_decoders
 from wsvnc.utils.safe_transport import SafeTransport
 
 
+class LegacyEncoding(EncodingInterface):
+    """Only implements fetch_additional_data() & read()."""
+
+    def type(self):
+        return 30
+
+    async def fetch_additional_data(self, width, height, transport, msg, pf):
+        return await transport.recvd(msg, 2)
+
+    def read(self, width, height, msg, pf):
+        self.data = bytes(msg[:2])
+        return 2
+
+
+class OtherLegacyEncoding(LegacyEncoding):
+    """Shares LegacyEncoding's type."""
+
+
+class BytesLegacyEncoding(LegacyEncoding):
+    """Treats its message as bytes, like encodings written for the baseline did."""
+
+    async def fetch_additional_data(self, width, height, transport, msg, pf):
+        msg = await transport.recvd(msg, 1)
+        if len(msg) < 2:
+            msg = msg + await transport.recv()
+        return msg
+
+    def read(self, width, height, msg, pf):
+        assert msg.startswith(b'a') or msg.find(b'd') == 0
+        self.data = msg[:2] + b'.'
+        return 2
+
+
+def tightpng_rect(x, y, w, h, sub, data):
+    n = len(data)
+    length = bytes([n & 0x7F | 0x80, n >> 7 & 0x7F | 0x80, n >> 14])
+    return pack("!HHHHi", x, y, w, h, -260) + bytes([sub]) + length + data
+
+
+def image_bytes(w, h, fmt):
+    buffer = BytesIO()
+    Image.frombytes("RGB", (w, h), urandom(w * h * 3)).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
 class TestFrameBufferUpdateMessage(TestCase):
     def setUp(self):
-        self.transport_mock = mock.Mock(spec=SafeTransport)
+        self.conn_mock = mock.AsyncMock(spec=WebSocketClientProtocol)
+        self.transport = SafeTransport(self.conn_mock)
         self.pf = PixelFormat()
         self.pf.bpp=32
         self.pf.big_endian=1
@@ -31,8 +92,8 @@ class TestFrameBufferUpdateMessage(TestCase):
         msg = b'\x00\x00\x01'
         rect = b'\x00\x00\x00\x00\x00\x01\x00\x01\x00\x00\x00\x00'
         pixel=b'\x00\x01\x00\x02'
-        self.transport_mock.recvd = mock.AsyncMock(side_effect=[rect+pixel, pixel])
-        await fbu.read(self.transport_mock, msg+rect+pixel)
+        await fbu.read(self.transport, msg+rect+pixel)
+        self.conn_mock.recv.assert_not_awaited()
         
         assert len(fbu.rectangles) == 1
         assert fbu.rectangles[0].enc.img.getpixel((0, 0)) == (0,255,0,255)
@@ -47,13 +108,137 @@ class TestFrameBufferUpdateMessage(TestCase):
         rect = b'\x00\x00\x00\x00\x00\x01\x00\x01\x00\x00\x00\x00'
         #pixel=b'\x00\x01\x00\x02'
         # this will cuase the fbu to wait for the transport to return pixel data.
-        self.transport_mock.recvd = mock.AsyncMock(side_effect=[rect, b'\x00\x01\x00\x02'])
-        await fbu.read(self.transport_mock, msg+rect)
+        self.conn_mock.recv.side_effect = [b'\x00\x01', b'\x00\x02']
+        await fbu.read(self.transport, msg+rect)
         
         assert len(fbu.rectangles) == 1
         assert fbu.rectangles[0].enc.img.getpixel((0, 0)) == (0,255,0,255)
         assert fbu.rectangles[0].height == fbu.rectangles[0].width == 1
     
+    async def async_test_message_leaves_next_message(self):
+        """Bytes after the last rectangle stay on the stream for the next message."""
+        fbu = FrameBufferUpdate(self.pf)
+        msg = b'\x00\x00\x01'
+        rect = b'\x00\x00\x00\x00\x00\x01\x00\x01\x00\x00\x00\x00'
+        pixel = b'\x00\x01\x00\x02'
+        await fbu.read(self.transport, msg+rect+pixel+b'\x02')
+
+        assert len(fbu.rectangles) == 1
+        assert bytes(await self.transport.read_exact(1)) == b'\x02'
+
+    async def async_test_legacy_encoding(self):
+        """Encodings without read_stream() get the buffered bytes as their message."""
+        fbu = FrameBufferUpdate(self.pf, [LegacyEncoding])
+        msg = b'\x00\x00\x02'
+        rect = b'\x00\x00\x00\x00\x00\x01\x00\x01\x00\x00\x00\x1e'
+        self.conn_mock.recv.side_effect = [b'b' + rect + b'def']
+        await fbu.read(self.transport, msg + rect + b'a')
+
+        assert [r.enc.data for r in fbu.rectangles] == [b'ab', b'de']
+        assert self.transport.buffered() == 1
+
+    async def async_test_legacy_encoding_bytes(self):
+        """Legacy encodings get bytes they can concatenate onto & search."""
+        fbu = FrameBufferUpdate(self.pf, [BytesLegacyEncoding])
+        msg = b'\x00\x00\x02'
+        rect = b'\x00\x00\x00\x00\x00\x01\x00\x01\x00\x00\x00\x1e'
+        transport = SafeTransport(self.conn_mock)
+        self.conn_mock.recv.side_effect = [b'b', rect + b'def']
+        await fbu.read(transport, msg + rect + b'a')
+
+        assert [r.enc.data for r in fbu.rectangles] == [b'ab.', b'de.']
+        assert transport.buffered() == 1
+
+    async def async_test_legacy_encoding_many_rects(self):
+        """Legacy rectangles in one websocket message are read one after another."""
+        fbu = FrameBufferUpdate(self.pf, [LegacyEncoding])
+        rect = b'\x00\x00\x00\x00\x00\x01\x00\x01\x00\x00\x00\x1e'
+        transport = SafeTransport(self.conn_mock)
+        await fbu.read(transport, b'\x00\x03\xe8' + (rect + b'ab') * 1000)
+
+        assert len(fbu.rectangles) == 1000
+        assert transport.buffered() == 0
+
+    async def async_test_decoders_persist(self):
+        """Rectangles are dispatched to the same decoder instance."""
+        decoders = build_decoders([RawEncoding])
+        rect = b'\x00\x00\x00\x00\x00\x01\x00\x01\x00\x00\x00\x00'
+        pixel = b'\x00\x01\x00\x02'
+        for _ in range(2):
+            fbu = FrameBufferUpdate(self.pf, fb=FrameBuffer(1, 1), decoders=decoders)
+            await fbu.read(self.transport, b'\x00\x00\x02' + (rect + pixel) * 2)
+            assert [r.enc for r in fbu.rectangles] == [decoders[0], decoders[0]]
+
+    async def async_test_unknown_encoding(self):
+        fbu = FrameBufferUpdate(self.pf)
+        rect = b'\x00\x00\x00\x00\x00\x01\x00\x01\x00\x00\x00\x07'
+        with pytest.raises(PixelEncodingError):
+            await fbu.read(self.transport, b'\x00\x00\x01' + rect)
+
+    def executor_update(self):
+        """Overlapping rectangles, some decoded in jobs & some inline."""
+        rects = [
+            tightpng_rect(0, 0, 8, 8, 0xA0, image_bytes(8, 8, "PNG")),
+            tightpng_rect(2, 2, 4, 4, 0x90, image_bytes(4, 4, "JPEG")),
+            # fill over part of both
+            pack("!HHHHi", 4, 0, 2, 6, -260) + b"\x80\x01\x02\x03",
+            # CopyRect is decoded inline, after the rectangles above are drawn
+            pack("!HHHHi", 0, 4, 4, 4, 1) + pack("!HH", 3, 1),
+            pack("!HHHHi", 1, 1, 2, 2, 0) + urandom(2 * 2 * 4),
+            tightpng_rect(0, 0, 4, 4, 0xA0, image_bytes(4, 4, "PNG")),
+        ]
+        return b"\x00" + pack("!H", len(rects)) + b"".join(rects)
+
+    async def async_test_executor(self, executor):
+        """Decoding in an executor draws the same screen as decoding inline."""
+        self.pf.red_max = self.pf.green_max = self.pf.blue_max = 255
+        encs = [TightPNGEncoding, CopyRectEncoding, RawEncoding]
+        update = self.executor_update()
+        screens = []
+        for pool in (None, executor):
+            fb = FrameBuffer(8, 8)
+            fbu = FrameBufferUpdate(self.pf, encs, fb, executor=pool)
+            transport = SafeTransport(self.conn_mock)
+            await fbu.read(transport, update + b"\x05")
+            assert len(fbu.rectangles) == 6
+            assert transport.buffered() == 1
+            screens.append(fb.pixels)
+        assert np.array_equal(screens[0], screens[1])
+        assert screens[1][0, 4].tolist() == [1, 2, 3, 255]
+
+    async def async_test_executor_error(self, executor):
+        """A rectangle that fails to decode fails the update."""
+        fbu = FrameBufferUpdate(
+            self.pf, [TightPNGEncoding], FrameBuffer(4, 4), executor=executor
+        )
+        rect = tightpng_rect(0, 0, 4, 4, 0xA0, b"not a png")
+        with pytest.raises(Exception):
+            await fbu.read(SafeTransport(self.conn_mock), b"\x00\x00\x01" + rect)
+
+    def test_executor(self):
+        with ThreadPoolExecutor(2) as executor:
+            asyncio.run(self.async_test_executor(executor))
+            asyncio.run(self.async_test_executor_error(executor))
+        with ProcessPoolExecutor(2) as executor:
+            asyncio.run(self.async_test_executor(executor))
+
+    def test_build_decoders(self):
+        """The first encoding listed for a type wins."""
+        decoders = build_decoders([LegacyEncoding, RawEncoding, OtherLegacyEncoding])
+        assert list(decoders) == [30, 0]
+        assert type(decoders[30]) is LegacyEncoding
+
+    def test_build_decoders_keeps_current(self):
+        """Decoders of the current table are kept if their encoding still is."""
+        current = build_decoders([LegacyEncoding, RawEncoding])
+        decoders = build_decoders([CopyRectEncoding, RawEncoding, LegacyEncoding], current)
+        assert list(decoders) == [1, 0, 30]
+        assert decoders[0] is current[0]
+        assert decoders[30] is current[30]
+        # another encoding of the same type gets its own decoder
+        decoders = build_decoders([OtherLegacyEncoding], current)
+        assert type(decoders[30]) is OtherLegacyEncoding
+
     def test_type(self):
         """Verify type."""
         fbu = FrameBufferUpdate(self.pf)
@@ -62,3 +247,9 @@ class TestFrameBufferUpdateMessage(TestCase):
     def test(self):
         asyncio.run(self.async_test_message_no_transport())
         asyncio.run(self.async_test_message_need_transport())
+        asyncio.run(self.async_test_message_leaves_next_message())
+        asyncio.run(self.async_test_legacy_encoding())
+        asyncio.run(self.async_test_legacy_encoding_bytes())
+        asyncio.run(self.async_test_legacy_encoding_many_rects())
+        asyncio.run(self.async_test_decoders_persist())
+        asyncio.run(self.async_test_unknown_encoding())
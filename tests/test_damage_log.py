@@ -0,0 +1,96 @@
+"""Unit tests for the damage log."""
+
+from unittest import TestCase
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.damage_log import MAX_EXACT_RECTS, MERGE_GRID, DamageLog, merge_rects
+
+
+def covered(rects, width, height):
+    mask = np.zeros((height, width), dtype=int)
+    for x, y, w, h in rects:
+        mask[y : y + h, x : x + w] += 1
+    return mask
+
+
+class TestMergeRects(TestCase):
+    def test_overlapping_and_adjacent(self):
+        # two overlapping rectangles & one right below them, lined up
+        rects = [(0, 0, 4, 2), (2, 0, 4, 2), (0, 2, 6, 3)]
+        assert merge_rects(rects, 10, 10) == [(0, 0, 6, 5)]
+
+    def test_same_pixels_no_overlap(self):
+        rng = np.random.default_rng(0)
+        rects = [tuple(int(v) for v in r) for r in rng.integers(0, 40, (30, 4))]
+        merged = merge_rects(rects, 50, 50)
+        expected = covered(rects, 50, 50) > 0
+        result = covered(merged, 50, 50)
+        assert result.max() == 1
+        assert ((result > 0) == expected).all()
+
+    def test_clipped(self):
+        assert merge_rects([(8, 8, 5, 5), (20, 0, 2, 2), (0, 0, 0, 3)], 10, 10) == [
+            (8, 8, 2, 2)
+        ]
+        assert merge_rects([], 10, 10) == []
+
+    def test_many_rects_snapped(self):
+        """Lots of little rectangles are grown out to the merge grid."""
+        rects = [(x * 3, 0, 1, 1) for x in range(MAX_EXACT_RECTS + 1)]
+        width = rects[-1][0] + 1
+        merged = merge_rects(rects, width, 100)
+        assert merged == [(0, 0, width, MERGE_GRID)]
+
+
+class TestDamageLog(TestCase):
+    def test_changes(self):
+        log = DamageLog(size=4)
+        screen = Image.new("RGBA", (10, 10), (1, 2, 3, 255))
+        assert not log.changes(0)
+        log.record(1, [(0, 0, 2, 2)], screen)
+        log.record(2, [], screen)
+        log.record(3, [(2, 0, 2, 2)], screen)
+
+        changes = log.changes(0, pixels=True)
+        assert (changes.since, changes.seq) == (0, 3)
+        assert changes.regions == [(0, 0, 4, 2)]
+        assert changes.images[0].size == (4, 2)
+        assert log.changes(1).regions == [(2, 0, 2, 2)]
+        assert log.changes(2).regions == [(2, 0, 2, 2)]
+        assert log.changes(3).regions == []
+
+    def test_forgotten(self):
+        """Changes older than the log are the whole screen."""
+        log = DamageLog(size=2)
+        screen = Image.new("RGBA", (10, 10))
+        for seq in range(1, 4):
+            log.record(seq, [(seq, seq, 1, 1)], screen)
+        assert log.changes(0).regions == [(0, 0, 10, 10)]
+        assert log.changes(1).regions == [(2, 2, 1, 1), (3, 3, 1, 1)]
+
+    def test_pixels_match_seq(self):
+        """Pixels come from the screen recorded with the sequence number."""
+        log = DamageLog()
+        log.record(1, [(0, 0, 1, 1)], Image.new("RGBA", (2, 2), (1, 1, 1, 255)))
+        changes = log.changes(0, pixels=True)
+        log.record(2, [(0, 0, 1, 1)], Image.new("RGBA", (2, 2), (2, 2, 2, 255)))
+        assert changes.images[0].getpixel((0, 0)) == (1, 1, 1, 255)
+        assert log.changes(0, pixels=True).images[0].getpixel((0, 0)) == (2, 2, 2, 255)
+
+    def test_touches(self):
+        log = DamageLog(size=2)
+        screen = Image.new("RGBA", (10, 10))
+        log.record(1, [(0, 0, 2, 2)], screen)
+        log.record(2, [], screen)
+        log.record(3, [(5, 5, 2, 2)], screen)
+        assert log.touches(0, (1, 1, 1, 1))
+        assert not log.touches(1, (1, 1, 1, 1))
+        assert log.touches(1, (6, 0, 1, 6))
+        assert not log.touches(1, (7, 0, 3, 10))
+        assert log.touches(2)
+        assert not log.touches(3)
+        log.record(4, [(9, 9, 1, 1)], screen)
+        # forgotten
+        assert log.touches(0, (0, 0, 1, 1))
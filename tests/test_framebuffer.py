@@ -0,0 +1,139 @@
+"""Unit tests for FrameBuffer class."""
+
+from unittest import TestCase, mock
+
+import numpy as np
+from PIL import Image
+
+from wsvnc.framebuffer import DAMAGE_HISTORY, SPARE_BUFFERS, FrameBuffer
+
+
+class TestFrameBuffer(TestCase):
+    def test_img_shares_memory(self):
+        """Writes to the pixels show up in img without copying."""
+        fb = FrameBuffer(4, 3)
+        assert fb.img.size == (4, 3)
+        assert (fb.width, fb.height) == (4, 3)
+        assert fb.img.getpixel((0, 0)) == (0, 0, 0, 0)
+        fb.region(1, 1, 2, 1)[...] = (1, 2, 3, 255)
+        assert fb.img.getpixel((2, 1)) == (1, 2, 3, 255)
+
+    def test_fill(self):
+        fb = FrameBuffer(4, 4)
+        fb.fill(1, 1, 2, 2, (9, 8, 7))
+        assert fb.img.getpixel((2, 2)) == (9, 8, 7, 255)
+        assert fb.img.getpixel((3, 3)) == (0, 0, 0, 0)
+
+    def test_copy_rect_overlapping(self):
+        fb = FrameBuffer(4, 1)
+        fb.pixels[0, :, 0] = [1, 2, 3, 4]
+        fb.copy_rect(0, 0, 1, 0, 3, 1)
+        assert list(fb.pixels[0, :, 0]) == [1, 1, 2, 3]
+
+    def test_paste(self):
+        fb = FrameBuffer(4, 4)
+        fb.paste(Image.new("RGB", (2, 2), (5, 6, 7)), 3, 3)
+        # clipped to the screen
+        assert fb.img.getpixel((3, 3)) == (5, 6, 7, 255)
+        assert fb.img.getpixel((2, 2)) == (0, 0, 0, 0)
+
+    def test_paste_pixels(self):
+        fb = FrameBuffer(4, 4)
+        fb.paste(np.full((2, 3, 4), (5, 6, 7, 255), dtype=np.uint8), 2, 1)
+        assert fb.img.getpixel((3, 2)) == (5, 6, 7, 255)
+        assert fb.img.getpixel((1, 1)) == (0, 0, 0, 0)
+
+    def test_resize(self):
+        fb = FrameBuffer(2, 2)
+        fb.fill(0, 0, 2, 2, (1, 1, 1))
+        fb.resize(5, 1)
+        assert fb.img.size == (5, 1)
+        assert not np.any(fb.pixels)
+
+    def test_snapshot(self):
+        """Snapshots only change on commit, and never once taken."""
+        fb = FrameBuffer(4, 4)
+        blank = fb.snapshot
+        assert blank.size == (4, 4)
+        fb.fill(0, 0, 2, 2, (1, 2, 3))
+        assert fb.snapshot is blank
+        fb.commit([(0, 0, 2, 2)])
+        first = fb.snapshot
+        assert first.getpixel((1, 1)) == (1, 2, 3, 255)
+        assert blank.getpixel((1, 1)) == (0, 0, 0, 0)
+
+        fb.fill(1, 1, 3, 3, (4, 5, 6))
+        fb.commit([(1, 1, 3, 3)])
+        assert first.getpixel((1, 1)) == (1, 2, 3, 255)
+        assert fb.snapshot.getpixel((1, 1)) == (4, 5, 6, 255)
+        assert fb.snapshot.getpixel((0, 0)) == (1, 2, 3, 255)
+
+        # drawing on a snapshot doesn't touch the screen or other snapshots
+        first.paste((9, 9, 9, 255), (0, 0, 4, 4))
+        fb.commit([])
+        assert fb.snapshot.getpixel((0, 0)) == (1, 2, 3, 255)
+
+    def test_snapshot_buffers_reused(self):
+        """Buffers no one holds are brought up to date & reused."""
+        rng = np.random.default_rng(0)
+        fb = FrameBuffer(20, 10)
+        held = []
+        for i in range(40):
+            x, y = rng.integers(0, 20), rng.integers(0, 10)
+            w, h = rng.integers(1, 8, 2)
+            fb.fill(x, y, w, h, tuple(int(c) for c in rng.integers(0, 256, 3)))
+            fb.commit([(x, y, w, h)])
+            # readers hold on to some snapshots for a while
+            if i % 7 == 0:
+                held.append((fb.snapshot, fb.pixels.copy()))
+            if len(held) > 3:
+                img, pixels = held.pop(0)
+                assert np.array_equal(np.asarray(img), pixels)
+            assert np.array_equal(np.asarray(fb.snapshot), fb.pixels)
+        del img
+        held.clear()
+        fb.commit([])
+        assert len(fb._buffers) <= 2 + SPARE_BUFFERS
+
+        # a snapshot too old for the damage history is copied whole
+        old = fb.snapshot
+        for i in range(DAMAGE_HISTORY + 2):
+            fb.fill(i, 0, 1, 1, (i, i, i))
+            fb.commit([(i, 0, 1, 1)])
+        del old
+        fb.fill(0, 5, 20, 1, (7, 7, 7))
+        fb.commit([(0, 5, 20, 1)])
+        fb.commit([])
+        assert np.array_equal(np.asarray(fb.snapshot), fb.pixels)
+
+        # without readers two buffers take turns
+        used = set()
+        for _ in range(5):
+            fb.commit([])
+            used.add(id(fb._buffers[-1]))
+        assert len(used) == 2
+
+    def test_fill_rects(self):
+        """Same as filling the rectangles one by one, scattered or not."""
+        rng = np.random.default_rng(0)
+        rects = np.stack(
+            [
+                rng.integers(-5, 40, 200),
+                rng.integers(-5, 30, 200),
+                rng.integers(0, 20, 200),
+                rng.integers(0, 20, 200),
+            ],
+            axis=1,
+        )
+        colors = rng.integers(0, 256, (200, 3), dtype=np.uint8)
+        expected = FrameBuffer(40, 30)
+        for (x, y, w, h), color in zip(rects, colors):
+            x1, y1 = max(x + w, 0), max(y + h, 0)
+            x, y = max(x, 0), max(y, 0)
+            expected.fill(x, y, x1 - x, y1 - y, tuple(int(c) for c in color))
+
+        for scatter_pixels in (1 << 16, 50):
+            with mock.patch("wsvnc.framebuffer.SCATTER_PIXELS", scatter_pixels):
+                fb = FrameBuffer(40, 30)
+                fb.fill_rects(rects, colors)
+            assert np.array_equal(fb.pixels, expected.pixels)
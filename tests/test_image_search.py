@@ -0,0 +1,111 @@
+"""Unit tests for template search."""
+
+from unittest import TestCase, mock
+
+import numpy as np
+from PIL import Image
+
+from wsvnc import image_search
+from wsvnc.damage_log import DamageLog
+from wsvnc.image_search import SEARCH_TILE, ImageFinder, fft_size, match_scores
+
+
+def screen_of(pixels):
+    rgba = np.full(pixels.shape[:2] + (4,), 255, dtype=np.uint8)
+    rgba[..., :3] = pixels
+    return Image.fromarray(rgba)
+
+
+class TestMatchScores(TestCase):
+    def test_same_as_brute_force(self):
+        rng = np.random.default_rng(0)
+        area = rng.integers(0, 256, (20, 30, 3)).astype(np.float64)
+        template = area[5:9, 7:12].copy()
+        scores = match_scores(area, template)
+        expected = np.array(
+            [
+                [
+                    1 - np.sqrt(((area[y : y + 4, x : x + 5] - template) ** 2).mean()) / 255
+                    for x in range(26)
+                ]
+                for y in range(17)
+            ]
+        )
+        assert scores.shape == (17, 26)
+        assert np.allclose(scores, expected)
+        assert np.unravel_index(np.argmax(scores), scores.shape) == (5, 7)
+
+    def test_fft_size(self):
+        assert fft_size(256) == 256
+        assert fft_size(287) == 288
+        assert fft_size(7) == 8
+
+
+class TestImageFinder(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 256, (600, 700, 3), dtype=np.uint8)
+        self.template = self.pixels[300:320, 400:430].copy()
+        self.log = DamageLog()
+        self.log.record(1, [(0, 0, 700, 600)], screen_of(self.pixels))
+        self.finder = ImageFinder(self.log)
+
+    def test_find(self):
+        match = self.finder.find(self.template)
+        assert (match.x, match.y, match.width, match.height) == (400, 300, 30, 20)
+        assert match.score > 0.999
+        assert match.center == (415, 310)
+        # also as an image
+        assert self.finder.find(Image.fromarray(self.template)).x == 400
+
+    def test_region_and_threshold(self):
+        assert self.finder.find(self.template, region=(400, 300, 30, 20)).x == 400
+        # the match has to fit in the region
+        assert self.finder.find(self.template, region=(401, 300, 30, 20)) is None
+        assert self.finder.find(self.template, region=(0, 0, 300, 300)) is None
+        other = np.zeros((20, 30, 3), dtype=np.uint8)
+        assert self.finder.find(other) is None
+        assert self.finder.find(other, threshold=0) is not None
+
+    def test_no_screen(self):
+        assert ImageFinder(DamageLog()).find(self.template) is None
+
+    def test_only_changed_tiles_searched_again(self):
+        with mock.patch.object(
+            image_search, "match_scores", wraps=image_search.match_scores
+        ) as scores:
+            self.finder.find(self.template)
+            cold = scores.call_count
+            assert cold == 3 * 3  # 700x600 in 256 tiles
+
+            self.finder.find(self.template)
+            assert scores.call_count == cold
+
+            # move the template to the top left, only the tiles there change
+            pixels = self.pixels.copy()
+            pixels[300:320, 400:430] = 0
+            pixels[10:30, 20:50] = self.template
+            self.log.record(
+                2,
+                [(400, 300, 30, 20), (20, 10, 30, 20)],
+                screen_of(pixels),
+            )
+            match = self.finder.find(self.template)
+            assert (match.x, match.y) == (20, 10)
+            # (400, 300) is in tile (1, 1), positions up to 29 left & 19 above of it
+            # see it too, that's still only tile (1, 1)
+            assert scores.call_count == cold + 2
+
+    def test_tiles_edges(self):
+        """Templates spanning tiles are found, at the last positions too."""
+        template = self.pixels[SEARCH_TILE - 5 : SEARCH_TILE + 15, 670:700].copy()
+        match = self.finder.find(template)
+        assert (match.x, match.y) == (670, SEARCH_TILE - 5)
+
+    def test_resize(self):
+        self.finder.find(self.template)
+        pixels = np.zeros((100, 100, 3), dtype=np.uint8)
+        pixels[50:70, 50:80] = self.template
+        self.log.record(2, [(0, 0, 100, 100)], screen_of(pixels))
+        match = self.finder.find(self.template)
+        assert (match.x, match.y) == (50, 50)
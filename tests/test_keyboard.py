@@ -0,0 +1,61 @@
+"""Unit tests for compiling text into key events."""
+
+from struct import unpack
+
+from wsvnc.constants import KEY_Return, KEY_ShiftLeft
+from wsvnc.keyboard import (
+    compile_combo,
+    compile_text,
+    encode_key_events,
+    is_shift_required,
+    keysym,
+)
+
+
+def test_shift_held_across_runs():
+    events = compile_text("aBC!d")
+    assert events == [
+        (ord("a"), True),
+        (ord("a"), False),
+        (KEY_ShiftLeft, True),
+        (ord("B"), True),
+        (ord("B"), False),
+        (ord("C"), True),
+        (ord("C"), False),
+        (ord("!"), True),
+        (ord("!"), False),
+        (KEY_ShiftLeft, False),
+        (ord("d"), True),
+        (ord("d"), False),
+    ]
+
+
+def test_shift_released_at_end():
+    assert compile_text("A")[-1] == (KEY_ShiftLeft, False)
+    assert compile_text("") == []
+
+
+def test_keysyms():
+    assert keysym("\n") == KEY_Return
+    assert keysym("é") == 0xE9
+    assert keysym("€") == 0x010020AC
+    assert is_shift_required("?")
+    assert not is_shift_required("/")
+
+
+def test_encode_key_events():
+    msg = encode_key_events([(KEY_ShiftLeft, True), (ord("A"), False)])
+    assert len(msg) == 16
+    assert unpack("!BBxxI", msg[:8]) == (4, 1, KEY_ShiftLeft)
+    assert unpack("!BBxxI", msg[8:]) == (4, 0, ord("A"))
+
+
+def test_compile_combo():
+    assert compile_combo([1, 2, 3]) == [
+        (1, True),
+        (2, True),
+        (3, True),
+        (3, False),
+        (2, False),
+        (1, False),
+    ]
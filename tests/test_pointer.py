@@ -0,0 +1,36 @@
+"""Unit tests for pointer paths."""
+
+import pytest
+
+from wsvnc.pointer import PointerPath, path_ticks
+
+
+def test_polyline_constant_speed():
+    path = PointerPath([(0, 0), (10, 0), (10, 30)])
+    assert path.at(0) == (0, 0)
+    assert path.at(0.25) == (10, 0)
+    assert path.at(0.5) == (10, 10)
+    assert path.at(1) == (10, 30)
+    assert path.at(2) == (10, 30)
+
+
+def test_bezier():
+    path = PointerPath([(0, 0), (50, 100), (100, 0)], bezier=True)
+    assert path.at(0) == (0, 0)
+    assert path.at(0.5) == (50, 50)
+    assert path.at(1) == (100, 0)
+
+
+def test_single_point():
+    assert PointerPath([(3, 4)]).at(0.5) == (3, 4)
+    assert PointerPath([(3, 4), (3, 4)]).sample(1.0) == []
+    with pytest.raises(ValueError):
+        PointerPath([])
+
+
+def test_sample():
+    path = PointerPath.line(0, 0, 100, 0)
+    assert path.sample(0.1, rate=50) == [(20, 0), (40, 0), (60, 0), (80, 0), (100, 0)]
+    # positions aren't repeated
+    assert PointerPath.line(0, 0, 2, 0).sample(1.0, rate=50) == [(1, 0), (2, 0)]
+    assert path_ticks(0, 60) == 1
@@ -0,0 +1,109 @@
+"""Unit tests for the update budget."""
+
+import asyncio
+from unittest import TestCase, mock
+
+import pytest
+
+from wsvnc import update_budget
+from wsvnc.update_budget import ACTIVE_WINDOW, CPUMeter, UpdateBudget
+
+
+class TestUpdateBudget(TestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch.object(
+            update_budget.time, "monotonic", side_effect=lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_delay_repays_debt(self):
+        budget = UpdateBudget(bytes_per_second=1000)
+        session = object()
+        assert budget.delay(session) == 0
+        budget.charge(session, 500, 0.1)
+        assert budget.delay(session) == pytest.approx(0.5)
+        self.now += 0.2
+        assert budget.delay(session) == pytest.approx(0.3)
+        self.now += 1
+        assert budget.delay(session) == 0
+
+    def test_cpu(self):
+        budget = UpdateBudget(bytes_per_second=1e6, cpu_per_second=0.5)
+        session = object()
+        budget.charge(session, 1000, 0.25)
+        # the CPU time takes longer to pay off than the bytes
+        assert budget.delay(session) == pytest.approx(0.5)
+
+    def test_fair_share(self):
+        budget = UpdateBudget(bytes_per_second=1000)
+        busy, quiet = object(), object()
+        budget.charge(busy, 1000, 0)
+        budget.charge(quiet, 100, 0)
+        # each gets half of the rate while both are receiving updates
+        assert budget.delay(busy) == pytest.approx(2)
+        assert budget.delay(quiet) == pytest.approx(0.2)
+
+        # once the quiet one stops, the busy one gets all of it
+        self.now += ACTIVE_WINDOW + 1
+        budget.charge(busy, 1000, 0)
+        assert budget.delay(busy) == pytest.approx(1)
+
+    def test_remove(self):
+        budget = UpdateBudget(cpu_per_second=1)
+        session = object()
+        budget.charge(session, 10, 1)
+        assert budget.delay(session) == pytest.approx(1)
+        budget.remove(session)
+        assert budget.delay(session) == 0
+        budget.remove(session)
+
+    def test_unlimited_and_invalid(self):
+        session = object()
+        budget = UpdateBudget()
+        budget.charge(session, 10**9, 100)
+        assert budget.delay(session) == 0
+        with pytest.raises(ValueError):
+            UpdateBudget(bytes_per_second=0)
+        with pytest.raises(ValueError):
+            UpdateBudget(cpu_per_second=-1)
+
+
+class TestCPUMeter(TestCase):
+    async def async_test_measure(self):
+        """Steps are timed, suspensions aren't, results & exceptions pass through."""
+        meter = CPUMeter()
+        clock = iter(range(100))
+
+        async def step(result):
+            await asyncio.sleep(0)
+            return result
+
+        async def failing():
+            await asyncio.sleep(0)
+            raise ValueError("bad")
+
+        async def catching():
+            try:
+                await asyncio.wait_for(asyncio.Event().wait(), 0)
+            except asyncio.TimeoutError:
+                return "timed out"
+
+        with mock.patch.object(update_budget.time, "thread_time", lambda: next(clock)):
+            assert await meter.measure(step(5)) == 5
+            # two steps, one second each on the fake clock
+            assert meter.cpu == 2
+            with pytest.raises(ValueError):
+                await meter.measure(failing())
+            assert meter.cpu == 4
+            assert await meter.measure(catching()) == "timed out"
+
+        task = asyncio.ensure_future(meter.measure(asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    def test_measure(self):
+        asyncio.run(self.async_test_measure())
@@ -0,0 +1,219 @@
+"""Unit tests for SafeTransport class."""
+
+import asyncio
+from unittest import TestCase, mock
+
+import pytest
+from websockets import WebSocketClientProtocol
+
+from wsvnc.utils.safe_transport import SafeTransport
+
+
+class TestSafeTransport(TestCase):
+    def setUp(self):
+        self.conn_mock = mock.AsyncMock(spec=WebSocketClientProtocol)
+        self.transport = SafeTransport(self.conn_mock)
+
+    async def async_test_read_exact_within_chunk(self):
+        """Reads inside one websocket message don't copy."""
+        self.conn_mock.recv.side_effect = [b'abcdef']
+        assert bytes(await self.transport.read_exact(2)) == b'ab'
+        assert bytes(await self.transport.read_exact(4)) == b'cdef'
+        assert self.transport.bytes_copied == 0
+        assert self.transport.buffered() == 0
+
+    async def async_test_read_exact_across_chunks(self):
+        """Reads spanning websocket messages wait for and join the data."""
+        self.conn_mock.recv.side_effect = [b'ab', b'cd', b'ef']
+        assert bytes(await self.transport.read_exact(5)) == b'abcde'
+        assert self.transport.bytes_copied == 5
+        assert bytes(await self.transport.read_exact(1)) == b'f'
+
+    async def async_test_peek_and_skip(self):
+        self.conn_mock.recv.side_effect = [b'abc', b'def']
+        assert bytes(await self.transport.peek(4)) == b'abcd'
+        # peeking doesn't consume & the joined chunk is reused
+        assert bytes(await self.transport.read_exact(4)) == b'abcd'
+        assert self.transport.bytes_copied == 4
+        self.transport.feed(b'gh')
+        await self.transport.skip(3)
+        assert bytes(await self.transport.read_exact(1)) == b'h'
+
+    async def async_test_unread_and_take_buffered(self):
+        self.transport.feed(b'cd')
+        self.transport.unread(b'ab')
+        assert self.transport.buffered() == 4
+        assert self.transport.take_buffered() == b'abcd'
+        assert self.transport.buffered() == 0
+
+    async def async_test_recvd(self):
+        self.conn_mock.recv.side_effect = [b'cdef']
+        msg = b'ab'
+        assert await self.transport.recvd(msg, 1) is msg
+        data = await self.transport.recvd(memoryview(b'ab'), 4)
+        assert type(data) is bytes and data == b'abcd'
+        data = await self.transport.recvd(memoryview(b'ab'), 2)
+        assert type(data) is bytes and data == b'ab'
+        assert self.transport.buffered() == 2
+
+    async def async_test_recv_drains_buffer_first(self):
+        self.conn_mock.recv.side_effect = [b'cd']
+        self.transport.feed(b'ab')
+        assert await self.transport.recv() == b'ab'
+        assert await self.transport.recv() == b'cd'
+
+    async def async_test_recv_not_bytes(self):
+        self.conn_mock.recv.side_effect = ['text']
+        with pytest.raises(ValueError):
+            await self.transport.read_exact(1)
+
+    async def async_test_send_right_away(self):
+        """Without coalescing every message is its own websocket message."""
+        await self.transport.send(b'ab')
+        await self.transport.send(b'cd')
+        assert self.conn_mock.send.await_args_list == [mock.call(b'ab'), mock.call(b'cd')]
+        assert self.transport.frames_sent == self.transport.messages_sent == 2
+
+    async def async_test_send_coalesced(self):
+        """Messages within the window go out together, in order."""
+        transport = SafeTransport(self.conn_mock, coalesce_window=0.01)
+        await transport.send(b'ab')
+        await transport.send(b'cd')
+        self.conn_mock.send.assert_not_awaited()
+        await asyncio.sleep(0.05)
+        self.conn_mock.send.assert_awaited_once_with(b'abcd')
+        await transport.send(b'ef')
+        await transport.flush()
+        self.conn_mock.send.assert_awaited_with(b'ef')
+        assert transport.frames_sent == 2
+        assert transport.messages_sent == 3
+
+    async def async_test_hold(self):
+        """Held messages are sent once the last hold is released."""
+        self.transport.hold()
+        self.transport.hold()
+        await self.transport.send(b'ab')
+        self.transport.release()
+        await self.transport.send(b'cd')
+        await asyncio.sleep(0)
+        self.conn_mock.send.assert_not_awaited()
+        assert self.transport.held()
+        self.transport.release()
+        assert not self.transport.held()
+        await asyncio.sleep(0)
+        self.conn_mock.send.assert_awaited_once_with(b'abcd')
+
+    async def async_test_supersede(self):
+        """A queued message is replaced by the next one with the same key only."""
+        transport = SafeTransport(self.conn_mock, coalesce_window=0)
+        await transport.send(b'a', 'move')
+        await transport.send(b'b', 'move')
+        await transport.send(b'c')
+        await transport.send(b'd', 'move')
+        await transport.send(b'e', 'drag')
+        await transport.send(b'f', 'drag')
+        await transport.flush()
+        self.conn_mock.send.assert_awaited_once_with(b'bcdf')
+        assert transport.messages_superseded == 2
+        # nothing is replaced once it's sent
+        await transport.send(b'g', 'drag')
+        await transport.flush()
+        self.conn_mock.send.assert_awaited_with(b'g')
+
+    async def async_test_flush_in_order(self):
+        """Sending after a release waits for the released messages to be sent."""
+        self.transport.hold()
+        await self.transport.send(b'ab')
+        self.transport.release()
+        await self.transport.send(b'cd')
+        await self.transport.send(b'ef')
+        assert self.conn_mock.send.await_args_list == [
+            mock.call(b'ab'),
+            mock.call(b'cd'),
+            mock.call(b'ef'),
+        ]
+
+    async def async_test_written(self):
+        """written() is done once everything sent so far is written."""
+        transport = SafeTransport(self.conn_mock, coalesce_window=0.01)
+        assert transport.written().done()
+        await transport.send(b'ab')
+        written = transport.written()
+        await transport.send(b'cd')
+        assert transport.written() is written
+        assert not written.done()
+        await written
+        self.conn_mock.send.assert_awaited_once_with(b'abcd')
+
+    async def async_test_written_raises(self):
+        """Failures are raised by written() & the flushes covering the messages."""
+        transport = SafeTransport(self.conn_mock, coalesce_window=0)
+        self.conn_mock.send.side_effect = ConnectionError
+        await transport.send(b'ab')
+        with pytest.raises(ConnectionError):
+            await transport.flush()
+        with pytest.raises(ConnectionError):
+            await transport.written()
+        # nothing this flush covers failed
+        await transport.flush()
+
+        # a message still being flushed in the background is covered
+        transport.hold()
+        await transport.send(b'cd')
+        with self.assertLogs('wsvnc.utils.safe_transport', 'ERROR'):
+            transport.release()
+            with pytest.raises(ConnectionError):
+                await transport.flush()
+        await transport.flush()
+
+    async def async_test_flush_failure_logged(self):
+        transport = SafeTransport(self.conn_mock, coalesce_window=0)
+        self.conn_mock.send.side_effect = ConnectionError
+        await transport.send(b'ab')
+        with self.assertLogs('wsvnc.utils.safe_transport', 'ERROR'):
+            await asyncio.sleep(0.01)
+
+    def test_read_exact_within_chunk(self):
+        asyncio.run(self.async_test_read_exact_within_chunk())
+
+    def test_read_exact_across_chunks(self):
+        asyncio.run(self.async_test_read_exact_across_chunks())
+
+    def test_peek_and_skip(self):
+        asyncio.run(self.async_test_peek_and_skip())
+
+    def test_unread_and_take_buffered(self):
+        asyncio.run(self.async_test_unread_and_take_buffered())
+
+    def test_recvd(self):
+        asyncio.run(self.async_test_recvd())
+
+    def test_recv_drains_buffer_first(self):
+        asyncio.run(self.async_test_recv_drains_buffer_first())
+
+    def test_recv_not_bytes(self):
+        asyncio.run(self.async_test_recv_not_bytes())
+
+    def test_send_right_away(self):
+        asyncio.run(self.async_test_send_right_away())
+
+    def test_send_coalesced(self):
+        asyncio.run(self.async_test_send_coalesced())
+
+    def test_hold(self):
+        asyncio.run(self.async_test_hold())
+
+    def test_supersede(self):
+        asyncio.run(self.async_test_supersede())
+
+    def test_flush_in_order(self):
+        asyncio.run(self.async_test_flush_in_order())
+
+    def test_written(self):
+        asyncio.run(self.async_test_written())
+
+    def test_written_raises(self):
+        asyncio.run(self.async_test_written_raises())
+
+    def test_flush_failure_logged(self):
+        asyncio.run(self.async_test_flush_failure_logged())
@@ -0,0 +1,168 @@
+"""Unit tests for AsyncWSVNCClient class."""
+
+import asyncio
+from unittest import TestCase, mock
+
+import pytest
+
+from wsvnc.pointer import PointerPath
+from wsvnc.rfb.rfb_client import RFBClient
+from wsvnc.vnc.async_vnc_client import AsyncWSVNCClient
+
+
+class TestAsyncVNCClient(TestCase):
+    def setUp(self):
+        self.vnc = AsyncWSVNCClient('ws://localhost:5800')
+        self.vnc._rfb_client = mock.Mock(spec=RFBClient)
+
+    @mock.patch('websockets.connect')
+    @mock.patch('wsvnc.vnc.async_vnc_client.RFBClient')
+    def test_connect_and_close(self, patched_rfb_client, patched_connect):
+        """The client connects & listens on the caller's loop, then closes."""
+        rfb_client = patched_rfb_client.return_value
+        rfb_client.handshake = mock.AsyncMock()
+        rfb_client.listen = mock.AsyncMock()
+        rfb_client.close = mock.AsyncMock()
+        patched_connect.side_effect = mock.AsyncMock()
+
+        async def main():
+            async with AsyncWSVNCClient('ws://localhost:5800') as vnc:
+                assert vnc._rfb_client is rfb_client
+            rfb_client.handshake.assert_awaited_once()
+            rfb_client.listen.assert_awaited_once()
+            rfb_client.close.assert_awaited_once()
+
+        asyncio.run(main())
+
+    @mock.patch('websockets.connect')
+    @mock.patch('wsvnc.vnc.async_vnc_client.RFBClient')
+    def test_connect_fail(self, patched_rfb_client, patched_connect):
+        """The websocket is closed if the handshake fails."""
+        conn = mock.Mock()
+        conn.close = mock.AsyncMock()
+        patched_connect.side_effect = mock.AsyncMock(return_value=conn)
+        patched_rfb_client.return_value.handshake = mock.AsyncMock(
+            side_effect=ConnectionError
+        )
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(AsyncWSVNCClient('ws://localhost:5800').connect())
+        conn.close.assert_awaited_once()
+
+    def test_input(self):
+        """Input methods await the RFB client's events in order."""
+        self.vnc._rfb_client.key_event = mock.AsyncMock()
+        self.vnc._rfb_client.pointer_event = mock.AsyncMock()
+
+        async def main():
+            await self.vnc.emit_text("hE1!o")
+            await self.vnc.left_click(5, 6)
+
+        asyncio.run(main())
+        assert self.vnc._rfb_client.key_event.await_count == 14
+        self.vnc._rfb_client.pointer_event.assert_has_awaits(
+            [mock.call(5, 6, 0), mock.call(5, 6, 1), mock.call(5, 6, 0)]
+        )
+
+    def test_drag(self):
+        """Moves along the path hold the button, which is pressed & released exactly."""
+        self.vnc._rfb_client.pointer_event = mock.AsyncMock()
+        self.vnc._rfb_client.transport = mock.Mock()
+        self.vnc._rfb_client.transport.write_backlog.return_value = 0
+        path = PointerPath([(0, 0), (30, 0), (30, 30)])
+
+        asyncio.run(self.vnc.drag(path, 0.05, rate=100))
+        calls = self.vnc._rfb_client.pointer_event.await_args_list
+        assert calls[:2] == [mock.call(0, 0, 0), mock.call(0, 0, 1)]
+        assert calls[-2:] == [
+            mock.call(30, 30, 1, supersede=True),
+            mock.call(30, 30, 0),
+        ]
+        assert all(c.args[2] == 1 and c.kwargs for c in calls[2:-1])
+        assert 3 <= len(calls) - 3 <= 5
+
+        # intermediate moves are skipped while the connection is backed up
+        self.vnc._rfb_client.pointer_event.reset_mock()
+        self.vnc._rfb_client.transport.write_backlog.return_value = 100
+        asyncio.run(self.vnc.drag(path, 0.05, rate=100))
+        assert self.vnc._rfb_client.pointer_event.await_args_list == [
+            mock.call(0, 0, 0),
+            mock.call(0, 0, 1),
+            mock.call(30, 30, 1, supersede=True),
+            mock.call(30, 30, 0),
+        ]
+
+    def test_type_text(self):
+        """Text is typed in one write without a delay, event by event with one."""
+        self.vnc._rfb_client.key_events = mock.AsyncMock()
+        self.vnc._rfb_client.key_event = mock.AsyncMock()
+
+        asyncio.run(self.vnc.type_text("Hi"))
+        self.vnc._rfb_client.key_events.assert_awaited_once_with(
+            [(65505, True), (72, True), (72, False), (65505, False), (105, True),
+             (105, False)]
+        )
+        self.vnc._rfb_client.key_event.assert_not_awaited()
+
+        asyncio.run(self.vnc.type_text("Hi", delay=0.001))
+        assert self.vnc._rfb_client.key_event.await_count == 6
+
+    def test_paste_text(self):
+        """Long text is pasted once the server echoes it, typed otherwise."""
+        self.vnc._rfb_client.cut_text_seq = 0
+        self.vnc._rfb_client.cut_text = mock.AsyncMock()
+        self.vnc._rfb_client.key_events = mock.AsyncMock()
+        self.vnc._rfb_client.wait_for_cut_text = mock.AsyncMock(
+            return_value="x" * 100
+        )
+
+        assert asyncio.run(self.vnc.paste_text("x" * 100))
+        self.vnc._rfb_client.cut_text.assert_awaited_once_with("x" * 100)
+        self.vnc._rfb_client.wait_for_cut_text.assert_awaited_once_with(0, 1.0)
+        self.vnc._rfb_client.key_events.assert_awaited_once_with(
+            [(0xFFE3, True), (118, True), (118, False), (0xFFE3, False)]
+        )
+
+        # too short to paste
+        self.vnc._rfb_client.key_events.reset_mock()
+        assert not asyncio.run(self.vnc.paste_text("xy"))
+        self.vnc._rfb_client.key_events.assert_awaited_once_with(
+            [(120, True), (120, False), (121, True), (121, False)]
+        )
+        self.vnc._rfb_client.cut_text.assert_awaited_once()
+
+        # the server doesn't echo it, or echoes something else
+        for echo in (TimeoutError(), "y" * 100):
+            self.vnc._rfb_client.key_events.reset_mock()
+            self.vnc._rfb_client.wait_for_cut_text.side_effect = [echo]
+            assert not asyncio.run(self.vnc.paste_text("x" * 100, timeout=0.1))
+            assert len(self.vnc._rfb_client.key_events.await_args.args[0]) == 200
+
+        # not confirmed
+        assert asyncio.run(self.vnc.paste_text("x" * 100, (1, 2), confirm=False))
+        self.vnc._rfb_client.key_events.assert_awaited_with(
+            [(1, True), (2, True), (2, False), (1, False)]
+        )
+
+        # text outside of latin-1 can't be cut text, so it's typed
+        self.vnc._rfb_client.cut_text.reset_mock()
+        assert not asyncio.run(self.vnc.paste_text("€" * 100, confirm=False))
+        self.vnc._rfb_client.cut_text.assert_not_awaited()
+        assert len(self.vnc._rfb_client.key_events.await_args.args[0]) == 200
+
+    def test_update_screen_wait(self):
+        """update_screen(wait=True) waits for the update answering the request."""
+        self.vnc._rfb_client.width = self.vnc._rfb_client.height = 100
+        self.vnc._rfb_client.framebuffer_update_request = mock.AsyncMock(
+            return_value=4
+        )
+        self.vnc._rfb_client.wait_for_update = mock.AsyncMock(return_value=4)
+
+        assert asyncio.run(self.vnc.update_screen(wait=True, timeout=1)) == 4
+        self.vnc._rfb_client.framebuffer_update_request.assert_awaited_once_with(
+            0, 0, 100, 100, False
+        )
+        self.vnc._rfb_client.wait_for_update.assert_awaited_once_with(3, 1)
+        # without waiting, it's the sequence number the update will get
+        assert asyncio.run(self.vnc.update_screen()) == 4
+        self.vnc._rfb_client.wait_for_update.assert_awaited_once()
@@ -0,0 +1,165 @@
+"""Unit tests for SessionManager class."""
+
+import asyncio
+from unittest import TestCase, mock
+
+import pytest
+
+from wsvnc.vnc.session_manager import SessionManager
+
+
+def fake_client(ticket_url, **kwargs):
+    """AsyncWSVNCClient that connects after a moment, unless the URL is bad."""
+    client = mock.Mock()
+    client.ticket_url = ticket_url
+    client.kwargs = kwargs
+    client.closed = False
+
+    async def connect():
+        await asyncio.sleep(1 if ticket_url == "hanging" else 0.01)
+        if ticket_url == "bad":
+            raise ConnectionError("refused")
+
+    async def close():
+        client.closed = True
+
+    async def update_screen(wait):
+        if ticket_url == "slow":
+            await asyncio.sleep(1)
+
+    client.connect = mock.AsyncMock(side_effect=connect)
+    client.close = mock.AsyncMock(side_effect=close)
+    client.update_screen = mock.AsyncMock(side_effect=update_screen)
+    client.get_screen.return_value = f"screen of {ticket_url}"
+    client.is_closed.side_effect = lambda: client.closed
+    return client
+
+
+@mock.patch('wsvnc.vnc.session_manager.AsyncWSVNCClient', side_effect=fake_client)
+class TestSessionManager(TestCase):
+    def test_open_all_bounded(self, patched_client):
+        """No more than max_connecting sessions connect at a time."""
+        connecting = 0
+        most = 0
+
+        async def connect():
+            nonlocal connecting, most
+            connecting += 1
+            most = max(most, connecting)
+            await asyncio.sleep(0.01)
+            connecting -= 1
+
+        def client(ticket_url, **kwargs):
+            c = fake_client(ticket_url, **kwargs)
+            c.connect.side_effect = connect
+            return c
+
+        patched_client.side_effect = client
+
+        async def main():
+            manager = SessionManager(max_connecting=3, shared_flag=0)
+            urls = {f"vm{i}": f"ws://vm{i}" for i in range(10)}
+            assert await manager.open_all(urls) == {}
+            assert len(manager) == 10
+            assert manager.get("vm4").ticket_url == "ws://vm4"
+            assert manager.get("vm4").kwargs == {"shared_flag": 0}
+            await manager.close_all()
+            assert len(manager) == 0
+
+        asyncio.run(main())
+        assert most == 3
+
+    def test_health(self, patched_client):
+        """Failed & disconnected sessions are reported, the rest are healthy."""
+
+        async def main():
+            async with SessionManager() as manager:
+                failed = await manager.open_all({"a": "ws://a", "b": "bad", "c": "ws://c"})
+                assert list(failed) == ["b"]
+                assert isinstance(failed["b"], ConnectionError)
+                manager.get("c").closed = True
+
+                health = manager.health()
+                assert health["a"].healthy
+                assert health["b"].state == "failed"
+                assert health["c"].state == "disconnected"
+                assert manager.connected() == ["a"]
+
+                with pytest.raises(ValueError):
+                    await manager.open("a", "ws://a")
+            assert "a" not in manager
+
+        asyncio.run(main())
+
+    def test_connect_timeout(self, patched_client):
+        async def main():
+            manager = SessionManager(connect_timeout=0.001)
+            with pytest.raises(TimeoutError) as error:
+                await manager.open("a", "ws://a")
+            # the builtin one the docstring promises, on every Python version
+            assert type(error.value) is TimeoutError
+            assert manager.health()["a"].state == "failed"
+            assert type(manager.sessions["a"].error) is TimeoutError
+
+        asyncio.run(main())
+
+    def test_screenshot_all(self, patched_client):
+        """Sessions that don't send their screen in time are left out & unhealthy."""
+
+        async def main():
+            async with SessionManager() as manager:
+                await manager.open_all({"a": "ws://a", "b": "slow", "c": "bad"})
+                screens = await manager.screenshot_all(timeout=0.1)
+                assert screens == {"a": "screen of ws://a"}
+                assert not manager.health()["b"].healthy
+                assert isinstance(manager.health()["b"].error, asyncio.TimeoutError)
+
+        asyncio.run(main())
+
+    def test_close_while_connecting(self, patched_client):
+        """Closing sessions that are still connecting cancels their connection."""
+
+        async def main():
+            manager = SessionManager(max_connecting=1)
+            opening = asyncio.ensure_future(
+                manager.open_all({"a": "hanging", "b": "ws://b"})
+            )
+            await asyncio.sleep(0.05)
+            client = manager.get("a")
+            assert manager.health()["b"].state == "connecting"
+            await asyncio.wait_for(manager.close_all(), 0.5)
+
+            assert len(manager) == 0
+            failed = await asyncio.wait_for(opening, 0.5)
+            assert set(failed) == {"a", "b"}
+            assert all(isinstance(e, asyncio.CancelledError) for e in failed.values())
+            # cancelled mid-connect, nothing is left running to close
+            client.close.assert_not_awaited()
+            assert not [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+        asyncio.run(main())
+
+    def test_close_one_while_connecting(self, patched_client):
+        async def main():
+            manager = SessionManager()
+            opening = asyncio.ensure_future(manager.open("a", "hanging"))
+            await asyncio.sleep(0.05)
+            await manager.close("a")
+            with pytest.raises(asyncio.CancelledError):
+                await opening
+            assert "a" not in manager
+
+        asyncio.run(main())
+
+    def test_screenshot_without_screen(self, patched_client):
+        """A session with no screen after the update fails, the others don't."""
+
+        async def main():
+            async with SessionManager() as manager:
+                await manager.open_all({"a": "ws://a", "b": "ws://b"})
+                manager.get("b").get_screen.return_value = None
+                screens = await manager.screenshot_all()
+                assert list(screens) == ["a"]
+                assert isinstance(manager.health()["b"].error, RuntimeError)
+
+        asyncio.run(main())
@@ -1,11 +1,14 @@
 """Unit tests for WSVNCClient class."""
 
 import asyncio
+import threading
 from unittest import TestCase, mock
 
 import pytest
 
+from wsvnc.image_search import Match
 from wsvnc.rfb.rfb_client import RFBClient
+from wsvnc.subscription import Subscription
 from wsvnc.vnc.vnc_client import WSVNCClient
 
 
@@ -20,6 +23,26 @@ class TestVNCClient(TestCase):
         vnc = WSVNCClient(self.ticket_url)    
         return vnc
     
+    def run_loop(self, vnc: WSVNCClient) -> threading.Thread:
+        """Run the client's event loop in a thread, as _run() would."""
+        thread = threading.Thread(target=vnc._loop.run_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def mock_transport(self, vnc: WSVNCClient) -> mock.Mock:
+        """Give the client a transport whose sends are written right away."""
+        vnc._rfb_client = mock.Mock(spec=RFBClient)
+        vnc._rfb_client.transport = mock.Mock()
+        vnc._rfb_client.transport.written.return_value = asyncio.Future(loop=vnc._loop)
+        vnc._rfb_client.transport.written.return_value.set_result(None)
+        return vnc._rfb_client.transport
+
+    def stop_loop(self, vnc: WSVNCClient, thread: threading.Thread) -> None:
+        """Wait for submitted calls, then stop the client's event loop."""
+        vnc._call(asyncio.sleep(0))
+        vnc._loop.call_soon_threadsafe(vnc._loop.stop)
+        thread.join()
+
     @mock.patch('wsvnc.vnc.vnc_client.WSVNCClient._run')
     @mock.patch('threading.Event.wait')
     def test_init(self, patch_run, patch_wait):
@@ -75,48 +98,182 @@ class TestVNCClient(TestCase):
         
         assert vnc.get_screen_bytes() is None
 
-    @mock.patch("wsvnc.vnc.vnc_client.WSVNCClient.update_screen")
-    def test_set_resend_flag(self, patched_update_screen):
+    def test_update_screen_wait(self):
+        """update_screen(wait=True) waits for the update answering the request."""
+        vnc = self.fake_init()
+        self.mock_transport(vnc)
+        vnc._rfb_client.width = vnc._rfb_client.height = 100
+        vnc._rfb_client.frame_seq = 6
+        vnc._rfb_client.framebuffer_update_request = mock.AsyncMock(return_value=8)
+        vnc._rfb_client.wait_for_update = mock.AsyncMock(return_value=8)
+        thread = self.run_loop(vnc)
+
+        assert vnc.update_screen(wait=True, timeout=2).result(timeout=2) == 8
+        vnc._rfb_client.wait_for_update.assert_awaited_once_with(7, 2)
+        assert vnc.wait_for_update() == 8
+        vnc._rfb_client.wait_for_update.assert_awaited_with(6, None)
+        assert vnc.get_frame_seq() == 6
+        self.stop_loop(vnc, thread)
+
+    def test_wait_until_stable(self):
+        vnc = self.fake_init()
+        vnc._rfb_client = mock.Mock(spec=RFBClient)
+        vnc._rfb_client.wait_until_stable = mock.AsyncMock(return_value=3)
+        thread = self.run_loop(vnc)
+
+        assert vnc.wait_until_stable((1, 2, 3, 4), quiet_ms=100, timeout=2) == 3
+        vnc._rfb_client.wait_until_stable.assert_awaited_once_with((1, 2, 3, 4), 100, 2)
+        assert asyncio.run(vnc.wait_until_stable_async()) == 3
+        self.stop_loop(vnc, thread)
+
+    def test_wait_for_image(self):
+        """Searches again after every update, keeping one request outstanding."""
+        vnc = self.fake_init()
+        vnc._rfb_client = mock.Mock(spec=RFBClient)
+        vnc._rfb_client.resending = False
+        vnc._rfb_client.width = vnc._rfb_client.height = 100
+        vnc._rfb_client.frame_seq = 0
+        match = Match(1, 2, 3, 4, 1.0)
+        vnc._rfb_client.find_image.side_effect = [None, None, match]
+
+        async def update(after, timeout):
+            vnc._rfb_client.frame_seq += 1
+            return vnc._rfb_client.frame_seq
+
+        vnc._rfb_client.wait_for_update = mock.AsyncMock(side_effect=update)
+        vnc._rfb_client.framebuffer_update_request = mock.AsyncMock(return_value=1)
+        thread = self.run_loop(vnc)
+
+        assert vnc.wait_for_image("template", (0, 0, 50, 50), timeout=2) is match
+        assert vnc._rfb_client.wait_for_update.await_count == 2
+        vnc._rfb_client.framebuffer_update_request.assert_awaited_with(
+            0, 0, 50, 50, True
+        )
+        assert vnc._rfb_client.framebuffer_update_request.await_count == 2
+
+        vnc._rfb_client.find_image.side_effect = None
+        vnc._rfb_client.find_image.return_value = None
+        with pytest.raises(TimeoutError):
+            vnc.wait_for_image("template", timeout=0)
+        self.stop_loop(vnc, thread)
+
+    def test_subscribe(self):
+        vnc = self.fake_init()
+        vnc._rfb_client = mock.Mock(spec=RFBClient)
+        subscription = Subscription(1, 2, 3, 4, fps=2)
+        vnc._rfb_client.subscribe = mock.AsyncMock(return_value=subscription)
+        vnc._rfb_client.unsubscribe = mock.AsyncMock()
+        thread = self.run_loop(vnc)
+
+        assert vnc.subscribe(1, 2, 3, 4, fps=2) is subscription
+        vnc._rfb_client.subscribe.assert_awaited_once_with(1, 2, 3, 4, 2)
+        vnc.unsubscribe(subscription)
+        vnc._rfb_client.unsubscribe.assert_awaited_once_with(subscription)
+        self.stop_loop(vnc, thread)
+
+    def test_frame_rate_and_pause(self):
+        vnc = self.fake_init()
+        vnc._rfb_client = mock.Mock(spec=RFBClient)
+        vnc._rfb_client.pause_updates = mock.AsyncMock()
+        vnc._rfb_client.resume_updates = mock.AsyncMock()
+        thread = self.run_loop(vnc)
+
+        vnc.set_frame_rate(10, min_interval=0.5)
+        vnc._rfb_client.set_frame_rate.assert_called_once_with(10, 0.5)
+        vnc.pause_updates()
+        vnc._rfb_client.pause_updates.assert_awaited_once()
+        vnc.resume_updates()
+        vnc._rfb_client.resume_updates.assert_awaited_once()
+        self.stop_loop(vnc, thread)
+
+    def test_set_resend_flag(self):
         """Verify the reset flag is set to True."""
         vnc = self.fake_init()
         vnc._rfb_client = mock.Mock(spec=RFBClient)
         vnc._rfb_client.resend_flag = False
-        
-        vnc.set_resend_flag()
-        
+        vnc._rfb_client.width = vnc._rfb_client.height = 100
+        vnc._rfb_client.framebuffer_update_request = mock.AsyncMock(return_value=1)
+        vnc._rfb_client.transport = mock.Mock()
+        vnc._rfb_client.transport.written.return_value = asyncio.Future(loop=vnc._loop)
+        vnc._rfb_client.transport.written.return_value.set_result(None)
+        thread = self.run_loop(vnc)
+
+        # the future of the request for the whole screen
+        vnc.set_resend_flag().result(timeout=2)
         assert vnc._rfb_client.resend_flag
+        vnc._rfb_client.framebuffer_update_request.assert_awaited_once_with(
+            0, 0, 100, 100, False
+        )
+        assert vnc.update_screen(10, 10).result(timeout=2) == 1
+        assert vnc._rfb_client.framebuffer_update_request.await_count == 2
+        assert vnc.set_resend_flag(False) is None
+        assert not vnc._rfb_client.resend_flag
+        self.stop_loop(vnc, thread)
     
-    @mock.patch("wsvnc.vnc.vnc_client.WSVNCClient.key_event")
+    @mock.patch("wsvnc.vnc.async_vnc_client.AsyncWSVNCClient.pointer_event")
+    def test_batch(self, patched_pointer_event):
+        """Only input & requests this thread sends in batch() hold the transport."""
+        vnc = self.fake_init()
+        transport = self.mock_transport(vnc)
+        vnc._rfb_client.wait_until_stable = mock.AsyncMock(return_value=3)
+        thread = self.run_loop(vnc)
+
+        with vnc.batch():
+            vnc.move(1, 1).result(timeout=2)
+            assert transport.hold.call_count == 2
+            # waiting calls don't take a hold, and don't wait for the block
+            assert vnc.wait_until_stable(timeout=2) == 3
+            # neither does input other threads send meanwhile
+            other = threading.Thread(target=lambda: vnc.move(2, 2).result(timeout=2))
+            other.start()
+            other.join()
+            vnc._call(asyncio.sleep(0))
+            assert transport.hold.call_count == 2
+        self.stop_loop(vnc, thread)
+
+        assert transport.release.call_count == 2
+        assert patched_pointer_event.call_count == 2
+
+    @mock.patch("wsvnc.vnc.async_vnc_client.AsyncWSVNCClient.key_event")
     def test_send_key(self, patched_key_event):
         """Verify we press & release a key."""
         vnc = self.fake_init()
-        vnc.send_key(50)
+        self.mock_transport(vnc)
+        thread = self.run_loop(vnc)
+        assert vnc.send_key(50).result(timeout=2) is None
+        self.stop_loop(vnc, thread)
         assert patched_key_event.call_count == 2
     
-    @mock.patch("wsvnc.vnc.vnc_client.WSVNCClient.pointer_event")
+    @mock.patch("wsvnc.vnc.async_vnc_client.AsyncWSVNCClient.pointer_event")
     def test_mouse_movements(self, patched_pointer_event):
         """Tests all of the movements we implemented."""
         vnc = self.fake_init()
+        self.mock_transport(vnc)
+        thread = self.run_loop(vnc)
         vnc.move(50, 50)
         vnc.release(50, 50)
         vnc.left_click(50, 50)
-        vnc.double_left_click(50, 50)
+        vnc.double_left_click(50, 50).result(timeout=2)
         vnc.press(50, 50)
         vnc.right_click(50, 50)
-        vnc.wheel_up(100, 100)
-        vnc.wheel_down(300, 300)
-        vnc.wheel(150, 150, 50)
-        vnc.wheel(150, 50, 50, True)
+        vnc.wheel_up(100, 100).result(timeout=2)
+        vnc.wheel_down(300, 300).result(timeout=2)
+        vnc.wheel(150, 150, 50).result(timeout=2)
+        vnc.wheel(150, 50, 50, True).result(timeout=2)
         vnc.click_and_drag(50, 50, 100, 100)
+        self.stop_loop(vnc, thread)
         
         patched_pointer_event.assert_called()
         assert patched_pointer_event.call_count == 28
     
-    @mock.patch("wsvnc.vnc.vnc_client.WSVNCClient.key_event")
+    @mock.patch("wsvnc.vnc.async_vnc_client.AsyncWSVNCClient.key_event")
     def test_emit_text(self, patched_key_event):
         """Test emit_text()."""
         vnc = self.fake_init()
-        vnc.emit_text("hE1!o")
+        self.mock_transport(vnc)
+        thread = self.run_loop(vnc)
+        assert vnc.emit_text("hE1!o").result(timeout=5) is None
+        self.stop_loop(vnc, thread)
         
         assert patched_key_event.call_count == 14
         